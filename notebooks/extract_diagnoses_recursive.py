@@ -156,13 +156,23 @@ def print_diagnosis_tree(diagnoses: List[Dict[str, Any]], max_display: int = 50)
                 print(f"{indent}   Includes: {', '.join(diag['inclusion_terms'][:2])}")
 
 
-def main():
-    # Path to the XML file
-    data_dir = Path("../data/icd10cm-table-and-index-2026")
-    xml_path = data_dir / "icd10cm-tabular-2026.xml"
+def find_tabular_xml(data_dir: Path) -> Path | None:
+    """Find the tabular XML file of a release directory.
 
-    if not xml_path.exists():
-        print(f"Error: File not found at {xml_path}")
+    File names vary between releases (icd10cm-tabular-2026.xml,
+    icd10cm_tabular_2019.xml), so any tabular XML file is accepted.
+    """
+    matches = sorted(data_dir.glob("icd10cm*tabular*.xml"))
+    return matches[0] if matches else None
+
+
+def main(year: int = 2026):
+    # Release directory, e.g. ../data/icd10cm-table-and-index-2019 for FY2019
+    data_dir = Path(f"../data/icd10cm-table-and-index-{year}")
+    xml_path = find_tabular_xml(data_dir)
+
+    if xml_path is None:
+        print(f"Error: No tabular XML file found in {data_dir}")
         return
 
     print(f"Extracting diagnoses from {xml_path}...")
@@ -213,4 +223,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import sys
+
+    # Fiscal years to extract, e.g. `python extract_diagnoses_recursive.py 2019 2026`
+    for year in sys.argv[1:] or ["2026"]:
+        main(int(year))
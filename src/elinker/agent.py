@@ -0,0 +1,268 @@
+"""Tool-using coder that runs the ICD-10 tools in-process."""
+
+import asyncio
+import json
+import re
+import time
+from typing import Any
+
+from .coders import DEFAULT_MODEL, MISSING_CODE, CodingRequest, CodingResult, token_usage
+from .codes import CodeTable
+from .prompts import render_prompt
+from .retrieval import CandidateRetriever
+
+TOOLS_TEMPLATE = "prompt_template_tools.md.jinja2"
+
+TOOL_DEFINITIONS = [
+    {
+        "name": "search_codes",
+        "description": "Search the ICD-10-CM code table for billable codes matching a clinical phrase.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Clinical phrase to search for"},
+                "max_results": {"type": "integer", "description": "Number of codes to return"},
+            },
+            "required": ["query"],
+        },
+    },
+    {
+        "name": "validate_code",
+        "description": "Check whether an ICD-10-CM code exists and is billable.",
+        "input_schema": {
+            "type": "object",
+            "properties": {"code": {"type": "string", "description": "ICD-10-CM code"}},
+            "required": ["code"],
+        },
+    },
+    {
+        "name": "lookup_code",
+        "description": "Return the full details of an ICD-10-CM code, including notes.",
+        "input_schema": {
+            "type": "object",
+            "properties": {"code": {"type": "string", "description": "ICD-10-CM code"}},
+            "required": ["code"],
+        },
+    },
+]
+
+_ANSWER_CODE = re.compile(r"<icd10_code>\s*(.*?)\s*</icd10_code>", re.DOTALL)
+_ANSWER_DESCRIPTION = re.compile(r"<description>\s*(.*?)\s*</description>", re.DOTALL)
+_ANSWER_JUSTIFICATION = re.compile(r"<justification>\s*(.*?)\s*</justification>", re.DOTALL)
+
+_LOOKUP_FIELDS = (
+    "code",
+    "description",
+    "parent_code",
+    "is_billable",
+    "inclusion_terms",
+    "includes",
+    "excludes1",
+    "excludes2",
+    "code_first",
+    "use_additional_code",
+    "code_also",
+    "chapter_desc",
+    "section_desc",
+)
+
+# Tools slow enough to run in a worker thread; the rest are memoized dict lookups
+_THREADED_TOOLS = frozenset({"search_codes"})
+
+
+class LocalTools:
+    """The ICD-10 tools, answered from the local code table.
+
+    ``validate_code`` and ``lookup_code`` results are memoized, so sharing one
+    instance across a run answers repeated codes from a dict.
+    """
+
+    def __init__(self, table: CodeTable, retriever: CandidateRetriever | None = None):
+        self.table = table
+        self.retriever = retriever or CandidateRetriever(table)
+        self._validate_cache: dict[str, dict] = {}
+        self._lookup_cache: dict[str, dict] = {}
+
+    def search_codes(self, query: str, max_results: int = 10) -> list[dict]:
+        """Return the best matching billable codes for a phrase."""
+        return [
+            {"code": c.code, "description": c.description}
+            for c in self.retriever.retrieve(query, max_results)
+        ]
+
+    def validate_code(self, code: str) -> dict:
+        """Check whether a code exists and is billable."""
+        code = code.strip().upper()
+        if code not in self._validate_cache:
+            record = self.table.get(code)
+            self._validate_cache[code] = {
+                "code": code,
+                "valid": record is not None,
+                "billable": bool(record and record.get("is_billable")),
+                "description": record.get("description", "") if record else "",
+            }
+        return self._validate_cache[code]
+
+    def lookup_code(self, code: str) -> dict:
+        """Return the details of a code."""
+        code = code.strip().upper()
+        if code not in self._lookup_cache:
+            record = self.table.get(code)
+            if record is None:
+                self._lookup_cache[code] = {"code": code, "error": "Code not found"}
+            else:
+                self._lookup_cache[code] = {
+                    field: record[field] for field in _LOOKUP_FIELDS if field in record
+                }
+        return self._lookup_cache[code]
+
+    def call(self, name: str, arguments: dict) -> Any:
+        """Dispatch a tool call by name."""
+        if name == "search_codes":
+            return self.search_codes(arguments["query"], int(arguments.get("max_results", 10)))
+        if name == "validate_code":
+            return self.validate_code(arguments["code"])
+        if name == "lookup_code":
+            return self.lookup_code(arguments["code"])
+        raise ValueError(f"Unknown tool: {name}")
+
+    async def execute(self, tool_calls: list) -> list[dict]:
+        """Run the tool calls of one model turn concurrently.
+
+        ``search_codes`` runs in a worker thread; the memoized dict lookups
+        answer inline, so their caches are only touched from the event loop.
+
+        Args:
+            tool_calls: ``tool_use`` content blocks from a model response
+
+        Returns:
+            ``tool_result`` content blocks, in the same order
+        """
+
+        async def _run(block) -> dict:
+            try:
+                if block.name in _THREADED_TOOLS:
+                    output = await asyncio.to_thread(self.call, block.name, block.input)
+                else:
+                    output = self.call(block.name, block.input)
+                return {
+                    "type": "tool_result",
+                    "tool_use_id": block.id,
+                    "content": json.dumps(output),
+                }
+            except Exception as e:
+                return {
+                    "type": "tool_result",
+                    "tool_use_id": block.id,
+                    "content": str(e),
+                    "is_error": True,
+                }
+
+        return list(await asyncio.gather(*(_run(block) for block in tool_calls)))
+
+
+class ToolUsingCoder:
+    """Agent loop over the Anthropic Messages API with local tools.
+
+    Each model turn is one API round trip; the tool calls it requests run
+    in-process and concurrently before the next turn. Turn latency, tool
+    latency and tool-call counts are recorded on the result.
+
+    With ``stream=True`` each turn is streamed so the time to the first
+    token of the first turn can be recorded in ``result.usage["ttft"]``.
+    """
+
+    def __init__(
+        self,
+        tools: LocalTools,
+        model: str = DEFAULT_MODEL,
+        max_tokens: int = 2048,
+        max_turns: int = 8,
+        client: Any = None,
+        stream: bool = False,
+    ):
+        if client is None:
+            import anthropic
+
+            client = anthropic.AsyncAnthropic()
+
+        self.tools = tools
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_turns = max_turns
+        self.client = client
+        self.stream = stream
+
+    async def code(self, request: CodingRequest) -> CodingResult:
+        """Code a single request, running tool calls until the model answers.
+
+        Args:
+            request: Phrase and note context to code
+
+        Returns:
+            The assigned code with per-turn timings
+        """
+        prompt = render_prompt(
+            TOOLS_TEMPLATE,
+            clinical_note=request.clinical_note,
+            clinical_phrase=request.clinical_phrase,
+            exemplars=request.exemplars or [],
+        )
+        messages: list[dict] = [{"role": "user", "content": prompt}]
+        turns = []
+        usage = {"input_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+        if self.stream:
+            usage["ttft"] = None
+        request_start = time.perf_counter()
+
+        for _ in range(self.max_turns):
+            start = time.perf_counter()
+            kwargs = {
+                "model": self.model,
+                "max_tokens": self.max_tokens,
+                "messages": messages,
+                "tools": TOOL_DEFINITIONS,
+            }
+            if not self.stream:
+                response = await self.client.messages.create(**kwargs)
+            else:
+                async with self.client.messages.stream(**kwargs) as stream:
+                    async for event in stream:
+                        if event.type == "content_block_delta" and usage["ttft"] is None:
+                            usage["ttft"] = time.perf_counter() - request_start
+                    response = await stream.get_final_message()
+            turn = {"latency": time.perf_counter() - start, "tool_calls": 0, "tool_latency": 0.0}
+            turns.append(turn)
+            for key, value in token_usage(getattr(response, "usage", None)).items():
+                usage[key] += value
+
+            tool_calls = [block for block in response.content if block.type == "tool_use"]
+            if not tool_calls:
+                text = "".join(block.text for block in response.content if block.type == "text")
+                result = parse_answer(text, turns)
+                result.usage = usage
+                return result
+
+            start = time.perf_counter()
+            results = await self.tools.execute(tool_calls)
+            turn["tool_calls"] = len(tool_calls)
+            turn["tool_latency"] = time.perf_counter() - start
+
+            messages.append({"role": "assistant", "content": response.content})
+            messages.append({"role": "user", "content": results})
+
+        raise RuntimeError(f"No answer after {self.max_turns} turns")
+
+
+def parse_answer(text: str, turns: list[dict] | None = None) -> CodingResult:
+    """Parse the ``<answer>`` block of a tool-using response."""
+    code = _ANSWER_CODE.search(text)
+    description = _ANSWER_DESCRIPTION.search(text)
+    justification = _ANSWER_JUSTIFICATION.search(text)
+
+    return CodingResult(
+        code.group(1) if code else MISSING_CODE,
+        description.group(1) if description else "",
+        justification.group(1) if justification else "",
+        turns=turns,
+    )
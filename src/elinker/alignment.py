@@ -0,0 +1,178 @@
+"""Alignment of predicted spans with gold spans for error review."""
+
+from .coders import MISSING_CODE
+
+# Alignment kinds, in report order
+KINDS = ("tp", "wrong_code", "fp", "fn")
+
+
+class SpanAlignment:
+    """A gold span, a predicted span, or an overlapping pair of both."""
+
+    def __init__(self, kind: str, gold: dict | None, predicted: dict | None, exact: bool = False):
+        self.kind = kind  # One of KINDS
+        self.gold = gold  # Gold annotation dict, None for a false positive
+        self.predicted = predicted  # Predicted span dict, None for a false negative
+        self.exact = exact  # Both spans have the same offsets
+
+    @property
+    def begin(self) -> int:
+        return (self.gold or self.predicted)["begin"]
+
+    @property
+    def end(self) -> int:
+        return (self.gold or self.predicted)["end"]
+
+    @property
+    def gold_code(self) -> str | None:
+        return self.gold.get("code") if self.gold else None
+
+    @property
+    def predicted_code(self) -> str | None:
+        return self.predicted.get("code") if self.predicted else None
+
+    def to_dict(self) -> dict:
+        """Serialize the alignment."""
+        return {
+            "kind": self.kind,
+            "begin": self.begin,
+            "end": self.end,
+            "gold": self.gold_code,
+            "predicted": self.predicted_code,
+            "exact": self.exact,
+        }
+
+    def __repr__(self):
+        return f"<SpanAlignment {self.kind} {self.begin}-{self.end}>"
+
+
+def align_spans(gold: list[dict], predicted: list[dict]) -> list[SpanAlignment]:
+    """Align the predicted spans of a note with its gold spans.
+
+    A sort-merge interval join finds every overlapping (gold, predicted)
+    pair in one pass over both lists sorted by offset. Pairs are then
+    matched one-to-one, preferring exact offsets, then the same code, then
+    the larger overlap. A matched pair is a true positive when the codes
+    agree and a wrong-code match otherwise; unmatched gold spans are false
+    negatives and unmatched predictions false positives.
+
+    Args:
+        gold: Gold annotations (``begin``, ``end``, ``code``)
+        predicted: Predicted spans (``begin``, ``end``, ``code``)
+
+    Returns:
+        Alignments ordered by offset
+    """
+    gold = [span for span in gold if span.get("begin") is not None]
+    gold = sorted(gold, key=lambda span: (span["begin"], span["end"]))
+    predicted = sorted(predicted, key=lambda span: (span["begin"], span["end"]))
+
+    pairs = []
+    active = []  # Predictions that may still overlap the current gold span
+    j = 0
+    for i, g in enumerate(gold):
+        while j < len(predicted) and predicted[j]["begin"] < max(g["end"], g["begin"] + 1):
+            active.append(j)
+            j += 1
+        # Gold spans come in begin order, so a prediction ending before this one never returns
+        active = [k for k in active if predicted[k]["end"] > g["begin"]]
+        for k in active:
+            p = predicted[k]
+            exact = p["begin"] == g["begin"] and p["end"] == g["end"]
+            overlap = min(p["end"], g["end"]) - max(p["begin"], g["begin"])
+            if exact or overlap > 0:
+                same = p.get("code") == g.get("code")
+                pairs.append((not exact, not same, -overlap, i, k))
+
+    pairs.sort()
+    gold_match = {}
+    used = set()
+    for inexact, _, _, i, k in pairs:
+        if i not in gold_match and k not in used:
+            gold_match[i] = (k, not inexact)
+            used.add(k)
+
+    alignments = []
+    for i, g in enumerate(gold):
+        if i in gold_match:
+            k, exact = gold_match[i]
+            p = predicted[k]
+            kind = "tp" if p.get("code") == g.get("code") else "wrong_code"
+            alignments.append(SpanAlignment(kind, g, p, exact))
+        else:
+            alignments.append(SpanAlignment("fn", g, None))
+    for k, p in enumerate(predicted):
+        if k not in used:
+            alignments.append(SpanAlignment("fp", None, p))
+
+    alignments.sort(key=lambda a: (a.begin, a.end))
+    return alignments
+
+
+def predicted_spans(records: list[dict], hadm_id=None) -> dict[str, list[dict]]:
+    """Predicted spans per note from prediction records.
+
+    Records written by ``elinker evaluate`` carry the gold ``code`` and the
+    ``predicted`` one; for other records ``code`` is the prediction.
+    Spans coded ``__MISSING__`` count as not predicted.
+
+    Args:
+        records: Prediction records with ``note_id``, ``begin``, ``end``
+        hadm_id: Keep only records of this admission
+
+    Returns:
+        Dict of note id (as a string) to spans with ``begin``, ``end``, ``code``
+    """
+    spans = {}
+    for record in records:
+        if hadm_id is not None and str(record.get("hadm_id")) != str(hadm_id):
+            continue
+        code = record.get("predicted", record.get("code"))
+        if code is None or code == MISSING_CODE or record.get("begin") is None:
+            continue
+        spans.setdefault(str(record.get("note_id")), []).append(
+            {"begin": record["begin"], "end": record["end"], "code": code}
+        )
+    return spans
+
+
+def align_admission(data: dict, records: list[dict]) -> list[list[SpanAlignment]]:
+    """Align an admission's gold annotations with prediction records.
+
+    Args:
+        data: Admission in the viewer's JSON format
+        records: Prediction records, e.g. from ``predictions.jsonl``
+
+    Returns:
+        Alignments per note, in note order
+    """
+    spans = predicted_spans(records, data.get("hadm_id"))
+    return [
+        align_spans(note.get("annotations", []), spans.get(str(note.get("note_id")), []))
+        for note in data.get("notes", [])
+    ]
+
+
+def summarize(alignments: list[SpanAlignment]) -> dict:
+    """Counts per alignment kind with span-level precision, recall and F1.
+
+    A wrong-code match counts against both precision and recall.
+    """
+    counts = dict.fromkeys(KINDS, 0)
+    exact = 0
+    for alignment in alignments:
+        counts[alignment.kind] += 1
+        exact += alignment.exact
+    predicted = counts["tp"] + counts["wrong_code"] + counts["fp"]
+    gold = counts["tp"] + counts["wrong_code"] + counts["fn"]
+    precision = counts["tp"] / predicted if predicted else 0.0
+    recall = counts["tp"] / gold if gold else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        **counts,
+        "exact": exact,
+        "overlapping": counts["tp"] + counts["wrong_code"] - exact,
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+    }
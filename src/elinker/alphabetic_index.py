@@ -0,0 +1,226 @@
+"""ICD-10-CM Alphabetic Index as a trie of term paths."""
+
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from .coders import CodingRequest, CodingResult
+from .codes import CodeTable
+
+# Words that need not be matched for a phrase to be fully resolved
+STOPWORDS = frozenset({"a", "an", "and", "in", "of", "on", "or", "the", "to", "with", "without"})
+
+# Longest term key considered, in tokens
+_MAX_KEY_TOKENS = 6
+
+# Cross-references followed per lookup
+_MAX_SEE_HOPS = 2
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word tokens with apostrophes dropped (``"Addison's"`` -> ``addisons``)."""
+    return _TOKEN.findall(text.lower().replace("'", "").replace("’", ""))
+
+
+class IndexMatch:
+    """The index path a phrase resolved to."""
+
+    def __init__(self, code: str | None, path: list[str], matched: int, complete: bool):
+        self.code = code
+        self.path = path  # Term titles from main term down
+        self.matched = matched  # Phrase tokens consumed
+        self.complete = complete  # Every non-stopword token consumed
+
+    def to_dict(self) -> dict:
+        """Serialize the match."""
+        return {
+            "code": self.code,
+            "path": self.path,
+            "matched": self.matched,
+            "complete": self.complete,
+        }
+
+    def __repr__(self):
+        return f"<IndexMatch {' > '.join(self.path)}: {self.code}>"
+
+
+class AlphabeticIndex:
+    """Trie over the Alphabetic Index.
+
+    Node 0 is the root; its children are main terms and every deeper level
+    is a subterm. Edges are keyed by normalized term text (lower-cased
+    tokens joined by spaces, nonessential modifiers dropped), and main terms
+    such as "Abdomen, abdominal" get one edge per comma-separated form.
+    Nodes are stored as parallel lists to keep the ~100k terms compact.
+    """
+
+    def __init__(self):
+        self.children: list[dict[str, int]] = [{}]
+        self.titles: list[str] = [""]
+        self.codes: list[str | None] = [None]
+        self.see: list[str | None] = [None]
+        self.see_also: list[str | None] = [None]
+        self.parents: list[int] = [-1]
+
+    @classmethod
+    def load(cls, path: Path) -> "AlphabeticIndex":
+        """Load the index XML, e.g. ``icd10cm-index-2026.xml``."""
+        index = cls()
+        for main_term in ET.parse(path).getroot().iter("mainTerm"):
+            index._add_term(main_term, 0, main=True)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.titles) - 1
+
+    def _add_term(self, element: ET.Element, parent: int, main: bool = False) -> None:
+        title = _title(element)
+        node = len(self.titles)
+        self.titles.append(title)
+        self.codes.append(_text(element.find("code")) or None)
+        self.see.append(_text(element.find("see")) or None)
+        self.see_also.append(_text(element.find("seeAlso")) or None)
+        self.parents.append(parent)
+        self.children.append({})
+
+        forms = title.split(",") if main else [title]
+        for form in forms:
+            key = " ".join(tokenize(form))
+            if key:
+                # The first term with a key wins, as in a printed index
+                self.children[parent].setdefault(key, node)
+
+        for term in element.findall("term"):
+            self._add_term(term, node)
+
+    def find(self, path: list[str]) -> int | None:
+        """Node of a term path such as ``["Failure", "kidney"]``, or None."""
+        node = 0
+        for term in path:
+            node = self.children[node].get(" ".join(tokenize(term)))
+            if node is None:
+                return None
+        return node
+
+    def path(self, node: int) -> list[str]:
+        """Term titles from the main term down to a node."""
+        titles = []
+        while node > 0:
+            titles.append(self.titles[node])
+            node = self.parents[node]
+        return titles[::-1]
+
+    def lookup(self, phrase: str) -> IndexMatch | None:
+        """Resolve a phrase by its longest path through the index.
+
+        Any run of phrase tokens can name the main term; the remaining
+        tokens are then matched against subterms level by level, in any
+        order. The path consuming the most tokens wins, then the deeper one.
+        A node without a code that has a "see" reference continues at the
+        referenced term.
+
+        Args:
+            phrase: Clinical phrase, e.g. a span's ``covered_text``
+
+        Returns:
+            Best match, or None if no main term occurs in the phrase
+        """
+        tokens = tokenize(phrase)
+        best = None
+        for start, end, node in _spans(tokens, self.children[0]):
+            rest = tokens[:start] + tokens[end:]
+            found = self._descend(node, rest, end - start, 0)
+            if best is None or found[:2] > best[:2]:
+                best = found
+        if best is None:
+            return None
+
+        matched, _, node, rest = best
+        code = self.codes[node]
+        complete = all(token in STOPWORDS for token in rest)
+        return IndexMatch(code, self.path(node), matched, complete and code is not None)
+
+    def _descend(
+        self, node: int, rest: list[str], matched: int, hops: int
+    ) -> tuple[int, int, int, list[str]]:
+        """Best (matched, depth, node, unmatched tokens) below a node."""
+        if self.codes[node] is None and self.see[node] and hops < _MAX_SEE_HOPS:
+            target = self.find(self.see[node].split(","))
+            if target is not None:
+                return self._descend(target, rest, matched, hops + 1)
+
+        best = (matched, 0, node, rest)
+        for start, end, child in _spans(rest, self.children[node]):
+            found = self._descend(child, rest[:start] + rest[end:], matched + end - start, hops)
+            found = (found[0], found[1] + 1, found[2], found[3])
+            if found[:2] > best[:2]:
+                best = found
+        return best
+
+
+class IndexFirstCoder:
+    """Codes spans from the Alphabetic Index, calling a model only when needed.
+
+    A span is resolved locally when its phrase is fully consumed by an index
+    path ending in a complete code (and, given a code table, a billable one).
+    Everything else goes to the wrapped coder, including every ICD-10-PCS
+    span: the index only holds diagnosis (ICD-10-CM) codes.
+    """
+
+    def __init__(self, index: AlphabeticIndex, coder, table: CodeTable | None = None):
+        self.index = index
+        self.coder = coder
+        self.table = table
+        self.model = getattr(coder, "model", None)
+        self.resolved = 0
+
+    def resolve(self, phrase: str, code_system: str | None = None) -> IndexMatch | None:
+        """The index match for a phrase if it can be coded without a model."""
+        if code_system is not None and "PCS" in code_system.upper():
+            return None
+        match = self.index.lookup(phrase)
+        if match is None or not match.complete or match.code.endswith("-"):
+            return None
+        if self.table is not None and not self.table.is_billable(match.code):
+            return None
+        return match
+
+    async def code(self, request: CodingRequest) -> CodingResult:
+        """Code a request from the index, or with the wrapped coder."""
+        match = self.resolve(request.clinical_phrase, request.code_system)
+        if match is None:
+            return await self.coder.code(request)
+
+        self.resolved += 1
+        description = self.table.description(match.code) if self.table is not None else ""
+        return CodingResult(
+            match.code,
+            description=description,
+            justification=f"Alphabetic Index: {' > '.join(match.path)}",
+        )
+
+
+def _spans(tokens: list[str], children: dict[str, int]):
+    """``(start, end, node)`` for every token run that is a child key."""
+    for start in range(len(tokens)):
+        for end in range(start + 1, min(start + _MAX_KEY_TOKENS, len(tokens)) + 1):
+            node = children.get(" ".join(tokens[start:end]))
+            if node is not None:
+                yield start, end, node
+
+
+def _title(element: ET.Element) -> str:
+    """Term title without its nonessential modifiers (``<nemod>``)."""
+    title = element.find("title")
+    if title is None:
+        return ""
+    parts = [title.text or ""] + [child.tail or "" for child in title]
+    return " ".join("".join(parts).split()).strip(" ,")
+
+
+def _text(element: ET.Element | None) -> str:
+    if element is None:
+        return ""
+    return " ".join("".join(element.itertext()).split())
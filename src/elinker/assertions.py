@@ -0,0 +1,224 @@
+"""NegEx/ConText-style assertion classification of spans in their note."""
+
+import re
+
+# Assertion categories, in report order
+CATEGORIES = ("negated", "hypothetical", "historical", "family")
+
+# Trigger phrases per category. "pre" triggers scope forward over the text
+# after them, "post" triggers backward over the text before them.
+TRIGGERS = {
+    "negated": {
+        "pre": [
+            "no",
+            "not",
+            "denies",
+            "denied",
+            "denying",
+            "without",
+            "negative for",
+            "no evidence of",
+            "no signs of",
+            "no sign of",
+            "no history of",
+            "free of",
+            "absence of",
+            "never had",
+            "resolved",
+        ],
+        "post": ["ruled out", "was ruled out", "has been ruled out", "was negative", "absent"],
+    },
+    "hypothetical": {
+        "pre": [
+            "rule out",
+            "r/o",
+            "possible",
+            "possibly",
+            "suspected",
+            "suspect",
+            "suspicion of",
+            "concern for",
+            "question of",
+            "questionable",
+            "evaluate for",
+            "evaluation for",
+            "if",
+            "in case of",
+            "return if",
+            "risk of",
+        ],
+        "post": ["is suspected", "unlikely", "is possible", "not excluded", "cannot be excluded"],
+    },
+    "historical": {
+        "pre": [
+            "history of",
+            "h/o",
+            "hx of",
+            "past history of",
+            "past medical history",
+            "pmh",
+            "previous",
+            "prior",
+            "remote",
+            "status post",
+            "s/p",
+        ],
+        "post": ["in the past", "years ago", "previously"],
+    },
+    "family": {
+        "pre": [
+            "family history of",
+            "family history",
+            "fhx",
+            "fh of",
+            "mother",
+            "father",
+            "sister",
+            "brother",
+            "maternal",
+            "paternal",
+            "grandmother",
+            "grandfather",
+            "aunt",
+            "uncle",
+        ],
+        "post": ["in her mother", "in his mother", "in her father", "in his father"],
+    },
+}
+
+# Words that end a trigger's scope
+TERMINATORS = [
+    "but",
+    "however",
+    "although",
+    "though",
+    "aside from",
+    "apart from",
+    "except",
+    "which",
+    "who",
+    "presents with",
+    "presenting with",
+    "now with",
+    "complains of",
+]
+
+# Phrases that contain a trigger but do not assert anything
+PSEUDO_TRIGGERS = [
+    "no increase",
+    "no change",
+    "no significant change",
+    "not only",
+    "no further",
+    "not certain if",
+    "without difficulty",
+    "gram negative",
+    "if needed",
+    "prior to",
+]
+
+# Sentence boundaries: end punctuation before whitespace, or a blank line
+_BOUNDARY = re.compile(r"[.!?;](?=\s)|\n\s*\n")
+
+_WORD = re.compile(r"\w+")
+
+
+class AssertionClassifier:
+    """Classifies a span as negated, hypothetical, historical or family-related.
+
+    Every trigger, terminator and pseudo-trigger is compiled into a single
+    regular expression (longest phrase first), so classifying a span is one
+    left-to-right scan of its sentence. A pre-trigger applies to a span that
+    follows it within ``window`` words of the same sentence with no
+    terminator in between; a post-trigger likewise applies backwards.
+    """
+
+    def __init__(self, window: int = 6, max_sentence: int = 400):
+        self.window = window
+        self.max_sentence = max_sentence  # Characters searched either side of a span
+
+        self.lexicon: dict[str, tuple[str, str]] = {}
+        for category, directions in TRIGGERS.items():
+            for direction, phrases in directions.items():
+                for phrase in phrases:
+                    self.lexicon[phrase] = (category, direction)
+        for phrase in TERMINATORS:
+            self.lexicon[phrase] = ("terminate", "")
+        for phrase in PSEUDO_TRIGGERS:
+            self.lexicon[phrase] = ("pseudo", "")
+
+        alternatives = sorted(self.lexicon, key=len, reverse=True)
+        pattern = "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in alternatives)
+        self.automaton = re.compile(rf"(?<![\w/])(?:{pattern})(?![\w/])", re.IGNORECASE)
+
+    def classify(self, text: str, begin: int, end: int) -> dict[str, str]:
+        """Assertion categories of a span.
+
+        Args:
+            text: Note text
+            begin: Span start offset
+            end: Span end offset
+
+        Returns:
+            Dict of category to the trigger that set it, in :data:`CATEGORIES`
+            order; empty for an affirmed, current, patient condition
+        """
+        start, stop = self._sentence(text, begin, end)
+        matches = []
+        for match in self.automaton.finditer(text, start, stop):
+            if match.end() <= begin or match.start() >= end:
+                key = " ".join(match.group().lower().split())
+                matches.append((match.start(), match.end(), *self.lexicon[key], match.group()))
+
+        stops = [(s, e) for s, e, category, *_ in matches if category == "terminate"]
+        found = {}
+        for m_start, m_end, category, direction, trigger in matches:
+            if category in found or category in ("terminate", "pseudo"):
+                continue
+            if direction == "pre" and m_end <= begin:
+                gap = (m_end, begin)
+            elif direction == "post" and m_start >= end:
+                gap = (end, m_start)
+            else:
+                continue
+            terminated = any(gap[0] <= s and e <= gap[1] for s, e in stops)
+            if not terminated and len(_WORD.findall(text, *gap)) <= self.window:
+                found[category] = trigger
+
+        return {category: found[category] for category in CATEGORIES if category in found}
+
+    def _sentence(self, text: str, begin: int, end: int) -> tuple[int, int]:
+        """Bounds of the sentence containing a span."""
+        lo = max(0, begin - self.max_sentence)
+        start = lo
+        for boundary in _BOUNDARY.finditer(text, lo, begin):
+            start = boundary.end()
+        boundary = _BOUNDARY.search(text, end, min(len(text), end + self.max_sentence))
+        stop = boundary.start() if boundary else min(len(text), end + self.max_sentence)
+        return start, stop
+
+
+class AssertionFilter:
+    """Decides which spans skip the model based on their assertion categories.
+
+    Args:
+        skip: Categories whose spans are not sent to the model
+        classifier: Classifier to use (a default one when omitted)
+    """
+
+    def __init__(self, skip=("negated", "hypothetical"), classifier=None):
+        unknown = set(skip) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unknown assertion categories: {sorted(unknown)}")
+        self.skip = frozenset(skip)
+        self.classifier = classifier or AssertionClassifier()
+
+    def classify(self, row: dict) -> dict[str, str]:
+        """Assertion categories of an example row (``text``, ``begin``, ``end``)."""
+        if row.get("begin") is None or row.get("end") is None:
+            return {}
+        return self.classifier.classify(row.get("text") or "", row["begin"], row["end"])
+
+    def skips(self, assertions: dict[str, str]) -> bool:
+        """Whether a span with these assertions is coded without the model."""
+        return any(category in self.skip for category in assertions)
@@ -0,0 +1,187 @@
+"""Bulk retrieval linking of spans across a process pool."""
+
+import json
+import multiprocessing
+import os
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any
+
+from .retrieval import CandidateRetriever
+
+# Input columns holding the phrase to link, in order of preference
+PHRASE_FIELDS = ("phrase", "covered_text")
+
+# Input columns not copied to the output (note text is large and not needed)
+DROPPED_FIELDS = ("text", "note")
+
+# Per-process retriever, loaded once by the pool initializer
+_retriever: CandidateRetriever | None = None
+
+
+def read_spans(path: Path, batch_size: int = 10_000) -> Iterator[dict]:
+    """Stream span rows from a JSONL or Parquet file.
+
+    Parquet files are read one record batch at a time, so the whole file is
+    never held in memory.
+
+    Args:
+        path: ``.jsonl`` or ``.parquet`` file
+        batch_size: Rows per Parquet record batch
+
+    Yields:
+        One dict per span
+    """
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def count_spans(path: Path) -> int | None:
+    """Number of rows in a Parquet file, or None for JSONL."""
+    if path.suffix != ".parquet":
+        return None
+    import pyarrow.parquet as pq
+
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def phrase_of(row: dict) -> str:
+    """The phrase to link from an input row."""
+    for field in PHRASE_FIELDS:
+        if row.get(field):
+            return str(row[field])
+    return ""
+
+
+def link_spans(
+    spans: Iterator[dict],
+    index_dir: Path,
+    k: int = 1,
+    workers: int | None = None,
+    chunk_size: int = 512,
+    max_pending: int | None = None,
+    on_progress: Callable[[int, float], Any] | None = None,
+) -> Iterator[dict]:
+    """Link spans with the retriever in a process pool, in input order.
+
+    Spans are cut into chunks and dispatched to workers, each of which
+    memory-maps the saved index once. At most ``max_pending`` chunks are in
+    flight; finished chunks wait in a reorder buffer until every earlier
+    chunk is done, so output order matches input order and memory stays
+    bounded by the window.
+
+    Args:
+        spans: Input rows with a ``phrase`` or ``covered_text`` field
+        index_dir: Index written by :meth:`CandidateRetriever.save`
+        k: Candidates per span; the best is the linked code
+        workers: Worker processes (defaults to all cores)
+        chunk_size: Spans per task
+        max_pending: Chunks in flight (defaults to four per worker)
+        on_progress: Called with (spans written, seconds elapsed) after each chunk
+
+    Yields:
+        Input rows (without note text) with ``code``, ``description`` and
+        ``score``, plus ``candidates`` when ``k > 1``
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    start = time.perf_counter()
+    written = 0
+
+    pending: dict[Future, int] = {}
+    rows_by_chunk: dict[int, list[dict]] = {}
+    finished: dict[int, list] = {}
+    next_chunk = 0
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_pool_context(),
+        initializer=_init_worker,
+        initargs=(str(index_dir),),
+    ) as pool:
+        chunks = enumerate(_chunks(spans, chunk_size))
+        exhausted = False
+
+        while True:
+            while not exhausted and len(pending) + len(finished) < max_pending:
+                try:
+                    chunk_id, rows = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                rows_by_chunk[chunk_id] = rows
+                future = pool.submit(_link_chunk, [phrase_of(row) for row in rows], k)
+                pending[future] = chunk_id
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+
+            while next_chunk in finished:
+                rows = rows_by_chunk.pop(next_chunk)
+                for row, candidates in zip(rows, finished.pop(next_chunk), strict=True):
+                    yield _output_row(row, candidates, k)
+                written += len(rows)
+                next_chunk += 1
+                if on_progress is not None:
+                    on_progress(written, time.perf_counter() - start)
+
+
+def _chunks(spans: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for span in spans:
+        chunk.append(span)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """Start workers without forking the (multi-threaded) parent.
+
+    The fork server imports this module and scikit-learn (needed to unpickle
+    the vectorizer) once and forks workers from there, which is much cheaper
+    than spawning and importing in every worker.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__, "sklearn.feature_extraction.text"])
+    return context
+
+
+def _init_worker(index_dir: str) -> None:
+    global _retriever
+    _retriever = CandidateRetriever.load(Path(index_dir), mmap=True)
+
+
+def _link_chunk(phrases: list[str], k: int) -> list[list[tuple[str, str, float]]]:
+    """Retrieve candidates for a chunk in a worker, as plain tuples for cheap pickling."""
+    return [
+        [(c.code, c.description, c.score) for c in candidates]
+        for candidates in _retriever.retrieve_batch(phrases, k)
+    ]
+
+
+def _output_row(row: dict, candidates: list[tuple[str, str, float]], k: int) -> dict:
+    output = {key: value for key, value in row.items() if key not in DROPPED_FIELDS}
+    code, description, score = candidates[0] if candidates else (None, "", 0.0)
+    output.update({"code": code, "description": description, "score": score})
+    if k > 1:
+        output["candidates"] = [{"code": c, "description": d, "score": s} for c, d, s in candidates]
+    return output
@@ -1,17 +1,16 @@
 """CLI for ICD-10 Entity Linker."""
 
-import asyncio
 import json
 import sys
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Any, Literal
 
 from cyclopts import App, Parameter
 from rich.console import Console
 from rich.json import JSON
 from rich.panel import Panel
 
-app = App(name="elinker", help="ICD-10 Entity Linker CLI")
+app = App(name="elinker", help="ICD-10 Entity Linker CLI", help_format="rich")
 console = Console()
 console_err = Console(stderr=True)
 
@@ -83,6 +82,10 @@ def view_json(
 @app.command
 async def view(
     file_path: Annotated[Path, Parameter(help="Path to ICD-10 annotation JSON file")],
+    codes: Annotated[
+        Path | None,
+        Parameter(help="Code table (diagnoses_recursive.json) to flag Excludes conflicts"),
+    ] = None,
 ):
     """Launch interactive viewer for ICD-10 annotated clinical notes.
 
@@ -91,31 +94,67 @@ async def view(
 
     Args:
         file_path: Path to the ICD-10 annotation JSON file
+        codes: Path to the local code table; conflicting codes are flagged when given
     """
     try:
         # Import viewer here to avoid loading textual unless needed
         from .viewer import ICD10Viewer
 
-        # Validate file
-        if not file_path.exists():
-            console_err.print(f"[red]Error:[/red] File not found: {file_path}")
-            sys.exit(1)
+        data, exclusions = _load_admission(file_path, codes)
 
-        if not file_path.is_file():
-            console_err.print(f"[red]Error:[/red] Not a file: {file_path}")
-            sys.exit(1)
+        # Launch viewer
+        viewer = ICD10Viewer(data, file_path, exclusions=exclusions)
+        del data  # The viewer keeps only what it shows
+        await viewer.run_async()
 
-        # Load JSON data
-        with open(file_path, encoding="utf-8") as f:
-            data = json.load(f)
+    except json.JSONDecodeError as e:
+        console_err.print(f"[red]Error:[/red] Invalid JSON: {e}")
+        sys.exit(1)
+    except Exception as e:
+        console_err.print(f"[red]Error:[/red] {e}")
+        sys.exit(1)
+
+
+@app.command
+async def diff(
+    gold_path: Annotated[Path, Parameter(help="Path to the gold ICD-10 annotation JSON file")],
+    predictions: Annotated[Path, Parameter(help="predictions.jsonl written by elinker evaluate")],
+    codes: Annotated[
+        Path | None,
+        Parameter(help="Code table (diagnoses_recursive.json) to flag Excludes conflicts"),
+    ] = None,
+):
+    """Launch the viewer on gold annotations aligned with predicted spans.
+
+    Predicted and gold spans of each note are aligned by offset; true
+    positives, wrong-code matches, false positives and false negatives are
+    colored apart, with a summary of the counts and span-level scores.
 
-        # Validate structure
-        if "notes" not in data:
-            console_err.print(f"[red]Error:[/red] Invalid format - missing 'notes' field")
+    Args:
+        gold_path: Path to the gold ICD-10 annotation JSON file
+        predictions: Prediction records; those of other admissions are ignored
+        codes: Path to the local code table; conflicting codes are flagged when given
+    """
+    try:
+        # Import viewer here to avoid loading textual unless needed
+        from .viewer import DiffViewer
+
+        data, exclusions = _load_admission(gold_path, codes)
+        if not predictions.is_file():
+            console_err.print(f"[red]Error:[/red] File not found: {predictions}")
             sys.exit(1)
 
-        # Launch viewer
-        viewer = ICD10Viewer(data, file_path)
+        with open(predictions, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+        hadm_id = str(data.get("hadm_id"))
+        if not any(str(record.get("hadm_id")) == hadm_id for record in records):
+            console_err.print(
+                f"[yellow]No predictions for admission {hadm_id} in {predictions}[/yellow]"
+            )
+
+        viewer = DiffViewer(data, gold_path, records, exclusions=exclusions)
+        del data, records  # The viewer keeps only what it shows
         await viewer.run_async()
 
     except json.JSONDecodeError as e:
@@ -126,6 +165,92 @@ async def view(
         sys.exit(1)
 
 
+def _load_admission(file_path: Path, codes: Path | None = None) -> tuple[dict, Any]:
+    """Load an annotation JSON file for the viewers, exiting on invalid input.
+
+    Args:
+        file_path: Path to the ICD-10 annotation JSON file
+        codes: Path to the local code table, to flag Excludes conflicts
+
+    Returns:
+        Tuple of (admission data, ExclusionIndex or None)
+
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON
+    """
+    # Validate file
+    if not file_path.exists():
+        console_err.print(f"[red]Error:[/red] File not found: {file_path}")
+        sys.exit(1)
+
+    if not file_path.is_file():
+        console_err.print(f"[red]Error:[/red] Not a file: {file_path}")
+        sys.exit(1)
+
+    # Load JSON data
+    with open(file_path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    # Validate structure
+    if "notes" not in data:
+        console_err.print("[red]Error:[/red] Invalid format - missing 'notes' field")
+        sys.exit(1)
+
+    exclusions = None
+    if codes is not None:
+        if not codes.is_file():
+            console_err.print(f"[red]Error:[/red] File not found: {codes}")
+            sys.exit(1)
+
+        from .codes import CodeTable
+        from .excludes import ExclusionIndex
+
+        exclusions = ExclusionIndex(CodeTable.load(codes))
+
+    return data, exclusions
+
+
+# Commands with heavy dependencies live in elinker.commands and are imported
+# only when cyclopts dispatches to them (or renders their help).
+app.command("elinker.commands.evaluate:evaluate", name="evaluate")
+app.command("elinker.commands.link_batch:link_batch", name="link-batch")
+app.command("elinker.commands.merge_runs:merge_runs", name="merge-runs")
+app.command("elinker.commands.prepare:prepare", name="prepare")
+app.command("elinker.commands.serve:serve", name="serve")
+
+
+@app.meta.default
+def launcher(
+    *tokens: Annotated[str, Parameter(show=False, allow_leading_hyphen=True)],
+    profile: Annotated[
+        Literal["cpu", "mem"] | None,
+        Parameter(help="Profile the command with cProfile (cpu) or tracemalloc (mem)"),
+    ] = None,
+    profile_out: Annotated[
+        Path | None,
+        Parameter(help="Write the profile report to this file (.prof for raw cProfile stats)"),
+    ] = None,
+    profile_top: Annotated[
+        int, Parameter(help="Number of hot spots or allocation sites to report")
+    ] = 25,
+):
+    """Run a command, optionally under a profiler.
+
+    Args:
+        tokens: Command and arguments to run
+        profile: Profiler to run the command under
+        profile_out: Report file; the report is printed to stderr when unset
+        profile_top: Number of entries in the report
+    """
+    if profile is None:
+        return app(tokens)
+
+    from .profiling import profiled
+
+    with profiled(profile, profile_out, top=profile_top, console=console_err):
+        return app(tokens)
+
+
 def _format_size(size_bytes: int) -> str:
     """Format file size in human-readable format.
 
@@ -143,4 +268,4 @@ def _format_size(size_bytes: int) -> str:
 
 
 if __name__ == "__main__":
-    asyncio.run(app())
+    app.meta()
@@ -0,0 +1,224 @@
+"""Coder backends that assign an ICD-10 code to a clinical phrase."""
+
+import asyncio
+import json
+import time
+from typing import Any
+
+from .prompts import CANDIDATES_TEMPLATE, DEFAULT_TEMPLATE, render_prompt
+from .retrieval import Candidate
+
+DEFAULT_MODEL = "claude-sonnet-4-5"
+MISSING_CODE = "__MISSING__"
+STRUCTURED_OUTPUTS_BETA = "structured-outputs-2025-11-13"
+
+OUTPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ICD10": {"type": "string"},
+        "description": {"type": "string"},
+        "justification": {"type": "string"},
+    },
+    "required": ["ICD10", "description", "justification"],
+    "additionalProperties": False,
+}
+
+
+class CodingRequest:
+    """A clinical phrase to code, with its note context."""
+
+    def __init__(
+        self,
+        clinical_phrase: str,
+        clinical_note: str,
+        begin: int | None = None,
+        end: int | None = None,
+        candidates: list[Candidate] | None = None,
+        request_id: Any = None,
+        exemplars: list | None = None,
+        prompt: str | None = None,
+        code_system: str | None = None,
+    ):
+        self.clinical_phrase = clinical_phrase
+        self.clinical_note = clinical_note
+        self.begin = begin
+        self.end = end
+        self.candidates = candidates  # Restricts the answer when set
+        self.request_id = request_id
+        self.exemplars = exemplars  # Coded train spans shown as worked examples
+        self.prompt = prompt  # Rendered by elinker prepare; replaces the template
+        self.code_system = code_system  # "ICD-10-CM" or "ICD-10-PCS" when the data says
+
+
+class CodingResult:
+    """The code a backend assigned to a request."""
+
+    def __init__(
+        self,
+        code: str,
+        description: str = "",
+        justification: str = "",
+        turns: list[dict] | None = None,
+        usage: dict | None = None,
+    ):
+        self.code = code
+        self.description = description
+        self.justification = justification
+        self.turns = turns or []  # Per model turn: latency and tool calls
+        self.usage = usage or {}  # Token counts and, when streamed, "ttft"
+
+    def to_dict(self) -> dict:
+        """Serialize the result for prediction files."""
+        return {
+            "code": self.code,
+            "description": self.description,
+            "justification": self.justification,
+        }
+
+    def __repr__(self):
+        return f"<CodingResult {self.code}>"
+
+
+def candidate_schema(candidates: list[Candidate]) -> dict:
+    """Build a structured-output schema restricted to the candidate codes.
+
+    Args:
+        candidates: Candidates retrieved for the request
+
+    Returns:
+        JSON schema whose only field is an enum of the candidate codes
+    """
+    return {
+        "type": "object",
+        "properties": {"ICD10": {"type": "string", "enum": [c.code for c in candidates]}},
+        "required": ["ICD10"],
+        "additionalProperties": False,
+    }
+
+
+class AnthropicCoder:
+    """Single round-trip coder using Anthropic structured outputs.
+
+    Requests without candidates use the free-text prompt template. Requests
+    with candidates use the candidate template and an enum-constrained schema,
+    so the model can only answer with one of the retrieved codes.
+
+    With ``stream=True`` the response is streamed so the time to first token
+    can be recorded in ``result.usage["ttft"]``. A cancelled stream carries
+    the usage received so far on the ``CancelledError`` as ``usage``.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        max_tokens: int = 1024,
+        client: Any = None,
+        template: str = DEFAULT_TEMPLATE,
+        stream: bool = False,
+    ):
+        if client is None:
+            import anthropic
+
+            client = anthropic.AsyncAnthropic()
+
+        self.model = model
+        self.max_tokens = max_tokens
+        self.client = client
+        self.template = template
+        self.stream = stream
+
+    def build_prompt(self, request: CodingRequest) -> str:
+        """Render the prompt for a request."""
+        if request.prompt is not None:
+            return request.prompt
+        if request.candidates:
+            return render_prompt(
+                CANDIDATES_TEMPLATE,
+                clinical_note=request.clinical_note,
+                clinical_phrase=request.clinical_phrase,
+                candidates=request.candidates,
+                exemplars=request.exemplars or [],
+            )
+        return render_prompt(
+            self.template,
+            clinical_note=request.clinical_note,
+            clinical_phrase=request.clinical_phrase,
+            exemplars=request.exemplars or [],
+        )
+
+    def output_schema(self, request: CodingRequest) -> dict:
+        """Return the structured-output schema for a request."""
+        if request.candidates:
+            return candidate_schema(request.candidates)
+        return OUTPUT_SCHEMA
+
+    async def code(self, request: CodingRequest) -> CodingResult:
+        """Code a single request.
+
+        Args:
+            request: Phrase and note context to code
+
+        Returns:
+            The assigned code
+        """
+        kwargs = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "betas": [STRUCTURED_OUTPUTS_BETA],
+            "messages": [{"role": "user", "content": self.build_prompt(request)}],
+            "output_format": {"type": "json_schema", "schema": self.output_schema(request)},
+        }
+
+        if not self.stream:
+            response = await self.client.beta.messages.create(**kwargs)
+            result = parse_result(response.content[0].text, request.candidates)
+            result.usage = token_usage(getattr(response, "usage", None))
+            return result
+
+        start = time.perf_counter()
+        chunks = []
+        usage: dict = {"ttft": None}
+
+        try:
+            async for event in await self.client.beta.messages.create(**kwargs, stream=True):
+                if event.type == "message_start":
+                    usage.update(token_usage(event.message.usage))
+                elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    if usage["ttft"] is None:
+                        usage["ttft"] = time.perf_counter() - start
+                    chunks.append(event.delta.text)
+                elif event.type == "message_delta":
+                    usage["output_tokens"] = event.usage.output_tokens
+        except asyncio.CancelledError as e:
+            # Input tokens are billed once the message has started
+            e.usage = usage
+            raise
+
+        result = parse_result("".join(chunks), request.candidates)
+        result.usage = usage
+        return result
+
+
+def token_usage(usage: Any) -> dict:
+    """Extract token counts from an Anthropic ``usage`` object."""
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cached_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+    }
+
+
+def parse_result(text: str, candidates: list[Candidate] | None = None) -> CodingResult:
+    """Parse a structured-output payload into a result.
+
+    Candidate answers carry only the code; their description is filled in
+    from the candidate list.
+    """
+    payload = json.loads(text)
+    code = payload.get("ICD10", MISSING_CODE)
+    description = payload.get("description", "")
+
+    if candidates and not description:
+        description = next((c.description for c in candidates if c.code == code), "")
+
+    return CodingResult(code, description, payload.get("justification", ""))
@@ -0,0 +1,54 @@
+"""Local ICD-10-CM code table."""
+
+import json
+from pathlib import Path
+
+
+class CodeTable:
+    """In-memory ICD-10-CM code table.
+
+    Built from the records written by ``extract_diagnoses_recursive.py``
+    (``diagnoses_recursive.json``). Records keep their tabular order and are
+    indexed by code for constant-time lookup.
+    """
+
+    def __init__(self, records: list[dict]):
+        self.records = records
+        self.index = {record["code"]: idx for idx, record in enumerate(records)}
+
+    @classmethod
+    def load(cls, path: Path) -> "CodeTable":
+        """Load a code table from a ``diagnoses_recursive.json`` file.
+
+        Args:
+            path: Path to the JSON list of diagnosis records
+
+        Returns:
+            Loaded code table
+        """
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def get(self, code: str) -> dict | None:
+        """Return the record for a code, or None if it is not in the table."""
+        idx = self.index.get(code)
+        return None if idx is None else self.records[idx]
+
+    def description(self, code: str) -> str:
+        """Return the description of a code, or an empty string if unknown."""
+        record = self.get(code)
+        return record.get("description", "") if record else ""
+
+    def is_billable(self, code: str) -> bool:
+        """Check whether a code exists and is billable."""
+        record = self.get(code)
+        return bool(record and record.get("is_billable"))
+
+    def __repr__(self):
+        return f"<CodeTable {len(self)} codes>"
@@ -0,0 +1,6 @@
+"""CLI subcommands, registered lazily by import path in ``elinker.cli``.
+
+Command modules are imported to build ``elinker --help``, so they import
+only the standard library, cyclopts and rich at module level. Everything
+else is imported inside the command function.
+"""
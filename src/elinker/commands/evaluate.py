@@ -0,0 +1,493 @@
+"""The ``evaluate`` command."""
+
+import json
+import sys
+from pathlib import Path
+from typing import Annotated, Literal
+
+from cyclopts import Parameter
+from rich.json import JSON
+
+from ..cli import console, console_err
+
+
+async def evaluate(
+    data: Annotated[Path, Parameter(help="Path to MDACE parquet file with a 'split' column")],
+    output: Annotated[Path, Parameter(help="Run directory for scores.json and report.txt")],
+    split: Annotated[str, Parameter(help="Dataset split to evaluate")] = "dev",
+    limit: Annotated[int | None, Parameter(help="Maximum number of examples")] = None,
+    mode: Annotated[
+        Literal["direct", "candidates", "tools"],
+        Parameter(
+            help="'direct' lets the model name any code; 'candidates' restricts it to top-k; "
+            "'tools' lets it search, validate and look up codes locally"
+        ),
+    ] = "direct",
+    codes: Annotated[
+        Path | None,
+        Parameter(
+            help="Code table (diagnoses_recursive.json) for candidate and tools modes; "
+            "also validates predicted codes and checks Excludes conflicts"
+        ),
+    ] = None,
+    pcs_tables: Annotated[
+        Path | None,
+        Parameter(help="ICD-10-PCS tables (icd10pcs_tables_YYYY.xml) to validate procedure codes"),
+    ] = None,
+    releases: Annotated[
+        list[str] | None,
+        Parameter(
+            help="Code tables of several fiscal years as YEAR=PATH; predictions are "
+            "validated against the release in effect on their note's date (shifted "
+            "MIMIC dates fall after every release and use the newest)",
+            negative="",
+        ),
+    ] = None,
+    date_field: Annotated[
+        str, Parameter(help="Example field holding the note date, for --releases")
+    ] = "chartdate",
+    alphabetic_index: Annotated[
+        Path | None,
+        Parameter(
+            help="Alphabetic Index (icd10cm-index-YYYY.xml); spans it resolves fully "
+            "are coded without a model call"
+        ),
+    ] = None,
+    k: Annotated[int, Parameter(help="Number of candidate codes per span")] = 20,
+    model: Annotated[str, Parameter(help="Anthropic model name")] = "claude-sonnet-4-5",
+    concurrency: Annotated[int, Parameter(help="Maximum requests in flight")] = 4,
+    local_model: Annotated[
+        str | None, Parameter(help="Hugging Face model ID or path to code offline on CPU")
+    ] = None,
+    batch_size: Annotated[int, Parameter(help="Generation batch size for --local-model")] = 8,
+    context_tokens: Annotated[
+        int | None, Parameter(help="Send only this many tokens of note context per span")
+    ] = None,
+    context_tokenizer: Annotated[
+        str | None,
+        Parameter(help="Hugging Face tokenizer used to count context and exemplar tokens"),
+    ] = None,
+    track: Annotated[
+        list[Literal["mlflow", "trackio"]] | None,
+        Parameter(help="Experiment trackers to export run metrics to"),
+    ] = None,
+    project: Annotated[str, Parameter(help="Tracker project or experiment name")] = "elinker",
+    skip_assertions: Annotated[
+        list[Literal["negated", "hypothetical", "historical", "family"]] | None,
+        Parameter(
+            help="Answer spans with these assertions __MISSING__ without a model call",
+            negative="",
+        ),
+    ] = None,
+    tag_assertions: Annotated[
+        bool, Parameter(help="Tag every span's assertions in predictions.jsonl")
+    ] = False,
+    shard: Annotated[
+        str | None,
+        Parameter(help="Evaluate only shard i of n ('i/n'); merge shards with merge-runs"),
+    ] = None,
+    exemplars: Annotated[
+        int | None,
+        Parameter(help="Add this many nearest coded train spans to each prompt as examples"),
+    ] = None,
+    exemplar_tokens: Annotated[
+        int | None, Parameter(help="Token budget for the exemplars of one prompt")
+    ] = None,
+    exemplar_split: Annotated[
+        str, Parameter(help="Dataset split to draw exemplars from")
+    ] = "train",
+    exemplar_cache: Annotated[
+        Path | None,
+        Parameter(
+            help="Saved exemplar index directory; fitted and saved here if missing "
+            "or fitted on other data"
+        ),
+    ] = None,
+    prepared: Annotated[
+        Path | None,
+        Parameter(help="Split rendered by elinker prepare; replaces --split, --limit, --k"),
+    ] = None,
+    policy: Annotated[
+        Literal["single", "hedged", "ensemble"],
+        Parameter(
+            help="'hedged' re-sends slow requests to a backup model; 'ensemble' asks "
+            "several models at once and stops once enough agree"
+        ),
+    ] = "single",
+    policy_models: Annotated[
+        list[str] | None,
+        Parameter(
+            help="Backup model (hedged; defaults to --model) or the other ensemble models",
+            negative="",
+        ),
+    ] = None,
+    hedge_percentile: Annotated[
+        float, Parameter(help="Percentile of recent latency after which a request is hedged")
+    ] = 95.0,
+    votes: Annotated[
+        int | None,
+        Parameter(help="Agreeing answers that end an ensemble request (default: a majority)"),
+    ] = None,
+):
+    """Code a dataset split with an LLM and score the predictions.
+
+    Args:
+        data: Path to the MDACE parquet file
+        output: Directory to write scores.json, report.txt and predictions.jsonl to
+        split: Dataset split to evaluate
+        limit: Maximum number of examples to evaluate
+        mode: Coding mode
+        codes: Path to the local code table, required for candidate and tools modes and
+            used to validate predictions and check Excludes conflicts in every mode
+        pcs_tables: Path to the ICD-10-PCS tables XML; procedure predictions are
+            validated against it
+        releases: ``YEAR=PATH`` code tables; diagnosis predictions are validated
+            against the release in effect on their date instead of ``codes``
+        date_field: Example field with the note date; undated examples, and
+            dates after the newest release such as MIMIC's shifted 21xx dates,
+            use the newest release
+        alphabetic_index: Path to the Alphabetic Index XML to code spans from first
+        k: Number of candidate codes retrieved per span
+        model: Anthropic model name
+        concurrency: Maximum number of requests in flight
+        local_model: Local causal LM to use instead of the Anthropic API
+        batch_size: Generation batch size for the local model
+        context_tokens: Token budget for the note context; the whole note when unset
+        context_tokenizer: Tokenizer for counting context and exemplar tokens
+        track: Experiment trackers to export metrics to
+        project: Tracker project or experiment name
+        skip_assertions: Assertion categories whose spans skip the model
+        tag_assertions: Tag assertions without skipping any span
+        shard: Shard ``i/n`` of the examples, partitioned by ``hadm_id``
+        exemplars: Number of few-shot exemplars per prompt; zero-shot when unset
+        exemplar_tokens: Token budget for the exemplars of one prompt
+        exemplar_split: Split the exemplars are drawn from
+        exemplar_cache: Directory of a saved exemplar index
+        prepared: Directory written by ``elinker prepare``; its requests are
+            sent as rendered
+        policy: How requests are spread over backends
+        policy_models: Backup or additional Anthropic models for the policy
+        hedge_percentile: Latency percentile that triggers a hedged request
+        votes: Agreeing answers needed to stop an ensemble request early
+    """
+    try:
+        # Import heavy dependencies only when evaluating
+        from ..coders import AnthropicCoder
+        from ..data import load_examples
+        from ..releases import parse_release
+        from ..runner import run_evaluation, write_run
+        from ..shards import parse_shard, select_shard, write_shard_info
+
+        shard_id, shards = parse_shard(shard) if shard is not None else (0, 1)
+
+        if not data.is_file():
+            console_err.print(f"[red]Error:[/red] File not found: {data}")
+            sys.exit(1)
+
+        if local_model is not None and mode == "tools":
+            console_err.print("[red]Error:[/red] Local models do not support tools mode")
+            sys.exit(1)
+
+        if local_model is not None and policy != "single":
+            console_err.print("[red]Error:[/red] Local models do not support request policies")
+            sys.exit(1)
+
+        if policy == "ensemble" and not policy_models:
+            console_err.print("[red]Error:[/red] Ensemble mode requires --policy-models")
+            sys.exit(1)
+
+        if prepared is not None and (
+            mode == "tools" or exemplars is not None or context_tokens is not None
+        ):
+            console_err.print(
+                "[red]Error:[/red] --prepared cannot be combined with tools mode, "
+                "--exemplars or --context-tokens"
+            )
+            sys.exit(1)
+
+        retriever = None
+        if local_model is not None:
+            from ..local import LocalModelCoder
+
+            coder = LocalModelCoder(local_model, batch_size=batch_size)
+            # Queue enough requests to fill several batches
+            concurrency = max(concurrency, batch_size * 4)
+        else:
+            coder = AnthropicCoder(model=model, stream=True)
+
+        # Prepared splits carry their candidates
+        if mode != "direct" and codes is None and prepared is None:
+            console_err.print(f"[red]Error:[/red] Mode '{mode}' requires --codes")
+            sys.exit(1)
+
+        release_paths = {}
+        for spec in releases or []:
+            try:
+                year, path = parse_release(spec)
+            except ValueError as e:
+                console_err.print(f"[red]Error:[/red] {e}")
+                sys.exit(1)
+            release_paths[year] = path
+
+        for path in (codes, pcs_tables, alphabetic_index, *release_paths.values()):
+            if path is not None and not path.is_file():
+                console_err.print(f"[red]Error:[/red] File not found: {path}")
+                sys.exit(1)
+
+        table = None
+        if codes is not None:
+            from ..codes import CodeTable
+
+            table = CodeTable.load(codes)
+
+        if mode != "direct" and prepared is None:
+            from ..retrieval import CandidateRetriever
+
+            retriever = CandidateRetriever(table)
+
+            if mode == "tools":
+                from ..agent import LocalTools, ToolUsingCoder
+
+                coder = ToolUsingCoder(
+                    LocalTools(retriever.table, retriever), model=model, stream=True
+                )
+
+        policy_coder = None
+        if policy != "single":
+            from ..policies import EnsembleCoder, HedgedCoder
+
+            def backend(name: str):
+                if mode == "tools":
+                    return ToolUsingCoder(
+                        LocalTools(retriever.table, retriever), model=name, stream=True
+                    )
+                return AnthropicCoder(model=name, stream=True)
+
+            if policy == "hedged":
+                backup = backend((policy_models or [model])[0])
+                policy_coder = HedgedCoder(coder, backup, percentile=hedge_percentile)
+            else:
+                policy_coder = EnsembleCoder(
+                    [coder, *(backend(name) for name in policy_models)], votes=votes
+                )
+            coder = policy_coder
+
+        # Context and exemplar budgets count tokens as the coding model does
+        tokenizer = None
+        if context_tokens is not None or exemplars is not None:
+            if context_tokenizer is not None:
+                from transformers import AutoTokenizer
+
+                tokenizer = AutoTokenizer.from_pretrained(context_tokenizer)
+            elif local_model is not None:
+                tokenizer = coder.tokenizer
+
+        context = None
+        if context_tokens is not None:
+            from ..context import ContextSelector
+
+            context = ContextSelector(max_tokens=context_tokens, tokenizer=tokenizer)
+
+        assertions = None
+        if skip_assertions or tag_assertions:
+            from ..assertions import AssertionFilter
+
+            assertions = AssertionFilter(skip=skip_assertions or ())
+
+        from ..instrumentation import InstrumentedCoder, export_metrics, write_metrics
+
+        # Policies price each backend call themselves (see write_metrics)
+        instrumented = InstrumentedCoder(
+            coder, model=None if local_model or policy_coder else model
+        )
+        # Index hits bypass the instrumented model coder, so metrics count model calls only
+        first = instrumented
+        if alphabetic_index is not None:
+            from ..alphabetic_index import AlphabeticIndex, IndexFirstCoder
+
+            first = IndexFirstCoder(AlphabeticIndex.load(alphabetic_index), instrumented, table)
+        requests = None
+        if prepared is not None:
+            from ..local import LOCAL_TEMPLATE
+            from ..preprocess import load_prepared
+            from ..prompts import CANDIDATES_TEMPLATE, DEFAULT_TEMPLATE
+
+            meta, examples, requests = load_prepared(prepared)
+            expected = (
+                LOCAL_TEMPLATE
+                if local_model is not None
+                else CANDIDATES_TEMPLATE
+                if mode == "candidates"
+                else DEFAULT_TEMPLATE
+            )
+            if meta["template"] != expected:
+                console_err.print(
+                    f"[red]Error:[/red] {prepared} was rendered with {meta['template']}, "
+                    f"but this run uses {expected}"
+                )
+                sys.exit(1)
+            if context_tokenizer is not None and context_tokenizer != meta["context_tokenizer"]:
+                console_err.print(
+                    f"[red]Error:[/red] {prepared} counted context tokens with "
+                    f"{meta['context_tokenizer'] or 'words and punctuation'}, "
+                    f"not {context_tokenizer}; prepare it with --context-tokenizer"
+                )
+                sys.exit(1)
+            split, limit = meta["split"], meta["limit"]
+            k = meta["k"] or k
+            context_tokens = meta["context_tokens"]
+        else:
+            examples = load_examples(data, split=split, limit=limit)
+        exemplar_index = None
+        if exemplars is not None:
+            from ..exemplars import ExemplarIndex, train_digest
+
+            if exemplar_split == split:
+                console_err.print(
+                    "[yellow]Warning:[/yellow] Exemplars come from the evaluated split; "
+                    "each span's own annotation is excluded"
+                )
+            digest = train_digest(data, exemplar_split)
+            if exemplar_cache is not None and ExemplarIndex.saved_digest(exemplar_cache) == digest:
+                exemplar_index = ExemplarIndex.load(
+                    exemplar_cache, k=exemplars, tokenizer=tokenizer
+                )
+            else:
+                exemplar_index = ExemplarIndex(
+                    load_examples(data, split=exemplar_split), k=exemplars, tokenizer=tokenizer
+                )
+                if exemplar_cache is not None:
+                    exemplar_index.save(exemplar_cache, train_digest=digest)
+        total_examples = len(examples)
+        if shard is not None:
+            positions = select_shard(examples, shard_id, shards)
+            examples = [examples[position] for position in positions]
+            if requests is not None:
+                requests = [requests[position] for position in positions]
+        if prepared is not None and context_tokens is not None:
+            from ..context import ContextSelector
+            from ..preprocess import context_token_totals
+
+            # Stands in for the selector that prepared the split, for its token totals
+            context = ContextSelector(max_tokens=context_tokens)
+            context.selected_tokens, context.original_tokens = context_token_totals(
+                prepared, positions if shard is not None else None
+            )
+
+        scores, report, predictions = await run_evaluation(
+            examples,
+            first,
+            retriever=retriever if mode == "candidates" else None,
+            k=k,
+            concurrency=concurrency,
+            context=context,
+            assertions=assertions,
+            exemplars=exemplar_index,
+            exemplar_tokens=exemplar_tokens,
+            requests=requests,
+        )
+        # Flag invalid and non-billable predictions in predictions.jsonl
+        procedures = [r for r in predictions if r.get("code_system") == "ICD-10-PCS"]
+        diagnoses = [r for r in predictions if r.get("code_system") != "ICD-10-PCS"]
+        if pcs_tables is not None:
+            from ..pcs import PcsTables
+
+            PcsTables.load(pcs_tables).annotate(procedures)
+
+        if release_paths:
+            from ..releases import CodeReleases
+
+            dates = [
+                row.get(date_field)
+                for row, record in zip(examples, predictions, strict=True)
+                if record.get("code_system") != "ICD-10-PCS"
+            ]
+            code_releases = CodeReleases.load(release_paths)
+            newest = code_releases.years[-1]
+            years = (str(date)[:4] for date in dates if date)
+            late = sum(1 for year in years if year.isdigit() and int(year) > newest)
+            if late:
+                console_err.print(
+                    f"[yellow]Warning:[/yellow] {late} note dates fall after the newest "
+                    f"release and are validated against {newest} (MIMIC shifts dates "
+                    "into the 2100s; map them to real years for per-date releases)"
+                )
+            code_releases.annotate(diagnoses, dates)
+
+        conflicts = None
+        if table is not None:
+            from ..excludes import ExclusionIndex, write_conflicts
+            from ..normalize import CodeValidator
+
+            if not release_paths:
+                CodeValidator(table).annotate(diagnoses)
+            conflicts = ExclusionIndex(table).check_admissions(diagnoses)
+        write_run(output, scores, report, predictions)
+        if conflicts is not None:
+            write_conflicts(output, conflicts)
+        summary = write_metrics(output, instrumented, policy_coder)
+
+        if shard is not None:
+            write_shard_info(
+                output,
+                {
+                    "shard": shard_id,
+                    "shards": shards,
+                    "data": data.name,
+                    "split": split,
+                    "limit": limit,
+                    "mode": mode,
+                    "k": k if mode == "candidates" else None,
+                    "context_max_tokens": context_tokens,
+                    "exemplars": exemplars,
+                    "exemplar_tokens": exemplar_tokens,
+                    "context_selected_tokens": context.selected_tokens if context else 0,
+                    "context_original_tokens": context.original_tokens if context else 0,
+                    "exemplar_totals": exemplar_index.totals() if exemplar_index else None,
+                    "total_examples": total_examples,
+                    "examples": positions,
+                },
+            )
+
+        config = {
+            "split": split,
+            "mode": mode,
+            "model": local_model or model,
+            "k": k,
+            "concurrency": concurrency,
+            "context_tokens": context_tokens,
+            "shard": shard,
+            "releases": sorted(release_paths) or None,
+            "skip_assertions": skip_assertions,
+            "exemplars": exemplars,
+            "exemplar_tokens": exemplar_tokens,
+            "policy": policy,
+            "policy_models": policy_models,
+        }
+        for tracker in track or []:
+            export_metrics(tracker, project, config, summary, scores)
+
+        console.print(JSON(json.dumps(scores)))
+        console.print(JSON(json.dumps(summary)))
+        if alphabetic_index is not None:
+            console.print(
+                f"[bold cyan]Coded from the Alphabetic Index:[/bold cyan] "
+                f"{first.resolved} of {len(examples)} spans"
+            )
+        if exemplar_index is not None:
+            console.print(
+                f"[bold cyan]Few-shot trade-off:[/bold cyan] accuracy {scores['accuracy']} "
+                f"at p50 latency {summary.get('latency_p50', 0.0)}s with "
+                f"{scores['exemplar_tokens_per_request']} exemplar tokens per prompt "
+                f"(index {scores['exemplar_index_seconds']}s)"
+            )
+        if conflicts:
+            console.print(
+                f"[yellow]Excludes conflicts in {len(conflicts)} admissions[/yellow] "
+                f"(see {output / 'conflicts.jsonl'})"
+            )
+        console.print(f"[bold cyan]Saved run to:[/bold cyan] {output}")
+
+    except Exception as e:
+        console_err.print(f"[red]Error:[/red] {e}")
+        sys.exit(1)
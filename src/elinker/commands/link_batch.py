@@ -0,0 +1,111 @@
+"""The ``link-batch`` command."""
+
+import json
+import sys
+from pathlib import Path
+from typing import Annotated
+
+from cyclopts import Parameter
+
+from ..cli import console, console_err
+
+
+def link_batch(
+    input_path: Annotated[
+        Path, Parameter(name="--input", help="Spans to link (.jsonl or .parquet)")
+    ],
+    output: Annotated[Path, Parameter(help="Predictions file (.jsonl), in input order")],
+    codes: Annotated[
+        Path | None, Parameter(help="Code table (diagnoses_recursive.json) to index")
+    ] = None,
+    index: Annotated[
+        Path | None,
+        Parameter(
+            help="Saved index directory; built from --codes and saved here if missing "
+            "or built from a different code table"
+        ),
+    ] = None,
+    workers: Annotated[int | None, Parameter(help="Worker processes (default: all cores)")] = None,
+    k: Annotated[int, Parameter(help="Candidates written per span")] = 1,
+    chunk_size: Annotated[int, Parameter(help="Spans per worker task")] = 512,
+):
+    """Link spans in bulk with the retriever across a process pool.
+
+    Args:
+        input_path: JSONL or Parquet spans with a ``phrase`` or ``covered_text`` field
+        output: JSONL predictions file
+        codes: Path to the local code table
+        index: Directory of a saved retriever index
+        workers: Number of worker processes
+        k: Number of candidates per span
+        chunk_size: Number of spans per worker task
+    """
+    try:
+        # Import heavy dependencies only when linking
+        import tempfile
+
+        from rich.progress import BarColumn, Progress, TextColumn, TimeElapsedColumn
+
+        from ..batch import count_spans, link_spans, read_spans
+        from ..retrieval import CandidateRetriever, file_digest
+
+        if not input_path.is_file():
+            console_err.print(f"[red]Error:[/red] File not found: {input_path}")
+            sys.exit(1)
+
+        if (index is None or not (index / "index.json").is_file()) and (
+            codes is None or not codes.is_file()
+        ):
+            console_err.print("[red]Error:[/red] Either --codes or a saved --index is required")
+            sys.exit(1)
+
+        with tempfile.TemporaryDirectory(prefix="elinker-index-") as scratch:
+            index_dir = index or Path(scratch)
+            digest = file_digest(codes) if codes is not None else None
+            saved = (index_dir / "index.json").is_file()
+            if not saved or (
+                digest is not None and CandidateRetriever.saved_digest(index_dir) != digest
+            ):
+                from ..codes import CodeTable
+
+                action = "Re-indexing" if saved else "Indexing"
+                console_err.print(f"[bold cyan]{action}[/bold cyan] {codes}")
+                CandidateRetriever(CodeTable.load(codes)).save(index_dir, codes_digest=digest)
+
+            progress = Progress(
+                TextColumn("[bold cyan]Linking"),
+                BarColumn(),
+                TextColumn("{task.completed:,} spans"),
+                TextColumn("{task.fields[rate]:,.0f} spans/s"),
+                TimeElapsedColumn(),
+                console=console_err,
+            )
+            task = progress.add_task("link", total=count_spans(input_path), rate=0.0)
+
+            def report(done: int, elapsed: float):
+                progress.update(task, completed=done, rate=done / elapsed if elapsed else 0.0)
+
+            output.parent.mkdir(parents=True, exist_ok=True)
+            written = 0
+            with progress, open(output, "w", encoding="utf-8") as f:
+                for row in link_spans(
+                    read_spans(input_path),
+                    index_dir,
+                    k=k,
+                    workers=workers,
+                    chunk_size=chunk_size,
+                    on_progress=report,
+                ):
+                    f.write(json.dumps(row, default=str) + "\n")
+                    written += 1
+
+        elapsed = progress.tasks[0].elapsed or 0.0
+        rate = written / elapsed if elapsed else 0.0
+        console.print(
+            f"[bold cyan]Linked {written:,} spans[/bold cyan] in {elapsed:.1f}s "
+            f"({rate:,.0f} spans/s) to {output}"
+        )
+
+    except Exception as e:
+        console_err.print(f"[red]Error:[/red] {e}")
+        sys.exit(1)
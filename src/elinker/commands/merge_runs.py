@@ -0,0 +1,46 @@
+"""The ``merge-runs`` command."""
+
+import json
+import sys
+from pathlib import Path
+from typing import Annotated
+
+from cyclopts import Parameter
+from rich.json import JSON
+
+from ..cli import console, console_err
+
+
+def merge_runs(
+    runs: Annotated[
+        list[Path],
+        Parameter(help="Shard run directories written by evaluate --shard", negative=""),
+    ],
+    *,
+    output: Annotated[Path, Parameter(help="Run directory for the merged results")],
+):
+    """Merge shard runs into the scores, report and predictions of a single run.
+
+    Args:
+        runs: Shard run directories
+        output: Directory to write scores.json, report.txt and predictions.jsonl to
+    """
+    try:
+        # Import heavy dependencies only when merging
+        from ..runner import write_run
+        from ..shards import merge_runs as merge
+
+        for run in runs:
+            if not run.is_dir():
+                console_err.print(f"[red]Error:[/red] Not a directory: {run}")
+                sys.exit(1)
+
+        scores, report, predictions = merge(runs)
+        write_run(output, scores, report, predictions)
+
+        console.print(JSON(json.dumps(scores)))
+        console.print(f"[bold cyan]Merged {len(runs)} shards to:[/bold cyan] {output}")
+
+    except Exception as e:
+        console_err.print(f"[red]Error:[/red] {e}")
+        sys.exit(1)
@@ -0,0 +1,88 @@
+"""The ``prepare`` command."""
+
+import sys
+from pathlib import Path
+from typing import Annotated
+
+from cyclopts import Parameter
+
+from ..cli import console, console_err
+
+
+def prepare(
+    data: Annotated[Path, Parameter(help="Path to MDACE parquet file with a 'split' column")],
+    cache_dir: Annotated[Path, Parameter(help="Root directory of prepared splits")] = Path(
+        ".cache/prepared"
+    ),
+    split: Annotated[str, Parameter(help="Dataset split to prepare")] = "dev",
+    limit: Annotated[int | None, Parameter(help="Maximum number of examples")] = None,
+    codes: Annotated[
+        Path | None,
+        Parameter(help="Code table (diagnoses_recursive.json) to attach top-k candidates from"),
+    ] = None,
+    k: Annotated[int, Parameter(help="Number of candidate codes per span")] = 20,
+    context_tokens: Annotated[
+        int | None, Parameter(help="Keep only this many tokens of note context per span")
+    ] = None,
+    context_tokenizer: Annotated[
+        str | None, Parameter(help="Hugging Face tokenizer used to count context tokens")
+    ] = None,
+    local: Annotated[
+        bool, Parameter(help="Render the prompt template of evaluate --local-model")
+    ] = False,
+    num_proc: Annotated[int | None, Parameter(help="Worker processes for rendering")] = None,
+    batch_size: Annotated[int, Parameter(help="Rows rendered per batch")] = 256,
+):
+    """Render a split's prompts, candidates and context once for evaluate --prepared.
+
+    Results are stored as Arrow under a fingerprint of the data, code table,
+    template and settings; running the command again with the same inputs
+    reuses them.
+
+    Args:
+        data: Path to the MDACE parquet file
+        cache_dir: Directory prepared splits are stored under
+        split: Dataset split to prepare
+        limit: Maximum number of examples to prepare
+        codes: Path to the local code table; prompts list the top-k candidates
+        k: Number of candidate codes retrieved per span
+        context_tokens: Token budget for the note context; the whole note when unset
+        context_tokenizer: Tokenizer for counting context tokens, as in evaluate
+        local: Render the local-model template instead of the Anthropic one
+        num_proc: Number of worker processes
+        batch_size: Rows per batch
+    """
+    try:
+        # Import heavy dependencies only when preparing
+        from ..preprocess import prepare as prepare_split
+
+        for path in (data, codes):
+            if path is not None and not path.is_file():
+                console_err.print(f"[red]Error:[/red] File not found: {path}")
+                sys.exit(1)
+
+        template = None
+        if local:
+            from ..local import LOCAL_TEMPLATE
+
+            template = LOCAL_TEMPLATE
+
+        directory, cached = prepare_split(
+            data,
+            cache_dir,
+            split=split,
+            limit=limit,
+            template=template,
+            codes=codes,
+            k=k,
+            context_tokens=context_tokens,
+            context_tokenizer=context_tokenizer,
+            num_proc=num_proc,
+            batch_size=batch_size,
+        )
+        status = "Reused cached" if cached else "Prepared"
+        console.print(f"[bold cyan]{status} split:[/bold cyan] {directory}")
+
+    except Exception as e:
+        console_err.print(f"[red]Error:[/red] {e}")
+        sys.exit(1)
@@ -0,0 +1,90 @@
+"""The ``serve`` command."""
+
+import sys
+from pathlib import Path
+from typing import Annotated
+
+from cyclopts import Parameter
+
+from ..cli import console, console_err
+
+
+async def serve(
+    codes: Annotated[Path, Parameter(help="Code table (diagnoses_recursive.json)")],
+    host: Annotated[str, Parameter(help="Interface to listen on")] = "127.0.0.1",
+    port: Annotated[int, Parameter(help="Port to listen on")] = 8000,
+    k: Annotated[int, Parameter(help="Number of candidate codes per span")] = 20,
+    model: Annotated[
+        str | None,
+        Parameter(help="Anthropic model that chooses among the candidates; top candidate if unset"),
+    ] = None,
+    local_model: Annotated[
+        str | None, Parameter(help="Hugging Face model ID or path to choose codes offline on CPU")
+    ] = None,
+    batch_size: Annotated[int, Parameter(help="Maximum /link requests per micro-batch")] = 32,
+    max_wait_ms: Annotated[
+        float, Parameter(help="Longest a /link request waits for its batch to fill")
+    ] = 10.0,
+    max_queue: Annotated[
+        int, Parameter(help="Queued /link requests before new ones are rejected with 503")
+    ] = 1024,
+    concurrency: Annotated[int, Parameter(help="Micro-batches processed at once")] = 4,
+):
+    """Serve /link, /search, /lookup and /metrics over HTTP.
+
+    Args:
+        codes: Path to the local code table
+        host: Interface to listen on
+        port: Port to listen on
+        k: Number of candidate codes retrieved per span
+        model: Anthropic model name
+        local_model: Local causal LM to use instead of the Anthropic API
+        batch_size: Maximum number of requests per micro-batch
+        max_wait_ms: Latency cap for filling a micro-batch, in milliseconds
+        max_queue: Queue length at which requests are rejected
+        concurrency: Maximum number of micro-batches in flight
+    """
+    try:
+        # Import heavy dependencies only when serving
+        from ..codes import CodeTable
+        from ..retrieval import CandidateRetriever
+        from ..service import LinkingService
+
+        if not codes.is_file():
+            console_err.print(f"[red]Error:[/red] File not found: {codes}")
+            sys.exit(1)
+
+        coder = None
+        if local_model is not None:
+            from ..local import LocalModelCoder
+
+            coder = LocalModelCoder(local_model)
+        elif model is not None:
+            from ..coders import AnthropicCoder
+
+            coder = AnthropicCoder(model=model)
+
+        retriever = CandidateRetriever(CodeTable.load(codes))
+        service = LinkingService(
+            retriever,
+            coder=coder,
+            k=k,
+            max_batch=batch_size,
+            max_wait=max_wait_ms / 1000,
+            max_queue=max_queue,
+            concurrency=concurrency,
+        )
+
+        server = await service.serve(host, port)
+        console.print(
+            f"[bold cyan]Serving {len(retriever.table)} codes on[/bold cyan] http://{host}:{port}"
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await service.close()
+
+    except Exception as e:
+        console_err.print(f"[red]Error:[/red] {e}")
+        sys.exit(1)
@@ -0,0 +1,305 @@
+"""Selection of the note context sent to a coder for a span."""
+
+import re
+from typing import Any
+
+# Headers seen in MIMIC discharge summaries and physician notes. Matched at
+# the start of a line, optionally followed by a colon.
+SECTION_TITLES = (
+    "chief complaint",
+    "major surgical or invasive procedure",
+    "history of present illness",
+    "hpi",
+    "past medical history",
+    "pmh",
+    "past surgical history",
+    "social history",
+    "family history",
+    "allergies",
+    "review of systems",
+    "physical exam",
+    "physical examination",
+    "pertinent results",
+    "labs",
+    "imaging",
+    "brief hospital course",
+    "hospital course",
+    "assessment and plan",
+    "assessment/plan",
+    "assessment & plan",
+    "a/p",
+    "assessment",
+    "plan",
+    "impression",
+    "findings",
+    "medications on admission",
+    "discharge medications",
+    "discharge disposition",
+    "discharge diagnosis",
+    "discharge diagnoses",
+    "discharge condition",
+    "discharge instructions",
+    "followup instructions",
+)
+
+# Sections that carry diagnoses; these are kept first when the budget is tight
+PRIORITY_TITLES = (
+    "discharge diagnos",
+    "assessment",
+    "a/p",
+    "impression",
+    "history of present illness",
+    "hpi",
+    "brief hospital course",
+    "hospital course",
+    "past medical history",
+    "pmh",
+)
+
+_SECTION_PATTERN = re.compile(
+    r"^[ \t]*(?:(?P<known>"
+    + "|".join(re.escape(title) for title in sorted(SECTION_TITLES, key=len, reverse=True))
+    + r")[ \t]*:|(?P<caps>[A-Z][A-Z /&-]{2,40}):)",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n[ \t]*\n")
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+SEPARATOR = "\n[...]\n"
+
+
+class Section:
+    """A titled region of a note, as character offsets."""
+
+    def __init__(self, title: str, begin: int, end: int):
+        self.title = title
+        self.begin = begin
+        self.end = end
+
+    def __repr__(self):
+        return f"<Section {self.title!r} [{self.begin}:{self.end}]>"
+
+
+def split_sections(text: str) -> list[Section]:
+    """Split a note into sections at recognized header lines.
+
+    Text before the first header becomes an untitled section.
+
+    Args:
+        text: Note text
+
+    Returns:
+        Sections covering the whole note, in order
+    """
+    starts = []
+    for match in _SECTION_PATTERN.finditer(text):
+        if match.group("caps") and not match.group("caps").isupper():
+            continue
+        title = (match.group("known") or match.group("caps")).strip().lower()
+        starts.append((match.start(), title))
+
+    if not starts or starts[0][0] > 0:
+        starts.insert(0, (0, ""))
+
+    sections = []
+    for (begin, title), (end, _) in zip(starts, starts[1:] + [(len(text), "")], strict=True):
+        if end > begin:
+            sections.append(Section(title, begin, end))
+    return sections
+
+
+def split_sentences(text: str, begin: int = 0, end: int | None = None) -> list[tuple[int, int]]:
+    """Return ``(begin, end)`` offsets of the sentences in ``text[begin:end]``."""
+    end = len(text) if end is None else end
+    spans = []
+    start = begin
+    for match in _SENTENCE_BOUNDARY.finditer(text, begin, end):
+        if match.start() > start:
+            spans.append((start, match.start()))
+        start = match.end()
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+
+def token_starts(text: str, begin: int, end: int) -> list[int]:
+    """Start offsets of the words and punctuation marks in ``text[begin:end]``."""
+    return [match.start() for match in _TOKEN_PATTERN.finditer(text, begin, end)]
+
+
+class ContextSelector:
+    """Builds a token-budgeted excerpt of a note around a span.
+
+    The excerpt is the span's whole section, extended to other sections
+    (diagnosis-bearing sections first) while the token budget allows. When
+    the section alone is over budget, the span's sentence window is sent
+    instead, narrowed to fit. Section splits are cached per note.
+
+    Tokens are counted with ``tokenizer.encode`` when a tokenizer (such as a
+    Hugging Face tokenizer) is given, and approximated by words and
+    punctuation otherwise.
+    """
+
+    def __init__(self, max_tokens: int = 1024, window: int = 2, tokenizer: Any = None):
+        self.max_tokens = max_tokens
+        self.window = window
+        self.tokenizer = tokenizer
+        self._notes: dict[Any, tuple[list[Section], list[int], int]] = {}
+
+        # Totals over every select() call, for reporting the reduction
+        self.selected_tokens = 0
+        self.original_tokens = 0
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the configured tokenizer."""
+        if self.tokenizer is None:
+            return len(_TOKEN_PATTERN.findall(text))
+        try:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        except TypeError:
+            return len(self.tokenizer.encode(text))
+
+    def sections(self, text: str, key: Any = None) -> list[Section]:
+        """Return the cached sections of a note."""
+        return self._note(text, key)[0]
+
+    def _note(self, text: str, key: Any) -> tuple[list[Section], list[int], int]:
+        """Sections, per-section token counts and total tokens of a note (cached)."""
+        key = key if key is not None else hash(text)
+        if key not in self._notes:
+            sections = split_sections(text)
+            tokens = [self.count_tokens(text[s.begin : s.end]) for s in sections]
+            self._notes[key] = (sections, tokens, sum(tokens))
+        return self._notes[key]
+
+    def select(self, text: str, begin: int, end: int, key: Any = None) -> str:
+        """Build the excerpt of a note to send for the span ``text[begin:end]``.
+
+        Args:
+            text: Full note text
+            begin: Span start offset
+            end: Span end offset
+            key: Cache key for the note, e.g. its ``note_id``
+
+        Returns:
+            Excerpt in note order, with ``[...]`` between non-adjacent pieces
+        """
+        sections, section_tokens, note_tokens = self._note(text, key)
+        if not sections:
+            return text
+
+        home = next(
+            (idx for idx, s in enumerate(sections) if s.begin <= begin < s.end),
+            len(sections) - 1,
+        )
+
+        if section_tokens[home] <= self.max_tokens:
+            pieces = [(sections[home].begin, sections[home].end)]
+            used = section_tokens[home]
+
+            for idx in self._by_priority(sections, home):
+                if used + section_tokens[idx] <= self.max_tokens:
+                    pieces.append((sections[idx].begin, sections[idx].end))
+                    used += section_tokens[idx]
+        else:
+            pieces, used = self._fit_window(text, sections[home], begin, end)
+
+        self.selected_tokens += used
+        self.original_tokens += note_tokens
+        return _join(text, pieces)
+
+    @property
+    def reduction(self) -> float:
+        """Fraction of note tokens removed across all selections so far."""
+        if not self.original_tokens:
+            return 0.0
+        return round(1 - self.selected_tokens / self.original_tokens, 4)
+
+    def _fit_window(
+        self, text: str, section: Section, begin: int, end: int
+    ) -> tuple[list[tuple[int, int]], int]:
+        """The largest sentence window around the span that fits the budget.
+
+        Narrows the window a sentence at a time; when even the span's own
+        sentence is over budget, keeps as many words as fit on each side of
+        the span (or the start of the span when it alone is over budget).
+
+        Returns:
+            Tuple of (pieces, tokens used)
+        """
+        for window in range(self.window, -1, -1):
+            piece = self._window(text, section, begin, end, window)
+            used = self.count_tokens(text[piece[0] : piece[1]])
+            if used <= self.max_tokens:
+                return [piece], used
+
+        words = [m.span() for m in _TOKEN_PATTERN.finditer(text, piece[0], piece[1])]
+        hit = [i for i, (s, e) in enumerate(words) if s < max(end, begin + 1) and e > begin]
+        if not hit:
+            return [(begin, begin)], 0
+        first, last = hit[0], hit[-1]
+
+        def fits(lo: int, hi: int) -> bool:
+            return self.count_tokens(text[words[lo][0] : words[hi][1]]) <= self.max_tokens
+
+        if fits(first, last):
+            # Grow the number of words kept each side of the span
+            low, high = 0, max(first, len(words) - 1 - last)
+            while low < high:
+                radius = (low + high + 1) // 2
+                if fits(max(first - radius, 0), min(last + radius, len(words) - 1)):
+                    low = radius
+                else:
+                    high = radius - 1
+            first, last = max(first - low, 0), min(last + low, len(words) - 1)
+        else:
+            # Keep the longest prefix of the span that fits
+            low, high = first - 1, last - 1
+            while low < high:
+                mid = (low + high + 1) // 2
+                if fits(first, mid):
+                    low = mid
+                else:
+                    high = mid - 1
+            if low < first:
+                return [(begin, begin)], 0
+            last = low
+
+        piece = (words[first][0], words[last][1])
+        return [piece], self.count_tokens(text[piece[0] : piece[1]])
+
+    def _window(
+        self, text: str, section: Section, begin: int, end: int, window: int
+    ) -> tuple[int, int]:
+        """Offsets of the span's sentence plus ``window`` sentences each side."""
+        sentences = split_sentences(text, section.begin, section.end)
+        hit = [i for i, (s, e) in enumerate(sentences) if s < max(end, begin + 1) and e > begin]
+        if not hit:
+            return begin, end
+        first = max(hit[0] - window, 0)
+        last = min(hit[-1] + window, len(sentences) - 1)
+        return sentences[first][0], sentences[last][1]
+
+    @staticmethod
+    def _by_priority(sections: list[Section], home: int) -> list[int]:
+        """Indexes of the other sections, diagnosis-bearing ones first."""
+
+        def rank(idx: int) -> int:
+            for priority, prefix in enumerate(PRIORITY_TITLES):
+                if sections[idx].title.startswith(prefix):
+                    return priority
+            return len(PRIORITY_TITLES)
+
+        return sorted((idx for idx in range(len(sections)) if idx != home), key=rank)
+
+
+def _join(text: str, pieces: list[tuple[int, int]]) -> str:
+    """Concatenate note pieces in note order, marking gaps."""
+    parts = []
+    last_end = None
+    for begin, end in sorted(pieces):
+        if last_end is not None:
+            parts.append("\n" if begin <= last_end else SEPARATOR)
+        parts.append(text[begin:end].strip("\n"))
+        last_end = end
+    return "".join(parts).strip()
@@ -0,0 +1,29 @@
+"""Loading MDACE coding examples."""
+
+from pathlib import Path
+
+
+def load_examples(path: Path, split: str | None = None, limit: int | None = None) -> list[dict]:
+    """Load coded spans from an MDACE parquet file.
+
+    Each row is one annotated span with its note (``hadm_id``, ``note_id``,
+    ``category``, ``text``, ``begin``, ``end``, ``covered_text``, ``code``, ...).
+
+    Args:
+        path: Parquet file, e.g. ``Inpatient-ICD-10-with-splits.parquet``
+        split: Keep only rows of this split (requires a ``split`` column)
+        limit: Keep at most this many rows
+
+    Returns:
+        List of row dicts
+    """
+    import polars as pl
+
+    df = pl.read_parquet(path)
+    if split is not None:
+        if "split" not in df.columns:
+            raise ValueError(f"No 'split' column in {path}")
+        df = df.filter(pl.col("split") == split)
+    if limit is not None:
+        df = df.head(limit)
+    return df.to_dicts()
@@ -0,0 +1,201 @@
+"""Excludes1/Excludes2 conflicts between codes of the same admission."""
+
+import json
+import re
+from bisect import bisect_left
+from pathlib import Path
+
+from .codes import CodeTable
+
+# Note kinds checked; Excludes1 pairs must never be coded together, Excludes2
+# pairs may be (the excluded condition is not part of the code) but are worth
+# a second look
+KINDS = ("excludes1", "excludes2")
+
+_CODE = r"[A-Z][0-9][0-9A-Z](?:\.[0-9A-Z]{1,4})?"
+
+# A code or code range, each end optionally marked "and subcodes" (O24.4-, E10.-)
+_REFERENCE = re.compile(rf"\b({_CODE})(?:\.?-)?(?:\s*-\s*({_CODE})(?:\.?-)?)?(?![0-9A-Z.])")
+
+_PARENTHESIZED = re.compile(r"\(([^()]*)\)")
+
+
+class Conflict:
+    """A pair of codes in one admission that an Excludes note rules out."""
+
+    def __init__(self, code: str, excluded: str, kind: str, note: str):
+        self.code = code
+        self.excluded = excluded
+        self.kind = kind
+        self.note = note
+
+    def to_dict(self) -> dict:
+        """Serialize the conflict for run files."""
+        return {"code": self.code, "excluded": self.excluded, "kind": self.kind, "note": self.note}
+
+    def __repr__(self):
+        return f"<Conflict {self.code} {self.kind} {self.excluded}>"
+
+
+def parse_references(note: str) -> list[tuple[str, str]]:
+    """Code ranges referenced by an Excludes note.
+
+    Only parenthesized references are read, so words such as "A1C" in the
+    note text are not taken for codes. A single code is a range of one
+    category or subcategory; every range includes the subcodes of both ends.
+
+    Args:
+        note: Note text, e.g. ``"diabetes mellitus (E08-E13)"``
+
+    Returns:
+        List of ``(first, last)`` code prefixes without dots, e.g. ``[("E08", "E13")]``
+    """
+    ranges = []
+    for group in _PARENTHESIZED.findall(note):
+        for match in _REFERENCE.finditer(group):
+            first = match.group(1).replace(".", "")
+            last = (match.group(2) or match.group(1)).replace(".", "")
+            ranges.append((first, last))
+    return ranges
+
+
+class ExclusionIndex:
+    """Excludes1/Excludes2 relations precomputed as per-code bitsets.
+
+    Codes get integer IDs in sorted order, so every referenced range,
+    including all subcodes, is a contiguous run of IDs. Each code with its
+    own Excludes notes stores the union of its ranges as a bitset; since a
+    note applies to every code below it, a code's exclusions are the bitsets
+    of itself and its ancestors. Checking a set of codes is then one bitwise
+    AND per code and ancestor against the bitset of the whole set.
+
+    Bitsets are Python ints offset by their lowest ID, so a note excluding a
+    few codes near the end of the table stays small.
+    """
+
+    def __init__(self, table: CodeTable):
+        self.table = table
+        self.codes = sorted((record["code"] for record in table.records), key=_key)
+        self.ids = {code: idx for idx, code in enumerate(self.codes)}
+        self._keys = [_key(code) for code in self.codes]
+
+        # Parent ID per code ID, -1 for categories
+        self._parents = [
+            self.ids.get(table.get(code).get("parent_code") or "", -1) for code in self.codes
+        ]
+
+        # kind -> code ID -> (offset, bitset, [(first ID, end ID, note)])
+        self.bitsets: dict[str, dict[int, tuple[int, int, list]]] = {}
+        for kind in KINDS:
+            self.bitsets[kind] = {}
+            for code in self.codes:
+                ranges = [
+                    (*self._id_range(first, last), note)
+                    for note in table.get(code).get(kind) or []
+                    for first, last in parse_references(note)
+                ]
+                ranges = [(lo, hi, note) for lo, hi, note in ranges if lo < hi]
+                if ranges:
+                    self.bitsets[kind][self.ids[code]] = _bitset(ranges) + (ranges,)
+
+    def _id_range(self, first: str, last: str) -> tuple[int, int]:
+        """IDs ``[lo, hi)`` of the codes from ``first`` through the subcodes of ``last``."""
+        return bisect_left(self._keys, first), bisect_left(self._keys, last + "~")
+
+    def _lineage(self, code_id: int) -> list[int]:
+        """The code and its ancestors, nearest first."""
+        lineage = []
+        while code_id >= 0:
+            lineage.append(code_id)
+            code_id = self._parents[code_id]
+        return lineage
+
+    def conflicts(self, codes: list[str]) -> list[Conflict]:
+        """Excludes conflicts among a set of codes.
+
+        Args:
+            codes: Codes of one admission; codes not in the table are ignored
+
+        Returns:
+            Conflicts in input order, one per pair and kind (the first code
+            whose note excludes the other)
+        """
+        ids = list(dict.fromkeys(self.ids[code] for code in codes if code in self.ids))
+        mask = 0
+        for code_id in ids:
+            mask |= 1 << code_id
+
+        found = []
+        seen = set()
+        for code_id in ids:
+            lineage = self._lineage(code_id)
+            for kind in KINDS:
+                bitsets = self.bitsets[kind]
+                for owner in lineage:
+                    if owner not in bitsets:
+                        continue
+                    offset, bits, ranges = bitsets[owner]
+                    hits = (mask >> offset) & bits
+                    while hits:
+                        low = hits & -hits
+                        hits ^= low
+                        other = offset + low.bit_length() - 1
+                        pair = (kind, min(code_id, other), max(code_id, other))
+                        if other in lineage or pair in seen:
+                            continue
+                        seen.add(pair)
+                        note = next(note for lo, hi, note in ranges if lo <= other < hi)
+                        found.append(Conflict(self.codes[code_id], self.codes[other], kind, note))
+        return found
+
+    def check_admissions(
+        self, predictions: list[dict], field: str = "predicted", group: str = "hadm_id"
+    ) -> dict:
+        """Excludes conflicts of every admission in a run.
+
+        Args:
+            predictions: Prediction records; ``normalized`` codes are used when present
+            field: Field holding the predicted code
+            group: Field identifying the admission
+
+        Returns:
+            Dict of admission ID to its conflicts, for admissions that have any
+        """
+        admissions: dict = {}
+        for record in predictions:
+            code = record.get("normalized") or record.get(field)
+            admissions.setdefault(record.get(group), []).append(code)
+
+        results = {}
+        for admission, codes in admissions.items():
+            found = self.conflicts(codes)
+            if found:
+                results[admission] = found
+        return results
+
+
+def write_conflicts(output_dir: Path, conflicts: dict) -> None:
+    """Write ``conflicts.jsonl``, one line per admission with conflicts.
+
+    Args:
+        output_dir: Run directory
+        conflicts: Result of :meth:`ExclusionIndex.check_admissions`
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "conflicts.jsonl", "w", encoding="utf-8") as f:
+        for admission, found in conflicts.items():
+            record = {"hadm_id": admission, "conflicts": [c.to_dict() for c in found]}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _key(code: str) -> str:
+    return code.replace(".", "")
+
+
+def _bitset(ranges: list[tuple[int, int, str]]) -> tuple[int, int]:
+    """Offset and bits of the union of ID ranges."""
+    offset = min(lo for lo, _, _ in ranges)
+    bits = 0
+    for lo, hi, _ in ranges:
+        bits |= ((1 << (hi - lo)) - 1) << (lo - offset)
+    return offset, bits
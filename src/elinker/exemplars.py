@@ -0,0 +1,307 @@
+"""Nearest-neighbour coded exemplars from the train split for few-shot prompts."""
+
+import json
+import pickle
+import re
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .context import ContextSelector
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def example_key(row: dict) -> tuple:
+    """Key identifying a span across splits: admission, note and offsets."""
+    return (row.get("hadm_id"), row.get("note_id"), row.get("begin"), row.get("end"))
+
+
+class Exemplar:
+    """A coded train span shown to the model as a worked example."""
+
+    def __init__(self, phrase: str, context: str, code: str, description: str = ""):
+        self.phrase = phrase
+        self.context = context  # Note text around the span
+        self.code = code
+        self.description = description
+
+    @property
+    def text(self) -> str:
+        """The text the exemplar adds to a prompt, for token budgets."""
+        return f"{self.context} {self.phrase} {self.code}"
+
+    def to_dict(self) -> dict:
+        """Serialize the exemplar."""
+        return {
+            "phrase": self.phrase,
+            "context": self.context,
+            "code": self.code,
+            "description": self.description,
+        }
+
+    def __repr__(self):
+        return f"<Exemplar {self.phrase!r}: {self.code}>"
+
+
+class ExemplarIndex:
+    """Train exemplars with the nearest ones to each evaluated span precomputed.
+
+    Train spans are indexed once as TF-IDF vectors of character n-grams of
+    their covered text and surrounding context. :meth:`build` then scores
+    the spans to evaluate in batches, with one sparse matrix product per
+    batch, and keeps each span's top-k exemplars, so assembling a few-shot
+    prompt is a dict lookup rather than a search per request. The fitted
+    index can be written with :meth:`save` and read back with :meth:`load`,
+    so runs over the same train split skip the fit.
+
+    Args:
+        train: Train split rows (``covered_text``, ``code``, ``text``, ``begin``, ``end``)
+        k: Exemplars kept per span
+        context_chars: Characters of note context kept either side of a span
+        batch_size: Spans scored per matrix product
+        tokenizer: Tokenizer of the coding model for token budgets and counts;
+            words and punctuation when None
+    """
+
+    def __init__(
+        self,
+        train: list[dict],
+        k: int = 8,
+        context_chars: int = 120,
+        batch_size: int = 256,
+        tokenizer: Any = None,
+    ):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        start_time = time.perf_counter()
+        self.k = k
+        self.count_tokens = ContextSelector(tokenizer=tokenizer).count_tokens
+        self.context_chars = context_chars
+        self.batch_size = batch_size
+        self.exemplars = [
+            Exemplar(
+                row.get("covered_text") or "",
+                _context(row, context_chars),
+                row["code"],
+                row.get("description") or "",
+            )
+            for row in train
+        ]
+        self.columns: dict[tuple, list[int]] = {}  # Span key -> exemplar ids
+        for idx, row in enumerate(train):
+            self.columns.setdefault(example_key(row), []).append(idx)
+
+        self.vectorizer = TfidfVectorizer(
+            analyzer="char_wb", ngram_range=(3, 4), sublinear_tf=True, lowercase=True
+        )
+        documents = [_document(e.phrase, e.context) for e in self.exemplars]
+        self.matrix = self.vectorizer.fit_transform(documents).T.tocsr()
+
+        self._reset(time.perf_counter() - start_time)
+
+    def _reset(self, build_seconds: float) -> None:
+        self.neighbors: dict[tuple, np.ndarray] = {}  # Span key -> exemplar ids, best first
+        self.build_seconds = build_seconds  # Indexing (or loading) and neighbour search
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+        self.chosen = 0  # Exemplars returned by all lookups
+        self.chosen_tokens = 0  # And their tokens
+
+    def __len__(self) -> int:
+        return len(self.exemplars)
+
+    def save(self, directory: Path, train_digest: str | None = None) -> None:
+        """Write the fitted index to a directory for :meth:`load`.
+
+        Args:
+            directory: Index directory, created if missing
+            train_digest: :func:`train_digest` of the split the index was
+                fitted on, recorded so a stale index can be detected
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "vectorizer.pkl", "wb") as f:
+            pickle.dump(self.vectorizer, f)
+        for name in ("data", "indices", "indptr"):
+            np.save(directory / f"matrix_{name}.npy", getattr(self.matrix, name))
+        keys = [None] * len(self.exemplars)
+        for key, ids in self.columns.items():
+            for idx in ids:
+                keys[idx] = key
+        with open(directory / "exemplars.jsonl", "w", encoding="utf-8") as f:
+            for exemplar, key in zip(self.exemplars, keys, strict=True):
+                f.write(json.dumps({**exemplar.to_dict(), "key": key}, default=str) + "\n")
+        with open(directory / "index.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "shape": list(self.matrix.shape),
+                    "k": self.k,
+                    "context_chars": self.context_chars,
+                    "batch_size": self.batch_size,
+                    "train_digest": train_digest,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, directory: Path, k: int | None = None, tokenizer: Any = None) -> "ExemplarIndex":
+        """Load an index written by :meth:`save`.
+
+        Args:
+            directory: Index directory
+            k: Exemplars kept per span; the saved ``k`` when None
+            tokenizer: Tokenizer of the coding model for token budgets and counts
+
+        Returns:
+            Index with no neighbours built yet
+        """
+        from scipy.sparse import csr_matrix
+
+        start_time = time.perf_counter()
+        with open(directory / "index.json", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        index = cls.__new__(cls)
+        index.k = k if k is not None else meta["k"]
+        index.count_tokens = ContextSelector(tokenizer=tokenizer).count_tokens
+        index.context_chars = meta["context_chars"]
+        index.batch_size = meta["batch_size"]
+        with open(directory / "vectorizer.pkl", "rb") as f:
+            index.vectorizer = pickle.load(f)
+        arrays = [
+            np.load(directory / f"matrix_{name}.npy") for name in ("data", "indices", "indptr")
+        ]
+        index.matrix = csr_matrix(tuple(arrays), shape=tuple(meta["shape"]), copy=False)
+
+        index.exemplars = []
+        index.columns = {}
+        with open(directory / "exemplars.jsonl", encoding="utf-8") as f:
+            for idx, line in enumerate(f):
+                record = json.loads(line)
+                index.columns.setdefault(tuple(record.pop("key")), []).append(idx)
+                index.exemplars.append(Exemplar(**record))
+        index._reset(time.perf_counter() - start_time)
+        return index
+
+    @staticmethod
+    def saved_digest(directory: Path) -> str | None:
+        """The train digest recorded in a saved index, or None if there is none."""
+        path = directory / "index.json"
+        if not path.is_file():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("train_digest")
+
+    def totals(self) -> dict:
+        """Counters of the index, summable across the shards of a run."""
+        return {
+            "lookups": self.lookups,
+            "exemplars": self.chosen,
+            "tokens": self.chosen_tokens,
+            "build_seconds": self.build_seconds,
+            "lookup_seconds": self.lookup_seconds,
+        }
+
+    def build(self, examples: list[dict]) -> None:
+        """Precompute the nearest exemplars of spans not seen before.
+
+        A span that is itself a train exemplar never gets itself back.
+
+        Args:
+            examples: Rows to evaluate (``covered_text``, ``text``, ``begin``, ``end``)
+        """
+        start_time = time.perf_counter()
+        pending = [row for row in examples if example_key(row) not in self.neighbors]
+        k = min(self.k, len(self.exemplars))
+        if k <= 0:
+            return
+
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start : start + self.batch_size]
+            documents = [
+                _document(row.get("covered_text") or "", _context(row, self.context_chars))
+                for row in batch
+            ]
+            scores = (self.vectorizer.transform(documents) @ self.matrix).toarray()
+            for row_idx, row in enumerate(batch):
+                scores[row_idx, self.columns.get(example_key(row), [])] = -np.inf
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row_idx, row in enumerate(batch):
+                columns = top[row_idx]
+                ordered = columns[np.argsort(-scores[row_idx, columns], kind="stable")]
+                ordered = ordered[np.isfinite(scores[row_idx, ordered])]
+                self.neighbors[example_key(row)] = ordered.astype(np.int32)
+
+        self.build_seconds += time.perf_counter() - start_time
+
+    def lookup(
+        self, row: dict, max_tokens: int | None = None, count_tokens: Any = None
+    ) -> list[Exemplar]:
+        """The precomputed exemplars of a span, best first, within a token budget.
+
+        Exemplars repeating an earlier one's phrase and code are dropped.
+
+        Args:
+            row: A span passed to :meth:`build`
+            max_tokens: Token budget for all exemplars; unlimited when None
+            count_tokens: Token counter; the index's tokenizer by default
+
+        Returns:
+            Up to ``k`` exemplars (none for spans that were not built)
+        """
+        start_time = time.perf_counter()
+        count_tokens = count_tokens or self.count_tokens
+        chosen = []
+        seen = set()
+        used = 0
+        for idx in self.neighbors.get(example_key(row), ()):
+            exemplar = self.exemplars[idx]
+            signature = (exemplar.phrase.lower(), exemplar.code)
+            if signature in seen:
+                continue
+            if max_tokens is not None:
+                tokens = count_tokens(exemplar.text)
+                if used + tokens > max_tokens:
+                    break
+                used += tokens
+            seen.add(signature)
+            chosen.append(exemplar)
+        self.lookups += 1
+        self.lookup_seconds += time.perf_counter() - start_time
+        if max_tokens is None:  # Counted outside the timed lookup
+            used = sum(count_tokens(exemplar.text) for exemplar in chosen)
+        self.chosen += len(chosen)
+        self.chosen_tokens += used
+        return chosen
+
+
+def train_digest(data: Path, split: str, context_chars: int = 120) -> str:
+    """Key of the train rows an index is fitted on: data file, split and context size."""
+    from .retrieval import file_digest
+
+    return f"{file_digest(data)}:{split}:{context_chars}"
+
+
+def _context(row: dict, chars: int) -> str:
+    """Note text around a span on one line, cut at word boundaries."""
+    text = row.get("text") or ""
+    begin, end = row.get("begin"), row.get("end")
+    if begin is None or end is None:
+        return ""
+    lo = max(0, begin - chars)
+    hi = min(len(text), end + chars)
+    if lo > 0:
+        space = text.find(" ", lo, begin)
+        lo = space + 1 if space >= 0 else lo
+    if hi < len(text):
+        space = text.rfind(" ", end, hi)
+        hi = space if space >= 0 else hi
+    return _WHITESPACE.sub(" ", text[lo:hi]).strip()
+
+
+def _document(phrase: str, context: str) -> str:
+    """Indexed text of a span; the phrase is repeated to outweigh its context."""
+    return f"{phrase} ; {phrase} ; {context}"
@@ -0,0 +1,241 @@
+"""Per-request latency, token and cost instrumentation for coder backends."""
+
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any
+
+from .coders import CodingRequest, CodingResult
+
+# USD per million tokens: (input, output, cached input)
+PRICES = {
+    "claude-opus-4-5": (5.00, 25.00, 0.50),
+    "claude-sonnet-4-5": (3.00, 15.00, 0.30),
+    "claude-haiku-4-5": (1.00, 5.00, 0.10),
+}
+
+PERCENTILES = (50, 95, 99)
+
+# Characters trackers reject in metric names (e.g. "candidate_recall@20")
+_METRIC_NAME_INVALID = re.compile(r"[^\w\-./]")
+
+
+class RequestMetrics:
+    """Timings and token counts recorded for one coder request."""
+
+    def __init__(
+        self,
+        request_id: Any,
+        latency: float,
+        ttft: float | None = None,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cached_tokens: int = 0,
+        tool_calls: int = 0,
+        error: str | None = None,
+    ):
+        self.request_id = request_id
+        self.latency = latency
+        self.ttft = ttft
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cached_tokens = cached_tokens
+        self.tool_calls = tool_calls
+        self.error = error
+
+    def to_dict(self) -> dict:
+        """Serialize the metrics for the JSON summary."""
+        return {
+            "request_id": self.request_id,
+            "latency": self.latency,
+            "ttft": self.ttft,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "tool_calls": self.tool_calls,
+            "error": self.error,
+        }
+
+
+class InstrumentedCoder:
+    """Wraps any coder backend and records metrics for every request.
+
+    The wrapper has the same async ``code(request)`` interface, so it can be
+    passed anywhere a coder is expected.
+    """
+
+    def __init__(self, coder, model: str | None = None):
+        self.coder = coder
+        self.model = model or getattr(coder, "model", None)
+        if not isinstance(self.model, str):
+            self.model = None
+        self.records: list[RequestMetrics] = []
+        self.first_start: float | None = None
+        self.last_end: float | None = None
+
+    async def code(self, request: CodingRequest) -> CodingResult:
+        """Code a request through the wrapped backend, recording its metrics."""
+        start = time.perf_counter()
+        if self.first_start is None:
+            self.first_start = start
+
+        try:
+            result = await self.coder.code(request)
+        except Exception as e:
+            self._finish(
+                RequestMetrics(request.request_id, time.perf_counter() - start, error=str(e))
+            )
+            raise
+
+        usage = result.usage
+        self._finish(
+            RequestMetrics(
+                request.request_id,
+                time.perf_counter() - start,
+                ttft=usage.get("ttft"),
+                input_tokens=usage.get("input_tokens", 0),
+                output_tokens=usage.get("output_tokens", 0),
+                cached_tokens=usage.get("cached_tokens", 0),
+                tool_calls=sum(turn.get("tool_calls", 0) for turn in result.turns),
+            )
+        )
+        return result
+
+    def _finish(self, record: RequestMetrics) -> None:
+        self.records.append(record)
+        self.last_end = time.perf_counter()
+
+    def summary(self) -> dict:
+        """Aggregate the recorded requests into run-level metrics.
+
+        Returns:
+            Dict with request and error counts, wall time, throughput,
+            latency and TTFT percentiles, token totals, tool calls and cost
+        """
+        records = self.records
+        wall_time = (
+            self.last_end - self.first_start
+            if self.first_start is not None and self.last_end is not None
+            else 0.0
+        )
+        input_tokens = sum(r.input_tokens for r in records)
+        output_tokens = sum(r.output_tokens for r in records)
+        cached_tokens = sum(r.cached_tokens for r in records)
+
+        summary = {
+            "requests": len(records),
+            "errors": sum(r.error is not None for r in records),
+            "wall_time": round(wall_time, 4),
+            "throughput": round(len(records) / wall_time, 4) if wall_time > 0 else 0.0,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "tool_calls": sum(r.tool_calls for r in records),
+        }
+        summary.update(percentiles("latency", [r.latency for r in records]))
+        summary.update(percentiles("ttft", [r.ttft for r in records if r.ttft is not None]))
+
+        cost = estimate_cost(self.model, input_tokens, output_tokens, cached_tokens)
+        if cost is not None:
+            summary["cost_usd"] = cost
+
+        return summary
+
+
+def percentiles(name: str, values: list[float]) -> dict:
+    """Return ``{name}_p50``/``_p95``/``_p99`` (and the mean) of some values."""
+    if not values:
+        return {}
+    import numpy as np
+
+    array = np.asarray(values, dtype=float)
+    stats = {f"{name}_mean": round(float(array.mean()), 4)}
+    for q, value in zip(PERCENTILES, np.percentile(array, PERCENTILES), strict=True):
+        stats[f"{name}_p{q}"] = round(float(value), 4)
+    return stats
+
+
+def estimate_cost(
+    model: str | None, input_tokens: int, output_tokens: int, cached_tokens: int
+) -> float | None:
+    """Estimate the USD cost of a run, or None for models without a price.
+
+    Cached tokens are billed at the cached-input rate and deducted from the
+    regular input tokens.
+    """
+    if model is None:
+        return None
+    price = next((p for name, p in PRICES.items() if model.startswith(name)), None)
+    if price is None:
+        return None
+
+    input_price, output_price, cached_price = price
+    uncached = max(input_tokens - cached_tokens, 0)
+    cost = uncached * input_price + output_tokens * output_price + cached_tokens * cached_price
+    return round(cost / 1_000_000, 6)
+
+
+def write_metrics(output_dir: Path, coder: InstrumentedCoder, policy=None) -> dict:
+    """Write ``metrics.json`` (run summary and per-request records) next to ``scores.json``.
+
+    Args:
+        output_dir: Run directory
+        coder: Instrumented coder used for the run
+        policy: Request policy (see :mod:`elinker.policies`) whose per-backend
+            latency histograms and usage are added to the summary under
+            ``policy``. Its token totals and cost, which count every backend
+            call at that backend's price, replace the wrapper's.
+
+    Returns:
+        The run summary
+    """
+    summary = coder.summary()
+    if policy is not None:
+        policy_summary = policy.summary()
+        summary.pop("cost_usd", None)
+        for key in ("input_tokens", "output_tokens", "cached_tokens", "cost_usd"):
+            if key in policy_summary:
+                summary[key] = policy_summary[key]
+        summary["policy"] = policy_summary
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "metrics.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {"summary": summary, "requests": [r.to_dict() for r in coder.records]}, f, indent=4
+        )
+    return summary
+
+
+def export_metrics(
+    tracker: str, project: str, config: dict, summary: dict, scores: dict | None = None
+) -> None:
+    """Log a run's configuration, metrics and scores to an experiment tracker.
+
+    Args:
+        tracker: ``"mlflow"`` or ``"trackio"``
+        project: MLflow experiment or Trackio project name
+        config: Run configuration (mode, model, k, ...)
+        summary: Summary from :meth:`InstrumentedCoder.summary`
+        scores: Accuracy scores to log alongside the performance metrics
+    """
+    metrics = {
+        _METRIC_NAME_INVALID.sub("_", key): value
+        for key, value in {**(scores or {}), **summary}.items()
+        if isinstance(value, int | float) and not isinstance(value, bool)
+    }
+
+    if tracker == "mlflow":
+        import mlflow
+
+        mlflow.set_experiment(project)
+        with mlflow.start_run():
+            mlflow.log_params(config)
+            mlflow.log_metrics(metrics)
+    elif tracker == "trackio":
+        import trackio
+
+        trackio.init(project=project, config=config)
+        trackio.log(metrics)
+        trackio.finish()
+    else:
+        raise ValueError(f"Unknown tracker: {tracker}")
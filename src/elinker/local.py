@@ -0,0 +1,233 @@
+"""Offline coder backend running a Hugging Face causal LM on CPU.
+
+Requires the ``local`` extra (``torch`` and ``transformers``).
+"""
+
+import asyncio
+import re
+import time
+from collections.abc import Callable
+from typing import Any
+
+from .coders import MISSING_CODE, CodingRequest, CodingResult
+from .prompts import render_prompt
+
+LOCAL_TEMPLATE = "prompt_template_local.md.jinja2"
+
+SYSTEM_PROMPT = (
+    "You are an expert clinical coder. Given a phrase extracted from a medical note, "
+    "along with the note as context, identify the most specific billable ICD-10-CM "
+    "diagnosis code for the phrase. Answer with the code only."
+)
+
+_CODE_PATTERN = re.compile(r"\b([A-TV-Z][0-9][0-9A-Z](?:\.?[0-9A-Z]{1,4})?)\b")
+_SENTINEL = "<<elinker-user-content>>"
+
+
+class LocalModelCoder:
+    """Batched greedy generation with a local causal LM.
+
+    Concurrent ``code()`` calls are queued and flushed together: pending
+    requests are grouped into buckets of similar token length, and each bucket
+    is generated in batches of at most ``batch_size`` so padding stays small.
+    The shared system prompt is tokenized once and prepended as token IDs.
+    Results are delivered to each caller as soon as its batch finishes; the
+    time from a call to its batch's first generated token is reported as
+    ``usage["ttft"]``.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        tokenizer: Any = None,
+        batch_size: int = 8,
+        bucket_width: int = 64,
+        max_new_tokens: int = 16,
+        system_prompt: str = SYSTEM_PROMPT,
+    ):
+        if isinstance(model, str):
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+
+            tokenizer = tokenizer or AutoTokenizer.from_pretrained(model)
+            model = AutoModelForCausalLM.from_pretrained(model)
+
+        if tokenizer is None:
+            raise ValueError("A tokenizer is required when passing a model object")
+
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.bucket_width = bucket_width
+        self.max_new_tokens = max_new_tokens
+
+        self.pad_token_id = tokenizer.pad_token_id
+        if self.pad_token_id is None:
+            self.pad_token_id = tokenizer.eos_token_id
+
+        prefix, suffix = _split_prompt(tokenizer, system_prompt)
+        self.prefix_ids = tokenizer.encode(prefix, add_special_tokens=False)
+        self.suffix_ids = tokenizer.encode(suffix, add_special_tokens=False)
+
+        self._pending: list[tuple[list[int], asyncio.Future]] = []
+        self._worker: asyncio.Task | None = None
+
+    def encode(self, request: CodingRequest) -> list[int]:
+        """Token IDs of the full prompt for a request."""
+        user_text = request.prompt
+        if user_text is None:
+            user_text = render_prompt(
+                LOCAL_TEMPLATE,
+                clinical_note=request.clinical_note,
+                clinical_phrase=request.clinical_phrase,
+                candidates=request.candidates or [],
+                exemplars=request.exemplars or [],
+            )
+        user_ids = self.tokenizer.encode(user_text, add_special_tokens=False)
+        return self.prefix_ids + user_ids + self.suffix_ids
+
+    async def code(self, request: CodingRequest) -> CodingResult:
+        """Queue a request for the next batch and wait for its result.
+
+        Args:
+            request: Phrase and note context to code
+
+        Returns:
+            The assigned code
+        """
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        ids = self.encode(request)
+        self._pending.append((ids, future))
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._drain())
+
+        text, first_token = await future
+        result = parse_generation(text)
+        result.usage = {
+            "ttft": first_token - start if first_token is not None else None,
+            "input_tokens": len(ids),
+            "output_tokens": len(self.tokenizer.encode(text, add_special_tokens=False)),
+            "cached_tokens": 0,
+        }
+        return result
+
+    async def _drain(self) -> None:
+        """Flush queued requests in length buckets until the queue is empty."""
+        while self._pending:
+            # Let every caller scheduled in this loop iteration enqueue first
+            await asyncio.sleep(0)
+            pending, self._pending = self._pending, []
+
+            for batch in self.batches(pending):
+                first_token: list[float] = []
+                try:
+                    texts = await asyncio.to_thread(
+                        self.generate, [ids for ids, _ in batch], first_token.append
+                    )
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (_, future), text in zip(batch, texts, strict=True):
+                    if not future.done():
+                        future.set_result((text, first_token[0] if first_token else None))
+
+    def batches(self, pending: list) -> list[list]:
+        """Group queued items into length buckets, then into batches.
+
+        Args:
+            pending: ``(token_ids, payload)`` pairs
+
+        Returns:
+            Batches of pairs, shortest bucket first
+        """
+        buckets: dict[int, list] = {}
+        for item in sorted(pending, key=lambda item: len(item[0])):
+            buckets.setdefault(len(item[0]) // self.bucket_width, []).append(item)
+
+        batches = []
+        for bucket in buckets.values():
+            for start in range(0, len(bucket), self.batch_size):
+                batches.append(bucket[start : start + self.batch_size])
+        return batches
+
+    def generate(
+        self, batch: list[list[int]], on_first_token: Callable[[float], None] | None = None
+    ) -> list[str]:
+        """Greedily generate completions for one batch of prompts.
+
+        Prompts are left-padded to the longest prompt in the batch.
+
+        Args:
+            batch: Prompt token IDs
+            on_first_token: Called with ``time.perf_counter()`` once the first
+                token of the batch has been generated
+
+        Returns:
+            Decoded completions, aligned with ``batch``
+        """
+        import torch
+
+        width = max(len(ids) for ids in batch)
+        input_ids = torch.full((len(batch), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+
+        for row, ids in enumerate(batch):
+            input_ids[row, width - len(ids) :] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, width - len(ids) :] = 1
+
+        stopping_criteria = None
+        if on_first_token is not None:
+            from transformers import StoppingCriteriaList
+
+            fired = []
+
+            def first_token(input_ids, scores, **kwargs):
+                # Called after every generation step; never stops generation
+                if not fired:
+                    fired.append(True)
+                    on_first_token(time.perf_counter())
+                return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+            stopping_criteria = StoppingCriteriaList([first_token])
+
+        with torch.inference_mode():
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=False,
+                pad_token_id=self.pad_token_id,
+                stopping_criteria=stopping_criteria,
+            )
+
+        return self.tokenizer.batch_decode(output[:, width:], skip_special_tokens=True)
+
+
+def parse_generation(text: str) -> CodingResult:
+    """Extract the first ICD-10-CM code from generated text."""
+    match = _CODE_PATTERN.search(text.upper())
+    return CodingResult(match.group(1) if match else MISSING_CODE, justification=text.strip())
+
+
+def _split_prompt(tokenizer: Any, system_prompt: str) -> tuple[str, str]:
+    """Split the chat-formatted prompt around the per-request user content.
+
+    Returns:
+        Tuple of (text before the user content, text after it)
+    """
+    if getattr(tokenizer, "chat_template", None):
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": _SENTINEL},
+        ]
+        rendered = tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+        prefix, _, suffix = rendered.partition(_SENTINEL)
+        return prefix, suffix
+
+    return f"{system_prompt}\n\n", "\n\nICD-10-CM code:"
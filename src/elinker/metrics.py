@@ -0,0 +1,236 @@
+"""Scoring for ICD-10 coding runs."""
+
+from .coders import MISSING_CODE
+from .retrieval import Candidate
+
+
+def score_predictions(y_true: list[str], y_pred: list[str]) -> tuple[dict, str]:
+    """Compute accuracy and precision/recall/F1 for predicted codes.
+
+    Args:
+        y_true: Gold codes
+        y_pred: Predicted codes, aligned with ``y_true``
+
+    Returns:
+        Tuple of (scores dict, classification report text)
+    """
+    from sklearn.metrics import (
+        accuracy_score,
+        classification_report,
+        f1_score,
+        precision_score,
+        recall_score,
+    )
+
+    accuracy = accuracy_score(y_true, y_pred)
+    macro_precision = precision_score(y_true, y_pred, average="macro", zero_division=0)
+    macro_recall = recall_score(y_true, y_pred, average="macro", zero_division=0)
+    macro_f1 = f1_score(y_true, y_pred, average="macro", zero_division=0)
+    micro_precision = precision_score(y_true, y_pred, average="micro", zero_division=0)
+    micro_recall = recall_score(y_true, y_pred, average="micro", zero_division=0)
+    micro_f1 = f1_score(y_true, y_pred, average="micro", zero_division=0)
+    weighted_f1 = f1_score(y_true, y_pred, average="weighted", zero_division=0)
+
+    report = classification_report(y_true, y_pred, zero_division=0)
+    scores = {
+        "evaluated_examples": len(y_true),
+        "accuracy": round(accuracy, 4),
+        "micro_f1": round(micro_f1, 4),
+        "macro precision": round(macro_precision, 4),
+        "micro precision": round(micro_precision, 4),
+        "micro recall": round(micro_recall, 4),
+        "macro recall": round(macro_recall, 4),
+        "macro_f1": round(macro_f1, 4),
+        "weighted_f1": round(weighted_f1, 4),
+    }
+
+    return scores, report
+
+
+def candidate_recall(y_true: list[str], candidates: list[list[Candidate | str]]) -> float:
+    """Fraction of examples whose gold code is among the retrieved candidates.
+
+    This is the upper bound on accuracy for candidate-constrained coding.
+
+    Args:
+        y_true: Gold codes
+        candidates: Retrieved candidates (or their codes) per example
+
+    Returns:
+        Recall@k, where k is the number of candidates retrieved per example
+    """
+    if not y_true:
+        return 0.0
+    hits = sum(
+        gold in {getattr(c, "code", c) for c in example_candidates}
+        for gold, example_candidates in zip(y_true, candidates, strict=True)
+    )
+    return round(hits / len(y_true), 4)
+
+
+def span_scores(records: list[dict], unanswered: tuple[str, ...] = (MISSING_CODE,)) -> dict:
+    """Span-level evidence scores of prediction records.
+
+    Gold spans are the records' ``code`` at their offsets and predicted spans
+    their ``predicted`` code. A span is matched *exactly* by a span of the
+    same code, note and offsets, and by *overlap* when the two share at least
+    one character. Matches come from a polars interval join: an equi-join on
+    note and code, then a filter on the begin/end columns, so a whole split
+    scores in well under a second.
+
+    When the records carry ``span_tokens`` (the start offsets of the words in
+    each span, written by :func:`elinker.runner.run_evaluation`), a *token*
+    variant scores the tokens instead of the spans: per note and code, the
+    tokens under both gold and predicted spans over those under predicted
+    spans (precision) and under gold spans (recall).
+
+    Args:
+        records: Prediction records with ``hadm_id``, ``note_id``, ``begin``,
+            ``end``, ``code``, ``predicted`` and optionally ``category`` and
+            ``span_tokens``
+        unanswered: Predicted codes that stand for no prediction
+
+    Returns:
+        Dict of micro and macro (over codes) precision/recall/F1 per variant,
+        e.g. ``span_exact_micro_f1``, plus ``span_by_category`` and
+        ``span_by_code`` with the span counts and figures of each variant per
+        note category and per code
+    """
+    import polars as pl
+
+    keys = ["hadm_id", "note_id", "code"]
+    frame = pl.DataFrame(
+        {
+            "hadm_id": [str(record.get("hadm_id")) for record in records],
+            "note_id": [str(record.get("note_id")) for record in records],
+            "category": [record.get("category") or "Unknown" for record in records],
+            "begin": [record.get("begin") for record in records],
+            "end": [record.get("end") for record in records],
+            "gold": [record.get("code") for record in records],
+            "predicted": [record.get("predicted") for record in records],
+            "span_tokens": [record.get("span_tokens") for record in records],
+        },
+        schema={
+            "hadm_id": pl.String,
+            "note_id": pl.String,
+            "category": pl.String,
+            "begin": pl.Int64,
+            "end": pl.Int64,
+            "gold": pl.String,
+            "predicted": pl.String,
+            "span_tokens": pl.List(pl.Int64),
+        },
+    ).filter(pl.col("begin").is_not_null() & pl.col("end").is_not_null())
+
+    def spans(column: str) -> "pl.DataFrame":
+        return (
+            frame.filter(pl.col(column).is_not_null() & ~pl.col(column).is_in(list(unanswered)))
+            .select(
+                "hadm_id",
+                "note_id",
+                "category",
+                "begin",
+                "end",
+                "span_tokens",
+                pl.col(column).alias("code"),
+            )
+            .unique(subset=[*keys, "begin", "end"], maintain_order=True)
+            .with_row_index("id")
+        )
+
+    gold = spans("gold")
+    predicted = spans("predicted")
+
+    pairs = (
+        gold.select("id", *keys, "begin", "end")
+        .join(predicted.select("id", *keys, "begin", "end"), on=keys, suffix="_pred")
+        .filter((pl.col("begin") < pl.col("end_pred")) & (pl.col("begin_pred") < pl.col("end")))
+        .with_columns(
+            exact=(pl.col("begin") == pl.col("begin_pred")) & (pl.col("end") == pl.col("end_pred"))
+        )
+    )
+
+    def matched(side: "pl.DataFrame", id_column: str) -> "pl.DataFrame":
+        hits = pairs.group_by(id_column).agg(pl.col("exact").any(), overlap=pl.lit(True))
+        return side.join(hits, left_on="id", right_on=id_column, how="left").with_columns(
+            pl.col("exact", "overlap").fill_null(False)
+        )
+
+    variants = {"exact": (matched(gold, "id"), matched(predicted, "id_pred"))}
+    variants["overlap"] = variants["exact"]
+
+    if frame["span_tokens"].is_not_null().any():
+        # One row per token under a span, counted once however many spans of the code cover it
+        def tokens(side: "pl.DataFrame") -> "pl.DataFrame":
+            return (
+                side.select(*keys, "category", offset="span_tokens")
+                .explode("offset")
+                .drop_nulls("offset")
+                .unique(subset=[*keys, "offset"], maintain_order=True)
+            )
+
+        gold_tokens, predicted_tokens = tokens(gold), tokens(predicted)
+        shared = gold_tokens.join(predicted_tokens, on=[*keys, "offset"], how="semi").select(
+            *keys, "offset", token=pl.lit(True)
+        )
+        variants["token"] = tuple(
+            side.join(shared, on=[*keys, "offset"], how="left").with_columns(
+                pl.col("token").fill_null(False)
+            )
+            for side in (gold_tokens, predicted_tokens)
+        )
+
+    def counts(by: str) -> dict[str, dict[str, tuple[int, int, int, int]]]:
+        """``(tp_pred, n_pred, tp_gold, n_gold)`` per variant and value of ``by``."""
+        result = {}
+        for variant, (gold_side, predicted_side) in variants.items():
+            aggregations = [pl.len().alias("n"), pl.col(variant).sum().alias("tp")]
+            rows = (
+                gold_side.group_by(by)
+                .agg(*aggregations)
+                .join(
+                    predicted_side.group_by(by).agg(*aggregations), on=by, how="full", coalesce=True
+                )
+                .fill_null(0)
+                .select(by, "tp_right", "n_right", "tp", "n")
+                .iter_rows()
+            )
+            result[variant] = {row[0]: row[1:] for row in rows}
+        return result
+
+    def breakdown(by: str) -> dict:
+        table = counts(by)
+        result = {}
+        for value, (_, n_pred, _, n_gold) in sorted(table["exact"].items()):
+            result[value] = {"gold": n_gold, "predicted": n_pred}
+            for variant, variant_counts in table.items():
+                figures = _prf(*variant_counts.get(value, (0, 0, 0, 0)))
+                result[value][variant] = {
+                    name: round(figure, 4)
+                    for name, figure in zip(("precision", "recall", "f1"), figures, strict=True)
+                }
+        return result
+
+    scores = {"span_gold": gold.height, "span_predicted": predicted.height}
+    for variant, per_code in counts("code").items():
+        rows = list(per_code.values())
+        totals = [sum(column) for column in zip(*rows, strict=True)] or [0] * 4
+        per_code_scores = [_prf(*row) for row in rows]
+        macro = [sum(column) / len(rows) for column in zip(*per_code_scores, strict=True)]
+        for name, micro_value, macro_value in zip(
+            ("precision", "recall", "f1"), _prf(*totals), macro or [0.0] * 3, strict=True
+        ):
+            scores[f"span_{variant}_micro_{name}"] = round(micro_value, 4)
+            scores[f"span_{variant}_macro_{name}"] = round(macro_value, 4)
+
+    scores["span_by_category"] = breakdown("category")
+    scores["span_by_code"] = breakdown("code")
+    return scores
+
+
+def _prf(tp_pred: int, n_pred: int, tp_gold: int, n_gold: int) -> tuple[float, float, float]:
+    """Precision, recall and F1, counting matches on each side separately."""
+    precision = tp_pred / n_pred if n_pred else 0.0
+    recall = tp_gold / n_gold if n_gold else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
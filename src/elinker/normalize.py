@@ -0,0 +1,171 @@
+"""Vectorized normalization and validation of predicted ICD-10-CM codes."""
+
+import polars as pl
+
+from .codes import CodeTable
+
+# Shape of an ICD-10-CM code once dots and whitespace are removed
+_CODE_SHAPE = r"^[A-Z][0-9][0-9A-Z][0-9A-Z]{0,4}$"
+
+
+def normalize_expr(codes: pl.Expr) -> pl.Expr:
+    """Canonical form of free-text codes, as a polars expression.
+
+    Codes are upper-cased, stripped of whitespace and dots, and re-dotted
+    after the third character (``" e119 "`` becomes ``"E11.9"``). Values that
+    do not have the shape of a code (such as ``__MISSING__``) become null.
+
+    Args:
+        codes: String expression, e.g. ``pl.col("predicted")``
+
+    Returns:
+        Expression of canonical codes
+    """
+    bare = codes.str.to_uppercase().str.replace_all(r"[\s.]", "")
+    return pl.when(~bare.str.contains(_CODE_SHAPE)).then(None).otherwise(_dotted(bare))
+
+
+def normalize_codes(codes: pl.Series | list[str]) -> pl.Series:
+    """Normalize a column of codes; see :func:`normalize_expr`."""
+    codes = pl.Series("code", codes, dtype=pl.String)
+    return pl.select(normalize_expr(pl.lit(codes))).to_series().rename(codes.name)
+
+
+class CodeValidator:
+    """Checks whole columns of codes against a code table.
+
+    The table is turned once into a frame of every code with its billable
+    flag and suggested billable code: itself when billable, otherwise its
+    nearest billable descendant. Validation is then a hash join. Unknown
+    codes are matched by their longest known prefix, i.e. their nearest
+    ancestor, and take that ancestor's suggestion.
+    """
+
+    def __init__(self, table: CodeTable):
+        self.table = table
+        codes = [record["code"] for record in table.records]
+        suggestions = nearest_billable(table)
+        self.frame = pl.DataFrame(
+            {
+                "code": codes,
+                "billable": [bool(record.get("is_billable")) for record in table.records],
+                "suggestion": [suggestions.get(code) for code in codes],
+            },
+            schema={"code": pl.String, "billable": pl.Boolean, "suggestion": pl.String},
+        )
+
+    def validate(self, codes: pl.Series | list[str]) -> pl.DataFrame:
+        """Normalize and validate codes.
+
+        Args:
+            codes: Free-text codes, e.g. the ``predicted`` column of a run
+
+        Returns:
+            Frame aligned with ``codes`` with ``raw``, ``code`` (normalized),
+            ``valid``, ``billable`` and ``suggestion`` columns
+        """
+        frame = pl.DataFrame({"raw": pl.Series(codes, dtype=pl.String)}).with_row_index("row")
+        frame = frame.with_columns(normalize_expr(pl.col("raw")).alias("code"))
+        frame = frame.join(self.frame, on="code", how="left", maintain_order="left")
+
+        # Unknown codes take the suggestion of their longest known prefix.
+        # Only the (usually few) unknown rows are expanded into prefixes.
+        unknown = frame.filter(pl.col("billable").is_null() & pl.col("code").is_not_null())
+        if unknown.height:
+            bare = pl.col("code").str.replace(".", "", literal=True)
+            prefixes = (
+                unknown.select(
+                    "row",
+                    pl.int_ranges(bare.str.len_chars() - 1, 2, -1).alias("length"),
+                    bare.alias("bare"),
+                )
+                .explode("length")
+                .drop_nulls("length")
+                .with_columns(_dotted(pl.col("bare").str.slice(0, pl.col("length"))).alias("code"))
+                .join(self.frame.select("code", "suggestion"), on="code", how="inner")
+                .drop_nulls("suggestion")
+                .sort("row", "length", descending=[False, True])
+                .unique("row", keep="first")
+                .select("row", pl.col("suggestion").alias("ancestor_suggestion"))
+            )
+            frame = frame.join(prefixes, on="row", how="left", maintain_order="left")
+        else:
+            frame = frame.with_columns(pl.lit(None, dtype=pl.String).alias("ancestor_suggestion"))
+
+        return frame.select(
+            "raw",
+            "code",
+            pl.col("billable").is_not_null().alias("valid"),
+            pl.col("billable").fill_null(False),
+            pl.coalesce("suggestion", "ancestor_suggestion").alias("suggestion"),
+        )
+
+    def annotate(self, predictions: list[dict], field: str = "predicted") -> list[dict]:
+        """Add ``normalized``, ``valid``, ``billable`` and ``suggestion`` to records.
+
+        Args:
+            predictions: Prediction records, updated in place
+            field: Field holding the predicted code
+
+        Returns:
+            The same records
+        """
+        if not predictions:
+            return predictions
+        checked = self.validate([record.get(field) for record in predictions])
+        for record, row in zip(predictions, checked.iter_rows(named=True), strict=True):
+            record["normalized"] = row["code"]
+            record["valid"] = row["valid"]
+            record["billable"] = row["billable"]
+            record["suggestion"] = row["suggestion"]
+        return predictions
+
+
+def nearest_billable(table: CodeTable) -> dict[str, str]:
+    """Map every code to itself if billable, else to its nearest billable descendant.
+
+    Among the billable descendants at the smallest depth, an "unspecified"
+    code is preferred, then the first in tabular order.
+
+    Args:
+        table: Code table with ``parent_code`` links
+
+    Returns:
+        Dict of code to suggested billable code; codes without billable
+        descendants are omitted
+    """
+    children: dict[str, list[dict]] = {}
+    for record in table.records:
+        if record.get("parent_code"):
+            children.setdefault(record["parent_code"], []).append(record)
+
+    suggestions = {}
+    for record in table.records:
+        if record.get("is_billable"):
+            suggestions[record["code"]] = record["code"]
+            continue
+
+        level = children.get(record["code"], [])
+        while level:
+            billable = [child for child in level if child.get("is_billable")]
+            if billable:
+                unspecified = [
+                    child
+                    for child in billable
+                    if "unspecified" in child.get("description", "").lower()
+                ]
+                suggestions[record["code"]] = (unspecified or billable)[0]["code"]
+                break
+            level = [
+                grandchild for child in level for grandchild in children.get(child["code"], [])
+            ]
+    return suggestions
+
+
+def _dotted(bare: pl.Expr) -> pl.Expr:
+    """Insert the dot after the category (first three characters)."""
+    return (
+        pl.when(bare.str.len_chars() > 3)
+        .then(pl.concat_str(bare.str.slice(0, 3), pl.lit("."), bare.str.slice(3)))
+        .otherwise(bare)
+    )
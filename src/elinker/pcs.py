@@ -0,0 +1,208 @@
+"""ICD-10-PCS tables as dense positional lookup arrays."""
+
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+# The 34 characters a PCS axis can take (no I or O)
+PCS_CHARS = "0123456789ABCDEFGHJKLMNPQRSTUVWXYZ"
+
+CODE_LENGTH = 7
+
+# ASCII byte -> axis value index, -1 for characters that never occur in a code
+_CHAR_INDEX = np.full(256, -1, dtype=np.int16)
+for _idx, _char in enumerate(PCS_CHARS):
+    _CHAR_INDEX[ord(_char)] = _CHAR_INDEX[ord(_char.lower())] = _idx
+
+_N = len(PCS_CHARS)
+
+
+class PcsTables:
+    """ICD-10-PCS code tables compiled into dense arrays.
+
+    A PCS table is fixed by the first three characters (section, body
+    system, operation) and lists rows of allowed values for the last four
+    axes. Compiled form:
+
+    - ``table_ids``: one slot per possible three-character prefix (34³)
+      holding the table number, or -1
+    - ``masks``: ``[table, axis, value]`` bitmasks (one bit per row of the
+      table, split into 64-bit words) of the rows allowing that value
+
+    A code is valid when its table exists and some row allows all four of
+    its values, i.e. when the AND of four masks is non-zero. Validation and
+    decoding are therefore a fixed number of array lookups, and
+    :meth:`validate` does them for a whole column at once with NumPy.
+    """
+
+    def __init__(self, tables: list[dict]):
+        """Compile parsed tables.
+
+        Args:
+            tables: Tables as returned by :func:`parse_tables`, each with
+                ``axes`` (three ``(title, code, label)`` tuples) and ``rows``
+                (lists of four ``(title, {code: label})`` axes)
+        """
+        words = max((len(t["rows"]) + 63) // 64 for t in tables) if tables else 1
+        self.prefixes = ["".join(code for _, code, _ in t["axes"]) for t in tables]
+        self.table_ids = np.full(_N**3, -1, dtype=np.int32)
+        self.masks = np.zeros((len(tables), 4, _N, words), dtype=np.uint64)
+        self.titles: list[list[str]] = []
+        # [table][position] -> label per axis value index
+        self.labels: list[list[list[str | None]]] = []
+
+        for table_id, table in enumerate(tables):
+            self.table_ids[_slot(self.prefixes[table_id])] = table_id
+            titles = [title for title, _, _ in table["axes"]] + [""] * 4
+            labels = [[None] * _N for _ in range(CODE_LENGTH)]
+            for position, (_, code, label) in enumerate(table["axes"]):
+                labels[position][PCS_CHARS.index(code)] = label
+
+            for row_id, row in enumerate(table["rows"]):
+                word, bit = divmod(row_id, 64)
+                for axis, (title, values) in enumerate(row):
+                    titles[3 + axis] = titles[3 + axis] or title
+                    for code, label in values.items():
+                        value = PCS_CHARS.index(code)
+                        self.masks[table_id, axis, value, word] |= np.uint64(1 << bit)
+                        labels[3 + axis][value] = labels[3 + axis][value] or label
+
+            self.titles.append(titles)
+            self.labels.append(labels)
+
+    @classmethod
+    def load(cls, path: Path) -> "PcsTables":
+        """Load the PCS tables XML file, e.g. ``icd10pcs_tables_2026.xml``."""
+        return cls(parse_tables(path))
+
+    def __len__(self) -> int:
+        return len(self.prefixes)
+
+    def is_valid(self, code: str) -> bool:
+        """Check whether a single code is a valid (complete) PCS code."""
+        return bool(self.validate([code])[0])
+
+    def decode(self, code: str) -> list[tuple[str, str]] | None:
+        """Meaning of each character of a code.
+
+        Args:
+            code: Seven-character PCS code, e.g. ``"0DTJ4ZZ"``
+
+        Returns:
+            List of seven ``(axis title, value label)`` pairs, e.g.
+            ``("Operation", "Resection")``, or None if the code is not valid
+        """
+        if not self.is_valid(code):
+            return None
+        code = "".join(code.split()).upper()
+        table_id = self.table_ids[_slot(code)]
+        return [
+            (
+                self.titles[table_id][position],
+                self.labels[table_id][position][PCS_CHARS.index(char)],
+            )
+            for position, char in enumerate(code)
+        ]
+
+    def validate(self, codes: list[str]) -> np.ndarray:
+        """Validate a column of codes at once.
+
+        Codes are upper-cased and stripped of whitespace first; anything that
+        is not seven PCS characters is invalid.
+
+        Args:
+            codes: Predicted procedure codes (None allowed)
+
+        Returns:
+            Boolean array aligned with ``codes``
+        """
+        cleaned = [("".join(code.split()) if isinstance(code, str) else "") for code in codes]
+        shaped = np.array([len(code) == CODE_LENGTH and code.isascii() for code in cleaned], bool)
+        if not len(cleaned) or not len(self):
+            return np.zeros(len(cleaned), dtype=bool)
+
+        buffer = "".join(
+            code if ok else "!" * CODE_LENGTH for code, ok in zip(cleaned, shaped, strict=True)
+        )
+        values = _CHAR_INDEX[np.frombuffer(buffer.encode("ascii"), np.uint8)].reshape(
+            -1, CODE_LENGTH
+        )
+        shaped &= (values >= 0).all(axis=1)
+        values = np.where(values >= 0, values, 0).astype(np.int64)
+
+        table = self.table_ids[(values[:, 0] * _N + values[:, 1]) * _N + values[:, 2]]
+        found = shaped & (table >= 0)
+        table = np.where(found, table, 0)
+
+        rows = self.masks[table, 0, values[:, 3]]
+        for axis in range(1, 4):
+            rows = rows & self.masks[table, axis, values[:, 3 + axis]]
+        return found & rows.any(axis=1)
+
+    def annotate(self, predictions: list[dict], field: str = "predicted") -> list[dict]:
+        """Add ``normalized``, ``valid`` and ``billable`` to procedure records.
+
+        Every valid PCS code is a complete seven-character code, so valid
+        codes are also billable.
+
+        Args:
+            predictions: Prediction records, updated in place
+            field: Field holding the predicted code
+
+        Returns:
+            The same records
+        """
+        codes = [record.get(field) for record in predictions]
+        for record, code, valid in zip(predictions, codes, self.validate(codes), strict=True):
+            record["normalized"] = "".join(code.split()).upper() if valid else None
+            record["valid"] = record["billable"] = bool(valid)
+        return predictions
+
+    def __repr__(self):
+        return f"<PcsTables {len(self)} tables>"
+
+
+def parse_tables(path: Path) -> list[dict]:
+    """Parse the PCS tables XML file.
+
+    Args:
+        path: ``icd10pcs_tables_YYYY.xml`` from the CMS release
+
+    Returns:
+        One dict per ``pcsTable`` with ``axes``, the three ``(title, code,
+        label)`` axes shared by the table, and ``rows``, each a list of four
+        ``(title, {code: label})`` axes
+    """
+    tables: dict[str, dict] = {}
+    for element in ET.parse(path).getroot().iter("pcsTable"):
+        axes = [
+            (_text(axis, "title"), label.get("code"), _text(label))
+            for axis in sorted(element.findall("axis"), key=lambda a: int(a.get("pos")))
+            for label in axis.findall("label")[:1]
+        ]
+        rows = [
+            [
+                (
+                    _text(axis, "title"),
+                    {lab.get("code"): _text(lab) for lab in axis.findall("label")},
+                )
+                for axis in sorted(row.findall("axis"), key=lambda a: int(a.get("pos")))
+            ]
+            for row in element.findall("pcsRow")
+        ]
+        # A prefix split over several pcsTable elements is one table
+        prefix = "".join(code for _, code, _ in axes)
+        tables.setdefault(prefix, {"axes": axes, "rows": []})["rows"].extend(rows)
+    return list(tables.values())
+
+
+def _slot(code: str) -> int:
+    """Index of a code's three-character prefix in the dense table array."""
+    first, second, third = (PCS_CHARS.index(char) for char in code[:3])
+    return (first * _N + second) * _N + third
+
+
+def _text(element: ET.Element, tag: str | None = None) -> str:
+    node = element.find(tag) if tag else element
+    return " ".join((node.text or "").split()) if node is not None else ""
@@ -0,0 +1,285 @@
+"""Request policies that spread a coding request over several backends.
+
+:class:`HedgedCoder` sends a backup request when the primary backend is
+slower than usual and :class:`EnsembleCoder` asks several backends at once
+and stops as soon as enough of them agree. Both have the async
+``code(request)`` interface of a coder and keep a latency histogram and
+token usage per backend.
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+
+from .coders import CodingRequest, CodingResult
+from .instrumentation import estimate_cost, percentiles
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+TOKEN_KEYS = ("input_tokens", "output_tokens", "cached_tokens")
+
+
+class LatencyHistogram:
+    """Latencies of one backend in fixed buckets, plus a window of recent values.
+
+    The buckets cover the whole run; percentiles are taken over the recent
+    window so they follow the backend as its load changes.
+
+    Args:
+        window: Number of recent latencies kept for percentiles
+    """
+
+    def __init__(self, window: int = 200):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.recent: deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0  # Requests this backend answered first
+
+    def observe(self, latency: float) -> None:
+        """Record a latency in seconds."""
+        self.counts[bisect_left(BUCKETS, latency)] += 1
+        self.recent.append(latency)
+
+    def percentile(self, q: float) -> float | None:
+        """The q-th percentile of the recent latencies, or None before any."""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def to_dict(self) -> dict:
+        """Serialize the counts and recent percentiles for ``metrics.json``."""
+        bounds = [*BUCKETS, None]
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "wins": self.wins,
+            "buckets": [
+                {"le": bound, "count": count}
+                for bound, count in zip(bounds, self.counts, strict=True)
+            ],
+            **percentiles("latency", list(self.recent)),
+        }
+
+
+class _PolicyCoder:
+    """Timing, histogram and usage bookkeeping shared by the request policies.
+
+    Tokens are counted per backend for every call, including the ones that
+    lose or are cancelled, and priced with the backend's own model; a
+    policy has no single model of its own.
+    """
+
+    def __init__(self, coders: dict, window: int):
+        self.histograms = {name: LatencyHistogram(window) for name in coders}
+        self.models = {name: getattr(coder, "model", None) for name, coder in coders.items()}
+        for name, model in self.models.items():
+            if not isinstance(model, str):  # e.g. a local model's module
+                self.models[name] = None
+        self.usage = {name: Counter() for name in coders}
+
+    async def _timed(self, name: str, coder, request: CodingRequest) -> CodingResult:
+        """Run one backend call, recording its latency, tokens or failure."""
+        histogram = self.histograms[name]
+        histogram.requests += 1
+        start = time.perf_counter()
+        try:
+            result = await coder.code(request)
+        except asyncio.CancelledError as e:
+            # A cancelled call was at least this slow; keeping it stops the
+            # recent percentiles from drifting down to the calls that won
+            histogram.observe(time.perf_counter() - start)
+            # Streamed calls attach the usage reported before the cancel
+            self._add_usage(name, getattr(e, "usage", None) or {})
+            raise
+        except Exception:
+            histogram.errors += 1
+            raise
+        histogram.observe(time.perf_counter() - start)
+        self._add_usage(name, result.usage)
+        return result
+
+    def _add_usage(self, name: str, usage: dict) -> None:
+        self.usage[name].update({key: usage.get(key) or 0 for key in TOKEN_KEYS})
+
+    def summary(self) -> dict:
+        """Token totals, cost and per-backend latency histograms and usage.
+
+        ``cost_usd`` is the sum of the backends' costs, left out when a
+        backend that was called has no known price.
+        """
+        backends = {}
+        for name, histogram in self.histograms.items():
+            usage = self.usage[name]
+            backend = {"model": self.models[name], **histogram.to_dict()}
+            backend.update({key: usage[key] for key in TOKEN_KEYS})
+            cost = estimate_cost(self.models[name], *(usage[key] for key in TOKEN_KEYS))
+            if cost is not None:
+                backend["cost_usd"] = cost
+            backends[name] = backend
+
+        summary = {key: sum(b[key] for b in backends.values()) for key in TOKEN_KEYS}
+        costs = [b.get("cost_usd") for b in backends.values() if b["requests"]]
+        if None not in costs:
+            summary["cost_usd"] = round(sum(costs), 6)
+        summary["backends"] = backends
+        return summary
+
+
+class HedgedCoder(_PolicyCoder):
+    """Sends a duplicate request to a backup when the primary is slow.
+
+    The backup is started once the primary has been running longer than
+    the given percentile of its recent latencies (``initial_delay`` until
+    ``min_samples`` latencies are known), or straight away when the
+    primary fails. Whichever answers first wins and the other is cancelled.
+
+    Args:
+        primary: Coder every request goes to
+        backup: Coder for hedged requests (another model, or the same one)
+        percentile: Percentile of recent primary latency that triggers a hedge
+        min_samples: Primary latencies needed before the percentile is used
+        initial_delay: Hedge delay in seconds until then
+        window: Recent latencies kept per backend
+    """
+
+    def __init__(
+        self,
+        primary,
+        backup,
+        percentile: float = 95,
+        min_samples: int = 20,
+        initial_delay: float = 5.0,
+        window: int = 200,
+    ):
+        super().__init__({"primary": primary, "backup": backup}, window)
+        self.primary = primary
+        self.backup = backup
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.hedged = 0
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before sending the backup."""
+        histogram = self.histograms["primary"]
+        if len(histogram.recent) < self.min_samples:
+            return self.initial_delay
+        return histogram.percentile(self.percentile)
+
+    async def code(self, request: CodingRequest) -> CodingResult:
+        """Code a request, hedging to the backup if the primary is slow.
+
+        Raises:
+            Exception: The backup's error when both backends fail
+        """
+        primary = asyncio.create_task(self._timed("primary", self.primary, request))
+        tasks = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+            if done and primary.exception() is None:
+                self.histograms["primary"].wins += 1
+                return primary.result()
+
+            self.hedged += 1
+            backup = asyncio.create_task(self._timed("backup", self.backup, request))
+            tasks[backup] = "backup"
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.histograms[tasks[task]].wins += 1
+                        return task.result()
+            raise backup.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def summary(self) -> dict:
+        """Hedged request count, token totals, cost and per-backend metrics."""
+        return {"policy": "hedged", "hedged": self.hedged, **super().summary()}
+
+
+class EnsembleCoder(_PolicyCoder):
+    """Sends each request to several backends and stops once enough agree.
+
+    Backends are asked concurrently. As soon as ``votes`` of them return
+    the same code that answer is returned and the remaining calls are
+    cancelled; otherwise the most common code wins, ties going to the
+    earliest answer. The result's token usage is summed over the answers
+    received; :meth:`summary` prices each backend's calls separately.
+
+    Args:
+        coders: Backends to ask
+        votes: Agreeing answers needed to stop early (a majority by default)
+        window: Recent latencies kept per backend
+    """
+
+    def __init__(self, coders: list, votes: int | None = None, window: int = 200):
+        names = [
+            f"{idx}:{getattr(coder, 'model', None) or 'coder'}" for idx, coder in enumerate(coders)
+        ]
+        self.coders = dict(zip(names, coders, strict=True))
+        super().__init__(self.coders, window)
+        self.votes = votes or len(coders) // 2 + 1
+        self.early_stops = 0
+        self.agreement = Counter()  # Agreeing answers behind each returned code
+
+    async def code(self, request: CodingRequest) -> CodingResult:
+        """Code a request by vote across the backends.
+
+        Raises:
+            Exception: The last error when every backend fails
+        """
+        tasks = {
+            asyncio.create_task(self._timed(name, coder, request)): name
+            for name, coder in self.coders.items()
+        }
+        pending = set(tasks)
+        answers: list[tuple[str, CodingResult]] = []
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    answers.append((tasks[task], task.result()))
+                counts = Counter(result.code for _, result in answers)
+                if pending and counts and counts.most_common(1)[0][1] >= self.votes:
+                    self.early_stops += 1
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if not answers:
+            raise error
+        counts = Counter(result.code for _, result in answers)
+        best = max(counts.values())
+        name, result = next((n, r) for n, r in answers if counts[r.code] == best)
+        self.histograms[name].wins += 1
+        self.agreement[best] += 1
+
+        usage = Counter()
+        for _, answer in answers:
+            usage.update(
+                {key: value for key, value in answer.usage.items() if key.endswith("_tokens")}
+            )
+        result.usage = {**result.usage, **usage}
+        return result
+
+    def summary(self) -> dict:
+        """Vote counts, early stops, token totals, cost and per-backend metrics."""
+        return {
+            "policy": "ensemble",
+            "votes": self.votes,
+            "early_stops": self.early_stops,
+            "agreement": {str(count): n for count, n in sorted(self.agreement.items())},
+            **super().summary(),
+        }
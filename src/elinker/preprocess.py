@@ -0,0 +1,370 @@
+"""Cached preprocessing of dataset splits into rendered coding requests."""
+
+import hashlib
+import json
+import shutil
+from collections.abc import Callable, Iterator, Sequence
+from pathlib import Path
+from typing import Any
+
+from .coders import CodingRequest
+from .context import ContextSelector
+from .prompts import CANDIDATES_TEMPLATE, DEFAULT_TEMPLATE, get_environment, get_template
+from .retrieval import Candidate, CandidateRetriever, retrieves_for
+
+PREPARED_FILE = "prepared.json"
+
+# Bumped when the stored columns change, so older caches are not reused
+FORMAT_VERSION = 3
+
+# Columns added to the dataset rows; everything else is the original example
+PREPARED_FIELDS = (
+    "clinical_note",
+    "prompt",
+    "candidates",
+    "context_selected_tokens",
+    "context_original_tokens",
+)
+
+# Columns a request is built from
+REQUEST_FIELDS = (
+    "covered_text",
+    "begin",
+    "end",
+    "code_system",
+    "clinical_note",
+    "prompt",
+    "candidates",
+)
+
+# Per-process state for Dataset.map workers, loaded on first use
+_retrievers: dict[str, CandidateRetriever] = {}
+_selectors: dict[tuple[str, int], ContextSelector] = {}  # By (fingerprint, max_tokens)
+
+
+def fingerprint(data: Path, config: dict, codes: Path | None = None) -> str:
+    """Cache key of a preprocessing run.
+
+    Covers the data file and code table contents, the template source and
+    every setting that changes the rendered requests.
+
+    Args:
+        data: MDACE parquet file
+        config: Preprocessing settings, including the ``template`` name
+        codes: Code table candidates are retrieved from
+
+    Returns:
+        Hex digest
+    """
+    environment = get_environment()
+    source, _, _ = environment.loader.get_source(environment, config["template"])
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({**config, "format": FORMAT_VERSION}, sort_keys=True).encode())
+    digest.update(source.encode())
+    for path in (data, codes):
+        if path is not None:
+            with open(path, "rb") as f:
+                digest.update(hashlib.file_digest(f, "sha256").digest())
+    return digest.hexdigest()[:16]
+
+
+def prepare(
+    data: Path,
+    cache_dir: Path,
+    split: str | None = None,
+    limit: int | None = None,
+    template: str | None = None,
+    codes: Path | None = None,
+    k: int = 20,
+    context_tokens: int | None = None,
+    context_tokenizer: str | None = None,
+    num_proc: int | None = None,
+    batch_size: int = 256,
+) -> tuple[Path, bool]:
+    """Render the prompts of a split once and store them as Arrow.
+
+    Rows are processed with the ``datasets`` library's batched ``map``,
+    optionally across ``num_proc`` processes. Each batch selects the note
+    context around its spans, retrieves candidates with one sparse matrix
+    product and renders the prompts with a template compiled once per
+    process. The result is saved under a fingerprint of the data, code
+    table, template and settings, so later runs with the same inputs reuse
+    it and :func:`load_prepared` memory-maps it instead of re-rendering.
+
+    Args:
+        data: MDACE parquet file
+        cache_dir: Root directory of prepared splits
+        split: Keep only rows of this split
+        limit: Keep at most this many rows
+        template: Prompt template; the candidates template when ``codes`` is
+            given and the default template otherwise
+        codes: Code table (``diagnoses_recursive.json``) to retrieve candidates from
+        k: Number of candidates per span
+        context_tokens: Token budget for the note context; the whole note when unset
+        context_tokenizer: Hugging Face tokenizer that counts context tokens;
+            words and punctuation when None
+        num_proc: Worker processes for ``map``
+        batch_size: Rows per ``map`` batch
+
+    Returns:
+        Tuple of (prepared directory, whether it was already cached)
+    """
+    template = template or (CANDIDATES_TEMPLATE if codes is not None else DEFAULT_TEMPLATE)
+    config = {
+        "split": split,
+        "limit": limit,
+        "template": template,
+        "k": k if codes is not None else None,
+        "context_tokens": context_tokens,
+        "context_tokenizer": context_tokenizer if context_tokens is not None else None,
+    }
+    key = fingerprint(data, config, codes)
+    directory = cache_dir / key
+    if (directory / PREPARED_FILE).is_file():
+        return directory, True
+
+    from datasets import Dataset
+
+    # Build next to the final directory and rename, so an interrupted run leaves no cache
+    scratch = cache_dir / f".{key}.tmp"
+    shutil.rmtree(scratch, ignore_errors=True)
+    scratch.mkdir(parents=True)
+
+    index_dir = None
+    if codes is not None:
+        from .codes import CodeTable
+
+        index_dir = scratch / "index"
+        CandidateRetriever(CodeTable.load(codes)).save(index_dir)
+
+    dataset = Dataset.from_parquet(str(data))
+    if split is not None:
+        if "split" not in dataset.column_names:
+            raise ValueError(f"No 'split' column in {data}")
+        dataset = dataset.filter(
+            lambda batch: [value == split for value in batch["split"]], batched=True
+        )
+    if limit is not None:
+        dataset = dataset.select(range(min(limit, len(dataset))))
+
+    dataset = dataset.map(
+        _prepare_batch,
+        batched=True,
+        batch_size=batch_size,
+        num_proc=num_proc,
+        fn_kwargs={
+            "template": template,
+            "index_dir": str(index_dir) if index_dir is not None else None,
+            "k": k,
+            "context_tokens": context_tokens,
+            "context_tokenizer": context_tokenizer,
+            "key": key,
+        },
+        desc="Rendering prompts",
+    )
+    dataset.save_to_disk(str(scratch / "requests"))
+
+    with open(scratch / PREPARED_FILE, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": key, "data": data.name, "rows": len(dataset), **config}, f)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    scratch.rename(directory)
+    return directory, False
+
+
+class PreparedRows(Sequence):
+    """Rows of a prepared split, converted only when read.
+
+    Iteration reads ``batch_size`` rows at a time from the memory-mapped
+    Arrow table and indexing reads one row, so nothing is materialized up
+    front.
+
+    Args:
+        dataset: Prepared ``datasets.Dataset``
+        convert: Builds the value of a row from its position and column dict
+        batch_size: Rows read per batch when iterating
+    """
+
+    def __init__(self, dataset: Any, convert: Callable[[int, dict], Any], batch_size: int = 1024):
+        self.dataset = dataset
+        self.convert = convert
+        self.batch_size = batch_size
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return self.convert(idx, self.dataset[idx])
+
+    def __iter__(self) -> Iterator:
+        idx = 0
+        for batch in self.dataset.iter(batch_size=self.batch_size):
+            names = list(batch)
+            for values in zip(*batch.values(), strict=True):
+                yield self.convert(idx, dict(zip(names, values, strict=True)))
+                idx += 1
+
+
+def load_prepared(
+    directory: Path, batch_size: int = 1024
+) -> tuple[dict, PreparedRows, PreparedRows]:
+    """Load a split written by :func:`prepare`.
+
+    The Arrow files are memory-mapped and rows become example dicts and
+    requests only as they are read, in batches, so loading costs neither
+    re-rendering nor a pass over the split.
+
+    Args:
+        directory: Prepared directory
+        batch_size: Rows read per batch when iterating
+
+    Returns:
+        Tuple of (settings, example rows, requests with their rendered ``prompt``)
+    """
+    from datasets import load_from_disk
+
+    with open(directory / PREPARED_FILE, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    dataset = load_from_disk(str(directory / "requests"))
+    prepared = [name for name in dataset.column_names if name in PREPARED_FIELDS]
+    examples = PreparedRows(dataset.remove_columns(prepared), _example, batch_size)
+    requests = PreparedRows(
+        dataset.select_columns([name for name in REQUEST_FIELDS if name in dataset.column_names]),
+        _request,
+        batch_size,
+    )
+    return meta, examples, requests
+
+
+def context_token_totals(directory: Path, positions: list[int] | None = None) -> tuple[int, int]:
+    """Selected and original note tokens of a split prepared with a context budget.
+
+    Args:
+        directory: Prepared directory
+        positions: Rows to count, e.g. those of one shard; all rows when None
+
+    Returns:
+        Tuple of (selected tokens, original tokens), as a
+        :class:`~elinker.context.ContextSelector` would total them
+    """
+    from datasets import load_from_disk
+
+    dataset = load_from_disk(str(directory / "requests")).select_columns(
+        ["context_selected_tokens", "context_original_tokens"]
+    )
+    if positions is not None:
+        dataset = dataset.select(positions)
+    selected = original = 0
+    for batch in dataset.iter(batch_size=4096):
+        selected += sum(batch["context_selected_tokens"])
+        original += sum(batch["context_original_tokens"])
+    return selected, original
+
+
+def _example(idx: int, row: dict) -> dict:
+    return row
+
+
+def _request(idx: int, row: dict) -> CodingRequest:
+    request = CodingRequest(
+        clinical_phrase=row["covered_text"],
+        clinical_note=row["clinical_note"],
+        begin=row.get("begin"),
+        end=row.get("end"),
+        request_id=idx,
+        prompt=row["prompt"],
+        code_system=row.get("code_system"),
+    )
+    if row.get("candidates") is not None:
+        request.candidates = [
+            Candidate(c["code"], c["description"], c["score"]) for c in row["candidates"]
+        ]
+    return request
+
+
+def _prepare_batch(
+    batch: dict[str, list],
+    template: str,
+    index_dir: str | None,
+    k: int,
+    context_tokens: int | None,
+    context_tokenizer: str | None,
+    key: str,
+) -> dict[str, list]:
+    """Select context, retrieve candidates and render prompts for a batch of rows."""
+    phrases = batch["covered_text"]
+    notes = [text or "" for text in batch["text"]]
+
+    selected_tokens, original_tokens = [], []
+    if context_tokens is not None:
+        selector = _selector(key, context_tokens, context_tokenizer)
+        for idx, (begin, end, note_id) in enumerate(
+            zip(batch["begin"], batch["end"], batch["note_id"], strict=True)
+        ):
+            selected, original = selector.selected_tokens, selector.original_tokens
+            if begin is not None and end is not None:
+                notes[idx] = selector.select(notes[idx], begin, end, key=note_id)
+            # Per-row counts, so any subset of rows can report its reduction
+            selected_tokens.append(selector.selected_tokens - selected)
+            original_tokens.append(selector.original_tokens - original)
+
+    # ICD-10-PCS rows get no candidates and, with the default templates, the free-text prompt
+    coded = [retrieves_for(system) for system in batch.get("code_system", [None] * len(phrases))]
+    candidates: list[list[Candidate] | None] = [None] * len(phrases)
+    if index_dir is not None:
+        positions = [idx for idx, is_coded in enumerate(coded) if is_coded]
+        retrieved = _retriever(index_dir).retrieve_batch([phrases[idx] for idx in positions], k)
+        for idx, row_candidates in zip(positions, retrieved, strict=True):
+            candidates[idx] = row_candidates
+
+    compiled = get_template(template)
+    free_text = compiled
+    if template == CANDIDATES_TEMPLATE:
+        free_text = get_template(DEFAULT_TEMPLATE)
+    prompts = [
+        (compiled if row_candidates is not None or index_dir is None else free_text).render(
+            clinical_note=note,
+            clinical_phrase=phrase,
+            candidates=row_candidates or [],
+            exemplars=[],
+        )
+        for note, phrase, row_candidates in zip(notes, phrases, candidates, strict=True)
+    ]
+
+    columns: dict[str, Any] = {"clinical_note": notes, "prompt": prompts}
+    if index_dir is not None:
+        columns["candidates"] = [
+            [c.to_dict() for c in cs] if cs is not None else None for cs in candidates
+        ]
+    if context_tokens is not None:
+        columns["context_selected_tokens"] = selected_tokens
+        columns["context_original_tokens"] = original_tokens
+    return columns
+
+
+def _retriever(index_dir: str) -> CandidateRetriever:
+    if index_dir not in _retrievers:
+        _retrievers[index_dir] = CandidateRetriever.load(Path(index_dir), mmap=True)
+    return _retrievers[index_dir]
+
+
+def _selector(key: str, max_tokens: int, tokenizer: str | None) -> ContextSelector:
+    # Sections are cached by note_id, so a selector must not outlive its dataset
+    if (key, max_tokens) not in _selectors:
+        tokenizer_object = None
+        if tokenizer is not None:
+            from transformers import AutoTokenizer
+
+            tokenizer_object = AutoTokenizer.from_pretrained(tokenizer)
+        _selectors[key, max_tokens] = ContextSelector(
+            max_tokens=max_tokens, tokenizer=tokenizer_object
+        )
+    return _selectors[key, max_tokens]
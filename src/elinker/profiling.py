@@ -0,0 +1,158 @@
+"""CPU and memory profiling of CLI commands."""
+
+import io
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from rich.console import Console
+
+# Frames recorded per allocation in memory mode
+TRACEBACK_FRAMES = 10
+
+
+@contextmanager
+def profiled(
+    mode: str, output: Path | None = None, top: int = 25, console: Console | None = None
+) -> Iterator[None]:
+    """Profile the enclosed block and report its hot spots on exit.
+
+    The report is written even if the block raises or calls ``sys.exit``.
+
+    Args:
+        mode: ``"cpu"`` for cProfile or ``"mem"`` for tracemalloc
+        output: Report file. A ``.prof`` suffix writes raw cProfile stats
+            (for snakeviz and friends) instead of the text report.
+        top: Number of functions or allocation sites to report
+        console: Console to print the report to when no file is given
+    """
+    if mode not in ("cpu", "mem"):
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    start = time.perf_counter()
+
+    if mode == "cpu":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            if output is not None and output.suffix == ".prof":
+                output.parent.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(output)
+                if console is not None:
+                    console.print(f"[bold cyan]Profile stats written to:[/bold cyan] {output}")
+                output = None
+            _emit(cpu_report(profiler, top, elapsed), output, console)
+    else:
+        import tracemalloc
+
+        tracemalloc.start(TRACEBACK_FRAMES)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            elapsed = time.perf_counter() - start
+            _emit(memory_report(snapshot, peak, top, elapsed), output, console)
+
+
+def cpu_report(profiler, top: int = 25, elapsed: float | None = None) -> str:
+    """Format the hottest functions of a cProfile run.
+
+    Args:
+        profiler: Disabled ``cProfile.Profile``
+        top: Number of functions per table
+        elapsed: Wall time of the profiled block, in seconds
+
+    Returns:
+        Report text with functions by internal and by cumulative time
+    """
+    import pstats
+
+    stream = io.StringIO()
+    if elapsed is not None:
+        stream.write(f"CPU profile - wall time {elapsed:.3f}s\n\n")
+
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs()
+
+    stream.write(f"Top {top} functions by internal time\n")
+    stats.sort_stats("tottime").print_stats(top)
+    stream.write(f"Top {top} functions by cumulative time\n")
+    stats.sort_stats("cumulative").print_stats(top)
+    return stream.getvalue()
+
+
+def memory_report(snapshot, peak: int, top: int = 25, elapsed: float | None = None) -> str:
+    """Format the largest allocation sites of a tracemalloc snapshot.
+
+    Args:
+        snapshot: ``tracemalloc.Snapshot`` taken at the end of the block
+        peak: Peak traced memory in bytes
+        top: Number of allocation sites to report
+        elapsed: Wall time of the profiled block, in seconds
+
+    Returns:
+        Report text with allocation sites by size, and the traceback of the largest
+    """
+    import tracemalloc
+
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+    stats = snapshot.statistics("lineno")
+    total = sum(stat.size for stat in stats)
+
+    lines = []
+    if elapsed is not None:
+        lines.append(f"Memory profile - wall time {elapsed:.3f}s")
+    lines.append(f"Peak traced memory: {_format_bytes(peak)}")
+    lines.append(f"Live at exit: {_format_bytes(total)} in {len(stats)} sites")
+    lines.append("")
+    lines.append(f"Top {top} allocation sites")
+
+    for rank, stat in enumerate(stats[:top], start=1):
+        frame = stat.traceback[0]
+        lines.append(
+            f"#{rank:<3} {_format_bytes(stat.size):>10} {stat.count:>8} blocks  "
+            f"{frame.filename}:{frame.lineno}"
+        )
+
+    if stats:
+        lines.append("")
+        lines.append("Traceback of the largest site")
+        lines.extend(stats[0].traceback.format())
+
+    return "\n".join(lines) + "\n"
+
+
+def _emit(report: str, output: Path | None, console: Console | None) -> None:
+    """Write a report to a file, or print it."""
+    if output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(report, encoding="utf-8")
+        if console is not None:
+            console.print(f"[bold cyan]Profile written to:[/bold cyan] {output}")
+    elif console is not None:
+        console.print(report, markup=False, highlight=False)
+
+
+def _format_bytes(size: float) -> str:
+    """Format a byte count in human-readable form."""
+    for unit in ["B", "KiB", "MiB"]:
+        if abs(size) < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} GiB"
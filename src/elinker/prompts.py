@@ -0,0 +1,38 @@
+"""Prompt rendering for ICD-10 coders."""
+
+from jinja2 import Environment, PackageLoader, StrictUndefined, Template
+
+DEFAULT_TEMPLATE = "prompt_template.md.jinja2"
+CANDIDATES_TEMPLATE = "prompt_template_candidates.md.jinja2"
+
+_environment: Environment | None = None
+
+
+def get_environment() -> Environment:
+    """Return the shared Jinja environment for the packaged templates."""
+    global _environment
+    if _environment is None:
+        _environment = Environment(
+            loader=PackageLoader("elinker", "templates"),
+            undefined=StrictUndefined,
+            keep_trailing_newline=True,
+        )
+    return _environment
+
+
+def get_template(name: str) -> Template:
+    """Return a compiled packaged template (compiled once per process)."""
+    return get_environment().get_template(name)
+
+
+def render_prompt(template_name: str, **context) -> str:
+    """Render a packaged prompt template.
+
+    Args:
+        template_name: File name of the template in ``elinker/templates``
+        **context: Template variables (``clinical_note``, ``clinical_phrase``, ...)
+
+    Returns:
+        Rendered prompt text
+    """
+    return get_template(template_name).render(**context)
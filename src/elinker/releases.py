@@ -0,0 +1,323 @@
+"""Several ICD-10-CM fiscal-year releases held in one structure."""
+
+import datetime
+import json
+from array import array
+from pathlib import Path
+
+from .codes import CodeTable
+
+
+class CodeReleases:
+    """Code tables of several fiscal years with shared storage.
+
+    Every code gets a stable integer ID the first time any release contains
+    it. Strings (descriptions, notes, field names) are interned in one pool
+    and whole records are deduplicated, so a code that is unchanged between
+    releases is stored once. Each release keeps only a membership bitmap and
+    an array of record IDs indexed by code ID, which makes five releases
+    cost little more than one and makes per-release lookups O(1). The
+    billable flag and parent of each shared record are kept alongside, so
+    predictions are validated against a release without building its table.
+    """
+
+    def __init__(self):
+        self.codes: list[str] = []  # code ID -> code
+        self.ids: dict[str, int] = {}  # code -> code ID
+        self.records: list[tuple] = []  # record ID -> ((field, value), ...)
+        self.bitmaps: dict[int, bytearray] = {}  # year -> membership bitmap
+        self._strings: dict[str, str] = {}
+        self._record_ids: dict[tuple, int] = {}
+        self._versions: dict[int, array] = {}  # year -> record ID per code ID (-1 if absent)
+        self._orders: dict[int, array] = {}  # year -> code IDs in tabular order
+        self._billable = bytearray()  # record ID -> is_billable
+        self._parents: list[str | None] = []  # record ID -> parent code
+        self._children: dict[str, list[int]] = {}  # code -> child code IDs in any release
+        self._positions: dict[int, array] = {}  # year -> tabular position per code ID
+
+    @classmethod
+    def load(cls, paths: dict[int, Path]) -> "CodeReleases":
+        """Load ``diagnoses_recursive.json`` files of several releases.
+
+        Args:
+            paths: Fiscal year to code table file, e.g.
+                ``{2026: Path("data/icd10cm-table-and-index-2026/diagnoses_recursive.json")}``
+
+        Returns:
+            Loaded releases
+        """
+        releases = cls()
+        for year, path in sorted(paths.items()):
+            with open(path, encoding="utf-8") as f:
+                releases.add(year, json.load(f))
+        return releases
+
+    @property
+    def years(self) -> list[int]:
+        """Loaded fiscal years, oldest first."""
+        return sorted(self.bitmaps)
+
+    def add(self, year: int, records: list[dict]) -> None:
+        """Add a release.
+
+        Args:
+            year: Fiscal year of the release
+            records: Records as written by ``extract_diagnoses_recursive.py``
+        """
+        self._positions.clear()  # Sized by the code count, which may grow
+        versions = self._versions[year] = array("l")
+        bitmap = self.bitmaps[year] = bytearray()
+        order = self._orders[year] = array("l")
+
+        for record in records:
+            code_id = self.ids.get(record["code"])
+            if code_id is None:
+                code_id = self.ids[record["code"]] = len(self.codes)
+                self.codes.append(self._intern(record["code"]))
+
+            shared = tuple((self._intern(k), self._share(v)) for k, v in record.items())
+            record_id = self._record_ids.setdefault(shared, len(self.records))
+            if record_id == len(self.records):
+                self.records.append(shared)
+                self._billable.append(bool(record.get("is_billable")))
+                parent = record.get("parent_code")
+                self._parents.append(self._intern(parent) if parent else None)
+                if parent:
+                    children = self._children.setdefault(self._intern(parent), [])
+                    if code_id not in children:
+                        children.append(code_id)
+
+            if code_id >= len(versions):
+                versions.extend([-1] * (code_id + 1 - len(versions)))
+            versions[code_id] = record_id
+            order.append(code_id)
+
+        bitmap.extend(bytes((len(self.codes) + 7) // 8))
+        for code_id in order:
+            bitmap[code_id >> 3] |= 1 << (code_id & 7)
+
+    def contains(self, code: str, year: int) -> bool:
+        """Check whether a release has a code, in constant time."""
+        code_id = self.ids.get(code)
+        bitmap = self.bitmaps[year]
+        if code_id is None or code_id >> 3 >= len(bitmap):
+            return False
+        return bitmap[code_id >> 3] >> (code_id & 7) & 1 == 1
+
+    def get(self, code: str, year: int) -> dict | None:
+        """The record of a code in a release, or None if the release lacks it."""
+        if not self.contains(code, year):
+            return None
+        return self._record(self._versions[year][self.ids[code]])
+
+    def is_billable(self, code: str, year: int) -> bool:
+        """Check whether a code exists and is billable in a release."""
+        record = self.get(code, year)
+        return bool(record and record.get("is_billable"))
+
+    def release_for(self, date: datetime.date | str) -> int:
+        """The release in effect on a date.
+
+        A fiscal year runs from October 1 of the previous calendar year, so a
+        note dated 2019-11-02 is coded with the 2020 release. Dates outside
+        the loaded releases use the nearest loaded one. MIMIC shifts note
+        dates into the 2100s, so its raw chart dates all map to the newest
+        release; convert them to real years first (e.g. with the patient's
+        ``anchor_year_group``) for a per-date release.
+
+        Args:
+            date: Date or ISO date string, e.g. a note's chart date
+
+        Returns:
+            Fiscal year of a loaded release
+        """
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date[:10])
+        year = date.year + 1 if date.month >= 10 else date.year
+        if year in self.bitmaps:
+            return year
+        return min(self.bitmaps, key=lambda loaded: (abs(loaded - year), -loaded))
+
+    def annotate(
+        self,
+        predictions: list[dict],
+        dates: list[datetime.date | str | None],
+        field: str = "predicted",
+    ) -> list[dict]:
+        """Validate each prediction against the release in effect on its date.
+
+        Adds ``release`` and the fields of :meth:`CodeValidator.annotate
+        <elinker.normalize.CodeValidator.annotate>`, read from the release
+        bitmaps and shared records. Predictions without a date are checked
+        against the newest release; see :meth:`release_for` for shifted dates.
+
+        Args:
+            predictions: Prediction records, updated in place
+            dates: Note date of each prediction, aligned with ``predictions``
+            field: Field holding the predicted code
+
+        Returns:
+            The same records
+        """
+        from .normalize import normalize_codes
+
+        if not predictions:
+            return predictions
+        normalized = normalize_codes([record.get(field) for record in predictions])
+        suggestions: dict[tuple[int, str], str | None] = {}
+        for record, date, code in zip(predictions, dates, normalized, strict=True):
+            year = self.release_for(date) if date else self.years[-1]
+            valid = code is not None and self.contains(code, year)
+            record["release"] = year
+            record["normalized"] = code
+            record["valid"] = valid
+            record["billable"] = valid and bool(
+                self._billable[self._versions[year][self.ids[code]]]
+            )
+            if code is not None and (year, code) not in suggestions:
+                suggestions[year, code] = self.nearest_billable(code, year)
+            record["suggestion"] = suggestions.get((year, code))
+        return predictions
+
+    def nearest_billable(self, code: str, year: int) -> str | None:
+        """The billable code to suggest for a code in a release.
+
+        Matches :func:`elinker.normalize.nearest_billable` and
+        :class:`~elinker.normalize.CodeValidator`: the code itself when
+        billable, else its nearest billable descendant, preferring
+        "unspecified" codes and then tabular order. A code the release lacks
+        takes the suggestion of its longest prefix in the release.
+
+        Args:
+            code: Normalized (dotted) code
+            year: Fiscal year of the release
+
+        Returns:
+            Suggested code, or None when there is none
+        """
+        if self.contains(code, year):
+            return self._descend(self.ids[code], year)
+        bare = code.replace(".", "")
+        for length in range(len(bare) - 1, 2, -1):
+            prefix = bare[:3] + (f".{bare[3:length]}" if length > 3 else "")
+            if self.contains(prefix, year):
+                suggestion = self._descend(self.ids[prefix], year)
+                if suggestion is not None:
+                    return suggestion
+        return None
+
+    def _descend(self, code_id: int, year: int) -> str | None:
+        """Nearest billable descendant (or the code itself) within a release."""
+        versions = self._versions[year]
+        if self._billable[versions[code_id]]:
+            return self.codes[code_id]
+        level = [code_id]
+        while level:
+            level = [child for parent in level for child in self._children_in(parent, year)]
+            billable = [child for child in level if self._billable[versions[child]]]
+            if billable:
+                unspecified = [
+                    child
+                    for child in billable
+                    if "unspecified"
+                    in (dict(self.records[versions[child]]).get("description") or "").lower()
+                ]
+                return self.codes[(unspecified or billable)[0]]
+        return None
+
+    def _children_in(self, code_id: int, year: int) -> list[int]:
+        """Children of a code in a release, in its tabular order."""
+        code = self.codes[code_id]
+        versions = self._versions[year]
+        children = [
+            child
+            for child in self._children.get(code, ())
+            if self.contains(self.codes[child], year) and self._parents[versions[child]] == code
+        ]
+        if len(children) > 1:
+            if year not in self._positions:
+                positions = self._positions[year] = array("l", [-1]) * len(self.codes)
+                for position, member in enumerate(self._orders[year]):
+                    positions[member] = position
+            children.sort(key=self._positions[year].__getitem__)
+        return children
+
+    def table(self, year: int) -> CodeTable:
+        """The code table of a release, in its tabular order."""
+        return CodeTable([self._record(self._versions[year][i]) for i in self._orders[year]])
+
+    def diff(self, old: int, new: int) -> dict:
+        """Codes added, deleted and retitled between two releases.
+
+        Args:
+            old: Earlier fiscal year
+            new: Later fiscal year
+
+        Returns:
+            Dict with sorted ``added`` and ``deleted`` code lists and
+            ``retitled``, a list of ``{"code", "old", "new"}`` descriptions
+        """
+        before = int.from_bytes(self.bitmaps[old], "little")
+        after = int.from_bytes(self.bitmaps[new], "little")
+
+        retitled = []
+        for code_id in _members(before & after):
+            if self._versions[old][code_id] == self._versions[new][code_id]:
+                continue  # Same shared record, nothing changed
+            old_record = dict(self.records[self._versions[old][code_id]])
+            new_record = dict(self.records[self._versions[new][code_id]])
+            if old_record.get("description") != new_record.get("description"):
+                retitled.append(
+                    {
+                        "code": self.codes[code_id],
+                        "old": old_record.get("description"),
+                        "new": new_record.get("description"),
+                    }
+                )
+
+        return {
+            "added": sorted(self.codes[i] for i in _members(after & ~before)),
+            "deleted": sorted(self.codes[i] for i in _members(before & ~after)),
+            "retitled": sorted(retitled, key=lambda change: change["code"]),
+        }
+
+    def _intern(self, text: str) -> str:
+        return self._strings.setdefault(text, text)
+
+    def _share(self, value):
+        """Interned form of a field value; lists become tuples of interned strings."""
+        if isinstance(value, str):
+            return self._intern(value)
+        if isinstance(value, list):
+            return tuple(self._share(item) for item in value)
+        return value
+
+    def _record(self, record_id: int) -> dict:
+        return {
+            key: list(value) if isinstance(value, tuple) else value
+            for key, value in self.records[record_id]
+        }
+
+    def __repr__(self):
+        return f"<CodeReleases {self.years}: {len(self.codes)} codes, {len(self.records)} records>"
+
+
+def parse_release(spec: str) -> tuple[int, Path]:
+    """Parse a ``YEAR=PATH`` release argument.
+
+    Raises:
+        ValueError: If the spec is not a fiscal year and a path
+    """
+    year, sep, path = spec.partition("=")
+    if not sep or not year.strip().isdigit() or not path:
+        raise ValueError(f"Release must be YEAR=PATH, got {spec!r}")
+    return int(year), Path(path)
+
+
+def _members(bits: int):
+    """IDs of the set bits of a bitmap, in ascending order."""
+    for index, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, "little")):
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
@@ -0,0 +1,213 @@
+"""Candidate code retrieval over the local code table."""
+
+import hashlib
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+from .codes import CodeTable
+
+
+class Candidate:
+    """A candidate ICD-10 code retrieved for a clinical phrase."""
+
+    def __init__(self, code: str, description: str, score: float):
+        self.code = code
+        self.description = description
+        self.score = score
+
+    def to_dict(self) -> dict:
+        """Serialize the candidate for prompts and prediction files."""
+        return {"code": self.code, "description": self.description, "score": self.score}
+
+    def __repr__(self):
+        return f"<Candidate {self.code}: {self.score:.3f}>"
+
+
+class CandidateRetriever:
+    """TF-IDF retriever over code descriptions and inclusion terms.
+
+    Codes are indexed once with character n-grams, which tolerate the
+    abbreviations and inflections common in clinical phrases. Queries are
+    scored in batches with a single sparse matrix product per batch.
+    """
+
+    def __init__(self, table: CodeTable, billable_only: bool = True, batch_size: int = 64):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.table = table
+        self.batch_size = batch_size
+        self.rows = [
+            idx
+            for idx, record in enumerate(table.records)
+            if record.get("is_billable") or not billable_only
+        ]
+
+        self.codes = [table.records[idx]["code"] for idx in self.rows]
+        self.descriptions = [table.records[idx].get("description", "") for idx in self.rows]
+
+        documents = [_document_text(table.records[idx]) for idx in self.rows]
+        self.vectorizer = TfidfVectorizer(
+            analyzer="char_wb", ngram_range=(3, 4), sublinear_tf=True, lowercase=True
+        )
+        self.matrix = self.vectorizer.fit_transform(documents).T.tocsr()
+
+    def save(self, directory: Path, codes_digest: str | None = None) -> None:
+        """Write the fitted index to a directory for :meth:`load`.
+
+        The matrix, codes and descriptions are stored as flat arrays so that
+        processes loading the index map the same pages instead of copying.
+
+        Args:
+            directory: Index directory, created if missing
+            codes_digest: :func:`file_digest` of the code table the index was
+                built from, recorded so a stale index can be detected
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "vectorizer.pkl", "wb") as f:
+            pickle.dump(self.vectorizer, f)
+        for name in ("data", "indices", "indptr"):
+            np.save(directory / f"matrix_{name}.npy", getattr(self.matrix, name))
+        _save_strings(directory / "codes", self.codes)
+        _save_strings(directory / "descriptions", self.descriptions)
+        with open(directory / "index.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "shape": list(self.matrix.shape),
+                    "batch_size": self.batch_size,
+                    "codes_digest": codes_digest,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "CandidateRetriever":
+        """Load an index written by :meth:`save`.
+
+        A loaded retriever answers ``retrieve`` and ``retrieve_batch`` but has
+        no code table (``table`` is None).
+
+        Args:
+            directory: Index directory
+            mmap: Memory-map the arrays instead of reading them into memory
+
+        Returns:
+            Retriever over the saved index
+        """
+        from scipy.sparse import csr_matrix
+
+        mode = "r" if mmap else None
+        with open(directory / "index.json", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        retriever = cls.__new__(cls)
+        retriever.table = None
+        retriever.batch_size = meta["batch_size"]
+        with open(directory / "vectorizer.pkl", "rb") as f:
+            retriever.vectorizer = pickle.load(f)
+        arrays = [
+            np.load(directory / f"matrix_{name}.npy", mmap_mode=mode)
+            for name in ("data", "indices", "indptr")
+        ]
+        retriever.matrix = csr_matrix(tuple(arrays), shape=tuple(meta["shape"]), copy=False)
+        retriever.codes = _MappedStrings(directory / "codes", mmap)
+        retriever.descriptions = _MappedStrings(directory / "descriptions", mmap)
+        retriever.rows = range(len(retriever.codes))
+        return retriever
+
+    @staticmethod
+    def saved_digest(directory: Path) -> str | None:
+        """The code table digest recorded in a saved index, or None if there is none."""
+        path = directory / "index.json"
+        if not path.is_file():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("codes_digest")
+
+    def retrieve(self, phrase: str, k: int = 20) -> list[Candidate]:
+        """Retrieve the top-k candidate codes for a single phrase."""
+        return self.retrieve_batch([phrase], k)[0]
+
+    def retrieve_batch(self, phrases: list[str], k: int = 20) -> list[list[Candidate]]:
+        """Retrieve the top-k candidate codes for each phrase.
+
+        Args:
+            phrases: Clinical phrases to retrieve candidates for
+            k: Number of candidates per phrase
+
+        Returns:
+            One list of candidates per phrase, best first
+        """
+        k = min(k, len(self.rows))
+        results = []
+        if k <= 0:
+            return [[] for _ in phrases]
+
+        for start in range(0, len(phrases), self.batch_size):
+            batch = phrases[start : start + self.batch_size]
+            scores = (self.vectorizer.transform(batch) @ self.matrix).toarray()
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+            for row, columns in enumerate(top):
+                ordered = columns[np.argsort(-scores[row, columns], kind="stable")]
+                candidates = []
+                for column in ordered:
+                    candidates.append(
+                        Candidate(
+                            self.codes[column],
+                            self.descriptions[column],
+                            float(scores[row, column]),
+                        )
+                    )
+                results.append(candidates)
+
+        return results
+
+
+def retrieves_for(code_system: str | None) -> bool:
+    """Whether a span of this code system is coded from the diagnosis table.
+
+    The retriever indexes ICD-10-CM only, so ICD-10-PCS procedure spans get
+    no candidates: constraining them would force a diagnosis code.
+    """
+    return code_system is None or "PCS" not in code_system.upper()
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 hex digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _document_text(record: dict) -> str:
+    """Build the indexed text for a code record."""
+    parts = [record.get("description", "")]
+    parts.extend(record.get("inclusion_terms", []))
+    return " ; ".join(part for part in parts if part)
+
+
+class _MappedStrings:
+    """Read-only sequence of strings stored as one UTF-8 buffer plus offsets."""
+
+    def __init__(self, path: Path, mmap: bool = True):
+        mode = "r" if mmap else None
+        self.offsets = np.load(path.with_suffix(".offsets.npy"), mmap_mode=mode)
+        self.buffer = np.load(path.with_suffix(".utf8.npy"), mmap_mode=mode)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> str:
+        begin, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.buffer[begin:end].tobytes().decode("utf-8")
+
+
+def _save_strings(path: Path, strings: list[str]) -> None:
+    """Write strings in the layout read by :class:`_MappedStrings`."""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    np.save(path.with_suffix(".offsets.npy"), offsets)
+    np.save(path.with_suffix(".utf8.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
@@ -0,0 +1,307 @@
+"""Evaluation runs of a coder over MDACE examples."""
+
+import asyncio
+import json
+from collections.abc import Sequence
+from pathlib import Path
+
+from .assertions import CATEGORIES, AssertionFilter
+from .coders import MISSING_CODE, CodingRequest, CodingResult
+from .context import ContextSelector, token_starts
+from .exemplars import ExemplarIndex
+from .metrics import candidate_recall, score_predictions, span_scores
+from .retrieval import CandidateRetriever, retrieves_for
+
+ERROR_CODE = "__ERROR__"
+
+
+def build_requests(
+    examples: list[dict],
+    retriever: CandidateRetriever | None = None,
+    k: int = 20,
+    context: ContextSelector | None = None,
+    exemplars: ExemplarIndex | None = None,
+    exemplar_tokens: int | None = None,
+) -> list[CodingRequest]:
+    """Turn example rows into coding requests.
+
+    Args:
+        examples: Rows from :func:`elinker.data.load_examples`
+        retriever: When given, attach the top-k candidates to every diagnosis
+            request; ICD-10-PCS requests stay unconstrained
+        k: Number of candidates per request
+        context: When given, send only the selected part of each note
+        exemplars: When given, attach each example's nearest train exemplars
+        exemplar_tokens: Token budget for the exemplars of one request
+
+    Returns:
+        One request per example, in order
+    """
+    requests = [
+        CodingRequest(
+            clinical_phrase=row["covered_text"],
+            clinical_note=row.get("text", ""),
+            begin=row.get("begin"),
+            end=row.get("end"),
+            request_id=idx,
+            code_system=row.get("code_system"),
+        )
+        for idx, row in enumerate(examples)
+    ]
+
+    if context is not None:
+        for request, row in zip(requests, examples, strict=True):
+            if request.begin is not None and request.end is not None:
+                request.clinical_note = context.select(
+                    request.clinical_note, request.begin, request.end, key=row.get("note_id")
+                )
+
+    if retriever is not None:
+        coded = [request for request in requests if retrieves_for(request.code_system)]
+        candidates = retriever.retrieve_batch([r.clinical_phrase for r in coded], k)
+        for request, request_candidates in zip(coded, candidates, strict=True):
+            request.candidates = request_candidates
+
+    if exemplars is not None:
+        exemplars.build(examples)
+        for request, row in zip(requests, examples, strict=True):
+            request.exemplars = exemplars.lookup(row, exemplar_tokens)
+
+    return requests
+
+
+async def predict(
+    coder, requests: list[CodingRequest], concurrency: int = 4
+) -> list[CodingResult | Exception]:
+    """Run a coder over requests with bounded concurrency.
+
+    Failures are returned in place of the result so one bad request does not
+    abort the run.
+
+    Args:
+        coder: Backend with an async ``code(request)`` method
+        requests: Requests to code
+        concurrency: Maximum number of requests in flight
+
+    Returns:
+        Results (or exceptions) aligned with ``requests``
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _code(request: CodingRequest) -> CodingResult | Exception:
+        async with semaphore:
+            try:
+                return await coder.code(request)
+            except Exception as e:
+                return e
+
+    return await asyncio.gather(*(_code(request) for request in requests))
+
+
+async def run_evaluation(
+    examples: Sequence[dict],
+    coder,
+    retriever: CandidateRetriever | None = None,
+    k: int = 20,
+    concurrency: int = 4,
+    context: ContextSelector | None = None,
+    assertions: AssertionFilter | None = None,
+    exemplars: ExemplarIndex | None = None,
+    exemplar_tokens: int | None = None,
+    requests: Sequence[CodingRequest] | None = None,
+) -> tuple[dict, str, list[dict]]:
+    """Code every example and score the predictions.
+
+    Args:
+        examples: Rows from :func:`elinker.data.load_examples`
+        coder: Backend with an async ``code(request)`` method
+        retriever: Enables candidate-constrained coding when given
+        k: Number of candidates per request
+        concurrency: Maximum number of requests in flight
+        context: Reduces each note to the context around its span
+        assertions: Tags spans as negated, hypothetical, historical or family
+            and answers the skipped categories with ``__MISSING__`` instead
+            of calling the coder
+        exemplars: Adds each example's nearest train exemplars to its prompt
+        exemplar_tokens: Token budget for the exemplars of one request
+        requests: Requests built beforehand, one per example (e.g. by
+            :func:`elinker.preprocess.load_prepared`); built from the
+            examples when None
+
+    Returns:
+        Tuple of (scores, classification report, prediction records)
+    """
+    if requests is None:
+        requests = build_requests(examples, retriever, k, context, exemplars, exemplar_tokens)
+
+    labels = None
+    routed = list(range(len(requests)))
+    if assertions is not None:
+        labels = [assertions.classify(row) for row in examples]
+        routed = [idx for idx in routed if not assertions.skips(labels[idx])]
+
+    results: list[CodingResult | Exception | None] = [None] * len(requests)
+    routed_requests = requests if labels is None else [requests[idx] for idx in routed]
+    routed_results = await predict(coder, routed_requests, concurrency)
+    for idx, result in zip(routed, routed_results, strict=True):
+        results[idx] = result
+
+    predictions = []
+    for idx, (row, request, result) in enumerate(zip(examples, requests, results, strict=True)):
+        record = {
+            "hadm_id": row.get("hadm_id"),
+            "note_id": row.get("note_id"),
+            "begin": row.get("begin"),
+            "end": row.get("end"),
+            "code": row["code"],
+        }
+        if "code_system" in row:
+            record["code_system"] = row["code_system"]
+        if "category" in row:
+            record["category"] = row["category"]
+        if row.get("text") and record["begin"] is not None and record["end"] is not None:
+            # Kept so token-overlap span scores can be recomputed from the records alone
+            record["span_tokens"] = token_starts(row["text"], record["begin"], record["end"])
+
+        if result is None:
+            record["predicted"] = MISSING_CODE
+            record["skipped"] = True
+        elif isinstance(result, Exception):
+            record["predicted"] = ERROR_CODE
+            record["error"] = str(result)
+        else:
+            record["predicted"] = result.code
+            record["description"] = result.description
+            if result.turns:
+                record["turns"] = result.turns
+
+        if request.candidates is not None:
+            record["candidates"] = [c.code for c in request.candidates]
+
+        if request.exemplars is not None:
+            record["exemplars"] = [e.code for e in request.exemplars]
+
+        if labels is not None:
+            record["assertions"] = labels[idx]
+
+        predictions.append(record)
+
+    with_candidates = any(request.candidates is not None for request in requests)
+    scores, report = score_records(predictions, k if with_candidates else None)
+
+    if context is not None:
+        scores["context_max_tokens"] = context.max_tokens
+        scores["context_reduction"] = context.reduction
+
+    if exemplars is not None:
+        scores.update(exemplar_scores(exemplars.totals()))
+
+    return scores, report, predictions
+
+
+def score_records(predictions: list[dict], k: int | None = None) -> tuple[dict, str]:
+    """Score prediction records as written to ``predictions.jsonl``.
+
+    Args:
+        predictions: Records with gold ``code`` and ``predicted`` fields
+        k: Number of candidates per request, for candidate-constrained runs
+
+    Returns:
+        Tuple of (scores, classification report)
+    """
+    y_true = [record["code"] for record in predictions]
+    scores, report = score_predictions(y_true, [record["predicted"] for record in predictions])
+    scores["errors"] = sum(record["predicted"] == ERROR_CODE for record in predictions)
+
+    if k is not None:
+        # Over the records that were constrained; ICD-10-PCS spans get no candidates
+        constrained = [record for record in predictions if "candidates" in record]
+        scores[f"candidate_recall@{k}"] = candidate_recall(
+            [record["code"] for record in constrained],
+            [record["candidates"] for record in constrained],
+        )
+
+    if any("assertions" in record for record in predictions):
+        scores.update(assertion_scores(predictions))
+
+    if any(record.get("begin") is not None for record in predictions):
+        scores.update(span_scores(predictions, unanswered=(MISSING_CODE, ERROR_CODE)))
+
+    return scores, report
+
+
+def assertion_scores(predictions: list[dict]) -> dict:
+    """Model calls avoided by the assertion filter and the accuracy they cost.
+
+    ``accuracy`` counts skipped spans as answered ``__MISSING__``; comparing it
+    with ``accuracy_routed`` (spans sent to the coder only) shows how much the
+    skipped spans moved the score.
+
+    Args:
+        predictions: Records with ``assertions`` tags and ``skipped`` flags
+
+    Returns:
+        Dict with ``calls_avoided``, per-category tag and skip counts,
+        ``accuracy_routed`` and ``skipped_gold_codes``, the skipped spans
+        that had a gold code (at most the correct answers lost)
+    """
+    skipped = [record for record in predictions if record.get("skipped")]
+    routed = [record for record in predictions if not record.get("skipped")]
+    correct = sum(record["predicted"] == record["code"] for record in routed)
+    return {
+        "calls_avoided": len(skipped),
+        "assertions": {
+            category: sum(category in record.get("assertions", {}) for record in predictions)
+            for category in CATEGORIES
+        },
+        "calls_avoided_by": {
+            category: sum(category in record.get("assertions", {}) for record in skipped)
+            for category in CATEGORIES
+        },
+        "accuracy_routed": round(correct / len(routed), 4) if routed else 0.0,
+        "skipped_gold_codes": sum(record["code"] != MISSING_CODE for record in skipped),
+    }
+
+
+def exemplar_scores(totals: dict) -> dict:
+    """Prompt cost of few-shot exemplars, to weigh against accuracy and latency.
+
+    Args:
+        totals: Counters from :meth:`elinker.exemplars.ExemplarIndex.totals`,
+            or their sums over the shards of a run
+
+    Returns:
+        Dict with the exemplars and exemplar tokens per request, the
+        neighbour search time and the time per lookup in milliseconds
+    """
+    lookups = totals["lookups"]
+    return {
+        "exemplars_per_request": round(totals["exemplars"] / lookups, 4) if lookups else 0.0,
+        "exemplar_tokens_per_request": round(totals["tokens"] / lookups, 4) if lookups else 0.0,
+        "exemplar_index_seconds": round(totals["build_seconds"], 4),
+        "exemplar_lookup_ms": round(1000 * totals["lookup_seconds"] / lookups, 4)
+        if lookups
+        else 0.0,
+    }
+
+
+def write_run(output_dir: Path, scores: dict, report: str, predictions: list[dict]) -> None:
+    """Write ``scores.json``, ``report.txt`` and ``predictions.jsonl`` for a run.
+
+    Args:
+        output_dir: Run directory, e.g. ``experiments/results/test-run-1``
+        scores: Scores from :func:`run_evaluation`
+        report: Classification report text
+        predictions: Prediction records
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / "scores.json", "w", encoding="utf-8") as f:
+        json.dump(scores, f, indent=4)
+
+    with open(output_dir / "report.txt", "w", encoding="utf-8") as f:
+        f.write(report)
+
+    with open(output_dir / "predictions.jsonl", "w", encoding="utf-8") as f:
+        for record in predictions:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
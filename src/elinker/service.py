@@ -0,0 +1,476 @@
+"""Long-running HTTP/JSON linking service with micro-batched requests.
+
+The service is a small HTTP/1.1 server on ``asyncio.start_server``. The code
+table, retriever and coder are loaded once and shared by every request.
+Concurrent ``/link`` requests are collected into micro-batches so candidate
+retrieval runs as one sparse matrix product per batch.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from .agent import LocalTools
+from .coders import CodingRequest
+from .instrumentation import percentiles
+from .retrieval import CandidateRetriever
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+# Link latencies kept for the percentiles reported on /metrics
+LATENCY_WINDOW = 10_000
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """An error answered with an HTTP status and a JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class BatcherClosed(RuntimeError):
+    """Raised for items submitted to, or still queued in, a closed batcher."""
+
+
+class MicroBatcher:
+    """Collects concurrent submissions into batches.
+
+    A batch is flushed when it reaches ``max_batch`` items or when its first
+    item has waited ``max_wait`` seconds, whichever comes first. At most
+    ``concurrency`` batches are processed at once. Submissions beyond
+    ``max_queue`` waiting items are rejected with ``asyncio.QueueFull``.
+    Items still waiting when the batcher is closed fail with
+    :class:`BatcherClosed`.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[list], Awaitable[list]],
+        max_batch: int = 32,
+        max_wait: float = 0.01,
+        max_queue: int = 1024,
+        concurrency: int = 4,
+    ):
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.batches = 0
+        self.items = 0
+        self._worker: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+    @property
+    def depth(self) -> int:
+        """Number of items waiting for a batch."""
+        return self.queue.qsize()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result.
+
+        Raises:
+            asyncio.QueueFull: If ``max_queue`` items are already waiting
+            BatcherClosed: If the batcher is closed before the item is batched
+        """
+        if self._closed:
+            raise BatcherClosed("Batcher is closed")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future))
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._collect())
+
+        return await future
+
+    async def _collect(self) -> None:
+        """Form batches from the queue and hand them to ``process``."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self.queue.get())
+                deadline = loop.time() + self.max_wait
+
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except TimeoutError:
+                        break
+
+                await self.semaphore.acquire()
+            except asyncio.CancelledError:
+                # Closed while forming a batch: its items will never be processed
+                _fail(batch)
+                raise
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list) -> None:
+        """Process one batch and resolve its futures."""
+        try:
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await self.process([item for item, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+
+            for (_, future), result in zip(batch, results, strict=True):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self.semaphore.release()
+
+    async def close(self) -> None:
+        """Stop collecting batches, fail queued items and wait for the batches in flight."""
+        self._closed = True
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+
+        queued = []
+        while not self.queue.empty():
+            queued.append(self.queue.get_nowait())
+        _fail(queued)
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class LinkingService:
+    """The ``/link``, ``/search``, ``/lookup`` and ``/metrics`` endpoints.
+
+    Without a coder, ``/link`` answers with the top retrieved candidate.
+    With a coder, the coder chooses among the top-k candidates.
+    """
+
+    def __init__(
+        self,
+        retriever: CandidateRetriever,
+        coder: Any = None,
+        k: int = 20,
+        max_batch: int = 32,
+        max_wait: float = 0.01,
+        max_queue: int = 1024,
+        concurrency: int = 4,
+    ):
+        self.retriever = retriever
+        self.tools = LocalTools(retriever.table, retriever)
+        self.coder = coder
+        self.k = k
+        self.batcher = MicroBatcher(
+            self.link_batch,
+            max_batch=max_batch,
+            max_wait=max_wait,
+            max_queue=max_queue,
+            concurrency=concurrency,
+        )
+
+        self.started = time.time()
+        self.responses: Counter = Counter()
+        self.rejected = 0
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    async def link_batch(self, requests: list[CodingRequest]) -> list:
+        """Link one micro-batch of requests.
+
+        Args:
+            requests: Requests collected by the batcher
+
+        Returns:
+            Response payloads (or exceptions), aligned with ``requests``
+        """
+        candidates = await asyncio.to_thread(
+            self.retriever.retrieve_batch, [r.clinical_phrase for r in requests], self.k
+        )
+        for request, request_candidates in zip(requests, candidates, strict=True):
+            request.candidates = request_candidates
+
+        if self.coder is None:
+            return [_top_candidate(request) for request in requests]
+
+        results = await asyncio.gather(
+            *(self.coder.code(request) for request in requests), return_exceptions=True
+        )
+        return [
+            result if isinstance(result, Exception) else _link_payload(request, result.to_dict())
+            for request, result in zip(requests, results, strict=True)
+        ]
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple[int, str, str]:
+        """Answer one HTTP request.
+
+        Args:
+            method: HTTP method
+            target: Request target (path and query string)
+            body: Request body
+
+        Returns:
+            Tuple of (status, content type, response body)
+        """
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        endpoint = url.path.rstrip("/") or "/"
+
+        try:
+            if endpoint == "/metrics":
+                _require(method, "GET")
+                status, content_type, text = 200, "text/plain; version=0.0.4", self.metrics()
+            else:
+                payload = await self._route(method, endpoint, query, body)
+                status, content_type, text = 200, "application/json", json.dumps(payload)
+        except HTTPError as e:
+            status, content_type, text = e.status, "application/json", _error(e.message)
+        except Exception as e:
+            status, content_type, text = 500, "application/json", _error(str(e))
+
+        self.responses[(endpoint, status)] += 1
+        return status, content_type, text
+
+    async def _route(self, method: str, endpoint: str, query: dict, body: bytes) -> Any:
+        if endpoint == "/link":
+            _require(method, "POST")
+            return await self.link(_json_body(body))
+        if endpoint == "/search":
+            _require(method, "GET")
+            if not query.get("q"):
+                raise HTTPError(400, "Missing query parameter 'q'")
+            # The TF-IDF transform is CPU-bound; keep it off the event loop like /link
+            return await asyncio.to_thread(
+                self.tools.search_codes, query["q"], _int(query.get("k", "10"), "k")
+            )
+        if endpoint == "/lookup":
+            _require(method, "GET")
+            if not query.get("code"):
+                raise HTTPError(400, "Missing query parameter 'code'")
+            record = self.tools.lookup_code(query["code"])
+            if "error" in record:
+                raise HTTPError(404, f"Code not found: {record['code']}")
+            return record
+        if endpoint == "/health":
+            return {"status": "ok", "codes": len(self.retriever.table)}
+        raise HTTPError(404, f"Unknown endpoint: {endpoint}")
+
+    async def link(self, payload: dict) -> dict:
+        """Link one phrase, batched with concurrent ``/link`` requests.
+
+        Args:
+            payload: ``{"phrase": ..., "note": ..., "begin": ..., "end": ...}``;
+                only ``phrase`` is required
+
+        Returns:
+            The linked code with its description and candidates
+        """
+        phrase = payload.get("phrase") if isinstance(payload, dict) else None
+        if not isinstance(phrase, str) or not phrase.strip():
+            raise HTTPError(400, "Field 'phrase' is required")
+
+        request = CodingRequest(
+            clinical_phrase=phrase,
+            clinical_note=payload.get("note", ""),
+            begin=payload.get("begin"),
+            end=payload.get("end"),
+            request_id=payload.get("id"),
+        )
+
+        start = time.perf_counter()
+        try:
+            result = await self.batcher.submit(request)
+        except asyncio.QueueFull as e:
+            self.rejected += 1
+            raise HTTPError(503, "Link queue is full, retry later") from e
+        except BatcherClosed as e:
+            raise HTTPError(503, "Service is shutting down") from e
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def metrics(self) -> str:
+        """Service counters and link latency percentiles in Prometheus text format."""
+        lines = [
+            "# TYPE elinker_uptime_seconds gauge",
+            f"elinker_uptime_seconds {time.time() - self.started:.3f}",
+            "# TYPE elinker_responses_total counter",
+        ]
+        for (endpoint, status), count in sorted(self.responses.items()):
+            lines.append(
+                f'elinker_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+            )
+        lines += [
+            "# TYPE elinker_link_rejected_total counter",
+            f"elinker_link_rejected_total {self.rejected}",
+            "# TYPE elinker_link_queue_depth gauge",
+            f"elinker_link_queue_depth {self.batcher.depth}",
+            "# TYPE elinker_link_batches_total counter",
+            f"elinker_link_batches_total {self.batcher.batches}",
+            "# TYPE elinker_link_batched_requests_total counter",
+            f"elinker_link_batched_requests_total {self.batcher.items}",
+            "# TYPE elinker_link_latency_seconds summary",
+        ]
+        stats = percentiles("latency", list(self.latencies))
+        for key, value in stats.items():
+            if key != "latency_mean":
+                quantile = int(key.removeprefix("latency_p")) / 100
+                lines.append(f'elinker_link_latency_seconds{{quantile="{quantile}"}} {value}')
+        lines.append(f"elinker_link_latency_seconds_count {len(self.latencies)}")
+        lines.append(f"elinker_link_latency_seconds_sum {sum(self.latencies):.6f}")
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the HTTP/1.1 requests of one connection (keep-alive aware)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await _respond(writer, 400, "application/json", _error("Bad request line"))
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get("content-length") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await _respond(writer, 400, "application/json", _error("Bad Content-Length"))
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await _respond(writer, 413, "application/json", _error("Body too large"))
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, content_type, text = await self.dispatch(method, target, body)
+                keep_alive = _keep_alive(version, headers.get("connection", ""))
+                await _respond(writer, status, content_type, text, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.Server:
+        """Start listening; the caller runs ``serve_forever()`` on the result."""
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def close(self) -> None:
+        """Finish the batches in flight and fail the ``/link`` requests still queued."""
+        await self.batcher.close()
+
+
+def _fail(batch: list) -> None:
+    """Fail the futures of batched items that will not be processed."""
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(BatcherClosed("Batcher closed before the item was processed"))
+
+
+def _top_candidate(request: CodingRequest) -> dict:
+    """Retrieval-only link: the best scoring candidate."""
+    top = request.candidates[0] if request.candidates else None
+    result = {
+        "code": top.code if top else None,
+        "description": top.description if top else "",
+        "justification": "",
+    }
+    return _link_payload(request, result)
+
+
+def _link_payload(request: CodingRequest, result: dict) -> dict:
+    """Response body of a ``/link`` request."""
+    return {
+        "id": request.request_id,
+        "phrase": request.clinical_phrase,
+        "code": result["code"],
+        "description": result["description"],
+        "justification": result["justification"],
+        "candidates": [c.to_dict() for c in request.candidates or []],
+    }
+
+
+async def _respond(
+    writer: asyncio.StreamWriter,
+    status: int,
+    content_type: str,
+    text: str,
+    keep_alive: bool = False,
+) -> None:
+    body = text.encode("utf-8")
+    headers = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+def _keep_alive(version: str, connection: str) -> bool:
+    connection = connection.lower()
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+def _require(method: str, expected: str) -> None:
+    if method != expected:
+        raise HTTPError(405, f"Use {expected}")
+
+
+def _json_body(body: bytes) -> Any:
+    try:
+        return json.loads(body or b"{}")
+    except json.JSONDecodeError as e:
+        raise HTTPError(400, f"Invalid JSON: {e}") from e
+
+
+def _int(value: str, name: str) -> int:
+    try:
+        return int(value)
+    except ValueError as e:
+        raise HTTPError(400, f"Parameter '{name}' must be an integer") from e
+
+
+def _error(message: str) -> str:
+    return json.dumps({"error": message})
@@ -0,0 +1,146 @@
+"""Deterministic sharding of evaluation runs and merging of shard results."""
+
+import json
+import zlib
+from pathlib import Path
+
+from .runner import exemplar_scores, score_records
+
+SHARD_FILE = "shard.json"
+
+# Settings that must agree across the shards of one run
+_RUN_KEYS = (
+    "data",
+    "split",
+    "limit",
+    "mode",
+    "k",
+    "context_max_tokens",
+    "exemplars",
+    "exemplar_tokens",
+    "shards",
+    "total_examples",
+)
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parse an ``i/n`` shard spec into ``(i, n)`` with ``0 <= i < n``.
+
+    Raises:
+        ValueError: If the spec is malformed or out of range
+    """
+    index, _, count = spec.partition("/")
+    try:
+        shard, shards = int(index), int(count)
+    except ValueError as e:
+        raise ValueError(f"Invalid shard '{spec}', expected i/n such as 0/4") from e
+    if shards < 1 or not 0 <= shard < shards:
+        raise ValueError(f"Invalid shard '{spec}', need 0 <= i < n")
+    return shard, shards
+
+
+def shard_of(hadm_id, shards: int) -> int:
+    """Shard of an admission.
+
+    CRC-32 of the ID's string form is stable across processes, machines and
+    Python versions (unlike ``hash()``), and keeps all of an admission's notes
+    on one shard.
+    """
+    return zlib.crc32(str(hadm_id).encode("utf-8")) % shards
+
+
+def select_shard(examples: list[dict], shard: int, shards: int) -> list[int]:
+    """Positions of the examples that belong to a shard, in order."""
+    return [
+        idx for idx, row in enumerate(examples) if shard_of(row.get("hadm_id"), shards) == shard
+    ]
+
+
+def write_shard_info(output_dir: Path, info: dict) -> None:
+    """Write ``shard.json`` describing a shard run for :func:`merge_runs`.
+
+    Args:
+        output_dir: Shard run directory
+        info: Shard settings, example positions, context token totals and
+            exemplar counters
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / SHARD_FILE, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=4)
+
+
+def merge_runs(run_dirs: list[Path]) -> tuple[dict, str, list[dict]]:
+    """Combine shard runs into the result of a single-node run.
+
+    Predictions are put back in dataset order and rescored with the same
+    code as :func:`elinker.runner.run_evaluation`.
+
+    Args:
+        run_dirs: Shard run directories, each with ``shard.json`` and
+            ``predictions.jsonl``
+
+    Returns:
+        Tuple of (scores, classification report, prediction records)
+
+    Raises:
+        ValueError: If the shards disagree, repeat, or do not cover every example
+    """
+    if not run_dirs:
+        raise ValueError("No runs to merge")
+
+    infos = []
+    for run_dir in run_dirs:
+        path = run_dir / SHARD_FILE
+        if not path.is_file():
+            raise ValueError(f"{run_dir} is not a shard run (no {SHARD_FILE})")
+        with open(path, encoding="utf-8") as f:
+            infos.append(json.load(f))
+
+    first = infos[0]
+    for run_dir, info in zip(run_dirs, infos, strict=True):
+        for key in _RUN_KEYS:
+            if info.get(key) != first.get(key):
+                raise ValueError(
+                    f"{run_dir} has {key}={info.get(key)!r}, expected {first.get(key)!r}"
+                )
+
+    shard_ids = sorted(info["shard"] for info in infos)
+    if shard_ids != list(range(first["shards"])):
+        missing = sorted(set(range(first["shards"])) - set(shard_ids))
+        repeated = sorted({s for s in shard_ids if shard_ids.count(s) > 1})
+        raise ValueError(f"Incomplete shards: missing {missing}, repeated {repeated}")
+
+    merged: list[dict | None] = [None] * first["total_examples"]
+    for run_dir, info in zip(run_dirs, infos, strict=True):
+        with open(run_dir / "predictions.jsonl", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if len(records) != len(info["examples"]):
+            raise ValueError(
+                f"{run_dir} has {len(records)} predictions for {len(info['examples'])} examples"
+            )
+        for position, record in zip(info["examples"], records, strict=True):
+            if merged[position] is not None:
+                raise ValueError(f"Example {position} is predicted by more than one shard")
+            merged[position] = record
+
+    missing = [position for position, record in enumerate(merged) if record is None]
+    if missing:
+        raise ValueError(f"{len(missing)} examples have no prediction, e.g. {missing[:5]}")
+
+    scores, report = score_records(merged, first.get("k"))
+
+    if first.get("context_max_tokens") is not None:
+        selected = sum(info["context_selected_tokens"] for info in infos)
+        original = sum(info["context_original_tokens"] for info in infos)
+        scores["context_max_tokens"] = first["context_max_tokens"]
+        scores["context_reduction"] = round(1 - selected / original, 4) if original else 0.0
+
+    if first.get("exemplars") is not None:
+        # Each shard builds its own index, so index time is the sum over shards
+        totals = {
+            key: sum(info["exemplar_totals"][key] for info in infos)
+            for key in ("lookups", "exemplars", "tokens", "build_seconds", "lookup_seconds")
+        }
+        scores.update(exemplar_scores(totals))
+
+    return scores, report, merged
@@ -1,32 +1,206 @@
 """Interactive viewer for ICD-10 annotated clinical notes."""
 
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
 from pathlib import Path
 from typing import Any
 
 from rich.text import Text
 from textual.app import App, ComposeResult
-from textual.containers import Container, Horizontal, Vertical, VerticalScroll
+from textual.containers import Container, Vertical, VerticalScroll
+from textual.geometry import Region
 from textual.reactive import reactive
-from textual.widgets import Checkbox, Footer, Header, Static
+from textual.widgets import Footer, Header, Input, SelectionList, Static
+from textual.widgets.selection_list import Selection
+
+from .alignment import KINDS, SpanAlignment, align_admission, summarize
+
+_WORD = re.compile(r"\w+")
+
+# Orders of the code list, cycled with "s"
+SORTS = ("code", "count", "first")
+
+# Highlight of the selected codes' spans, gold and predicted
+GOLD_STYLE = "bold yellow on blue"
+PREDICTED_STYLE = "bold white on dark_magenta"
+
+# First category of each ICD-10-CM chapter (A00-B99, C00-D49, D50-D89, ...), sorted
+CHAPTER_STARTS = (
+    "A00",
+    "C00",
+    "D50",
+    "E00",
+    "F00",
+    "G00",
+    "H00",
+    "H60",
+    "I00",
+    "J00",
+    "K00",
+    "L00",
+    "M00",
+    "N00",
+    "O00",
+    "P00",
+    "Q00",
+    "R00",
+    "S00",
+    "U00",
+    "V00",
+    "Z00",
+)
+
+
+def chapter(group: "AnnotationGroup") -> str:
+    """Chapter of a code: its ICD-10-CM chapter range, or its ICD-10-PCS section."""
+    code = group.code.upper()
+    if "PCS" in group.code_system.upper() or not code[:1].isalpha():
+        return f"PCS {code[:1]}"
+    idx = bisect_right(CHAPTER_STARTS, code[:3]) - 1
+    return CHAPTER_STARTS[max(idx, 0)]
+
+
+class AnnotationTable:
+    """An admission's annotations as parallel integer columns.
+
+    Row ``i`` is one span: offsets ``begin[i]`` to ``end[i]`` in note
+    ``note[i]``, coded ``codes[code[i]]``; ``predicted[i]`` is 1 for a
+    predicted span shown next to the gold ones. Code strings, systems and
+    descriptions are stored once per distinct code, so a span costs four
+    machine integers and a byte rather than a dict. Rows are in text order,
+    with spans lacking offsets (``begin`` of -1) last: the first ``located``
+    rows are the spans that can be shown.
+    """
+
+    __slots__ = (
+        "begin",
+        "end",
+        "note",
+        "code",
+        "predicted",
+        "codes",
+        "code_systems",
+        "descriptions",
+        "code_ids",
+        "located",
+    )
+
+    def __init__(self):
+        self.begin = array("i")
+        self.end = array("i")
+        self.note = array("i")
+        self.code = array("i")  # Index into codes
+        self.predicted = array("b")  # 1 for predicted spans, 0 for gold ones
+        self.codes: list[str] = []
+        self.code_systems: list[str] = []
+        self.descriptions: list[str] = []  # First description seen for each code
+        self.code_ids: dict[str, int] = {}
+        self.located = 0
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def add(self, note_idx: int, annotation: dict, predicted: bool = False):
+        """Append an annotation dict as a row; call :meth:`sort` once all are added."""
+        code = annotation.get("code", "")
+        code_id = self.code_ids.get(code)
+        if code_id is None:
+            code_id = self.code_ids[code] = len(self.codes)
+            self.codes.append(code)
+            self.code_systems.append(sys.intern(annotation.get("code_system", "")))
+            self.descriptions.append(annotation.get("description", ""))
+
+        begin = annotation.get("begin")
+        end = annotation.get("end")
+        self.begin.append(-1 if begin is None else begin)
+        self.end.append(end if end is not None else -1 if begin is None else begin)
+        self.note.append(note_idx)
+        self.code.append(code_id)
+        self.predicted.append(predicted)
+
+    def sort(self):
+        """Put the rows in text order (note, begin, end, code), unlocated rows last."""
+        begin, end, note, code, codes = self.begin, self.end, self.note, self.code, self.codes
+        predicted = self.predicted
+        order = sorted(
+            range(len(code)),
+            key=lambda i: (begin[i] < 0, note[i], begin[i], end[i], predicted[i], codes[code[i]]),
+        )
+        if any(row != i for i, row in enumerate(order)):
+            for column in (begin, end, note, code, predicted):
+                column[:] = array(column.typecode, [column[row] for row in order])
+        self.located = sum(1 for value in begin if value >= 0)
+
+    def note_rows(self, note_idx: int) -> range:
+        """Rows of a note's located spans."""
+        return range(
+            bisect_left(self.note, note_idx, 0, self.located),
+            bisect_right(self.note, note_idx, 0, self.located),
+        )
 
 
 class AnnotationGroup:
     """Group of annotations sharing the same ICD-10 code."""
 
-    def __init__(self, code: str, code_system: str, description: str):
-        self.code = code
-        self.code_system = code_system
-        self.description = description
-        self.instances = []  # List of (note_idx, annotation_dict)
-
-    def add_instance(self, note_idx: int, annotation: dict):
-        """Add an annotation instance to this group."""
-        self.instances.append((note_idx, annotation))
+    __slots__ = (
+        "code_id",
+        "code",
+        "code_system",
+        "description",
+        "table",
+        "rows",
+        "predicted",
+        "conflicts",
+    )
+
+    def __init__(self, table: AnnotationTable, code_id: int):
+        self.code_id = code_id
+        self.code = table.codes[code_id]
+        self.code_system = table.code_systems[code_id]
+        self.description = table.descriptions[code_id]
+        self.table = table
+        self.rows = array("i")  # Rows of the table with this code, in text order
+        self.predicted = 0  # How many of the rows are predicted spans
+        self.conflicts = []  # Excludes conflicts with other codes of the admission
 
     @property
     def count(self) -> int:
-        """Total number of instances of this code."""
-        return len(self.instances)
+        """Number of gold instances of this code."""
+        return len(self.rows) - self.predicted
+
+    @property
+    def first(self) -> tuple[int, int]:
+        """(note index, begin) of the earliest instance."""
+        row = self.rows[0]
+        return self.table.note[row], max(self.table.begin[row], 0)
+
+    def label(self) -> Text:
+        """One-line label for the code list, with any conflicts flagged."""
+        # Format label: "S02.0XXB (ICD-10-CM): Fracture of vault of skull... (x3)"
+        label = (
+            f"[bold cyan]{self.code}[/bold cyan] "
+            f"({self.code_system}): "
+            f"{self.description[:50]}{'...' if len(self.description) > 50 else ''} "
+            f"[dim]({self.count})[/dim]"
+        )
+        if self.predicted:
+            label += f" [magenta]+{self.predicted} predicted[/magenta]"
+        for conflict in self.conflicts:
+            other = conflict.excluded if conflict.code == self.code else conflict.code
+            color = "red" if conflict.kind == "excludes1" else "yellow"
+            label += f" [{color}]⚠ {conflict.kind} {other}[/{color}]"
+        return Text.from_markup(label)
+
+    def matches(self, query: str) -> bool:
+        """Whether the code starts with, or the description contains, a lower-cased query."""
+        code = self.code.lower()
+        return (
+            code.startswith(query)
+            or code.replace(".", "").startswith(query.replace(".", ""))
+            or query in self.description.lower()
+        )
 
     def __repr__(self):
         return f"<AnnotationGroup {self.code}: {self.count} instances>"
@@ -35,52 +209,99 @@ class AnnotationGroup:
 class NoteData:
     """Processed note with character offset tracking."""
 
+    __slots__ = (
+        "note_id",
+        "category",
+        "description",
+        "text",
+        "rows",
+        "start_offset",
+        "end_offset",
+    )
+
     def __init__(
         self,
         note_id: int,
         category: str,
         description: str,
         text: str,
-        annotations: list,
         start_offset: int,
+        rows: range = range(0),
     ):
         self.note_id = note_id
         self.category = category
         self.description = description
         self.text = text
-        self.annotations = annotations
+        self.rows = rows  # Rows of the annotation table located in this note
         self.start_offset = start_offset  # Character offset in combined text
         self.end_offset = start_offset + len(text)
 
 
-class AnnotationItem(Horizontal):
-    """A clickable annotation item with checkbox showing ICD code."""
+class SearchIndex:
+    """Inverted index of word positions over an admission's concatenated notes.
 
-    def __init__(self, group: AnnotationGroup, group_id: int):
-        super().__init__(classes="annotation-item", id=f"annotation-item-{group_id}")
-        self.group = group
-        self.group_id = group_id
+    Built once per admission. A query matches at the start of any word that
+    begins with its first word (so "creat" finds "creatinine"), and the rest
+    of the query is checked in place, so lookups cost the number of
+    candidate positions rather than the length of the text.
 
-    def compose(self) -> ComposeResult:
-        """Create child widgets."""
-        # Format label: "S02.0XXB (ICD-10-CM): Fracture of vault of skull... (x3)"
-        label = (
-            f"[bold cyan]{self.group.code}[/bold cyan] "
-            f"({self.group.code_system}): "
-            f"{self.group.description[:50]}{'...' if len(self.group.description) > 50 else ''} "
-            f"[dim]({self.group.count})[/dim]"
-        )
+    Args:
+        text: Concatenated note text
+        starts: Offset of each note in ``text``; words never run across a
+            note boundary, so the first word of a note is indexed on its own
+    """
 
-        yield Checkbox(label, id=f"checkbox-{self.group_id}")
+    def __init__(self, text: str, starts: list[int] | None = None):
+        self.text = text.lower()
+        if len(self.text) != len(text):
+            # Keep offsets aligned when lower-casing changes a character's length
+            self.text = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        bounds = sorted(set(starts or []) | {0, len(text)})
+        postings: dict[str, array] = {}
+        for begin, end in zip(bounds, bounds[1:], strict=False):
+            for match in _WORD.finditer(self.text, begin, end):
+                postings.setdefault(match.group(), array("l")).append(match.start())
+        self.postings = postings
+        self.vocabulary = sorted(postings)
+
+    def search(self, query: str) -> list[tuple[int, int]]:
+        """Find a query, case-insensitively.
 
-    def on_checkbox_changed(self, event: Checkbox.Changed) -> None:
-        """Handle checkbox state changes."""
-        app = self.app
-        if isinstance(app, ICD10Viewer):
-            if event.value:
-                app.add_selected_group(self.group_id)
-            else:
-                app.remove_selected_group(self.group_id)
+        Args:
+            query: Text to find
+
+        Returns:
+            Sorted ``(begin, end)`` offsets into the concatenated text
+        """
+        query = query.lower().strip()
+        if not query:
+            return []
+        first = _WORD.match(query)
+        if first is None:
+            return self._scan(query)
+
+        word = first.group()
+        if first.end() == len(query):
+            # Single word: every word starting with it
+            lo = bisect_left(self.vocabulary, word)
+            hi = bisect_left(self.vocabulary, word + "\uffff")
+            words = self.vocabulary[lo:hi]
+        else:
+            words = [word] if word in self.postings else []
+
+        starts = sorted(start for w in words for start in self.postings[w])
+        return [
+            (start, start + len(query)) for start in starts if self.text.startswith(query, start)
+        ]
+
+    def _scan(self, query: str) -> list[tuple[int, int]]:
+        """Linear search, for queries that do not start with a word."""
+        matches = []
+        start = self.text.find(query)
+        while start >= 0:
+            matches.append((start, start + len(query)))
+            start = self.text.find(query, start + 1)
+        return matches
 
 
 class ICD10Viewer(App):
@@ -101,12 +322,22 @@ class ICD10Viewer(App):
 
     #annotations-panel {
         height: 40%;
-        padding: 1;
+        padding: 0 1;
         background: $panel;
         border: solid $primary;
         margin: 1 2;
     }
 
+    #code-filter {
+        margin: 0 0 1 0;
+    }
+
+    #code-list {
+        height: 1fr;
+        border: none;
+        padding: 0;
+    }
+
     #text-panel {
         height: 55%;
         padding: 1;
@@ -115,16 +346,6 @@ class ICD10Viewer(App):
         margin: 1 2;
     }
 
-    .annotation-item {
-        height: auto;
-        padding: 0;
-        margin: 0 0 0 0;
-    }
-
-    .annotation-item:hover {
-        background: $primary 10%;
-    }
-
     .note-header {
         height: auto;
         padding: 1;
@@ -141,61 +362,124 @@ class ICD10Viewer(App):
     .info-text {
         padding: 0 1;
     }
+
+    #search {
+        margin: 0 2;
+    }
     """
 
+    # Start on the annotation list, so "/" and n/N are not typed into the search bar
+    AUTO_FOCUS = "#code-list"
+
+    BINDINGS = [
+        ("/", "focus_search", "Search"),
+        ("n", "next_match", "Next match"),
+        ("N", "previous_match", "Previous match"),
+        ("f", "focus_filter", "Filter codes"),
+        ("s", "cycle_sort", "Sort codes"),
+        ("a", "select_shown", "Select shown"),
+        ("d", "deselect_shown", "Deselect shown"),
+        ("c", "toggle_chapter", "Toggle chapter"),
+        ("j", "next_span", "Next span"),
+        ("k", "previous_span", "Previous span"),
+    ]
+
     # Reactive properties
     selected_groups: reactive[set] = reactive(set())
 
-    def __init__(self, data: dict, file_path: Path):
+    def __init__(self, data: dict, file_path: Path, exclusions=None):
         super().__init__()
-        self.data = data
         self.file_path = file_path
+        self.exclusions = exclusions  # Optional ExclusionIndex for conflict checks
 
         # Process data
         self.hadm_id = data.get("hadm_id", "Unknown")
         self.annotation_groups = {}  # code -> AnnotationGroup
         self.notes = []  # List of NoteData
 
-        self._process_data()
+        # Search state
+        self.matches = []  # List of (note_idx, begin, end) in note offsets
+        self.match_index = -1  # Current match, -1 when there are none
+        self._note_matches = {}  # note_idx -> [(begin, end)] currently highlighted
+
+        # Code list state
+        self.code_filter = ""
+        self.sort = SORTS[0]
+        self.shown = []  # Group ids listed, in display order
 
-    def _process_data(self):
+        # Span navigation state
+        self.span_index = -1  # Index into self.spans of the span jumped to, -1 before any
+        self._span_route = None  # Sorted indices into self.spans of the selected codes
+
+        # Only the note fields and annotation table are kept, not the JSON itself
+        self._process_data(data)
+
+    def _process_data(self, data: dict):
         """Transform JSON data into viewer-friendly structure."""
-        # Build annotation groups and note data
+        # Build note data and the annotation table
         current_offset = 0
+        self.table = AnnotationTable()
 
-        for note_idx, note_dict in enumerate(self.data.get("notes", [])):
+        for note_idx, note_dict in enumerate(data.get("notes", [])):
             # Create note data
             note_data = NoteData(
                 note_id=note_dict.get("note_id", note_idx),
                 category=note_dict.get("category", "Unknown"),
                 description=note_dict.get("description", ""),
                 text=note_dict.get("text", ""),
-                annotations=note_dict.get("annotations", []),
                 start_offset=current_offset,
             )
             self.notes.append(note_data)
             current_offset = note_data.end_offset
 
-            # Group annotations by code
             for annotation in note_dict.get("annotations", []):
-                code = annotation.get("code", "")
-
-                if code not in self.annotation_groups:
-                    self.annotation_groups[code] = AnnotationGroup(
-                        code=code,
-                        code_system=annotation.get("code_system", ""),
-                        description=annotation.get("description", ""),
-                    )
+                self.table.add(note_idx, annotation)
+            for annotation in self._predicted_annotations(note_idx):
+                self.table.add(note_idx, annotation, predicted=True)
+
+        table = self.table
+        table.sort()
+        for note_idx, note in enumerate(self.notes):
+            note.rows = table.note_rows(note_idx)
+
+        # Group annotations by code
+        groups = [AnnotationGroup(table, code_id) for code_id in range(len(table.codes))]
+        for row, code_id in enumerate(table.code):
+            groups[code_id].rows.append(row)
+            groups[code_id].predicted += table.predicted[row]
+        self.annotation_groups = {group.code: group for group in groups}
+        self.gold_codes = sum(1 for group in groups if group.count)
+
+        # Sort groups by code; a group's id is its index here
+        self.sorted_groups = sorted(groups, key=lambda g: g.code)
+
+        # Search index over the concatenated text, located by note offsets
+        self._note_starts = [note.start_offset for note in self.notes]
+        self.search_index = SearchIndex(
+            "".join(note.text for note in self.notes), self._note_starts
+        )
 
-                self.annotation_groups[code].add_instance(note_idx, annotation)
+        # Navigable spans, in text order: the table's located rows
+        self.spans = range(table.located)
 
-        # Sort groups by code
-        self.sorted_groups = sorted(self.annotation_groups.values(), key=lambda g: g.code)
+        # Flag Excludes1/Excludes2 conflicts between the admission's codes
+        self.conflicts = []
+        if self.exclusions is not None:
+            # Between gold codes only; predicted codes are not part of the admission
+            self.conflicts = self.exclusions.conflicts(
+                [g.code for g in self.sorted_groups if g.count]
+            )
+            for conflict in self.conflicts:
+                self.annotation_groups[conflict.code].conflicts.append(conflict)
+                self.annotation_groups[conflict.excluded].conflicts.append(conflict)
 
     def compose(self) -> ComposeResult:
         """Create child widgets."""
         yield Header()
         yield self._create_file_info()
+        yield Input(
+            placeholder="Search notes (/ to search, n / N for next / previous match)", id="search"
+        )
         yield self._create_annotations_panel()
         yield self._create_text_panel()
         yield Footer()
@@ -206,27 +490,69 @@ class ICD10Viewer(App):
             f"[bold]File:[/bold] {self.file_path.name}  |  "
             f"[bold]HADM ID:[/bold] {self.hadm_id}  |  "
             f"[bold]Notes:[/bold] {len(self.notes)}  |  "
-            f"[bold]Unique Codes:[/bold] {len(self.annotation_groups)}"
+            f"[bold]Unique Codes:[/bold] {self.gold_codes}"
         )
+        if self.exclusions is not None:
+            color = "red" if self.conflicts else "green"
+            info_text += f"  |  [bold]Conflicts:[/bold] [{color}]{len(self.conflicts)}[/{color}]"
 
         container = Vertical(Static(info_text, classes="info-text"), id="file-info")
         container.border_title = "Document Information"
         return container
 
     def _create_annotations_panel(self) -> Container:
-        """Create panel showing grouped annotations."""
-        widgets = []
+        """Create panel listing the annotation groups.
 
+        The list only renders the rows in view, so admissions with hundreds
+        of codes stay responsive; filtering and sorting rebuild its options.
+        """
         if not self.sorted_groups:
-            widgets.append(Static("No annotations found", classes="annotation-item"))
+            widgets = [Static("No annotations found", classes="info-text")]
         else:
-            for idx, group in enumerate(self.sorted_groups):
-                widgets.append(AnnotationItem(group, idx))
-
-        container = VerticalScroll(*widgets, id="annotations-panel")
-        container.border_title = f"Annotations by ICD-10 Code ({len(self.sorted_groups)} codes)"
+            self.shown = self.visible_groups()
+            widgets = [
+                Input(placeholder="Filter by code prefix or description (f)", id="code-filter"),
+                SelectionList[int](*self._selections(), id="code-list"),
+            ]
+
+        container = Vertical(*widgets, id="annotations-panel")
+        container.border_title = self._annotations_title()
         return container
 
+    def visible_groups(self) -> list[int]:
+        """Ids of the groups matching the code filter, in the current sort order."""
+        query = self.code_filter.strip().lower()
+        ids = [
+            idx for idx, group in enumerate(self.sorted_groups) if not query or group.matches(query)
+        ]
+        if self.sort == "count":
+            ids.sort(key=lambda idx: -self.sorted_groups[idx].count)
+        elif self.sort == "first":
+            ids.sort(key=lambda idx: self.sorted_groups[idx].first)
+        return ids
+
+    def _selections(self) -> list[Selection]:
+        return [
+            Selection(self.sorted_groups[idx].label(), idx, idx in self.selected_groups)
+            for idx in self.shown
+        ]
+
+    def _annotations_title(self) -> str:
+        total = len(self.sorted_groups)
+        if len(self.shown) == total:
+            return f"Annotations by ICD-10 Code ({total} codes, by {self.sort})"
+        return f"Annotations by ICD-10 Code ({len(self.shown)} of {total} codes, by {self.sort})"
+
+    def _refresh_code_list(self):
+        """Rebuild the code list after the filter or sort order changed."""
+        self.shown = self.visible_groups()
+        if not self.is_running or not self.sorted_groups:
+            return
+        code_list = self.query_one("#code-list", SelectionList)
+        code_list.clear_options()
+        code_list.add_options(self._selections())
+        self.query_one("#annotations-panel").border_title = self._annotations_title()
+
     def _create_text_panel(self) -> Container:
         """Create panel showing all notes with text."""
         widgets = []
@@ -261,93 +587,452 @@ class ICD10Viewer(App):
         new_selected.discard(group_id)
         self.selected_groups = new_selected
 
+    def filter_codes(self, query: str):
+        """Show only codes starting with, or described by, a query."""
+        self.code_filter = query
+        self._refresh_code_list()
+
+    def action_focus_filter(self):
+        """Focus the code filter."""
+        if self.sorted_groups:
+            self.query_one("#code-filter", Input).focus()
+
+    def action_cycle_sort(self):
+        """Sort the code list by code, count (descending) or first occurrence."""
+        self.sort = SORTS[(SORTS.index(self.sort) + 1) % len(SORTS)]
+        self._refresh_code_list()
+
+    def action_select_shown(self):
+        """Select every code matching the filter."""
+        self.selected_groups = set(self.selected_groups) | set(self.shown)
+
+    def action_deselect_shown(self):
+        """Deselect every code matching the filter."""
+        self.selected_groups = set(self.selected_groups) - set(self.shown)
+
+    def action_toggle_chapter(self):
+        """Select the highlighted code's chapter, or deselect it if fully selected."""
+        if not self.is_running or not self.sorted_groups:
+            return
+        highlighted = self.query_one("#code-list", SelectionList).highlighted
+        if highlighted is None:
+            return
+        target = chapter(self.sorted_groups[self.shown[highlighted]])
+        ids = {idx for idx, group in enumerate(self.sorted_groups) if chapter(group) == target}
+        if ids <= self.selected_groups:
+            self.selected_groups = set(self.selected_groups) - ids
+        else:
+            self.selected_groups = set(self.selected_groups) | ids
+
+    def on_selection_list_selection_toggled(self, event: SelectionList.SelectionToggled) -> None:
+        """Handle a code being ticked or unticked."""
+        group_id = event.selection.value
+        if group_id in event.selection_list.selected:
+            self.add_selected_group(group_id)
+        else:
+            self.remove_selected_group(group_id)
+
+    def search(self, query: str):
+        """Find a query in all notes, highlight the hits and jump to the first."""
+        self.matches = []
+        for begin, end in self.search_index.search(query):
+            note_idx = bisect_right(self._note_starts, begin) - 1
+            note = self.notes[note_idx]
+            # Skip hits that straddle two notes
+            if end <= note.end_offset:
+                self.matches.append((note_idx, begin - note.start_offset, end - note.start_offset))
+
+        self.match_index = 0 if self.matches else -1
+        self._update_search_status(query)
+        # Only notes that had or have hits change
+        changed = set(self._note_matches) | {note_idx for note_idx, _, _ in self.matches}
+        self._update_text_highlighting(changed)
+        self._scroll_to_match()
+
+    def action_focus_search(self):
+        """Focus the search bar."""
+        self.query_one("#search", Input).focus()
+
+    def action_next_match(self):
+        """Jump to the next search hit, wrapping around."""
+        self._step_match(1)
+
+    def action_previous_match(self):
+        """Jump to the previous search hit, wrapping around."""
+        self._step_match(-1)
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        """Search or filter as the query is typed."""
+        if event.input.id == "search":
+            self.search(event.value)
+        elif event.input.id == "code-filter":
+            self.filter_codes(event.value)
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        """Leave the search bar so n/N navigate the hits, or the filter for the list."""
+        if event.input.id == "search":
+            self.query_one("#text-panel").focus()
+        elif event.input.id == "code-filter":
+            self.query_one("#code-list").focus()
+
+    def _step_match(self, step: int):
+        if not self.matches:
+            return
+        previous = self.matches[self.match_index][0]
+        self.match_index = (self.match_index + step) % len(self.matches)
+        self._update_search_status(self.query_one("#search", Input).value)
+        # Only the notes holding the old and new current hit change
+        self._update_text_highlighting({previous, self.matches[self.match_index][0]})
+        self._scroll_to_match()
+
+    def _update_search_status(self, query: str):
+        if not self.is_running:
+            return
+        search = self.query_one("#search", Input)
+        if not query.strip():
+            search.border_title = None
+        elif self.matches:
+            search.border_title = f"Match {self.match_index + 1} of {len(self.matches)}"
+        else:
+            search.border_title = "No matches"
+
+    def action_next_span(self):
+        """Jump to the next span of the selected codes (of any code if none are selected)."""
+        self._step_span(1)
+
+    def action_previous_span(self):
+        """Jump to the previous span of the selected codes (of any code if none are selected)."""
+        self._step_span(-1)
+
+    def span_route(self) -> list[int]:
+        """Sorted indices into ``spans`` that span navigation visits."""
+        if self._span_route is None:
+            if not self.selected_groups:
+                self._span_route = list(self.spans)
+            else:
+                located = self.table.located
+                self._span_route = sorted(
+                    row
+                    for idx in self.selected_groups
+                    for row in self.sorted_groups[idx].rows
+                    if row < located
+                )
+        return self._span_route
+
+    def _step_span(self, step: int):
+        route = self.span_route()
+        if not route:
+            return
+        # Bisect from the span last jumped to, which need not be on the route
+        if step > 0:
+            position = bisect_right(route, self.span_index) % len(route)
+        else:
+            position = (bisect_left(route, self.span_index) - 1) % len(route)
+
+        # Only the notes holding the old and new span change
+        changed = {self._span_at(self.span_index)[0]} if self.span_index >= 0 else set()
+        self.span_index = route[position]
+        note_idx, begin, _ = self._span_at(self.span_index)
+        changed.add(note_idx)
+        if self.is_running:
+            panel = self.query_one("#text-panel")
+            label = self._span_label(self.span_index)
+            panel.border_subtitle = f"Span {position + 1} of {len(route)}: {label}"
+        self._update_text_highlighting(changed)
+        self._scroll_to(note_idx, begin)
+
+    def _predicted_annotations(self, note_idx: int) -> list[dict]:
+        """Predicted spans of a note, listed and highlighted apart from the gold ones."""
+        return []
+
+    def _span_at(self, idx: int) -> tuple[int, int, int]:
+        """(note index, begin, end) of a span, in note offsets."""
+        table = self.table
+        return table.note[idx], table.begin[idx], table.end[idx]
+
+    def _note_styles(self, note_idx: int) -> list[tuple[int, int, str]]:
+        """Styles that always apply to a note's text, as (begin, end, style)."""
+        return []
+
+    def _span_label(self, idx: int) -> str:
+        """Label of a span in the text panel's subtitle while navigating."""
+        return self.table.codes[self.table.code[idx]]
+
+    def _scroll_to_match(self):
+        """Scroll the text panel to the line of the current hit."""
+        if self.match_index >= 0:
+            self._scroll_to(*self.matches[self.match_index][:2])
+
+    def _scroll_to(self, note_idx: int, begin: int):
+        """Scroll the text panel so an offset of a note is in view, centered."""
+        if not self.is_running:
+            return
+        note = self.notes[note_idx]
+        try:
+            text_widget = self.query_one(f"#note-text-{note.note_id}", Static)
+        except Exception:
+            return
+        line = note.text.count("\n", 0, begin)
+        top = text_widget.virtual_region.y + text_widget.gutter.top
+        panel = self.query_one("#text-panel", VerticalScroll)
+        panel.scroll_to_region(
+            Region(0, top + line, text_widget.size.width, 1), animate=False, center=True
+        )
+
     def watch_selected_groups(self, new_value: set):
         """React to changes in selected annotation groups."""
-        if not self.is_mounted:
+        self._span_route = None
+        if not self.is_running:
             return
 
-        # Update checkbox states
-        for idx in range(len(self.sorted_groups)):
-            try:
-                checkbox = self.query_one(f"#checkbox-{idx}", Checkbox)
-                checkbox.value = idx in new_value
-            except Exception:
-                pass
+        # Update the ticks of the listed codes
+        for code_list in self.query("#code-list").results(SelectionList):
+            for idx in self.shown:
+                if idx in new_value:
+                    code_list.select(idx)
+                else:
+                    code_list.deselect(idx)
 
         # Update text highlighting
         self._update_text_highlighting()
 
-    def _update_text_highlighting(self):
-        """Update text highlighting based on selected groups."""
+    def _update_text_highlighting(self, note_indices: set | None = None):
+        """Update text highlighting based on selected groups and search hits.
+
+        Args:
+            note_indices: Notes to redraw (all by default)
+        """
         # Get selected annotation groups
         selected_codes = set()
         for group_id in self.selected_groups:
             if group_id < len(self.sorted_groups):
-                selected_codes.add(self.sorted_groups[group_id].code)
+                selected_codes.add(self.sorted_groups[group_id].code_id)
+
+        # Group search hits by note
+        note_matches = {}
+        for note_idx, begin, end in self.matches:
+            note_matches.setdefault(note_idx, []).append((begin, end))
+        current = self.matches[self.match_index] if self.match_index >= 0 else None
+        span = self._span_at(self.span_index) if self.span_index >= 0 else None
+
+        if note_indices is None:
+            note_indices = set(range(len(self.notes)))
+        self._note_matches = note_matches
 
         # Update each note
-        for note in self.notes:
+        for note_idx in sorted(note_indices):
+            note = self.notes[note_idx]
             try:
                 text_widget = self.query_one(f"#note-text-{note.note_id}", Static)
 
-                if not selected_codes:
+                matches = note_matches.get(note_idx, [])
+                styles = self._note_styles(note_idx)
+                focused = None
+                if span and span[0] == note_idx:
+                    focused = span[1:]
+                if not selected_codes and not matches and not focused and not styles:
                     # No selection - show plain text
                     text_widget.update(note.text)
                 else:
-                    # Highlight matching annotations
+                    # Highlight matching annotations, search hits and the focused span
                     highlighted = self._highlight_text(
-                        note.text, note.annotations, selected_codes
+                        note.text,
+                        note.rows,
+                        selected_codes,
+                        matches=matches,
+                        current=current[1:] if current and current[0] == note_idx else None,
+                        focused=focused,
+                        styles=styles,
                     )
                     text_widget.update(highlighted)
             except Exception:
                 pass
 
     def _highlight_text(
-        self, text: str, annotations: list, selected_codes: set
+        self,
+        text: str,
+        rows: range,
+        selected_codes: set,
+        matches: list | None = None,
+        current: tuple | None = None,
+        focused: tuple | None = None,
+        styles: list | None = None,
     ) -> Text:
-        """Apply highlighting to text based on selected codes.
+        """Apply highlighting to text based on selected codes and search hits.
 
         Args:
             text: Original note text
-            annotations: List of annotation dicts
-            selected_codes: Set of ICD codes to highlight
+            rows: Rows of the annotation table in this note
+            selected_codes: Code ids (indices into ``table.codes``) to highlight;
+                predicted spans get their own style
+            matches: Search hits as (begin, end) offsets in the note
+            current: The current search hit, highlighted more strongly
+            focused: The span last jumped to, as (begin, end), shown reversed
+            styles: (begin, end, style) spans laid under all other highlighting
 
         Returns:
             Rich Text object with markup
         """
-        # Collect spans to highlight
-        highlight_spans = []
-        for annotation in annotations:
-            if annotation.get("code") in selected_codes:
-                begin = annotation.get("begin", 0)
-                end = annotation.get("end", 0)
-
-                # Validate positions
-                if 0 <= begin < len(text) and begin < end <= len(text):
-                    highlight_spans.append(
-                        {"begin": begin, "end": end, "code": annotation.get("code")}
-                    )
+        rich_text = Text(text)
+        for begin, end, style in styles or []:
+            rich_text.stylize(style, begin, end)
+
+        # Highlight the selected codes' spans
+        table = self.table
+        if selected_codes:
+            for row in rows:
+                if table.code[row] in selected_codes:
+                    begin = table.begin[row]
+                    end = table.end[row]
+
+                    # Validate positions
+                    if 0 <= begin < len(text) and begin < end <= len(text):
+                        style = PREDICTED_STYLE if table.predicted[row] else GOLD_STYLE
+                        rich_text.stylize(style, begin, end)
+
+        # Overlay search hits on top of annotation highlights
+        for begin, end in matches or []:
+            style = "bold black on bright_yellow" if (begin, end) == current else "black on yellow"
+            rich_text.stylize(style, begin, end)
+
+        if focused:
+            rich_text.stylize("reverse", *focused)
+
+        return rich_text
 
-        # Sort by position
-        highlight_spans.sort(key=lambda x: x["begin"])
 
-        # Build Rich Text with highlighting
-        rich_text = Text()
-        last_pos = 0
+class DiffSpan:
+    """The offsets and codes of a :class:`~elinker.alignment.SpanAlignment`."""
 
-        for span in highlight_spans:
-            # Add text before highlight
-            if span["begin"] > last_pos:
-                rich_text.append(text[last_pos : span["begin"]])
+    __slots__ = ("kind", "begin", "end", "gold_code", "predicted_code")
 
-            # Add highlighted text
-            highlighted_segment = text[span["begin"] : span["end"]]
-            rich_text.append(highlighted_segment, style="bold yellow on blue")
+    def __init__(self, alignment: SpanAlignment):
+        self.kind = alignment.kind
+        self.begin = alignment.begin
+        self.end = alignment.end
+        self.gold_code = alignment.gold_code
+        self.predicted_code = alignment.predicted_code
 
-            last_pos = span["end"]
 
-        # Add remaining text
-        if last_pos < len(text):
-            rich_text.append(text[last_pos:])
+class DiffViewer(ICD10Viewer):
+    """Viewer of an admission's gold annotations against predicted spans.
 
-        return rich_text
+    Spans are colored by how they align: true positives green, wrong-code
+    matches magenta, false positives red and false negatives yellow.
+    Predicted codes that are not gold join the code list, counted and
+    highlighted apart from the gold ones, and j / k step through the errors
+    until codes are selected.
+    """
+
+    CSS = (
+        ICD10Viewer.CSS
+        + """
+    #diff-summary {
+        height: auto;
+        padding: 0 1;
+        background: $panel;
+        border: solid $primary;
+        margin: 0 2;
+    }
+
+    #annotations-panel {
+        height: 30%;
+    }
+    """
+    )
+
+    COLORS = {"tp": "green", "wrong_code": "magenta", "fp": "red", "fn": "yellow"}
+    LABELS = {
+        "tp": "True positive",
+        "wrong_code": "Wrong code",
+        "fp": "False positive",
+        "fn": "False negative",
+    }
+
+    def __init__(self, data: dict, file_path: Path, records: list[dict], exclusions=None):
+        alignments = align_admission(data, records)  # Per note
+        self.summary = summarize([a for note in alignments for a in note])
+        # Predicted-only spans join the table, so their codes can be selected
+        self._predicted = [
+            [a.predicted for a in note if a.kind in ("fp", "wrong_code")] for note in alignments
+        ]
+        # Keep offsets and codes only, not the gold and predicted dicts
+        self.alignments = [[DiffSpan(a) for a in note] for note in alignments]
+        super().__init__(data, file_path, exclusions=exclusions)
+        self._predicted = None
+
+    def _predicted_annotations(self, note_idx: int) -> list[dict]:
+        return self._predicted[note_idx]
+
+    def _process_data(self, data: dict):
+        super()._process_data(data)
+
+        # Navigate alignments rather than annotations, as (note index, alignment)
+        self.spans = sorted(
+            (
+                (note_idx, a)
+                for note_idx, note in enumerate(self.notes)
+                for a in self.alignments[note_idx]
+            ),
+            key=lambda span: (self.notes[span[0]].start_offset + span[1].begin, span[1].end),
+        )
+        self._styles = [
+            [(a.begin, a.end, f"bold underline {self.COLORS[a.kind]}") for a in alignments]
+            for alignments in self.alignments
+        ]
+
+    def compose(self) -> ComposeResult:
+        """Create child widgets, with the diff summary under the file information."""
+        for widget in super().compose():
+            yield widget
+            if widget.id == "file-info":
+                yield self._create_summary_panel()
+
+    def _create_summary_panel(self) -> Container:
+        summary = self.summary
+        counts = "  |  ".join(
+            f"[{self.COLORS[kind]}]{self.LABELS[kind]}: {summary[kind]}[/{self.COLORS[kind]}]"
+            for kind in KINDS
+        )
+        matched = f"{summary['exact']} exact, {summary['overlapping']} overlapping"
+        predicted_only = len(self.annotation_groups) - self.gold_codes
+        info_text = (
+            f"{counts}\n"
+            f"[bold]Matched:[/bold] {matched}  |  "
+            f"[bold]Predicted-only codes:[/bold] {predicted_only}  |  "
+            f"[bold]Precision:[/bold] {summary['precision']:.2%}  "
+            f"[bold]Recall:[/bold] {summary['recall']:.2%}  "
+            f"[bold]F1:[/bold] {summary['f1']:.2%}"
+        )
+        container = Vertical(Static(info_text, classes="info-text"), id="diff-summary")
+        container.border_title = "Gold vs. Predicted"
+        return container
+
+    def span_route(self) -> list[int]:
+        """Sorted indices into ``spans``: errors, or any alignment of the selected codes."""
+        if self._span_route is None:
+            codes = {self.sorted_groups[idx].code for idx in self.selected_groups}
+            self._span_route = [
+                idx
+                for idx, (_, alignment) in enumerate(self.spans)
+                if (
+                    codes & {alignment.gold_code, alignment.predicted_code}
+                    if codes
+                    else alignment.kind != "tp"
+                )
+            ]
+        return self._span_route
+
+    def _span_at(self, idx: int) -> tuple[int, int, int]:
+        note_idx, alignment = self.spans[idx]
+        return note_idx, alignment.begin, alignment.end
+
+    def _note_styles(self, note_idx: int) -> list[tuple[int, int, str]]:
+        return self._styles[note_idx]
+
+    def _span_label(self, idx: int) -> str:
+        alignment = self.spans[idx][1]
+        label = self.LABELS[alignment.kind]
+        if alignment.kind == "wrong_code":
+            return f"{label}: gold {alignment.gold_code}, predicted {alignment.predicted_code}"
+        return f"{label}: {alignment.gold_code or alignment.predicted_code}"
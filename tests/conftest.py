@@ -20,3 +20,74 @@ def plain_console():
     output = StringIO()
     console = Console(file=output, force_terminal=False, legacy_windows=False)
     return console, output
+
+
+@pytest.fixture
+def code_records():
+    """A small slice of ``diagnoses_recursive.json`` records."""
+    return [
+        {
+            "code": "E11",
+            "description": "Type 2 diabetes mellitus",
+            "parent_code": None,
+            "level": 0,
+            "is_billable": False,
+            "inclusion_terms": ["diabetes (mellitus) due to insulin secretory defect"],
+        },
+        {
+            "code": "E11.9",
+            "description": "Type 2 diabetes mellitus without complications",
+            "parent_code": "E11",
+            "level": 1,
+            "is_billable": True,
+            "inclusion_terms": [],
+        },
+        {
+            "code": "I10",
+            "description": "Essential (primary) hypertension",
+            "parent_code": None,
+            "level": 0,
+            "is_billable": True,
+            "inclusion_terms": ["high blood pressure", "hypertension (arterial) (benign)"],
+        },
+        {
+            "code": "I50",
+            "description": "Heart failure",
+            "parent_code": None,
+            "level": 0,
+            "is_billable": False,
+            "inclusion_terms": [],
+        },
+        {
+            "code": "I50.33",
+            "description": "Acute on chronic diastolic (congestive) heart failure",
+            "parent_code": "I50",
+            "level": 1,
+            "is_billable": True,
+            "inclusion_terms": [],
+        },
+        {
+            "code": "J44.1",
+            "description": "Chronic obstructive pulmonary disease with (acute) exacerbation",
+            "parent_code": None,
+            "level": 0,
+            "is_billable": True,
+            "inclusion_terms": [],
+        },
+        {
+            "code": "N17.9",
+            "description": "Acute kidney failure, unspecified",
+            "parent_code": None,
+            "level": 0,
+            "is_billable": True,
+            "inclusion_terms": [],
+        },
+    ]
+
+
+@pytest.fixture
+def code_table(code_records):
+    """A CodeTable built from ``code_records``."""
+    from elinker.codes import CodeTable
+
+    return CodeTable(code_records)
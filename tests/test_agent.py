@@ -0,0 +1,206 @@
+"""Tests for the in-process tool-using coder."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from elinker.agent import TOOL_DEFINITIONS, LocalTools, ToolUsingCoder, parse_answer
+from elinker.coders import CodingRequest
+
+ANSWER = """<answer>
+<icd10_code>N17.9</icd10_code>
+<description>Acute kidney failure, unspecified</description>
+<justification>Documented AKI.</justification>
+</answer>"""
+
+
+def tool_use(block_id: str, name: str, arguments: dict):
+    """Build a fake tool_use content block."""
+    return SimpleNamespace(type="tool_use", id=block_id, name=name, input=arguments)
+
+
+class ScriptedMessages:
+    """Replies with a scripted sequence of responses."""
+
+    def __init__(self, responses: list):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=self.responses.pop(0))
+
+    def stream(self, **kwargs):
+        self.calls.append(kwargs)
+        return ScriptedStream(SimpleNamespace(content=self.responses.pop(0)))
+
+
+class ScriptedStream:
+    """Streams a scripted response as a single content delta."""
+
+    def __init__(self, response):
+        self.response = response
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        yield SimpleNamespace(type="message_start")
+        yield SimpleNamespace(type="content_block_delta")
+
+    async def get_final_message(self):
+        return self.response
+
+
+class TestLocalTools:
+    """Test the local tool implementations."""
+
+    def test_search_codes(self, code_table):
+        """Test searching returns billable codes."""
+        tools = LocalTools(code_table)
+        results = tools.search_codes("acute kidney failure", max_results=2)
+        assert results[0] == {"code": "N17.9", "description": "Acute kidney failure, unspecified"}
+        assert len(results) == 2
+
+    def test_validate_code(self, code_table):
+        """Test validation of known, category and unknown codes."""
+        tools = LocalTools(code_table)
+        assert tools.validate_code("e11.9 ")["billable"] is True
+        assert tools.validate_code("E11") == {
+            "code": "E11",
+            "valid": True,
+            "billable": False,
+            "description": "Type 2 diabetes mellitus",
+        }
+        assert tools.validate_code("Z99.99")["valid"] is False
+
+    def test_lookup_code(self, code_table):
+        """Test looking up code details."""
+        tools = LocalTools(code_table)
+        details = tools.lookup_code("I10")
+        assert details["description"] == "Essential (primary) hypertension"
+        assert "high blood pressure" in details["inclusion_terms"]
+        assert tools.lookup_code("Z99.99")["error"] == "Code not found"
+
+    def test_results_are_memoized(self, code_table):
+        """Test that repeated validations and lookups hit the cache."""
+        tools = LocalTools(code_table)
+        calls = []
+        original_get = code_table.get
+
+        def counting_get(code):
+            calls.append(code)
+            return original_get(code)
+
+        code_table.get = counting_get
+        for _ in range(3):
+            tools.validate_code("I10")
+            tools.lookup_code("I10")
+
+        assert calls == ["I10", "I10"]
+
+    def test_execute_keeps_order_and_reports_errors(self, code_table):
+        """Test that concurrent execution returns results in call order."""
+        tools = LocalTools(code_table)
+        blocks = [
+            tool_use("a", "validate_code", {"code": "I10"}),
+            tool_use("b", "unknown_tool", {}),
+            tool_use("c", "lookup_code", {"code": "N17.9"}),
+        ]
+        results = asyncio.run(tools.execute(blocks))
+
+        assert [r["tool_use_id"] for r in results] == ["a", "b", "c"]
+        assert json.loads(results[0]["content"])["billable"] is True
+        assert results[1]["is_error"] is True
+
+    def test_only_search_runs_in_a_thread(self, code_table, monkeypatch):
+        """Test that dict lookups answer inline and search_codes is offloaded."""
+        tools = LocalTools(code_table)
+        threaded = []
+
+        async def to_thread(func, *args):
+            threaded.append(args[0])
+            return func(*args)
+
+        monkeypatch.setattr(asyncio, "to_thread", to_thread)
+        blocks = [
+            tool_use("a", "validate_code", {"code": "I10"}),
+            tool_use("b", "search_codes", {"query": "hypertension"}),
+            tool_use("c", "lookup_code", {"code": "I10"}),
+        ]
+        asyncio.run(tools.execute(blocks))
+
+        assert threaded == ["search_codes"]
+
+
+class TestToolUsingCoder:
+    """Test the agent loop."""
+
+    def test_runs_parallel_tool_turn_then_answers(self, code_table):
+        """Test a turn with several tool calls followed by the answer."""
+        messages = ScriptedMessages(
+            [
+                [
+                    tool_use("t1", "search_codes", {"query": "AKI"}),
+                    tool_use("t2", "validate_code", {"code": "N17.9"}),
+                    tool_use("t3", "lookup_code", {"code": "N17.9"}),
+                ],
+                [SimpleNamespace(type="text", text=ANSWER)],
+            ]
+        )
+        client = SimpleNamespace(messages=messages)
+        coder = ToolUsingCoder(LocalTools(code_table), client=client)
+
+        result = asyncio.run(coder.code(CodingRequest("AKI", "Pt with AKI.")))
+
+        assert result.code == "N17.9"
+        assert result.justification == "Documented AKI."
+        assert [turn["tool_calls"] for turn in result.turns] == [3, 0]
+        assert all(turn["latency"] >= 0 for turn in result.turns)
+
+        second_call = messages.calls[1]
+        assert second_call["tools"] == TOOL_DEFINITIONS
+        tool_results = second_call["messages"][-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["t1", "t2", "t3"]
+
+    def test_streaming_records_ttft(self, code_table):
+        """Test that streamed turns report the time to the first token."""
+        messages = ScriptedMessages(
+            [
+                [tool_use("t1", "validate_code", {"code": "N17.9"})],
+                [SimpleNamespace(type="text", text=ANSWER)],
+            ]
+        )
+        coder = ToolUsingCoder(
+            LocalTools(code_table), client=SimpleNamespace(messages=messages), stream=True
+        )
+
+        result = asyncio.run(coder.code(CodingRequest("AKI", "Pt with AKI.")))
+
+        assert result.code == "N17.9"
+        assert 0 < result.usage["ttft"] <= result.turns[0]["latency"]
+
+    def test_gives_up_after_max_turns(self, code_table):
+        """Test that an endless tool loop raises."""
+        messages = ScriptedMessages(
+            [[tool_use(f"t{i}", "validate_code", {"code": "I10"})] for i in range(2)]
+        )
+        coder = ToolUsingCoder(
+            LocalTools(code_table), client=SimpleNamespace(messages=messages), max_turns=2
+        )
+
+        with pytest.raises(RuntimeError, match="No answer"):
+            asyncio.run(coder.code(CodingRequest("HTN", "HTN.")))
+
+
+class TestParseAnswer:
+    """Test answer parsing."""
+
+    def test_missing_answer(self):
+        """Test a response without an answer block."""
+        assert parse_answer("I am not sure.").code == "__MISSING__"
@@ -0,0 +1,115 @@
+"""Tests for aligning predicted spans with gold spans."""
+
+import random
+
+from elinker.alignment import align_admission, align_spans, predicted_spans, summarize
+
+
+def span(begin, end, code):
+    """A span dict."""
+    return {"begin": begin, "end": end, "code": code}
+
+
+def kinds(alignments):
+    """(kind, begin, gold code, predicted code) of each alignment."""
+    return [(a.kind, a.begin, a.gold_code, a.predicted_code) for a in alignments]
+
+
+class TestAlignSpans:
+    """Test the interval join and one-to-one matching."""
+
+    def test_kinds(self):
+        """Test exact, overlapping, missed and spurious spans."""
+        gold = [span(0, 10, "I10"), span(20, 30, "E11.9"), span(40, 50, "N17.9")]
+        predicted = [span(60, 65, "R69"), span(0, 10, "I10"), span(25, 35, "E11.65")]
+
+        alignments = align_spans(gold, predicted)
+
+        assert kinds(alignments) == [
+            ("tp", 0, "I10", "I10"),
+            ("wrong_code", 20, "E11.9", "E11.65"),
+            ("fn", 40, "N17.9", None),
+            ("fp", 60, None, "R69"),
+        ]
+        assert [a.exact for a in alignments] == [True, False, False, False]
+
+    def test_one_to_one(self):
+        """Test that a prediction matches one gold span, preferring the same code."""
+        gold = [span(0, 10, "I10"), span(0, 10, "I50.9")]
+        predicted = [span(0, 10, "I50.9")]
+
+        assert kinds(align_spans(gold, predicted)) == [
+            ("fn", 0, "I10", None),
+            ("tp", 0, "I50.9", "I50.9"),
+        ]
+
+    def test_exact_before_overlap(self):
+        """Test that exact offsets win over a larger overlapping span."""
+        gold = [span(5, 10, "I10")]
+        predicted = [span(0, 20, "I10"), span(5, 10, "I11.9")]
+
+        alignments = align_spans(gold, predicted)
+
+        assert kinds(alignments) == [("fp", 0, None, "I10"), ("wrong_code", 5, "I10", "I11.9")]
+
+    def test_matches_brute_force(self):
+        """Test the sweep against checking every pair on random overlapping spans."""
+        rng = random.Random(0)
+        for _ in range(50):
+            gold = [span(b, b + rng.randint(1, 30), "A") for b in rng.sample(range(200), 15)]
+            predicted = [span(b, b + rng.randint(1, 30), "A") for b in rng.sample(range(200), 15)]
+
+            alignments = align_spans(gold, predicted)
+            matched = sum(a.kind == "tp" for a in alignments)
+
+            # Matching is maximal: no unmatched gold span overlaps an unmatched prediction
+            fn = [a.gold for a in alignments if a.kind == "fn"]
+            fp = [a.predicted for a in alignments if a.kind == "fp"]
+            assert not any(g["begin"] < p["end"] and p["begin"] < g["end"] for g in fn for p in fp)
+            assert matched + len(fn) == len(gold)
+            assert matched + len(fp) == len(predicted)
+
+
+class TestAdmission:
+    """Test aligning prediction records with an admission."""
+
+    def test_records(self):
+        """Test filtering by admission and note, and missing predictions."""
+        records = [
+            {"hadm_id": 1, "note_id": 7, "begin": 0, "end": 4, "code": "I10", "predicted": "I10"},
+            {
+                "hadm_id": 1,
+                "note_id": 7,
+                "begin": 9,
+                "end": 12,
+                "code": "E11.9",
+                "predicted": "__MISSING__",
+            },
+            {"hadm_id": 2, "note_id": 7, "begin": 20, "end": 24, "code": "R69"},
+        ]
+        assert predicted_spans(records, hadm_id="1") == {"7": [span(0, 4, "I10")]}
+
+        data = {
+            "hadm_id": 1,
+            "notes": [
+                {"note_id": 7, "annotations": [span(0, 4, "I10"), span(9, 12, "E11.9")]},
+                {"note_id": 8, "annotations": []},
+            ],
+        }
+        alignments = align_admission(data, records)
+        assert [kinds(note) for note in alignments] == [
+            [("tp", 0, "I10", "I10"), ("fn", 9, "E11.9", None)],
+            [],
+        ]
+
+    def test_summary(self):
+        """Test counts and span-level scores."""
+        alignments = align_spans(
+            [span(0, 5, "A"), span(10, 15, "B"), span(20, 25, "C")],
+            [span(0, 5, "A"), span(11, 15, "X"), span(30, 35, "D")],
+        )
+        summary = summarize(alignments)
+        assert summary["tp"] == summary["wrong_code"] == summary["fp"] == summary["fn"] == 1
+        assert summary["exact"] == 1
+        assert summary["overlapping"] == 1
+        assert summary["precision"] == summary["recall"] == 0.3333
@@ -0,0 +1,138 @@
+"""Tests for the Alphabetic Index trie."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from elinker.alphabetic_index import AlphabeticIndex, IndexFirstCoder, tokenize
+from elinker.coders import CodingRequest, CodingResult
+from elinker.codes import CodeTable
+
+INDEX = Path(__file__).parent / "fixtures" / "icd10cm_index_sample.xml"
+
+
+@pytest.fixture(scope="module")
+def index():
+    """Index loaded from the sample XML."""
+    return AlphabeticIndex.load(INDEX)
+
+
+class ModelCoder:
+    """Stands in for a model; records the phrases it was asked about."""
+
+    def __init__(self):
+        self.phrases = []
+
+    async def code(self, request):
+        self.phrases.append(request.clinical_phrase)
+        return CodingResult("R69")
+
+
+class TestLoad:
+    """Test building the trie."""
+
+    def test_tokenize(self):
+        """Test lower-casing, punctuation and apostrophes."""
+        assert tokenize("Addison's disease, (bronze)") == ["addisons", "disease", "bronze"]
+
+    def test_terms(self, index):
+        """Test main terms, subterms, codes and cross-references."""
+        assert len(index) == 21
+        node = index.find(["Failure", "kidney", "acute"])
+        assert index.codes[node] == "N17.9"
+        assert index.path(node) == ["Failure", "kidney", "acute"]
+        assert index.see[index.find(["Failure", "renal"])] == "Failure, kidney"
+        assert index.see_also[index.find(["Abdomen"])] == "condition"
+
+    def test_nonessential_modifiers_and_forms(self, index):
+        """Test that nemods are dropped and comma forms of main terms are keys."""
+        assert index.find(["diabetic"]) == index.find(["Diabetes"])
+        assert index.titles[index.find(["Diabetes"])] == "Diabetes, diabetic"
+        assert index.find(["Diabetes", "mellitus"]) is None
+        assert index.find(["Failure", "heart", "diastolic"]) is not None
+
+
+class TestLookup:
+    """Test longest-path matching of phrases."""
+
+    @pytest.mark.parametrize(
+        "phrase, code",
+        [
+            ("hypertension", "I10"),
+            ("Acute kidney failure", "N17.9"),
+            ("kidney failure", "N19"),
+            ("acute on chronic diastolic heart failure", "I50.33"),
+            ("type 2 diabetes with hyperglycemia", "E11.65"),
+            ("diabetic", "E11.9"),
+            ("Addison's disease", "E27.1"),
+        ],
+    )
+    def test_complete_matches(self, index, phrase, code):
+        """Test phrases the index resolves completely."""
+        match = index.lookup(phrase)
+        assert match.code == code
+        assert match.complete
+
+    def test_see_reference(self, index):
+        """Test following "see" cross-references."""
+        assert index.lookup("acute renal failure").code == "N17.9"
+        match = index.lookup("high blood pressure")
+        assert match.code == "I10"
+        assert match.path == ["Hypertension, hypertensive"]
+
+    def test_partial_match(self, index):
+        """Test that unmatched words leave the match incomplete."""
+        match = index.lookup("chronic kidney failure stage 3")
+        assert match.code == "N19"
+        assert match.matched == 2
+        assert not match.complete
+
+    def test_no_match(self, index):
+        """Test phrases without a main term."""
+        assert index.lookup("patient ambulating") is None
+        assert index.lookup("") is None
+
+
+class TestIndexFirstCoder:
+    """Test coding from the index before calling a model."""
+
+    def test_resolves_locally(self, index, code_records):
+        """Test that complete, billable matches skip the model."""
+        model = ModelCoder()
+        coder = IndexFirstCoder(index, model, table=CodeTable(code_records))
+
+        result = asyncio.run(coder.code(CodingRequest("acute kidney failure", "note")))
+
+        assert result.code == "N17.9"
+        assert result.description == "Acute kidney failure, unspecified"
+        assert result.justification == "Alphabetic Index: Failure > kidney > acute"
+        assert model.phrases == []
+        assert coder.resolved == 1
+
+    @pytest.mark.parametrize(
+        "phrase",
+        [
+            "chronic kidney failure stage 3",  # incomplete
+            "femur fracture",  # code needs more characters
+            "kidney failure",  # N19 is not in the code table
+            "patient ambulating",  # no main term
+        ],
+    )
+    def test_falls_back_to_model(self, index, code_records, phrase):
+        """Test that anything not resolved deterministically goes to the model."""
+        model = ModelCoder()
+        coder = IndexFirstCoder(index, model, table=CodeTable(code_records))
+
+        assert asyncio.run(coder.code(CodingRequest(phrase, "note"))).code == "R69"
+        assert model.phrases == [phrase]
+
+    def test_procedure_spans_go_to_model(self, index, code_records):
+        """Test that ICD-10-PCS spans are never answered with a diagnosis code."""
+        model = ModelCoder()
+        coder = IndexFirstCoder(index, model, table=CodeTable(code_records))
+        request = CodingRequest("acute kidney failure", "note", code_system="ICD-10-PCS")
+
+        assert asyncio.run(coder.code(request)).code == "R69"
+        assert model.phrases == ["acute kidney failure"]
+        assert coder.resolved == 0
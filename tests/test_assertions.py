@@ -0,0 +1,92 @@
+"""Tests for NegEx/ConText-style assertion classification."""
+
+import pytest
+
+from elinker.assertions import AssertionClassifier, AssertionFilter
+
+
+def classify(note: str, phrase: str) -> dict:
+    """Classify the first occurrence of a phrase in a note."""
+    begin = note.index(phrase)
+    return AssertionClassifier().classify(note, begin, begin + len(phrase))
+
+
+class TestAssertionClassifier:
+    """Test classifying spans from their sentence."""
+
+    @pytest.mark.parametrize(
+        "note, phrase, expected",
+        [
+            (
+                "Chest x-ray shows no evidence of pneumonia.",
+                "pneumonia",
+                {"negated": "no evidence of"},
+            ),
+            ("Patient denies chest pain.", "chest pain", {"negated": "denies"}),
+            ("Pneumonia was ruled out.", "Pneumonia", {"negated": "was ruled out"}),
+            ("Admitted to r/o MI.", "MI", {"hypothetical": "r/o"}),
+            ("Possible pneumonia on imaging.", "pneumonia", {"hypothetical": "Possible"}),
+            ("Sepsis is unlikely.", "Sepsis", {"hypothetical": "unlikely"}),
+            ("History of stroke in 2010.", "stroke", {"historical": "History of"}),
+            ("Patient is s/p CABG.", "CABG", {"historical": "s/p"}),
+            ("Family history of breast cancer.", "breast cancer", {"family": "Family history of"}),
+            ("Mother has diabetes.", "diabetes", {"family": "Mother"}),
+            ("Patient with acute kidney failure.", "acute kidney failure", {}),
+        ],
+    )
+    def test_categories(self, note, phrase, expected):
+        """Test each category with pre- and post-triggers."""
+        assert classify(note, phrase) == expected
+
+    def test_terminator_ends_scope(self):
+        """Test that "but" ends a negation's scope."""
+        note = "Denies chest pain but reports dyspnea."
+        assert classify(note, "chest pain") == {"negated": "Denies"}
+        assert classify(note, "dyspnea") == {}
+
+    def test_sentence_ends_scope(self):
+        """Test that triggers do not cross sentence boundaries."""
+        note = "History of stroke in 2010. Now admitted for pneumonia."
+        assert classify(note, "pneumonia") == {}
+
+    def test_window(self):
+        """Test that pre-triggers reach only a few words."""
+        note = "No fever, chills, cough, nausea, vomiting, diarrhea, rash or headache."
+        assert classify(note, "chills") == {"negated": "No"}
+        assert classify(note, "headache") == {}
+
+    def test_pseudo_triggers(self):
+        """Test that pseudo-triggers such as "no increase" do not negate."""
+        assert classify("No increase in edema.", "edema") == {}
+        assert classify("Gram negative bacteremia.", "bacteremia") == {}
+
+    def test_several_categories(self):
+        """Test that a span can carry more than one category."""
+        note = "Family history of possible Huntington disease."
+        assert classify(note, "Huntington disease") == {
+            "hypothetical": "possible",
+            "family": "Family history of",
+        }
+
+
+class TestAssertionFilter:
+    """Test routing decisions."""
+
+    def test_skips(self):
+        """Test that only the configured categories skip the model."""
+        assertions = AssertionFilter(skip=["negated"])
+        assert assertions.skips({"negated": "no"})
+        assert not assertions.skips({"historical": "history of"})
+        assert not assertions.skips({})
+
+    def test_classify_row(self):
+        """Test classifying example rows, with or without offsets."""
+        assertions = AssertionFilter()
+        row = {"text": "No pneumonia.", "begin": 3, "end": 12}
+        assert assertions.classify(row) == {"negated": "No"}
+        assert assertions.classify({"text": "No pneumonia."}) == {}
+
+    def test_unknown_category(self):
+        """Test rejecting unknown categories."""
+        with pytest.raises(ValueError, match="Unknown assertion categories"):
+            AssertionFilter(skip=["speculative"])
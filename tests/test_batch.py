@@ -0,0 +1,151 @@
+"""Tests for bulk linking across a process pool."""
+
+import json
+
+import polars as pl
+import pytest
+
+from elinker import cli
+from elinker.batch import link_spans, phrase_of, read_spans
+from elinker.retrieval import CandidateRetriever, file_digest
+
+PHRASES = ["high blood pressure", "kidney failure", "copd exacerbation", "diabetes"]
+EXPECTED = ["I10", "N17.9", "J44.1", "E11.9"]
+
+
+@pytest.fixture
+def index_dir(code_table, tmp_path):
+    """Saved retriever index over the small code table."""
+    path = tmp_path / "index"
+    CandidateRetriever(code_table).save(path)
+    return path
+
+
+@pytest.fixture
+def spans():
+    """Span rows with ids, phrases and note text."""
+    return [{"id": idx, "covered_text": PHRASES[idx % 4], "text": "note"} for idx in range(50)]
+
+
+class TestReadSpans:
+    """Test streaming span input."""
+
+    def test_jsonl(self, tmp_path, spans):
+        """Test reading JSONL, skipping blank lines."""
+        path = tmp_path / "spans.jsonl"
+        path.write_text("".join(json.dumps(row) + "\n\n" for row in spans))
+        assert list(read_spans(path)) == spans
+
+    def test_parquet_in_batches(self, tmp_path, spans):
+        """Test reading Parquet one record batch at a time."""
+        path = tmp_path / "spans.parquet"
+        pl.DataFrame(spans).write_parquet(path)
+        assert list(read_spans(path, batch_size=7)) == spans
+
+    def test_phrase_fields(self):
+        """Test that 'phrase' is preferred over 'covered_text'."""
+        assert phrase_of({"phrase": "a", "covered_text": "b"}) == "a"
+        assert phrase_of({"covered_text": "b"}) == "b"
+        assert phrase_of({}) == ""
+
+
+class TestLinkSpans:
+    """Test pooled linking."""
+
+    def test_output_keeps_input_order(self, index_dir, spans):
+        """Test that out-of-order chunk completion still yields input order."""
+        rows = list(link_spans(iter(spans), index_dir, workers=2, chunk_size=3, max_pending=4))
+
+        assert [row["id"] for row in rows] == list(range(50))
+        assert [row["code"] for row in rows] == [EXPECTED[idx % 4] for idx in range(50)]
+
+    def test_output_fields(self, index_dir, spans):
+        """Test that note text is dropped and candidates are added for k > 1."""
+        first = next(link_spans(iter(spans[:2]), index_dir, k=2, workers=1))
+
+        assert "text" not in first
+        assert first["covered_text"] == "high blood pressure"
+        assert first["description"] == "Essential (primary) hypertension"
+        assert len(first["candidates"]) == 2
+        assert first["candidates"][0]["code"] == "I10"
+
+    def test_progress(self, index_dir, spans):
+        """Test that progress is reported once per chunk in order."""
+        calls = []
+        list(
+            link_spans(
+                iter(spans),
+                index_dir,
+                workers=2,
+                chunk_size=20,
+                on_progress=lambda done, elapsed: calls.append(done),
+            )
+        )
+        assert calls == [20, 40, 50]
+
+
+class TestLinkBatchCommand:
+    """Test the link-batch command."""
+
+    def test_link_batch(self, tmp_path, code_records, spans):
+        """Test linking a Parquet file from a code table."""
+        codes = tmp_path / "codes.json"
+        codes.write_text(json.dumps(code_records))
+        spans_path = tmp_path / "spans.parquet"
+        pl.DataFrame(spans).write_parquet(spans_path)
+        output = tmp_path / "out" / "preds.jsonl"
+
+        with pytest.raises(SystemExit) as exc_info:
+            cli.app(
+                [
+                    "link-batch",
+                    "--input",
+                    str(spans_path),
+                    "--output",
+                    str(output),
+                    "--codes",
+                    str(codes),
+                    "--index",
+                    str(tmp_path / "index"),
+                    "--workers",
+                    "2",
+                    "--chunk-size",
+                    "8",
+                ]
+            )
+
+        assert exc_info.value.code in (0, None)
+        rows = [json.loads(line) for line in output.read_text().splitlines()]
+        assert [row["id"] for row in rows] == list(range(50))
+        assert (tmp_path / "index" / "index.json").is_file()
+
+    def test_rebuilds_index_for_other_code_table(self, tmp_path, code_records, spans):
+        """Test that a saved index built from a different code table is not reused."""
+        spans_path = tmp_path / "spans.jsonl"
+        spans_path.write_text("".join(json.dumps(row) + "\n" for row in spans[:4]))
+        index = tmp_path / "index"
+        output = tmp_path / "preds.jsonl"
+
+        def link(records: list[dict]) -> list[dict]:
+            codes = tmp_path / "codes.json"
+            codes.write_text(json.dumps(records))
+            args = ["--input", str(spans_path), "--output", str(output)]
+            args += ["--codes", str(codes), "--index", str(index), "--workers", "1"]
+            with pytest.raises(SystemExit) as exc_info:
+                cli.app(["link-batch", *args])
+            assert exc_info.value.code in (0, None)
+            assert CandidateRetriever.saved_digest(index) == file_digest(codes)
+            return [json.loads(line) for line in output.read_text().splitlines()]
+
+        assert {row["code"] for row in link(code_records)} == set(EXPECTED)
+        hypertension = [record for record in code_records if record["code"] == "I10"]
+        assert {row["code"] for row in link(hypertension)} == {"I10"}
+
+    def test_requires_codes_or_index(self, tmp_path):
+        """Test that link-batch fails without an index source."""
+        spans_path = tmp_path / "spans.jsonl"
+        spans_path.write_text('{"phrase": "x"}\n')
+
+        with pytest.raises(SystemExit) as exc_info:
+            cli.app(["link-batch", "--input", str(spans_path), "--output", str(tmp_path / "o")])
+        assert exc_info.value.code == 1
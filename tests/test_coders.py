@@ -0,0 +1,147 @@
+"""Tests for coder backends."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from elinker.coders import (
+    OUTPUT_SCHEMA,
+    AnthropicCoder,
+    CodingRequest,
+    candidate_schema,
+    parse_result,
+)
+from elinker.retrieval import Candidate
+
+
+class FakeMessages:
+    """Records structured-output calls and replies with a fixed payload."""
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(self.payload))])
+
+
+def fake_client(payload: dict):
+    """Build a fake AsyncAnthropic client."""
+    return SimpleNamespace(beta=SimpleNamespace(messages=FakeMessages(payload)))
+
+
+CANDIDATES = [
+    Candidate("I10", "Essential (primary) hypertension", 0.9),
+    Candidate("I50.33", "Acute on chronic diastolic (congestive) heart failure", 0.4),
+]
+
+
+class TestAnthropicCoder:
+    """Test the structured-output Anthropic coder."""
+
+    def test_direct_mode(self):
+        """Test a free-text request uses the default template and schema."""
+        client = fake_client({"ICD10": "I10", "description": "HTN", "justification": "why"})
+        coder = AnthropicCoder(client=client)
+
+        request = CodingRequest("hypertension", "Pt has hypertension.")
+        result = asyncio.run(coder.code(request))
+
+        call = client.beta.messages.calls[0]
+        assert result.code == "I10"
+        assert result.justification == "why"
+        assert call["output_format"]["schema"] == OUTPUT_SCHEMA
+        assert "Pt has hypertension." in call["messages"][0]["content"]
+
+    def test_candidate_mode_constrains_output(self):
+        """Test that candidates become an enum in the output schema."""
+        client = fake_client({"ICD10": "I10"})
+        coder = AnthropicCoder(client=client)
+
+        request = CodingRequest("HTN", "Pt has HTN.", candidates=CANDIDATES)
+        result = asyncio.run(coder.code(request))
+
+        call = client.beta.messages.calls[0]
+        enum = call["output_format"]["schema"]["properties"]["ICD10"]["enum"]
+        assert enum == ["I10", "I50.33"]
+        assert "I50.33: Acute on chronic diastolic" in call["messages"][0]["content"]
+        assert result.code == "I10"
+        assert result.description == "Essential (primary) hypertension"
+
+
+class StreamingMessages:
+    """Streams a payload as structured-output events."""
+
+    def __init__(self, payload: dict):
+        self.text = json.dumps(payload)
+
+    async def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        return self._events()
+
+    async def _events(self):
+        usage = SimpleNamespace(input_tokens=120, output_tokens=1, cache_read_input_tokens=100)
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(usage=usage))
+        for chunk in (self.text[:5], self.text[5:]):
+            delta = SimpleNamespace(type="text_delta", text=chunk)
+            yield SimpleNamespace(type="content_block_delta", delta=delta)
+        yield SimpleNamespace(type="message_delta", usage=SimpleNamespace(output_tokens=9))
+
+
+class StalledMessages(StreamingMessages):
+    """Starts a message, then stalls before any text."""
+
+    async def _events(self):
+        usage = SimpleNamespace(input_tokens=120, output_tokens=1, cache_read_input_tokens=0)
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(usage=usage))
+        await asyncio.sleep(10)
+
+
+class TestStreaming:
+    """Test the streaming path used to measure time to first token."""
+
+    def test_stream_records_usage_and_ttft(self):
+        """Test that streamed chunks are joined and usage is recorded."""
+        client = SimpleNamespace(beta=SimpleNamespace(messages=StreamingMessages({"ICD10": "I10"})))
+        coder = AnthropicCoder(client=client, stream=True)
+
+        result = asyncio.run(coder.code(CodingRequest("HTN", "HTN.", candidates=CANDIDATES)))
+
+        assert result.code == "I10"
+        assert result.usage["input_tokens"] == 120
+        assert result.usage["output_tokens"] == 9
+        assert result.usage["cached_tokens"] == 100
+        assert result.usage["ttft"] >= 0
+
+    def test_cancelled_stream_reports_usage(self):
+        """Test that a cancelled stream carries the usage received before the cancel."""
+        client = SimpleNamespace(beta=SimpleNamespace(messages=StalledMessages({})))
+        coder = AnthropicCoder(client=client, stream=True)
+
+        async def run():
+            task = asyncio.create_task(coder.code(CodingRequest("HTN", "HTN.")))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError as e:
+                return e
+
+        error = asyncio.run(run())
+        assert error.usage["input_tokens"] == 120
+        assert error.usage["ttft"] is None
+
+
+class TestSchemas:
+    """Test schema and result helpers."""
+
+    def test_candidate_schema(self):
+        """Test the enum schema has a single required field."""
+        schema = candidate_schema(CANDIDATES)
+        assert schema["required"] == ["ICD10"]
+        assert schema["additionalProperties"] is False
+
+    def test_parse_missing_code(self):
+        """Test that a payload without a code is marked missing."""
+        assert parse_result("{}").code == "__MISSING__"
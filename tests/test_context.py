@@ -0,0 +1,144 @@
+"""Tests for note context selection."""
+
+from elinker.context import SEPARATOR, ContextSelector, split_sections, split_sentences
+from elinker.runner import build_requests
+
+NOTE = """Admission Date: [**2151-7-16**]
+
+Chief Complaint:
+Shortness of breath.
+
+History of Present Illness:
+72 yo man with COPD presents with dyspnea. He was started on nebulizers. \
+He denies chest pain.
+
+Social History:
+Lives alone. Former smoker.
+
+Pertinent Results:
+WBC 12.1. Creatinine 2.3, up from baseline 1.1. Lactate 1.9.
+
+Brief Hospital Course:
+COPD exacerbation treated with steroids. Acute kidney failure resolved with fluids.
+
+DISCHARGE DIAGNOSES:
+COPD exacerbation
+Acute kidney failure
+"""
+
+
+def offsets(phrase: str) -> tuple[int, int]:
+    """Offsets of the first occurrence of a phrase in NOTE."""
+    begin = NOTE.index(phrase)
+    return begin, begin + len(phrase)
+
+
+class TestSplitSections:
+    """Test section splitting."""
+
+    def test_finds_known_and_caps_headers(self):
+        """Test that known headers and all-caps headers start sections."""
+        titles = [section.title for section in split_sections(NOTE)]
+        assert titles == [
+            "",
+            "chief complaint",
+            "history of present illness",
+            "social history",
+            "pertinent results",
+            "brief hospital course",
+            "discharge diagnoses",
+        ]
+
+    def test_sections_cover_note(self):
+        """Test that sections are contiguous and cover the whole note."""
+        sections = split_sections(NOTE)
+        assert sections[0].begin == 0
+        assert sections[-1].end == len(NOTE)
+        for previous, section in zip(sections, sections[1:], strict=False):
+            assert previous.end == section.begin
+
+    def test_no_headers(self):
+        """Test a note without headers is a single section."""
+        sections = split_sections("Just some text.")
+        assert len(sections) == 1
+        assert sections[0].title == ""
+
+    def test_split_sentences(self):
+        """Test sentence offsets."""
+        text = "One. Two!\n\nThree"
+        assert [text[b:e] for b, e in split_sentences(text)] == ["One.", "Two!", "Three"]
+
+
+class TestContextSelector:
+    """Test budgeted context selection."""
+
+    def test_large_budget_keeps_everything(self):
+        """Test that a generous budget returns every section."""
+        selector = ContextSelector(max_tokens=10_000)
+        begin, end = offsets("Acute kidney failure resolved")
+        excerpt = selector.select(NOTE, begin, end)
+
+        assert "Lives alone" in excerpt
+        assert SEPARATOR not in excerpt
+        assert selector.reduction == 0.0
+
+    def test_budget_prefers_diagnosis_sections(self):
+        """Test that diagnosis-bearing sections are added before others."""
+        selector = ContextSelector(max_tokens=50)
+        begin, end = offsets("Creatinine 2.3")
+        excerpt = selector.select(NOTE, begin, end)
+
+        assert "Creatinine 2.3" in excerpt
+        assert "DISCHARGE DIAGNOSES" in excerpt
+        assert "Lives alone" not in excerpt
+        assert selector.count_tokens(excerpt) <= 50 + selector.count_tokens(SEPARATOR) * 3
+        assert selector.reduction > 0
+
+    def test_tiny_budget_uses_sentence_window(self):
+        """Test that an oversized section is cut to the span's sentences."""
+        selector = ContextSelector(max_tokens=6, window=1)
+        begin, end = offsets("started on nebulizers")
+        excerpt = selector.select(NOTE, begin, end)
+
+        assert excerpt == "He was started on nebulizers."
+
+    def test_over_budget_sentence_is_trimmed_around_span(self):
+        """Test that a sentence longer than the budget is cut to words around the span."""
+        selector = ContextSelector(max_tokens=4, window=2)
+        begin, end = offsets("on nebulizers")
+        excerpt = selector.select(NOTE, begin, end)
+
+        assert excerpt == "started on nebulizers."
+        assert selector.selected_tokens == 4
+
+        selector = ContextSelector(max_tokens=2)
+        begin, end = offsets("72 yo man with COPD")
+        assert selector.select(NOTE, begin, end) == "72 yo"
+
+    def test_sections_are_cached_per_note(self):
+        """Test that a note is split once per key."""
+        selector = ContextSelector(max_tokens=100)
+        selector.select(NOTE, 0, 5, key=1)
+        first = selector.sections(NOTE, key=1)
+        selector.select(NOTE, 10, 15, key=1)
+        assert selector.sections(NOTE, key=1) is first
+
+    def test_tokenizer_counting(self):
+        """Test that a tokenizer's encode() is used for counting."""
+
+        class CharTokenizer:
+            def encode(self, text, add_special_tokens=False):
+                return list(text)
+
+        selector = ContextSelector(tokenizer=CharTokenizer())
+        assert selector.count_tokens("abc de") == 6
+
+    def test_build_requests_reduces_notes(self):
+        """Test that requests carry the reduced note."""
+        begin, end = offsets("Acute kidney failure resolved")
+        row = {"covered_text": "Acute kidney failure", "text": NOTE, "begin": begin, "end": end}
+        selector = ContextSelector(max_tokens=40)
+
+        request = build_requests([row], context=selector)[0]
+        assert len(request.clinical_note) < len(NOTE)
+        assert "Acute kidney failure resolved" in request.clinical_note
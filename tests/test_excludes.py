@@ -0,0 +1,183 @@
+"""Tests for Excludes1/Excludes2 conflict checking."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from elinker.codes import CodeTable
+from elinker.excludes import ExclusionIndex, parse_references, write_conflicts
+
+
+@pytest.fixture
+def table():
+    """Code table with Excludes notes on categories and subcategories."""
+    return CodeTable(
+        [
+            {"code": "E08", "description": "Diabetes due to underlying condition"},
+            {"code": "E08.9", "parent_code": "E08", "is_billable": True},
+            {
+                "code": "E10",
+                "description": "Type 1 diabetes mellitus",
+                "excludes1": ["type 2 diabetes mellitus (E11.-)"],
+            },
+            {"code": "E10.9", "parent_code": "E10", "is_billable": True},
+            {
+                "code": "E11",
+                "description": "Type 2 diabetes mellitus",
+                "excludes1": [
+                    "diabetes mellitus due to underlying condition (E08.-)",
+                    "type 1 diabetes mellitus (E10.-)",
+                ],
+            },
+            {"code": "E11.6", "parent_code": "E11"},
+            {"code": "E11.65", "parent_code": "E11.6", "is_billable": True},
+            {"code": "E11.9", "parent_code": "E11", "is_billable": True},
+            {"code": "E13", "description": "Other specified diabetes mellitus"},
+            {"code": "E13.9", "parent_code": "E13", "is_billable": True},
+            {"code": "I10", "is_billable": True, "excludes1": ["hypertensive disease (I11-I13)"]},
+            {"code": "I12", "description": "Hypertensive chronic kidney disease"},
+            {"code": "I12.9", "parent_code": "I12", "is_billable": True},
+            {
+                "code": "O24",
+                "description": "Diabetes in pregnancy",
+                "excludes2": ["gestational diabetes (O24.4-), diabetes (E08-E13)"],
+            },
+            {"code": "O24.4", "parent_code": "O24"},
+            {"code": "O24.41", "parent_code": "O24.4", "is_billable": True},
+        ]
+    )
+
+
+class TestParseReferences:
+    """Test reading code ranges from note text."""
+
+    @pytest.mark.parametrize(
+        "note, expected",
+        [
+            ("diabetes mellitus (E08-E13)", [("E08", "E13")]),
+            ("type 1 diabetes mellitus (E10.-)", [("E10", "E10")]),
+            ("gestational diabetes (O24.4-)", [("O244", "O244")]),
+            ("hypertension (I10, I11.9)", [("I10", "I10"), ("I119", "I119")]),
+            ("fractures (S72.0- - S72.2-)", [("S720", "S722")]),
+            ("elevated A1C without diabetes", []),
+            ("no references here", []),
+        ],
+    )
+    def test_parse_references(self, note, expected):
+        """Test single codes, subcode markers, ranges and lists."""
+        assert parse_references(note) == expected
+
+
+class TestExclusionIndex:
+    """Test the precomputed bitsets and conflict checks."""
+
+    def test_ids_are_sorted(self, table):
+        """Test that codes get IDs in sorted order so ranges are contiguous."""
+        index = ExclusionIndex(table)
+        assert index.codes == sorted(index.codes, key=lambda code: code.replace(".", ""))
+        assert index.codes[index.ids["E11.65"]] == "E11.65"
+
+    def test_bitsets(self, table):
+        """Test that a range note sets the bits of every code in the range."""
+        index = ExclusionIndex(table)
+        offset, bits, _ = index.bitsets["excludes1"][index.ids["I10"]]
+
+        excluded = [index.codes[offset + i] for i in range(bits.bit_length()) if bits >> i & 1]
+        assert excluded == ["I12", "I12.9"]
+
+    def test_conflict(self, table):
+        """Test flagging an Excludes1 pair."""
+        conflicts = ExclusionIndex(table).conflicts(["I10", "N17.9", "I12.9"])
+
+        assert len(conflicts) == 1
+        assert conflicts[0].to_dict() == {
+            "code": "I10",
+            "excluded": "I12.9",
+            "kind": "excludes1",
+            "note": "hypertensive disease (I11-I13)",
+        }
+
+    def test_inherited_notes(self, table):
+        """Test that category notes apply to subcodes, and pairs are reported once."""
+        conflicts = ExclusionIndex(table).conflicts(["E11.65", "E10.9", "E08.9"])
+
+        assert [(c.code, c.excluded, c.kind) for c in conflicts] == [
+            ("E11.65", "E08.9", "excludes1"),
+            ("E11.65", "E10.9", "excludes1"),
+        ]
+
+    def test_excludes2(self, table):
+        """Test that Excludes2 pairs are reported with their kind."""
+        conflicts = ExclusionIndex(table).conflicts(["O24.41", "E13.9"])
+        assert [(c.code, c.excluded, c.kind) for c in conflicts] == [
+            ("O24.41", "E13.9", "excludes2")
+        ]
+
+    def test_no_conflicts(self, table):
+        """Test compatible, repeated and unknown codes."""
+        index = ExclusionIndex(table)
+        assert index.conflicts(["E11.9", "E11.65", "E11.9", "I10", "Z99.9", "__MISSING__"]) == []
+        assert index.conflicts([]) == []
+
+    def test_check_admissions(self, table):
+        """Test checking every admission of a run at once."""
+        predictions = [
+            {"hadm_id": 1, "predicted": "I10"},
+            {"hadm_id": 2, "predicted": "E11.9"},
+            {"hadm_id": 1, "predicted": "i129", "normalized": "I12.9"},
+            {"hadm_id": 2, "predicted": "I10"},
+        ]
+        conflicts = ExclusionIndex(table).check_admissions(predictions)
+
+        assert list(conflicts) == [1]
+        assert conflicts[1][0].excluded == "I12.9"
+
+    def test_write_conflicts(self, table, tmp_path):
+        """Test writing one line per admission with conflicts."""
+        index = ExclusionIndex(table)
+        write_conflicts(tmp_path, {7: index.conflicts(["I10", "I12"])})
+
+        lines = (tmp_path / "conflicts.jsonl").read_text().splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {
+                "hadm_id": 7,
+                "conflicts": [
+                    {
+                        "code": "I10",
+                        "excluded": "I12",
+                        "kind": "excludes1",
+                        "note": "hypertensive disease (I11-I13)",
+                    }
+                ],
+            }
+        ]
+
+
+class TestViewerConflicts:
+    """Test surfacing conflicts in the viewer."""
+
+    def test_viewer_flags_conflicts(self, table):
+        """Test that conflicting annotation groups carry their conflicts."""
+        from elinker.viewer import ICD10Viewer
+
+        data = {
+            "hadm_id": 1,
+            "notes": [
+                {
+                    "note_id": 1,
+                    "text": "HTN with CKD",
+                    "annotations": [
+                        {"code": "I10", "begin": 0, "end": 3},
+                        {"code": "I12.9", "begin": 9, "end": 12},
+                        {"code": "E11.9", "begin": 0, "end": 3},
+                    ],
+                }
+            ],
+        }
+        viewer = ICD10Viewer(data, Path("admission.json"), exclusions=ExclusionIndex(table))
+
+        assert len(viewer.conflicts) == 1
+        assert [c.excluded for c in viewer.annotation_groups["I10"].conflicts] == ["I12.9"]
+        assert viewer.annotation_groups["I12.9"].conflicts == viewer.conflicts
+        assert viewer.annotation_groups["E11.9"].conflicts == []
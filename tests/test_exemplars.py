@@ -0,0 +1,169 @@
+"""Tests for the nearest-neighbour exemplar index."""
+
+import asyncio
+
+from elinker.coders import AnthropicCoder, CodingRequest, CodingResult
+from elinker.context import ContextSelector
+from elinker.exemplars import ExemplarIndex, example_key, train_digest
+from elinker.runner import build_requests, run_evaluation
+
+
+def row(hadm_id, text, phrase, code):
+    """A train row whose span is the first occurrence of the phrase."""
+    begin = text.index(phrase)
+    return {
+        "hadm_id": hadm_id,
+        "note_id": hadm_id * 10,
+        "text": text,
+        "begin": begin,
+        "end": begin + len(phrase),
+        "covered_text": phrase,
+        "code": code,
+    }
+
+
+TRAIN = [
+    row(100, "Labs showed acute kidney injury on admission.", "acute kidney injury", "N17.9"),
+    row(101, "Creatinine up, acute kidney failure suspected.", "acute kidney failure", "N17.9"),
+    row(102, "Longstanding essential hypertension, on lisinopril.", "hypertension", "I10"),
+    row(103, "BP elevated; hypertension poorly controlled.", "hypertension", "I10"),
+    row(104, "COPD with acute exacerbation, on nebulizers.", "COPD", "J44.1"),
+]
+
+EXAMPLES = [
+    row(1, "Acute kidney failure noted.", "Acute kidney failure", "N17.9"),
+    row(1, "History of hypertension, untreated.", "hypertension", "I10"),
+    row(2, "COPD exacerbation.", "COPD exacerbation", "J44.1"),
+]
+
+
+class FixedCoder:
+    """Answers every request with the same code."""
+
+    async def code(self, request):
+        return CodingResult("N17.9")
+
+
+class TestExemplarIndex:
+    """Test the precomputed neighbour search and lookups."""
+
+    def test_nearest_first(self):
+        """Test that exemplars are ranked by similarity of phrase and context."""
+        index = ExemplarIndex(TRAIN, k=2)
+        index.build(EXAMPLES)
+
+        assert [e.code for e in index.lookup(EXAMPLES[0])] == ["N17.9", "N17.9"]
+        assert index.lookup(EXAMPLES[1])[0].code == "I10"
+        assert "kidney" in index.lookup(EXAMPLES[0])[0].context
+
+    def test_precomputed_once(self):
+        """Test that lookups read the stored neighbours and unbuilt spans get none."""
+        index = ExemplarIndex(TRAIN, k=3)
+        assert index.lookup(EXAMPLES[0]) == []
+
+        index.build(EXAMPLES[:2])
+        neighbors = index.neighbors.copy()
+        index.build(EXAMPLES)
+        assert len(index.neighbors) == 3
+        assert all(index.neighbors[key] is value for key, value in neighbors.items())
+
+    def test_batches_match_single_pass(self):
+        """Test that the batch size does not change the neighbours."""
+        single = ExemplarIndex(TRAIN, k=4)
+        batched = ExemplarIndex(TRAIN, k=4, batch_size=1)
+        single.build(TRAIN + EXAMPLES)
+        batched.build(TRAIN + EXAMPLES)
+        for key, value in single.neighbors.items():
+            assert value.tolist() == batched.neighbors[key].tolist()
+
+    def test_excludes_own_span(self):
+        """Test that a train span is never its own exemplar."""
+        index = ExemplarIndex(TRAIN, k=5)
+        index.build(TRAIN)
+        for idx, train_row in enumerate(TRAIN):
+            assert idx not in index.neighbors[example_key(train_row)]
+            assert len(index.neighbors[example_key(train_row)]) == 4
+
+    def test_token_budget_and_duplicates(self):
+        """Test that lookups stop at the budget and drop repeated phrase-code pairs."""
+        index = ExemplarIndex(TRAIN, k=5)
+        index.build(EXAMPLES)
+
+        phrases = [(e.phrase, e.code) for e in index.lookup(EXAMPLES[1])]
+        assert phrases.count(("hypertension", "I10")) == 1
+
+        first = index.lookup(EXAMPLES[0])[0]
+        budget = ContextSelector().count_tokens(first.text)
+        assert index.lookup(EXAMPLES[0], max_tokens=budget + 1) == [first]
+        assert index.lookup(EXAMPLES[0], max_tokens=1) == []
+
+
+class TestSavedIndex:
+    """Test saving and reloading a fitted exemplar index."""
+
+    def test_reload_gives_same_neighbours(self, tmp_path):
+        """Test that a reloaded index finds the same exemplars, own span excluded."""
+        index = ExemplarIndex(TRAIN, k=3)
+        index.save(tmp_path / "index", train_digest="abc")
+        loaded = ExemplarIndex.load(tmp_path / "index")
+
+        assert ExemplarIndex.saved_digest(tmp_path / "index") == "abc"
+        assert ExemplarIndex.saved_digest(tmp_path / "missing") is None
+        assert (loaded.k, len(loaded)) == (3, len(TRAIN))
+
+        rows = EXAMPLES + TRAIN[:2]  # Train spans must not get themselves back
+        index.build(rows)
+        loaded.build(rows)
+        for row in rows:
+            assert [e.to_dict() for e in loaded.lookup(row)] == [
+                e.to_dict() for e in index.lookup(row)
+            ]
+        assert TRAIN[0]["covered_text"] not in [e.phrase for e in loaded.lookup(TRAIN[0])]
+
+    def test_train_digest(self, tmp_path):
+        """Test that the digest follows the data file, split and context size."""
+        data = tmp_path / "mdace.parquet"
+        data.write_bytes(b"rows")
+        key = train_digest(data, "train")
+        assert train_digest(data, "dev") != key
+        assert train_digest(data, "train", context_chars=60) != key
+        data.write_bytes(b"other rows")
+        assert train_digest(data, "train") != key
+
+
+class TestFewShotPrompts:
+    """Test exemplars in requests, prompts and run scores."""
+
+    def test_requests_and_prompt(self):
+        """Test that exemplars reach the rendered prompt."""
+        requests = build_requests(EXAMPLES, exemplars=ExemplarIndex(TRAIN, k=2))
+        assert [e.code for e in requests[2].exemplars][0] == "J44.1"
+
+        prompt = AnthropicCoder(client=object()).build_prompt(requests[2])
+        assert "<icd10_code>J44.1</icd10_code>" in prompt
+        assert "<examples>" not in AnthropicCoder(client=object()).build_prompt(
+            CodingRequest("COPD", "COPD exacerbation.")
+        )
+
+    def test_run_scores(self):
+        """Test that runs report exemplar cost next to accuracy."""
+        scores, _, predictions = asyncio.run(
+            run_evaluation(EXAMPLES, FixedCoder(), exemplars=ExemplarIndex(TRAIN, k=2))
+        )
+        assert scores["exemplars_per_request"] == 1.6667  # Repeated hypertension dropped
+        assert scores["exemplar_tokens_per_request"] > 0
+        assert scores["exemplar_lookup_ms"] >= 0
+        assert predictions[0]["exemplars"] == ["N17.9", "N17.9"]
+
+    def test_run_scores_use_tokenizer(self):
+        """Test that exemplar budgets and token counts use the index's tokenizer."""
+
+        class CharTokenizer:
+            def encode(self, text, add_special_tokens=False):
+                return list(text)
+
+        index = ExemplarIndex(TRAIN, k=2, tokenizer=CharTokenizer())
+        scores, _, _ = asyncio.run(run_evaluation(EXAMPLES, FixedCoder(), exemplars=index))
+        requests = build_requests(EXAMPLES, exemplars=ExemplarIndex(TRAIN, k=2))
+        chars = sum(len(e.text) for request in requests for e in request.exemplars)
+        assert scores["exemplar_tokens_per_request"] == round(chars / len(EXAMPLES), 4)
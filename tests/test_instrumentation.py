@@ -0,0 +1,137 @@
+"""Tests for per-request instrumentation."""
+
+import asyncio
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from elinker.coders import CodingRequest, CodingResult
+from elinker.instrumentation import (
+    InstrumentedCoder,
+    estimate_cost,
+    export_metrics,
+    percentiles,
+    write_metrics,
+)
+
+
+class UsageCoder:
+    """Returns fixed usage, failing for one phrase."""
+
+    model = "claude-sonnet-4-5"
+
+    async def code(self, request):
+        if request.clinical_phrase == "fail":
+            raise RuntimeError("boom")
+        return CodingResult(
+            "I10",
+            usage={"input_tokens": 1000, "output_tokens": 10, "cached_tokens": 200, "ttft": 0.1},
+            turns=[{"tool_calls": 2}, {"tool_calls": 0}],
+        )
+
+
+def run(coder, phrases):
+    """Code phrases concurrently, ignoring failures."""
+
+    async def _run():
+        return await asyncio.gather(
+            *(coder.code(CodingRequest(p, "", request_id=i)) for i, p in enumerate(phrases)),
+            return_exceptions=True,
+        )
+
+    return asyncio.run(_run())
+
+
+class TestInstrumentedCoder:
+    """Test metric recording and aggregation."""
+
+    def test_records_every_request(self):
+        """Test that successes and failures are both recorded."""
+        coder = InstrumentedCoder(UsageCoder())
+        results = run(coder, ["a", "fail", "b"])
+
+        assert isinstance(results[1], RuntimeError)
+        assert len(coder.records) == 3
+        assert coder.records[0].tool_calls == 2
+        assert sum(r.error is not None for r in coder.records) == 1
+
+    def test_summary(self):
+        """Test run-level aggregation."""
+        coder = InstrumentedCoder(UsageCoder())
+        run(coder, ["a", "b", "fail"])
+        summary = coder.summary()
+
+        assert summary["requests"] == 3
+        assert summary["errors"] == 1
+        assert summary["input_tokens"] == 2000
+        assert summary["cached_tokens"] == 400
+        assert summary["tool_calls"] == 4
+        assert summary["ttft_p50"] == 0.1
+        assert {"latency_p50", "latency_p95", "latency_p99", "throughput"} <= summary.keys()
+        assert summary["cost_usd"] == estimate_cost("claude-sonnet-4-5", 2000, 20, 400)
+
+    def test_unknown_model_has_no_cost(self):
+        """Test that local models report no cost."""
+        coder = InstrumentedCoder(UsageCoder(), model="my-local-model")
+        run(coder, ["a"])
+        assert "cost_usd" not in coder.summary()
+
+    def test_write_metrics(self, tmp_path):
+        """Test the JSON summary next to scores.json."""
+        coder = InstrumentedCoder(UsageCoder())
+        run(coder, ["a"])
+        summary = write_metrics(tmp_path, coder)
+
+        written = json.loads((tmp_path / "metrics.json").read_text())
+        assert written["summary"] == summary
+        assert written["requests"][0]["input_tokens"] == 1000
+
+
+class TestHelpers:
+    """Test percentile and cost helpers."""
+
+    def test_percentiles(self):
+        """Test percentile keys and values."""
+        stats = percentiles("latency", [1.0, 2.0, 3.0, 4.0])
+        assert stats["latency_p50"] == 2.5
+        assert stats["latency_mean"] == 2.5
+        assert percentiles("ttft", []) == {}
+
+    def test_estimate_cost(self):
+        """Test cached tokens are billed at the cached rate."""
+        assert estimate_cost("claude-sonnet-4-5", 1_000_000, 0, 0) == 3.0
+        assert estimate_cost("claude-sonnet-4-5", 1_000_000, 0, 1_000_000) == 0.3
+        assert estimate_cost(None, 1, 1, 0) is None
+
+    def test_export_to_trackio(self, monkeypatch):
+        """Test that numeric scores and metrics are logged to trackio."""
+        logged = {}
+        fake = SimpleNamespace(
+            init=lambda project, config: logged.update(project=project, config=config),
+            log=lambda metrics: logged.update(metrics=metrics),
+            finish=lambda: logged.update(finished=True),
+        )
+        monkeypatch.setitem(sys.modules, "trackio", fake)
+
+        export_metrics(
+            "trackio",
+            "proj",
+            {"mode": "direct"},
+            {"latency_p50": 1.0},
+            {"macro precision": 0.5, "candidate_recall@20": 0.9},
+        )
+
+        assert logged["project"] == "proj"
+        assert logged["metrics"] == {
+            "macro_precision": 0.5,
+            "candidate_recall_20": 0.9,
+            "latency_p50": 1.0,
+        }
+        assert logged["finished"]
+
+    def test_export_unknown_tracker(self):
+        """Test that unknown trackers are rejected."""
+        with pytest.raises(ValueError, match="Unknown tracker"):
+            export_metrics("wandb", "proj", {}, {})
@@ -0,0 +1,110 @@
+"""Tests for the offline local-model coder."""
+
+import asyncio
+
+import pytest
+
+from elinker.coders import CodingRequest
+from elinker.local import LocalModelCoder, parse_generation
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+WORDS = (
+    "you are an expert clinical coder given a phrase extracted from medical note along with "
+    "the as context identify most specific billable icd-10-cm diagnosis code for answer "
+    "only input full ###end### acute kidney failure chronic heart pt has history of"
+).split()
+
+
+@pytest.fixture
+def tiny_coder():
+    """A coder backed by a tiny randomly initialized GPT-2."""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    vocab = {"[PAD]": 0, "[UNK]": 1, "[EOS]": 2}
+    for word in WORDS:
+        vocab.setdefault(word, len(vocab))
+
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend, pad_token="[PAD]", unk_token="[UNK]", eos_token="[EOS]"
+    )
+
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=len(vocab), n_positions=512, n_embd=16, n_layer=1, n_head=2)
+    model = GPT2LMHeadModel(config)
+
+    return LocalModelCoder(model, tokenizer, batch_size=2, bucket_width=8, max_new_tokens=3)
+
+
+def request(phrase: str, words: int) -> CodingRequest:
+    """Build a request whose note has the given number of words."""
+    return CodingRequest(phrase, " ".join(["pt has history of"] * words))
+
+
+class TestLocalModelCoder:
+    """Test batching and generation with a tiny model."""
+
+    def test_prefix_is_tokenized_once(self, tiny_coder):
+        """Test that every prompt starts with the cached system prompt IDs."""
+        ids = tiny_coder.encode(request("acute kidney failure", 1))
+        assert ids[: len(tiny_coder.prefix_ids)] == tiny_coder.prefix_ids
+        assert ids[-len(tiny_coder.suffix_ids) :] == tiny_coder.suffix_ids
+
+    def test_batches_group_similar_lengths(self, tiny_coder):
+        """Test that batches never mix length buckets and respect batch size."""
+        pending = [([0] * length, idx) for idx, length in enumerate([3, 30, 4, 31, 5, 6])]
+        batches = tiny_coder.batches(pending)
+
+        assert all(len(batch) <= 2 for batch in batches)
+        for batch in batches:
+            assert len({len(ids) // 8 for ids, _ in batch}) == 1
+        assert sorted(idx for batch in batches for _, idx in batch) == list(range(6))
+
+    def test_concurrent_requests_are_batched(self, tiny_coder):
+        """Test that concurrent calls share generate() calls."""
+        batch_sizes = []
+        original_generate = tiny_coder.generate
+
+        def recording_generate(batch, on_first_token=None):
+            batch_sizes.append(len(batch))
+            return original_generate(batch, on_first_token)
+
+        tiny_coder.generate = recording_generate
+        requests = [request("acute kidney failure", n) for n in (1, 1, 8, 8, 1)]
+
+        async def run():
+            return await asyncio.gather(*(tiny_coder.code(r) for r in requests))
+
+        results = asyncio.run(run())
+
+        assert len(results) == 5
+        assert sum(batch_sizes) == 5
+        assert len(batch_sizes) < 5
+        assert all(0 < r.usage["ttft"] for r in results)
+
+    def test_generation_errors_propagate(self, tiny_coder):
+        """Test that a failing batch fails its callers instead of hanging."""
+
+        def failing_generate(batch, on_first_token=None):
+            raise RuntimeError("out of memory")
+
+        tiny_coder.generate = failing_generate
+
+        with pytest.raises(RuntimeError, match="out of memory"):
+            asyncio.run(tiny_coder.code(request("chronic heart failure", 1)))
+
+
+class TestParseGeneration:
+    """Test code extraction from generated text."""
+
+    def test_extracts_first_code(self):
+        """Test that the first code-shaped token is used."""
+        assert parse_generation("The code is n17.9, not N18.3").code == "N17.9"
+
+    def test_missing_code(self):
+        """Test text without a code."""
+        assert parse_generation("no idea").code == "__MISSING__"
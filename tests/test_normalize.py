@@ -0,0 +1,122 @@
+"""Tests for vectorized code normalization and validation."""
+
+import pytest
+
+from elinker.codes import CodeTable
+from elinker.normalize import CodeValidator, nearest_billable, normalize_codes
+
+
+@pytest.fixture
+def table(code_records):
+    """Code table with a depression category and a deep fracture chain."""
+    extra = [
+        {"code": "F32", "description": "Depressive episode", "is_billable": False},
+        {
+            "code": "F32.0",
+            "description": "Major depressive disorder, single episode, mild",
+            "parent_code": "F32",
+            "is_billable": True,
+        },
+        {
+            "code": "F32.A",
+            "description": "Depression, unspecified",
+            "parent_code": "F32",
+            "is_billable": True,
+        },
+        {"code": "S72", "description": "Fracture of femur", "is_billable": False},
+        {"code": "S72.0", "description": "Fracture of head and neck", "parent_code": "S72"},
+        {"code": "S72.00", "description": "Fracture of neck", "parent_code": "S72.0"},
+        {"code": "S72.001", "description": "Fracture of right neck", "parent_code": "S72.00"},
+        {
+            "code": "S72.001A",
+            "description": "Fracture of right neck, initial encounter",
+            "parent_code": "S72.001",
+            "is_billable": True,
+        },
+    ]
+    return CodeTable(code_records + extra)
+
+
+class TestNormalizeCodes:
+    """Test canonical code formatting."""
+
+    @pytest.mark.parametrize(
+        "raw, expected",
+        [
+            ("E11.9", "E11.9"),
+            (" e119 ", "E11.9"),
+            ("E 11.9", "E11.9"),
+            ("i10", "I10"),
+            ("f32.a", "F32.A"),
+            ("S72001A", "S72.001A"),
+            ("__MISSING__", None),
+            ("E1", None),
+            ("", None),
+            (None, None),
+        ],
+    )
+    def test_formats(self, raw, expected):
+        """Test dotting, casing and rejecting non-codes."""
+        assert normalize_codes([raw]).to_list() == [expected]
+
+
+class TestCodeValidator:
+    """Test validating columns of codes."""
+
+    def test_valid_and_billable(self, table):
+        """Test membership and billable flags."""
+        checked = CodeValidator(table).validate(["e119", "E11", "Z99.9", "nope"])
+
+        assert checked["code"].to_list() == ["E11.9", "E11", "Z99.9", None]
+        assert checked["valid"].to_list() == [True, True, False, False]
+        assert checked["billable"].to_list() == [True, False, False, False]
+
+    def test_descendant_suggestion(self, table):
+        """Test that categories suggest their unspecified billable descendant."""
+        checked = CodeValidator(table).validate(["E11", "F32", "S72", "I10"])
+        assert checked["suggestion"].to_list() == ["E11.9", "F32.A", "S72.001A", "I10"]
+
+    def test_ancestor_suggestion(self, table):
+        """Test that unknown codes take the suggestion of their nearest known ancestor."""
+        checked = CodeValidator(table).validate(["E11.95", "S72.0019", "F32.9", "Z99.9"])
+        assert checked["suggestion"].to_list() == ["E11.9", "S72.001A", "F32.A", None]
+
+    def test_keeps_order_and_length(self, table):
+        """Test that results line up with the input, duplicates included."""
+        codes = ["I10", "E11.95", "I10", None, "F32"] * 50
+        checked = CodeValidator(table).validate(codes)
+
+        assert checked.height == len(codes)
+        assert checked["raw"].to_list() == codes
+
+    def test_annotate(self, table):
+        """Test adding validation fields to prediction records."""
+        predictions = [{"code": "F32.A", "predicted": "f32"}, {"code": "I10", "predicted": "I10"}]
+        CodeValidator(table).annotate(predictions)
+
+        assert predictions[0] == {
+            "code": "F32.A",
+            "predicted": "f32",
+            "normalized": "F32",
+            "valid": True,
+            "billable": False,
+            "suggestion": "F32.A",
+        }
+        assert predictions[1]["billable"] is True
+
+    def test_annotate_empty(self, table):
+        """Test annotating no predictions."""
+        assert CodeValidator(table).annotate([]) == []
+
+
+class TestNearestBillable:
+    """Test the nearest billable descendant map."""
+
+    def test_nearest_billable(self, table):
+        """Test billable codes, shallow descendants and deep chains."""
+        suggestions = nearest_billable(table)
+
+        assert suggestions["I10"] == "I10"
+        assert suggestions["F32"] == "F32.A"
+        assert suggestions["S72.0"] == "S72.001A"
+        assert "Z99" not in suggestions
@@ -0,0 +1,102 @@
+"""Tests for the ICD-10-PCS table loader."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from elinker.pcs import PcsTables, parse_tables
+
+TABLES = Path(__file__).parent / "fixtures" / "icd10pcs_tables_sample.xml"
+
+
+@pytest.fixture
+def pcs():
+    """PCS tables compiled from the sample XML."""
+    return PcsTables.load(TABLES)
+
+
+class TestParseTables:
+    """Test parsing the tables XML."""
+
+    def test_parse_tables(self):
+        """Test reading table axes and rows."""
+        tables = parse_tables(TABLES)
+
+        assert len(tables) == 2
+        assert tables[0]["axes"][2] == ("Operation", "T", "Resection")
+        assert len(tables[0]["rows"]) == 2
+        title, values = tables[0]["rows"][0][0]
+        assert title == "Body Part"
+        assert values == {"J": "Appendix", "K": "Ascending Colon"}
+
+
+class TestPcsTables:
+    """Test validating and decoding codes."""
+
+    def test_compiled_arrays(self, pcs):
+        """Test the dense table and mask arrays."""
+        assert len(pcs) == 2
+        assert pcs.prefixes == ["0DT", "5A1"]
+        assert (pcs.table_ids >= 0).sum() == 2
+        assert pcs.masks.shape == (2, 4, 34, 1)
+
+    @pytest.mark.parametrize(
+        "code, valid",
+        [
+            ("0DTJ4ZZ", True),
+            ("0DTK0ZZ", True),
+            ("0DTN8ZZ", False),  # approach 8 is not in the table
+            ("0DTNFZZ", True),
+            ("0DTJFZZ", False),  # values from different rows
+            ("5A1955Z", True),
+            ("0dtj4zz", True),
+            (" 0DT J4ZZ ", True),
+            ("0DTJ4Z", False),
+            ("0DTJ4ZZZ", False),
+            ("0DTI4ZZ", False),  # I is never a PCS character
+            ("0DQJ4ZZ", False),  # no such table
+            ("", False),
+            (None, False),
+        ],
+    )
+    def test_is_valid(self, pcs, code, valid):
+        """Test that only codes of a single table row are valid."""
+        assert pcs.is_valid(code) is valid
+
+    def test_validate_bulk(self, pcs):
+        """Test validating a column of codes."""
+        codes = ["0DTJ4ZZ", "0DTJFZZ", None, "5A1955Z", "E11.9"] * 1000
+        result = pcs.validate(codes)
+
+        assert result.dtype == np.bool_
+        assert result.tolist() == [True, False, False, True, False] * 1000
+        assert pcs.validate([]).tolist() == []
+
+    def test_decode(self, pcs):
+        """Test decoding a code to its axis meanings."""
+        assert pcs.decode("0DTJ4ZZ") == [
+            ("Section", "Medical and Surgical"),
+            ("Body System", "Gastrointestinal System"),
+            ("Operation", "Resection"),
+            ("Body Part", "Appendix"),
+            ("Approach", "Percutaneous Endoscopic"),
+            ("Device", "No Device"),
+            ("Qualifier", "No Qualifier"),
+        ]
+        assert pcs.decode("5A1955Z")[5] == ("Function", "Ventilation")
+        assert pcs.decode("0DTJFZZ") is None
+
+    def test_annotate(self, pcs):
+        """Test adding validation fields to procedure predictions."""
+        predictions = [{"predicted": "0dtj4zz"}, {"predicted": "0DTJ"}]
+        pcs.annotate(predictions)
+
+        assert predictions == [
+            {"predicted": "0dtj4zz", "normalized": "0DTJ4ZZ", "valid": True, "billable": True},
+            {"predicted": "0DTJ", "normalized": None, "valid": False, "billable": False},
+        ]
+
+    def test_empty_tables(self):
+        """Test that nothing is valid without tables."""
+        assert PcsTables([]).validate(["0DTJ4ZZ"]).tolist() == [False]
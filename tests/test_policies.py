@@ -0,0 +1,192 @@
+"""Tests for hedged and ensemble request policies."""
+
+import asyncio
+
+import pytest
+
+from elinker.coders import CodingRequest, CodingResult
+from elinker.instrumentation import InstrumentedCoder, write_metrics
+from elinker.policies import EnsembleCoder, HedgedCoder, LatencyHistogram
+
+
+class DelayedCoder:
+    """Fake backend answering a fixed code after injected delays.
+
+    Delays are used in turn (the last one repeats); a delay of None fails.
+    Like a streamed backend, a cancelled call reports its input tokens.
+    """
+
+    def __init__(self, code: str, delays: list[float | None], model: str = "fake"):
+        self.answer = code
+        self.delays = list(delays)
+        self.model = model
+        self.calls = 0
+        self.cancelled = 0
+
+    async def code(self, request):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay or 0.0)
+        except asyncio.CancelledError as e:
+            self.cancelled += 1
+            e.usage = {"input_tokens": 10}
+            raise
+        if delay is None:
+            raise RuntimeError(f"{self.model} failed")
+        return CodingResult(self.answer, usage={"input_tokens": 10, "output_tokens": 2})
+
+
+def request():
+    """A coding request."""
+    return CodingRequest("AKI", "Pt has AKI.")
+
+
+class TestLatencyHistogram:
+    """Test the per-backend latency histogram."""
+
+    def test_buckets_and_percentiles(self):
+        """Test bucket counts and percentiles over the recent window."""
+        histogram = LatencyHistogram(window=4)
+        assert histogram.percentile(95) is None
+        for latency in (0.01, 0.2, 0.3, 4.0, 100.0):
+            histogram.observe(latency)
+
+        counts = {bucket["le"]: bucket["count"] for bucket in histogram.to_dict()["buckets"]}
+        assert counts[0.05] == 1
+        assert counts[0.25] == 1
+        assert counts[None] == 1
+        assert sum(counts.values()) == 5
+        assert histogram.percentile(50) == 4.0  # 0.01 left the window
+        assert histogram.percentile(99) == 100.0
+
+
+class TestHedgedCoder:
+    """Test hedging slow primary requests to a backup."""
+
+    def test_fast_primary_is_not_hedged(self):
+        """Test that no backup is sent while the primary answers in time."""
+        primary = DelayedCoder("N17.9", [0.0])
+        backup = DelayedCoder("I10", [0.0])
+        coder = HedgedCoder(primary, backup, initial_delay=0.5)
+
+        result = asyncio.run(coder.code(request()))
+
+        assert result.code == "N17.9"
+        assert backup.calls == 0
+        assert coder.hedged == 0
+
+    def test_slow_primary_is_hedged(self):
+        """Test that the backup wins over a stalled primary, which is cancelled."""
+        primary = DelayedCoder("N17.9", [5.0])
+        backup = DelayedCoder("I10", [0.01])
+        coder = HedgedCoder(primary, backup, initial_delay=0.05)
+
+        result = asyncio.run(asyncio.wait_for(coder.code(request()), timeout=2.0))
+
+        assert result.code == "I10"
+        assert coder.hedged == 1
+        assert primary.cancelled == 1
+        assert coder.histograms["backup"].wins == 1
+        assert coder.histograms["primary"].recent[0] >= 0.05
+
+    def test_delay_follows_recent_latency(self):
+        """Test that the hedge delay becomes a percentile of primary latency."""
+        primary = DelayedCoder("N17.9", [0.01] * 9 + [0.05] + [1.0])
+        backup = DelayedCoder("I10", [0.0])
+        coder = HedgedCoder(primary, backup, percentile=90, min_samples=10, initial_delay=5.0)
+
+        async def run():
+            for _ in range(10):
+                await coder.code(request())
+            assert 0.05 <= coder.hedge_delay() < 0.5
+            return await coder.code(request())
+
+        assert asyncio.run(asyncio.wait_for(run(), timeout=2.0)).code == "I10"
+        assert coder.hedged == 1
+
+    def test_failed_primary_falls_back(self):
+        """Test that a failing primary is hedged at once and both failing raises."""
+        backup = DelayedCoder("I10", [0.0, None])
+        coder = HedgedCoder(DelayedCoder("N17.9", [None]), backup, initial_delay=5.0)
+
+        assert asyncio.run(coder.code(request())).code == "I10"
+        with pytest.raises(RuntimeError, match="fake failed"):
+            asyncio.run(coder.code(request()))
+        assert coder.histograms["primary"].errors == 2
+
+
+class TestEnsembleCoder:
+    """Test voting across backends with early stopping."""
+
+    def test_stops_once_enough_agree(self):
+        """Test that a slow third backend is cancelled once two agree."""
+        slow = DelayedCoder("J44.1", [5.0], model="slow")
+        coder = EnsembleCoder([DelayedCoder("N17.9", [0.01]), DelayedCoder("N17.9", [0.02]), slow])
+
+        result = asyncio.run(asyncio.wait_for(coder.code(request()), timeout=2.0))
+
+        assert result.code == "N17.9"
+        assert result.usage["input_tokens"] == 20
+        assert slow.cancelled == 1
+        assert coder.early_stops == 1
+        assert coder.summary()["backends"]["0:fake"]["wins"] == 1
+
+    def test_plurality_without_agreement(self):
+        """Test the most common answer wins when no code reaches the vote count."""
+        coders = [
+            DelayedCoder("I10", [0.01]),
+            DelayedCoder("N17.9", [0.02]),
+            DelayedCoder("N17.9", [None]),
+        ]
+        coder = EnsembleCoder(coders, votes=3)
+
+        assert asyncio.run(coder.code(request())).code == "I10"  # Tie: earliest answer
+        assert coder.early_stops == 0
+        assert coder.histograms["2:fake"].errors == 1
+
+    def test_instrumented(self):
+        """Test that a policy can be wrapped like any coder."""
+        coder = InstrumentedCoder(EnsembleCoder([DelayedCoder("I10", [0.0])] * 2))
+        asyncio.run(coder.code(request()))
+        assert coder.summary()["input_tokens"] == 20
+        assert coder.model is None  # Backends may be on different models
+
+
+class TestPolicyCost:
+    """Test per-backend usage and cost of the policies."""
+
+    def test_hedged_loser_is_priced(self, tmp_path):
+        """Test that a cancelled primary and the backup are priced at their own models."""
+        primary = DelayedCoder("N17.9", [1.0], model="claude-opus-4-5")
+        backup = DelayedCoder("N17.9", [0.0], model="claude-haiku-4-5")
+        coder = HedgedCoder(primary, backup, initial_delay=0.05)
+        instrumented = InstrumentedCoder(coder)
+        asyncio.run(instrumented.code(request()))
+
+        backends = coder.summary()["backends"]
+        assert primary.cancelled == 1
+        assert backends["primary"]["input_tokens"] == 10
+        assert backends["primary"]["cost_usd"] == 0.00005  # 10 Opus input tokens
+        assert backends["backup"]["cost_usd"] == 0.00002  # 10 input, 2 output on Haiku
+
+        summary = write_metrics(tmp_path, instrumented, coder)
+        assert summary["input_tokens"] == 20
+        assert summary["cost_usd"] == 0.00007
+        assert summary["policy"]["backends"]["backup"]["model"] == "claude-haiku-4-5"
+
+    def test_ensemble_cost(self, tmp_path):
+        """Test that ensemble members are priced separately, and unpriced ones drop the cost."""
+        coder = EnsembleCoder(
+            [
+                DelayedCoder("I10", [0.0], model="claude-sonnet-4-5"),
+                DelayedCoder("I10", [0.0], model="claude-haiku-4-5"),
+            ]
+        )
+        asyncio.run(coder.code(request()))
+        assert coder.summary()["cost_usd"] == 0.00008  # Sonnet 0.00006, Haiku 0.00002
+
+        coder = EnsembleCoder([DelayedCoder("I10", [0.0]), DelayedCoder("I10", [0.0])])
+        asyncio.run(coder.code(request()))
+        summary = write_metrics(tmp_path, InstrumentedCoder(coder, model="claude-opus-4-5"), coder)
+        assert "cost_usd" not in summary
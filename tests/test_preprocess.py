@@ -0,0 +1,220 @@
+"""Tests for cached preprocessing of dataset splits."""
+
+import asyncio
+import json
+
+import polars as pl
+import pytest
+
+from elinker.coders import AnthropicCoder, CodingRequest, CodingResult
+from elinker.context import ContextSelector
+from elinker.preprocess import (
+    PreparedRows,
+    context_token_totals,
+    fingerprint,
+    load_prepared,
+    prepare,
+)
+from elinker.prompts import CANDIDATES_TEMPLATE, DEFAULT_TEMPLATE, render_prompt
+from elinker.runner import build_requests, run_evaluation
+
+ROWS = [
+    {
+        "hadm_id": 1,
+        "note_id": 10,
+        "text": "Acute kidney failure noted.",
+        "begin": 0,
+        "end": 20,
+        "covered_text": "Acute kidney failure",
+        "code": "N17.9",
+        "split": "dev",
+    },
+    {
+        "hadm_id": 2,
+        "note_id": 20,
+        "text": "History of high blood pressure.",
+        "begin": 11,
+        "end": 30,
+        "covered_text": "high blood pressure",
+        "code": "I10",
+        "split": "dev",
+    },
+    {
+        "hadm_id": 3,
+        "note_id": 30,
+        "text": "COPD exacerbation.",
+        "begin": 0,
+        "end": 17,
+        "covered_text": "COPD exacerbation",
+        "code": "J44.1",
+        "split": "train",
+    },
+]
+
+
+@pytest.fixture
+def files(tmp_path, code_records):
+    """MDACE-style parquet file and code table on disk."""
+    data = tmp_path / "mdace.parquet"
+    pl.DataFrame(ROWS).write_parquet(data)
+    codes = tmp_path / "codes.json"
+    codes.write_text(json.dumps(code_records))
+    return data, codes
+
+
+class EchoCoder:
+    """Answers with the top candidate and records the prompts it was sent."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def code(self, request):
+        self.prompts.append(AnthropicCoder(client=object()).build_prompt(request))
+        return CodingResult(request.candidates[0].code)
+
+
+class TestFingerprint:
+    """Test the cache key of preprocessing runs."""
+
+    def test_inputs_change_key(self, files):
+        """Test that settings, templates and file contents change the key."""
+        data, codes = files
+        config = {"split": "dev", "limit": None, "template": DEFAULT_TEMPLATE, "k": None}
+        key = fingerprint(data, config)
+
+        assert fingerprint(data, dict(reversed(config.items()))) == key
+        assert fingerprint(data, {**config, "limit": 1}) != key
+        assert fingerprint(data, {**config, "context_tokenizer": "gpt2"}) != key
+        assert fingerprint(data, {**config, "template": CANDIDATES_TEMPLATE}) != key
+        assert fingerprint(data, config, codes) != key
+
+        pl.DataFrame(ROWS[:2]).write_parquet(data)
+        assert fingerprint(data, config) != key
+
+
+class TestPrepare:
+    """Test rendering, caching and loading a prepared split."""
+
+    @pytest.fixture(autouse=True)
+    def _datasets(self):
+        pytest.importorskip("datasets")
+
+    def test_candidates_and_prompts(self, tmp_path, files):
+        """Test that prepared requests carry candidates and rendered prompts."""
+        data, codes = files
+        directory, cached = prepare(data, tmp_path / "cache", split="dev", codes=codes, k=2)
+        assert not cached
+
+        meta, examples, requests = load_prepared(directory)
+        assert meta["rows"] == 2
+        assert meta["template"] == CANDIDATES_TEMPLATE
+        assert [row["code"] for row in examples] == ["N17.9", "I10"]
+        assert "prompt" not in examples[0]
+
+        assert [c.code for c in requests[1].candidates][0] == "I10"
+        assert "high blood pressure" in requests[1].prompt
+        assert "I10: Essential (primary) hypertension" in requests[1].prompt
+        assert AnthropicCoder(client=object()).build_prompt(requests[1]) == requests[1].prompt
+
+    def test_procedures_get_free_text_prompt(self, tmp_path, files):
+        """Test that ICD-10-PCS rows get no candidates and the default prompt."""
+        data, codes = files
+        systems = ["ICD-10-CM", "ICD-10-PCS", "ICD-10-CM"]
+        pl.DataFrame(ROWS).with_columns(code_system=pl.Series(systems)).write_parquet(data)
+        directory, _ = prepare(data, tmp_path / "cache", split="dev", codes=codes, k=2)
+        _, _, requests = load_prepared(directory)
+
+        assert len(requests[0].candidates) == 2
+        assert requests[1].candidates is None
+        assert requests[1].prompt == render_prompt(
+            DEFAULT_TEMPLATE,
+            clinical_note=requests[1].clinical_note,
+            clinical_phrase="high blood pressure",
+            candidates=[],
+            exemplars=[],
+        )
+
+    def test_rows_are_read_lazily(self, tmp_path, files):
+        """Test that iterating in batches and indexing build the same rows."""
+        data, codes = files
+        directory, _ = prepare(data, tmp_path / "cache", split="dev", codes=codes, k=2)
+        _, examples, requests = load_prepared(directory, batch_size=1)
+
+        assert isinstance(requests, PreparedRows)
+        assert len(requests) == 2
+        assert [r.prompt for r in requests] == [requests[0].prompt, requests[-1].prompt]
+        assert [r.request_id for r in requests] == [0, 1]
+        assert list(examples) == [examples[0], examples[1]]
+        with pytest.raises(IndexError):
+            requests[2]
+
+    def test_context_token_totals(self, tmp_path, files):
+        """Test that a prepared split reports the context reduction of a direct run."""
+        data, _ = files
+        directory, _ = prepare(data, tmp_path / "cache", split="dev", context_tokens=2)
+        _, examples, _ = load_prepared(directory)
+
+        selector = ContextSelector(max_tokens=2)
+        build_requests(list(examples), context=selector)
+        assert selector.reduction > 0
+        assert context_token_totals(directory) == (
+            selector.selected_tokens,
+            selector.original_tokens,
+        )
+        assert context_token_totals(directory, [1])[1] < selector.original_tokens
+
+    def test_no_stale_sections_across_datasets(self, tmp_path, files):
+        """Test that a second dataset with the same note ids gets its own context."""
+        data, _ = files
+        first, _ = prepare(data, tmp_path / "cache", split="dev", context_tokens=8)
+
+        other = tmp_path / "other.parquet"
+        header = "PLAN:\nFollow up in clinic.\n\nHPI:\n"
+        rows = [
+            {**row, "text": header + row["text"], "begin": row["begin"] + len(header)}
+            for row in ROWS
+        ]
+        for row in rows:
+            row["end"] = row["begin"] + len(row["covered_text"])
+        pl.DataFrame(rows).write_parquet(other)
+        second, _ = prepare(other, tmp_path / "cache", split="dev", context_tokens=8)
+
+        _, _, requests = load_prepared(second)
+        assert second != first
+        selector = ContextSelector(max_tokens=8)
+        for request, row in zip(requests, rows[:2], strict=True):
+            assert request.clinical_note == selector.select(
+                row["text"], row["begin"], row["end"], key=row["note_id"]
+            )
+
+    def test_reuses_cache(self, tmp_path, files):
+        """Test that the same inputs reuse the stored split and new ones do not."""
+        data, _ = files
+        first, _ = prepare(data, tmp_path / "cache", split="dev", num_proc=2, batch_size=1)
+        again, cached = prepare(data, tmp_path / "cache", split="dev")
+        assert again == first
+        assert cached
+
+        other, cached = prepare(data, tmp_path / "cache", split="dev", context_tokens=4)
+        assert other != first
+        assert not cached
+
+    def test_run_from_prepared(self, tmp_path, files):
+        """Test that a run sends the prepared prompts and reports candidate recall."""
+        data, codes = files
+        directory, _ = prepare(data, tmp_path / "cache", split="dev", codes=codes, k=2)
+        _, examples, requests = load_prepared(directory)
+
+        coder = EchoCoder()
+        scores, _, _ = asyncio.run(run_evaluation(examples, coder, k=2, requests=requests))
+        assert coder.prompts == [request.prompt for request in requests]
+        assert "candidate_recall@2" in scores
+
+
+class TestPreparedPrompt:
+    """Test that a rendered prompt replaces the template."""
+
+    def test_prompt_is_sent_as_is(self):
+        """Test that build_prompt returns a request's rendered prompt."""
+        request = CodingRequest("AKI", "Pt has AKI.", prompt="Code AKI.")
+        assert AnthropicCoder(client=object()).build_prompt(request) == "Code AKI."
@@ -0,0 +1,125 @@
+"""Tests for the profiling module and the global --profile option."""
+
+import pstats
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from rich.console import Console
+
+from elinker import cli
+from elinker.profiling import _format_bytes, profiled
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _busy(n: int = 20000) -> int:
+    return sum(i * i for i in range(n))
+
+
+class TestProfiled:
+    """Test the profiling context manager."""
+
+    def test_cpu_report_lists_hot_functions(self, tmp_path):
+        """Test that the CPU report names the profiled functions."""
+        output = tmp_path / "cpu.txt"
+        with profiled("cpu", output, top=10):
+            _busy()
+
+        report = output.read_text()
+        assert "CPU profile" in report
+        assert "by internal time" in report
+        assert "by cumulative time" in report
+        assert "_busy" in report
+
+    def test_prof_output_is_loadable(self, tmp_path):
+        """Test that a .prof output holds raw stats pstats can load."""
+        output = tmp_path / "run.prof"
+        with profiled("cpu", output):
+            _busy()
+
+        stats = pstats.Stats(str(output))
+        assert any(name == "_busy" for _, _, name in stats.stats)
+
+    def test_memory_report_lists_allocation_sites(self, tmp_path):
+        """Test that the memory report shows peak memory and allocation sites."""
+        output = tmp_path / "mem.txt"
+        with profiled("mem", output, top=5):
+            blocks = [bytearray(1024) for _ in range(1000)]
+
+        report = output.read_text()
+        assert "Peak traced memory" in report
+        assert "Top 5 allocation sites" in report
+        assert "test_profiling.py" in report
+        assert len(blocks) == 1000
+
+    def test_report_written_on_exit(self, tmp_path):
+        """Test that the report is written when the block exits the process."""
+        output = tmp_path / "cpu.txt"
+        with pytest.raises(SystemExit):
+            with profiled("cpu", output):
+                raise SystemExit(1)
+        assert output.exists()
+
+    def test_report_printed_without_output(self):
+        """Test that the report is printed to the console when no file is given."""
+        buffer = StringIO()
+        with profiled("cpu", console=Console(file=buffer, width=200)):
+            _busy()
+        assert "by internal time" in buffer.getvalue()
+
+    def test_unknown_mode(self):
+        """Test that an unknown mode is rejected."""
+        with pytest.raises(ValueError, match="Unknown profile mode"):
+            with profiled("gpu"):
+                pass
+
+    def test_format_bytes(self):
+        """Test human-readable byte counts."""
+        assert _format_bytes(512) == "512.0 B"
+        assert _format_bytes(2048) == "2.0 KiB"
+        assert _format_bytes(3 * 1024**3) == "3.0 GiB"
+
+
+class TestProfileOption:
+    """Test the global --profile option of the CLI."""
+
+    def test_profile_sync_command(self, tmp_path):
+        """Test profiling a synchronous command."""
+        output = tmp_path / "view-json.txt"
+        with pytest.raises(SystemExit) as exc_info:
+            cli.app.meta(
+                [
+                    "--profile",
+                    "cpu",
+                    "--profile-out",
+                    str(output),
+                    "view-json",
+                    str(FIXTURES / "sample.json"),
+                ]
+            )
+        assert exc_info.value.code in (0, None)
+        assert "view_json" in output.read_text()
+
+    def test_profile_async_command(self, tmp_path):
+        """Test that an async command failing under the profiler still writes the report."""
+        output = tmp_path / "view.txt"
+        with pytest.raises(SystemExit) as exc_info:
+            cli.app.meta(
+                [
+                    "--profile",
+                    "mem",
+                    "--profile-out",
+                    str(output),
+                    "view",
+                    str(tmp_path / "missing.json"),
+                ]
+            )
+        assert exc_info.value.code == 1
+        assert "Peak traced memory" in output.read_text()
+
+    def test_without_profile(self):
+        """Test that commands run unprofiled by default."""
+        with pytest.raises(SystemExit) as exc_info:
+            cli.app.meta(["view-json", str(FIXTURES / "sample.json")])
+        assert exc_info.value.code in (0, None)
@@ -0,0 +1,170 @@
+"""Tests for multi-release code tables."""
+
+import copy
+import datetime
+import json
+from pathlib import Path
+
+import pytest
+
+from elinker.codes import CodeTable
+from elinker.normalize import CodeValidator
+from elinker.releases import CodeReleases, parse_release
+
+
+@pytest.fixture
+def releases(code_records):
+    """Three releases: 2024, 2025 adding F32.A and retitling I10, 2026 deleting J44.1."""
+    fy2024 = [record for record in code_records if record["code"] != "F32.A"]
+    fy2025 = copy.deepcopy(fy2024) + [
+        {"code": "F32.A", "description": "Depression, unspecified", "is_billable": True}
+    ]
+    fy2025[2]["description"] = "Essential hypertension"
+    fy2026 = [copy.deepcopy(record) for record in fy2025 if record["code"] != "J44.1"]
+
+    releases = CodeReleases()
+    for year, records in ((2024, fy2024), (2025, fy2025), (2026, fy2026)):
+        releases.add(year, records)
+    return releases
+
+
+class TestCodeReleases:
+    """Test loading, sharing and querying releases."""
+
+    def test_stable_ids(self, releases):
+        """Test that a code has one ID across releases."""
+        assert releases.years == [2024, 2025, 2026]
+        assert len(releases.codes) == len(set(releases.codes))
+        assert releases.codes[releases.ids["F32.A"]] == "F32.A"
+
+    def test_membership(self, releases):
+        """Test per-release membership."""
+        assert not releases.contains("F32.A", 2024)
+        assert releases.contains("F32.A", 2025)
+        assert releases.contains("J44.1", 2025)
+        assert not releases.contains("J44.1", 2026)
+        assert not releases.contains("Z99.9", 2026)
+
+    def test_get(self, releases, code_records):
+        """Test that records come back as they were added."""
+        assert releases.get("E11.9", 2024) == code_records[1]
+        assert releases.get("I10", 2024)["description"] == "Essential (primary) hypertension"
+        assert releases.get("I10", 2025)["description"] == "Essential hypertension"
+        assert releases.get("J44.1", 2026) is None
+        assert releases.is_billable("F32.A", 2026)
+        assert not releases.is_billable("E11", 2026)
+
+    def test_structural_sharing(self, code_records):
+        """Test that identical releases share every record and string."""
+        one = CodeReleases()
+        one.add(2025, code_records)
+        many = CodeReleases()
+        for year in range(2022, 2027):
+            many.add(year, copy.deepcopy(code_records))
+
+        assert len(many.records) == len(one.records)
+        assert len(many._strings) == len(one._strings)
+        assert many.get("E11", 2022)["description"] is many.get("E11", 2026)["description"]
+
+    def test_diff(self, releases):
+        """Test added, deleted and retitled codes."""
+        assert releases.diff(2024, 2025) == {
+            "added": ["F32.A"],
+            "deleted": [],
+            "retitled": [
+                {
+                    "code": "I10",
+                    "old": "Essential (primary) hypertension",
+                    "new": "Essential hypertension",
+                }
+            ],
+        }
+        assert releases.diff(2025, 2026) == {"added": [], "deleted": ["J44.1"], "retitled": []}
+        assert releases.diff(2026, 2024)["added"] == ["J44.1"]
+
+    @pytest.mark.parametrize(
+        "date, year",
+        [
+            ("2024-09-30", 2024),
+            ("2024-10-01", 2025),
+            (datetime.date(2025, 3, 1), 2025),
+            ("2025-10-15T08:00:00", 2026),
+            ("2010-01-01", 2024),
+            ("2031-01-01", 2026),
+        ],
+    )
+    def test_release_for(self, releases, date, year):
+        """Test fiscal years starting in October, falling back to the nearest release."""
+        assert releases.release_for(date) == year
+
+    def test_table(self, releases):
+        """Test materializing one release as a code table."""
+        table = releases.table(2026)
+
+        assert isinstance(table, CodeTable)
+        assert "F32.A" in table
+        assert "J44.1" not in table
+        assert table.records[0]["code"] == "E11"
+
+    def test_load(self, tmp_path, code_records):
+        """Test loading releases from files."""
+        paths = {}
+        for year in (2026, 2019):
+            paths[year] = tmp_path / f"icd10cm-table-and-index-{year}" / "diagnoses_recursive.json"
+            paths[year].parent.mkdir()
+            paths[year].write_text(json.dumps(code_records))
+
+        releases = CodeReleases.load(paths)
+        assert releases.years == [2019, 2026]
+        assert releases.diff(2019, 2026) == {"added": [], "deleted": [], "retitled": []}
+
+    def test_annotate_by_note_date(self, releases):
+        """Test that predictions are validated against the release of their date."""
+        predictions = [
+            {"predicted": "F32.A"},
+            {"predicted": "f32a"},
+            {"predicted": "J44.1"},
+            {"predicted": "J44.1"},
+        ]
+        releases.annotate(predictions, ["2024-05-01", "2025-01-01", "2025-01-01", None])
+
+        assert [record["release"] for record in predictions] == [2024, 2025, 2025, 2026]
+        assert [record["valid"] for record in predictions] == [False, True, True, False]
+        assert predictions[1]["normalized"] == "F32.A"
+
+    def test_annotate_matches_code_validator(self, releases):
+        """Test that bitmap validation agrees with a CodeValidator over each release."""
+        releases.add(
+            2027,
+            [
+                {"code": "E11", "description": "Type 2 diabetes", "is_billable": False},
+                {"code": "E11.6", "parent_code": "E11", "is_billable": False},
+                {"code": "E11.65", "parent_code": "E11.6", "is_billable": True},
+                {
+                    "code": "E11.69",
+                    "description": "Complication, unspecified",
+                    "parent_code": "E11.6",
+                    "is_billable": True,
+                },
+                {"code": "I50", "is_billable": False},
+                {"code": "I50.3", "parent_code": "I50", "is_billable": False},
+                {"code": "I50.33", "parent_code": "I50.3", "is_billable": True},
+                {"code": "I50.31", "parent_code": "I50.3", "is_billable": True},
+            ],
+        )
+        codes = ["E11", "e11.9", "E11.6", "E11.64", "I50", "I50.339", "J44.1", "F32.A", "X", None]
+        for year in releases.years:
+            expected = CodeValidator(releases.table(year)).annotate(
+                [{"predicted": code} for code in codes]
+            )
+            dated = releases.annotate(
+                [{"predicted": code} for code in codes], [f"{year - 1}-12-01"] * len(codes)
+            )
+            assert [record.pop("release") for record in dated] == [year] * len(codes)
+            assert dated == expected, year
+
+    def test_parse_release(self):
+        """Test parsing YEAR=PATH arguments."""
+        assert parse_release("2025=data/codes.json") == (2025, Path("data/codes.json"))
+        with pytest.raises(ValueError, match="YEAR=PATH"):
+            parse_release("data/codes.json")
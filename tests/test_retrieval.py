@@ -0,0 +1,102 @@
+"""Tests for the code table and candidate retrieval."""
+
+import json
+
+import pytest
+
+from elinker.codes import CodeTable
+from elinker.retrieval import Candidate, CandidateRetriever
+
+
+class TestCodeTable:
+    """Test the in-memory code table."""
+
+    def test_load_from_json(self, tmp_path, code_records):
+        """Test loading a diagnoses_recursive.json file."""
+        path = tmp_path / "diagnoses_recursive.json"
+        path.write_text(json.dumps(code_records))
+
+        table = CodeTable.load(path)
+        assert len(table) == len(code_records)
+        assert "E11.9" in table
+
+    def test_lookup(self, code_table):
+        """Test code lookups."""
+        assert code_table.description("I10") == "Essential (primary) hypertension"
+        assert code_table.get("Z99.99") is None
+        assert code_table.description("Z99.99") == ""
+
+    def test_is_billable(self, code_table):
+        """Test the billable flag."""
+        assert code_table.is_billable("E11.9")
+        assert not code_table.is_billable("E11")
+        assert not code_table.is_billable("Z99.99")
+
+
+class TestCandidateRetriever:
+    """Test TF-IDF candidate retrieval."""
+
+    def test_retrieves_matching_code_first(self, code_table):
+        """Test that the best lexical match is ranked first."""
+        retriever = CandidateRetriever(code_table)
+        candidates = retriever.retrieve("acute kidney failure", k=3)
+
+        assert len(candidates) == 3
+        assert candidates[0].code == "N17.9"
+        assert all(isinstance(c, Candidate) for c in candidates)
+
+    def test_scores_are_sorted(self, code_table):
+        """Test that candidates are ordered by descending score."""
+        retriever = CandidateRetriever(code_table)
+        scores = [c.score for c in retriever.retrieve("diastolic heart failure", k=5)]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_billable_only(self, code_table):
+        """Test that category codes are excluded by default."""
+        retriever = CandidateRetriever(code_table)
+        codes = {c.code for c in retriever.retrieve("diabetes", k=10)}
+        assert "E11" not in codes
+        assert "E11.9" in codes
+
+    def test_include_categories(self, code_table):
+        """Test indexing non-billable codes."""
+        retriever = CandidateRetriever(code_table, billable_only=False)
+        codes = {c.code for c in retriever.retrieve("diabetes", k=10)}
+        assert "E11" in codes
+
+    def test_inclusion_terms_are_indexed(self, code_table):
+        """Test that inclusion terms contribute to matching."""
+        retriever = CandidateRetriever(code_table)
+        assert retriever.retrieve("high blood pressure", k=1)[0].code == "I10"
+
+    def test_batch_matches_single(self, code_table):
+        """Test that batched retrieval agrees with one-at-a-time retrieval."""
+        retriever = CandidateRetriever(code_table, batch_size=2)
+        phrases = ["copd exacerbation", "hypertension", "kidney failure"]
+
+        batched = retriever.retrieve_batch(phrases, k=2)
+        single = [retriever.retrieve(phrase, k=2) for phrase in phrases]
+
+        assert [[c.code for c in cs] for cs in batched] == [[c.code for c in cs] for cs in single]
+
+    def test_k_larger_than_table(self, code_table):
+        """Test that k is capped at the number of indexed codes."""
+        retriever = CandidateRetriever(code_table)
+        assert len(retriever.retrieve("failure", k=100)) == 5
+
+    def test_save_and_load(self, code_table, tmp_path):
+        """Test that a saved index answers like the fitted one."""
+        retriever = CandidateRetriever(code_table)
+        retriever.save(tmp_path / "index")
+
+        for mmap in (True, False):
+            loaded = CandidateRetriever.load(tmp_path / "index", mmap=mmap)
+            phrases = ["copd exacerbation", "high blood pressure", "acute on chronic chf"]
+            expected = retriever.retrieve_batch(phrases, k=3)
+            actual = loaded.retrieve_batch(phrases, k=3)
+
+            assert loaded.table is None
+            assert [[(c.code, c.description) for c in cs] for cs in actual] == [
+                [(c.code, c.description) for c in cs] for cs in expected
+            ]
+            assert [c.score for c in actual[0]] == pytest.approx([c.score for c in expected[0]])
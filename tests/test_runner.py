@@ -0,0 +1,271 @@
+"""Tests for evaluation runs and scoring."""
+
+import asyncio
+import json
+
+from elinker.assertions import AssertionFilter
+from elinker.coders import MISSING_CODE, CodingResult
+from elinker.context import token_starts
+from elinker.metrics import candidate_recall, score_predictions, span_scores
+from elinker.retrieval import Candidate, CandidateRetriever
+from elinker.runner import ERROR_CODE, build_requests, run_evaluation, write_run
+
+EXAMPLES = [
+    {
+        "hadm_id": 1,
+        "note_id": 10,
+        "text": "Acute kidney failure noted.",
+        "begin": 0,
+        "end": 20,
+        "covered_text": "Acute kidney failure",
+        "code": "N17.9",
+    },
+    {
+        "hadm_id": 1,
+        "note_id": 10,
+        "text": "History of high blood pressure.",
+        "begin": 11,
+        "end": 30,
+        "covered_text": "high blood pressure",
+        "code": "I10",
+    },
+    {
+        "hadm_id": 2,
+        "note_id": 20,
+        "text": "COPD exacerbation.",
+        "begin": 0,
+        "end": 17,
+        "covered_text": "COPD exacerbation",
+        "code": "J44.1",
+    },
+]
+
+
+class EchoCoder:
+    """Answers with the top candidate, or fails for one phrase."""
+
+    def __init__(self, fail_on: str | None = None):
+        self.fail_on = fail_on
+        self.calls = 0
+
+    async def code(self, request):
+        self.calls += 1
+        if request.clinical_phrase == self.fail_on:
+            raise RuntimeError("boom")
+        if request.candidates:
+            return CodingResult(request.candidates[0].code)
+        return CodingResult("N17.9")
+
+
+class TestScorePredictions:
+    """Test scoring of predicted codes."""
+
+    def test_scores_keys(self):
+        """Test that scores keep the scores.json layout."""
+        scores, report = score_predictions(["A", "B"], ["A", "C"])
+        assert scores["evaluated_examples"] == 2
+        assert scores["accuracy"] == 0.5
+        assert "macro precision" in scores
+        assert "precision" in report
+
+    def test_candidate_recall(self):
+        """Test recall@k over candidate lists."""
+        candidates = [[Candidate("A", "", 1.0)], [Candidate("C", "", 1.0)]]
+        assert candidate_recall(["A", "B"], candidates) == 0.5
+        assert candidate_recall([], []) == 0.0
+
+
+class TestSpanScores:
+    """Test span-level evidence scores."""
+
+    @staticmethod
+    def record(note_id, begin, end, code, predicted, category="Discharge summary"):
+        """A prediction record."""
+        return {
+            "hadm_id": 1,
+            "note_id": note_id,
+            "category": category,
+            "begin": begin,
+            "end": end,
+            "code": code,
+            "predicted": predicted,
+        }
+
+    def test_exact_and_overlap(self):
+        """Test that overlapping spans of the same code only count for the overlap variant."""
+        records = [
+            self.record(10, 0, 20, "N17.9", None),
+            self.record(10, 5, 20, None, "N17.9"),  # Overlaps the gold span
+            self.record(10, 30, 40, "I10", "I10"),
+            self.record(11, 30, 40, None, "I10"),  # Same offsets, other note
+        ]
+        scores = span_scores(records)
+
+        assert scores["span_gold"] == 2
+        assert scores["span_predicted"] == 3
+        assert scores["span_exact_micro_precision"] == 0.3333
+        assert scores["span_exact_micro_recall"] == 0.5
+        assert scores["span_overlap_micro_precision"] == 0.6667
+        assert scores["span_overlap_micro_recall"] == 1.0
+        # Macro over N17.9 (P 0, R 0 exact) and I10 (P 0.5, R 1)
+        assert scores["span_exact_macro_precision"] == 0.25
+        assert scores["span_exact_macro_recall"] == 0.5
+
+    def test_token_overlap(self):
+        """Test that the token variant scores the words shared by gold and predicted spans."""
+        text = "Acute kidney failure noted."
+        records = [
+            {**self.record(10, 0, 20, "N17.9", None), "span_tokens": token_starts(text, 0, 20)},
+            {**self.record(10, 6, 20, None, "N17.9"), "span_tokens": token_starts(text, 6, 20)},
+        ]
+        scores = span_scores(records)
+
+        assert scores["span_overlap_micro_recall"] == 1.0
+        assert scores["span_token_micro_precision"] == 1.0
+        assert scores["span_token_micro_recall"] == 0.6667
+        assert scores["span_by_code"]["N17.9"]["token"]["recall"] == 0.6667
+        assert "span_token_micro_f1" not in span_scores([self.record(10, 0, 5, "A", "A")])
+
+    def test_by_code(self):
+        """Test the per-code span counts and figures."""
+        records = [
+            self.record(10, 0, 5, "A", "A"),
+            self.record(10, 10, 15, "B", "C"),
+        ]
+        by_code = span_scores(records)["span_by_code"]
+
+        assert list(by_code) == ["A", "B", "C"]
+        assert by_code["A"]["exact"] == {"precision": 1.0, "recall": 1.0, "f1": 1.0}
+        assert by_code["B"] == {
+            "gold": 1,
+            "predicted": 0,
+            "exact": {"precision": 0.0, "recall": 0.0, "f1": 0.0},
+            "overlap": {"precision": 0.0, "recall": 0.0, "f1": 0.0},
+        }
+        assert by_code["C"]["predicted"] == 1
+
+    def test_by_category(self):
+        """Test per-category breakdowns and unanswered predictions."""
+        records = [
+            self.record(10, 0, 5, "A", "A"),
+            self.record(10, 10, 15, "B", "C"),
+            self.record(20, 0, 5, "A", MISSING_CODE, category="Radiology"),
+            self.record(20, 10, 15, "B", ERROR_CODE, category="Radiology"),
+        ]
+        by_category = span_scores(records, unanswered=(MISSING_CODE, ERROR_CODE))[
+            "span_by_category"
+        ]
+
+        assert by_category["Discharge summary"]["gold"] == 2
+        assert by_category["Discharge summary"]["exact"] == {
+            "precision": 0.5,
+            "recall": 0.5,
+            "f1": 0.5,
+        }
+        assert by_category["Radiology"]["predicted"] == 0
+        assert by_category["Radiology"]["overlap"]["recall"] == 0.0
+
+
+class TestRunEvaluation:
+    """Test end-to-end evaluation runs with a fake coder."""
+
+    def test_build_requests_with_candidates(self, code_table):
+        """Test that candidates are attached when a retriever is given."""
+        requests = build_requests(EXAMPLES, CandidateRetriever(code_table), k=2)
+        assert all(len(r.candidates) == 2 for r in requests)
+        assert requests[1].begin == 11
+
+    def test_procedures_get_no_candidates(self, code_table):
+        """Test that ICD-10-PCS spans stay unconstrained and out of recall@k."""
+        procedure = {**EXAMPLES[0], "covered_text": "Hemodialysis", "code": "5A1D70Z"}
+        examples = [
+            {**EXAMPLES[0], "code_system": "ICD-10-CM"},
+            {**procedure, "code_system": "ICD-10-PCS"},
+        ]
+        requests = build_requests(examples, CandidateRetriever(code_table), k=2)
+        assert len(requests[0].candidates) == 2
+        assert requests[1].candidates is None
+
+        scores, _, predictions = asyncio.run(
+            run_evaluation(examples, EchoCoder(), retriever=CandidateRetriever(code_table), k=2)
+        )
+        assert "candidates" not in predictions[1]
+        assert scores["candidate_recall@2"] == 1.0
+
+    def test_direct_run(self):
+        """Test a run without candidates."""
+        scores, _, predictions = asyncio.run(run_evaluation(EXAMPLES, EchoCoder()))
+        assert scores["evaluated_examples"] == 3
+        assert scores["errors"] == 0
+        assert not any(key.startswith("candidate_recall") for key in scores)
+        assert "candidates" not in predictions[0]
+        assert scores["span_gold"] == 3
+        assert scores["span_exact_micro_recall"] == 0.3333
+        assert predictions[0]["span_tokens"] == [0, 6, 13]
+        assert scores["span_token_micro_recall"] == 0.375  # 3 of 8 gold tokens
+
+    def test_candidate_run_reports_recall(self, code_table):
+        """Test that candidate mode reports recall@k next to accuracy."""
+        retriever = CandidateRetriever(code_table)
+        scores, _, predictions = asyncio.run(
+            run_evaluation(EXAMPLES, EchoCoder(), retriever=retriever, k=3)
+        )
+        assert "candidate_recall@3" in scores
+        assert scores["candidate_recall@3"] >= scores["accuracy"]
+        assert len(predictions[0]["candidates"]) == 3
+
+    def test_errors_do_not_abort_run(self):
+        """Test that a failing request is recorded as an error."""
+        scores, _, predictions = asyncio.run(
+            run_evaluation(EXAMPLES, EchoCoder(fail_on="COPD exacerbation"))
+        )
+        assert scores["errors"] == 1
+        assert predictions[2]["predicted"] == ERROR_CODE
+        assert predictions[2]["error"] == "boom"
+
+    def test_write_run(self, tmp_path):
+        """Test that run files are written."""
+        scores, report, predictions = asyncio.run(run_evaluation(EXAMPLES, EchoCoder()))
+        write_run(tmp_path / "run", scores, report, predictions)
+
+        assert json.loads((tmp_path / "run" / "scores.json").read_text()) == scores
+        assert (tmp_path / "run" / "report.txt").read_text() == report
+        lines = (tmp_path / "run" / "predictions.jsonl").read_text().splitlines()
+        assert len(lines) == 3
+
+    def test_assertion_filter_skips_calls(self):
+        """Test that skipped spans avoid the coder and are reported in the scores."""
+        examples = EXAMPLES + [
+            {
+                "hadm_id": 2,
+                "note_id": 20,
+                "text": "No evidence of acute kidney failure.",
+                "begin": 15,
+                "end": 35,
+                "covered_text": "acute kidney failure",
+                "code": "N17.9",
+            }
+        ]
+        coder = EchoCoder()
+        scores, _, predictions = asyncio.run(
+            run_evaluation(examples, coder, assertions=AssertionFilter(skip=["negated"]))
+        )
+
+        assert coder.calls == 3
+        assert predictions[3]["predicted"] == MISSING_CODE
+        assert predictions[3]["skipped"] is True
+        assert predictions[3]["assertions"] == {"negated": "No evidence of"}
+        assert predictions[1]["assertions"] == {"historical": "History of"}
+        assert "skipped" not in predictions[1]
+        assert scores["calls_avoided"] == 1
+        assert scores["calls_avoided_by"]["negated"] == 1
+        assert scores["assertions"]["historical"] == 1
+        assert scores["accuracy_routed"] == round(1 / 3, 4)
+        assert scores["accuracy"] == 0.25
+        assert scores["skipped_gold_codes"] == 1
+
+    def test_no_assertion_scores_without_filter(self):
+        """Test that runs without the filter keep their scores and records."""
+        scores, _, predictions = asyncio.run(run_evaluation(EXAMPLES, EchoCoder()))
+        assert "calls_avoided" not in scores
+        assert "assertions" not in predictions[0]
@@ -0,0 +1,341 @@
+"""Tests for the linking service."""
+
+import asyncio
+import json
+
+import pytest
+
+from elinker.coders import CodingResult
+from elinker.retrieval import CandidateRetriever
+from elinker.service import BatcherClosed, LinkingService, MicroBatcher
+
+
+class LastCandidateCoder:
+    """Chooses the last candidate, to tell coder answers from retrieval ones."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def code(self, request):
+        self.requests.append(request)
+        return CodingResult(request.candidates[-1].code, request.candidates[-1].description)
+
+
+@pytest.fixture
+def retriever(code_table):
+    """Retriever over the small code table."""
+    return CandidateRetriever(code_table)
+
+
+async def http(port: int, method: str, target: str, payload=None) -> tuple[int, dict, bytes]:
+    """Send one request to a local server and return (status, headers, body)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, content = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines)
+    return int(status_line.split()[1]), headers, content
+
+
+class TestMicroBatcher:
+    """Test batching of concurrent submissions."""
+
+    def test_concurrent_submissions_share_a_batch(self):
+        """Test that concurrent items are processed together."""
+        sizes = []
+
+        async def process(items):
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        async def run():
+            batcher = MicroBatcher(process, max_batch=8, max_wait=0.05)
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+            await batcher.close()
+            return results
+
+        assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+        assert sizes == [5]
+
+    def test_max_batch(self):
+        """Test that batches are capped at max_batch items."""
+        sizes = []
+
+        async def process(items):
+            sizes.append(len(items))
+            return items
+
+        async def run():
+            batcher = MicroBatcher(process, max_batch=4, max_wait=0.05)
+            await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+            await batcher.close()
+
+        asyncio.run(run())
+        assert sizes == [4, 4, 2]
+
+    def test_latency_cap(self):
+        """Test that a lone item is flushed after max_wait."""
+
+        async def process(items):
+            return items
+
+        async def run():
+            batcher = MicroBatcher(process, max_batch=64, max_wait=0.01)
+            result = await asyncio.wait_for(batcher.submit("a"), timeout=1)
+            await batcher.close()
+            return result
+
+        assert asyncio.run(run()) == "a"
+
+    def test_queue_full(self):
+        """Test that submissions beyond max_queue are rejected."""
+
+        async def process(items):
+            await asyncio.sleep(0.05)
+            return items
+
+        async def run():
+            batcher = MicroBatcher(process, max_batch=1, max_wait=0, max_queue=2, concurrency=1)
+            results = await asyncio.gather(
+                *(batcher.submit(i) for i in range(6)), return_exceptions=True
+            )
+            await batcher.close()
+            return results
+
+        results = asyncio.run(run())
+        assert any(isinstance(r, asyncio.QueueFull) for r in results)
+        assert 0 in results
+
+    def test_errors_are_per_item(self):
+        """Test that a failing item fails only its own submission."""
+
+        async def process(items):
+            return [ValueError("bad") if item == "bad" else item for item in items]
+
+        async def run():
+            batcher = MicroBatcher(process, max_wait=0.01)
+            results = await asyncio.gather(
+                batcher.submit("ok"), batcher.submit("bad"), return_exceptions=True
+            )
+            await batcher.close()
+            return results
+
+        ok, bad = asyncio.run(run())
+        assert ok == "ok"
+        assert isinstance(bad, ValueError)
+
+    def test_close_fails_queued_items(self):
+        """Test that items still waiting at shutdown fail instead of hanging."""
+        release = asyncio.Event()
+
+        async def process(items):
+            await release.wait()
+            return items
+
+        async def run():
+            batcher = MicroBatcher(process, max_batch=1, max_wait=0, concurrency=1)
+            submissions = [asyncio.create_task(batcher.submit(i)) for i in range(4)]
+            await asyncio.sleep(0.01)
+            closing = asyncio.create_task(batcher.close())
+            await asyncio.sleep(0.01)
+            release.set()
+            await closing
+            results = await asyncio.wait_for(
+                asyncio.gather(*submissions, return_exceptions=True), timeout=1
+            )
+            with pytest.raises(BatcherClosed):
+                await batcher.submit(5)
+            return results
+
+        results = asyncio.run(run())
+        assert results[0] == 0  # In flight when closed
+        assert all(isinstance(r, BatcherClosed) for r in results[1:])
+
+
+class TestLinkingService:
+    """Test the service endpoints."""
+
+    def test_link_with_retrieval_only(self, retriever):
+        """Test that /link answers with the top candidate without a coder."""
+        service = LinkingService(retriever, k=3)
+        status, content_type, text = asyncio.run(
+            service.dispatch("POST", "/link", b'{"phrase": "high blood pressure", "id": 7}')
+        )
+        payload = json.loads(text)
+        assert status == 200
+        assert content_type == "application/json"
+        assert payload["id"] == 7
+        assert payload["code"] == "I10"
+        assert len(payload["candidates"]) == 3
+
+    def test_link_with_coder(self, retriever):
+        """Test that the coder chooses among the retrieved candidates."""
+        coder = LastCandidateCoder()
+        service = LinkingService(retriever, coder=coder, k=2)
+
+        async def run():
+            results = await asyncio.gather(
+                service.link({"phrase": "heart failure", "note": "Acute on chronic CHF."}),
+                service.link({"phrase": "kidney failure"}),
+            )
+            await service.close()
+            return results
+
+        first, second = asyncio.run(run())
+        assert first["code"] == first["candidates"][-1]["code"]
+        assert second["code"] == second["candidates"][-1]["code"]
+        assert coder.requests[0].clinical_note == "Acute on chronic CHF."
+        assert service.batcher.batches == 1
+
+    def test_link_requires_phrase(self, retriever):
+        """Test that /link rejects a body without a phrase."""
+        service = LinkingService(retriever)
+        status, _, text = asyncio.run(service.dispatch("POST", "/link", b'{"note": "x"}'))
+        assert status == 400
+        assert "phrase" in json.loads(text)["error"]
+
+    def test_link_invalid_json(self, retriever):
+        """Test that /link rejects a malformed body."""
+        service = LinkingService(retriever)
+        status, _, _ = asyncio.run(service.dispatch("POST", "/link", b"{not json"))
+        assert status == 400
+
+    def test_search(self, retriever):
+        """Test the search endpoint."""
+        service = LinkingService(retriever)
+        status, _, text = asyncio.run(service.dispatch("GET", "/search?q=diabetes&k=1", b""))
+        assert status == 200
+        assert json.loads(text) == [
+            {"code": "E11.9", "description": "Type 2 diabetes mellitus without complications"}
+        ]
+
+    def test_search_runs_off_the_event_loop(self, retriever, monkeypatch):
+        """Test that /search hands the retriever to a worker thread."""
+        service = LinkingService(retriever)
+        threaded = []
+        to_thread = asyncio.to_thread
+
+        async def recording_to_thread(func, *args):
+            threaded.append(func.__name__)
+            return await to_thread(func, *args)
+
+        monkeypatch.setattr(asyncio, "to_thread", recording_to_thread)
+        status, _, _ = asyncio.run(service.dispatch("GET", "/search?q=hypertension", b""))
+        assert status == 200
+        assert threaded == ["search_codes"]
+
+    def test_lookup(self, retriever):
+        """Test the lookup endpoint, including unknown codes."""
+        service = LinkingService(retriever)
+        status, _, text = asyncio.run(service.dispatch("GET", "/lookup?code=i10", b""))
+        assert status == 200
+        assert json.loads(text)["description"] == "Essential (primary) hypertension"
+
+        status, _, _ = asyncio.run(service.dispatch("GET", "/lookup?code=Z99.99", b""))
+        assert status == 404
+
+    def test_method_and_path_errors(self, retriever):
+        """Test wrong methods and unknown endpoints."""
+        service = LinkingService(retriever)
+        assert asyncio.run(service.dispatch("GET", "/link", b""))[0] == 405
+        assert asyncio.run(service.dispatch("GET", "/nope", b""))[0] == 404
+
+    def test_metrics(self, retriever):
+        """Test that /metrics reports counters in Prometheus text format."""
+        service = LinkingService(retriever)
+
+        async def run():
+            await service.dispatch("POST", "/link", b'{"phrase": "hypertension"}')
+            await service.dispatch("GET", "/lookup?code=nope", b"")
+            result = await service.dispatch("GET", "/metrics", b"")
+            await service.close()
+            return result
+
+        status, content_type, text = asyncio.run(run())
+        assert status == 200
+        assert content_type.startswith("text/plain")
+        assert 'elinker_responses_total{endpoint="/link",status="200"} 1' in text
+        assert 'elinker_responses_total{endpoint="/lookup",status="404"} 1' in text
+        assert "elinker_link_batches_total 1" in text
+        assert 'elinker_link_latency_seconds{quantile="0.5"}' in text
+
+
+class TestHTTPServer:
+    """Test the service over a real socket."""
+
+    def test_round_trip(self, retriever):
+        """Test /link, /health and backpressure over HTTP."""
+        service = LinkingService(retriever, k=2)
+
+        async def run():
+            server = await service.serve("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                link = await http(port, "POST", "/link", {"phrase": "COPD exacerbation"})
+                health = await http(port, "GET", "/health")
+            await service.close()
+            return link, health
+
+        (status, headers, body), (health_status, _, health_body) = asyncio.run(run())
+        assert status == 200
+        assert headers["Content-Type"] == "application/json"
+        assert json.loads(body)["code"] == "J44.1"
+        assert health_status == 200
+        assert json.loads(health_body) == {"status": "ok", "codes": 7}
+
+    def test_queue_full_is_503(self, retriever):
+        """Test that a full link queue answers 503 with Retry-After."""
+        service = LinkingService(retriever, max_batch=1, max_wait=0, max_queue=1, concurrency=1)
+
+        async def slow_batch(requests):
+            await asyncio.sleep(0.1)
+            return [{"code": None} for _ in requests]
+
+        service.batcher.process = slow_batch
+
+        async def run():
+            server = await service.serve("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                responses = await asyncio.gather(
+                    *(http(port, "POST", "/link", {"phrase": "x"}) for _ in range(5))
+                )
+            await service.close()
+            return responses
+
+        responses = asyncio.run(run())
+        rejected = [headers for status, headers, _ in responses if status == 503]
+        assert rejected
+        assert rejected[0]["Retry-After"] == "1"
+        assert service.rejected == len(rejected)
+
+    def test_bad_content_length_is_400(self, retriever):
+        """Test that a malformed or negative Content-Length answers 400."""
+        service = LinkingService(retriever)
+
+        async def send(length: str) -> bytes:
+            server = await service.serve("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(
+                    f"POST /link HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1")
+                )
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+            return response
+
+        for length in ("abc", "-5", "1e3", "\xb2"):
+            response = asyncio.run(send(length))
+            assert response.startswith(b"HTTP/1.1 400 ")
+            assert b"Bad Content-Length" in response
@@ -0,0 +1,259 @@
+"""Tests for sharded evaluation and merging of shard runs."""
+
+import asyncio
+import json
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from elinker import cli
+from elinker.coders import CodingResult
+from elinker.codes import CodeTable
+from elinker.context import ContextSelector
+from elinker.exemplars import ExemplarIndex
+from elinker.retrieval import CandidateRetriever
+from elinker.runner import run_evaluation, write_run
+from elinker.shards import merge_runs, parse_shard, select_shard, shard_of, write_shard_info
+
+PHRASES = ["acute kidney failure", "high blood pressure", "copd exacerbation", "diabetes"]
+GOLD = ["N17.9", "I10", "J44.1", "E11.9"]
+
+
+def make_examples(count: int = 40) -> list[dict]:
+    """Spans over several admissions, with two notes per admission."""
+    examples = []
+    for idx in range(count):
+        hadm_id = 100 + idx // 4
+        phrase = PHRASES[idx % 4]
+        text = f"HPI:\nPatient with {phrase}.\n\nPLAN:\nFollow up on {phrase} in clinic."
+        examples.append(
+            {
+                "hadm_id": hadm_id,
+                "note_id": hadm_id * 10 + idx % 2,
+                "text": text,
+                "begin": text.index(phrase),
+                "end": text.index(phrase) + len(phrase),
+                "covered_text": phrase,
+                "code": GOLD[idx % 4],
+            }
+        )
+    return examples
+
+
+class FirstCandidateCoder:
+    """Answers with the top candidate; fails on diabetes spans."""
+
+    async def code(self, request):
+        if request.clinical_phrase == "diabetes":
+            raise RuntimeError("boom")
+        return CodingResult(request.candidates[0].code)
+
+
+def run_shard(
+    records: list[dict],
+    shard: int | None,
+    shards: int,
+    output: str,
+    context: bool,
+    exemplars: bool = False,
+) -> None:
+    """Evaluate one shard (or everything) the way ``elinker evaluate`` does."""
+    examples = make_examples()
+    retriever = CandidateRetriever(CodeTable(records))
+    selector = ContextSelector(max_tokens=8) if context else None
+    index = ExemplarIndex(make_examples(), k=2) if exemplars else None
+
+    positions = list(range(len(examples)))
+    if shard is not None:
+        positions = select_shard(examples, shard, shards)
+
+    scores, report, predictions = asyncio.run(
+        run_evaluation(
+            [examples[p] for p in positions],
+            FirstCandidateCoder(),
+            retriever=retriever,
+            k=3,
+            context=selector,
+            exemplars=index,
+        )
+    )
+    write_run(Path(output), scores, report, predictions)
+    if shard is not None:
+        write_shard_info(
+            Path(output),
+            {
+                "shard": shard,
+                "shards": shards,
+                "data": "mdace.parquet",
+                "split": "dev",
+                "limit": None,
+                "mode": "candidates",
+                "k": 3,
+                "exemplars": 2 if exemplars else None,
+                "context_max_tokens": selector.max_tokens if selector else None,
+                "context_selected_tokens": selector.selected_tokens if selector else 0,
+                "context_original_tokens": selector.original_tokens if selector else 0,
+                "exemplar_totals": index.totals() if index else None,
+                "total_examples": len(examples),
+                "examples": positions,
+            },
+        )
+
+
+def read_run(path):
+    """Scores, report and predictions file contents of a run directory."""
+    return tuple(
+        (path / name).read_text() for name in ("scores.json", "report.txt", "predictions.jsonl")
+    )
+
+
+class TestShardSpec:
+    """Test shard specs and assignment."""
+
+    def test_parse_shard(self):
+        """Test parsing i/n."""
+        assert parse_shard("0/4") == (0, 4)
+        assert parse_shard("3/4") == (3, 4)
+
+    @pytest.mark.parametrize("spec", ["4/4", "-1/2", "1", "a/b", "0/0"])
+    def test_invalid_shard(self, spec):
+        """Test rejecting malformed or out-of-range specs."""
+        with pytest.raises(ValueError, match="Invalid shard"):
+            parse_shard(spec)
+
+    def test_shard_of_is_stable(self):
+        """Test that assignment is a fixed function of the ID."""
+        assert shard_of(100, 4) == shard_of("100", 4) == zlib.crc32(b"100") % 4
+        assert [shard_of(hadm_id, 4) for hadm_id in (100, 101, 102, 103)] == [2, 0, 2, 0]
+
+    def test_admissions_stay_together(self):
+        """Test that every example of an admission lands in the same shard."""
+        examples = make_examples()
+        shards = [set() for _ in range(3)]
+        for shard in range(3):
+            for position in select_shard(examples, shard, 3):
+                shards[shard].add(examples[position]["hadm_id"])
+
+        assert sum(len(s) for s in shards) == len({row["hadm_id"] for row in examples})
+        covered = sorted(p for shard in range(3) for p in select_shard(examples, shard, 3))
+        assert covered == list(range(len(examples)))
+
+
+class TestMergeRuns:
+    """Test merging shard runs."""
+
+    @pytest.mark.parametrize("context", [False, True])
+    def test_merge_matches_single_run(self, tmp_path, code_records, context):
+        """Test that merged shards reproduce the single-node files exactly."""
+        run_shard(code_records, None, 1, str(tmp_path / "single"), context)
+        for shard in range(3):
+            run_shard(code_records, shard, 3, str(tmp_path / f"shard-{shard}"), context)
+
+        scores, report, predictions = merge_runs([tmp_path / f"shard-{s}" for s in (2, 0, 1)])
+        write_run(tmp_path / "merged", scores, report, predictions)
+
+        assert read_run(tmp_path / "merged") == read_run(tmp_path / "single")
+        assert json.loads((tmp_path / "merged" / "scores.json").read_text())["errors"] > 0
+
+    def test_merge_keeps_exemplar_scores(self, tmp_path, code_records):
+        """Test that merged shards report the exemplar cost of the single-node run."""
+        run_shard(code_records, None, 1, str(tmp_path / "single"), False, exemplars=True)
+        for shard in range(3):
+            run_shard(code_records, shard, 3, str(tmp_path / f"s{shard}"), False, exemplars=True)
+
+        scores, _, _ = merge_runs([tmp_path / f"s{s}" for s in range(3)])
+        single = json.loads((tmp_path / "single" / "scores.json").read_text())
+        for key in ("exemplars_per_request", "exemplar_tokens_per_request"):
+            assert scores[key] == single[key] > 0
+        assert scores["exemplar_index_seconds"] > 0
+        assert scores["exemplar_lookup_ms"] >= 0
+
+    def test_merge_shards_from_processes(self, tmp_path, code_records):
+        """Test merging shards evaluated by separate processes."""
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=3, mp_context=context) as pool:
+            futures = [
+                pool.submit(run_shard, code_records, shard, 3, str(tmp_path / f"s{shard}"), False)
+                for shard in range(3)
+            ]
+            for future in futures:
+                future.result()
+        run_shard(code_records, None, 1, str(tmp_path / "single"), False)
+
+        scores, report, predictions = merge_runs([tmp_path / f"s{s}" for s in range(3)])
+        write_run(tmp_path / "merged", scores, report, predictions)
+        assert read_run(tmp_path / "merged") == read_run(tmp_path / "single")
+
+    def test_missing_shard(self, tmp_path, code_records):
+        """Test that a missing shard is reported."""
+        for shard in (0, 2):
+            run_shard(code_records, shard, 3, str(tmp_path / f"s{shard}"), False)
+
+        with pytest.raises(ValueError, match=r"missing \[1\]"):
+            merge_runs([tmp_path / "s0", tmp_path / "s2"])
+
+    def test_repeated_shard(self, tmp_path, code_records):
+        """Test that a shard given twice is reported."""
+        run_shard(code_records, 0, 2, str(tmp_path / "s0"), False)
+
+        with pytest.raises(ValueError, match=r"repeated \[0\]"):
+            merge_runs([tmp_path / "s0", tmp_path / "s0"])
+
+    def test_mismatched_settings(self, tmp_path, code_records):
+        """Test that shards of different runs are not merged."""
+        run_shard(code_records, 0, 2, str(tmp_path / "s0"), False)
+        run_shard(code_records, 1, 2, str(tmp_path / "s1"), False)
+        info = json.loads((tmp_path / "s1" / "shard.json").read_text())
+        info["split"] = "test"
+        (tmp_path / "s1" / "shard.json").write_text(json.dumps(info))
+
+        with pytest.raises(ValueError, match="split='test'"):
+            merge_runs([tmp_path / "s0", tmp_path / "s1"])
+
+    def test_truncated_predictions(self, tmp_path, code_records):
+        """Test that a shard with missing predictions is reported."""
+        run_shard(code_records, 0, 2, str(tmp_path / "s0"), False)
+        run_shard(code_records, 1, 2, str(tmp_path / "s1"), False)
+        path = tmp_path / "s1" / "predictions.jsonl"
+        path.write_text("".join(path.read_text().splitlines(keepends=True)[:-1]))
+
+        with pytest.raises(ValueError, match="predictions for"):
+            merge_runs([tmp_path / "s0", tmp_path / "s1"])
+
+    def test_not_a_shard_run(self, tmp_path):
+        """Test that directories without shard.json are rejected."""
+        with pytest.raises(ValueError, match="not a shard run"):
+            merge_runs([tmp_path])
+
+
+class TestMergeRunsCommand:
+    """Test the merge-runs command."""
+
+    def test_merge_runs_command(self, tmp_path, code_records):
+        """Test writing merged results from the CLI."""
+        run_shard(code_records, 0, 2, str(tmp_path / "s0"), False)
+        run_shard(code_records, 1, 2, str(tmp_path / "s1"), False)
+
+        with pytest.raises(SystemExit) as exc_info:
+            cli.app(
+                [
+                    "merge-runs",
+                    str(tmp_path / "s0"),
+                    str(tmp_path / "s1"),
+                    "--output",
+                    str(tmp_path / "merged"),
+                ]
+            )
+        assert exc_info.value.code in (0, None)
+        assert (tmp_path / "merged" / "scores.json").is_file()
+
+    def test_merge_runs_incomplete(self, tmp_path, code_records):
+        """Test that incomplete coverage fails the command."""
+        run_shard(code_records, 0, 2, str(tmp_path / "s0"), False)
+
+        with pytest.raises(SystemExit) as exc_info:
+            cli.app(["merge-runs", str(tmp_path / "s0"), "--output", str(tmp_path / "m")])
+        assert exc_info.value.code == 1
@@ -0,0 +1,95 @@
+"""Tests for CLI startup cost."""
+
+import json
+import re
+import subprocess
+import sys
+
+# Total import time allowed for `elinker --help`, in milliseconds. A plain
+# interpreter start with cyclopts and rich is roughly half of this.
+STARTUP_BUDGET_MS = 500
+
+# Packages that must only be imported by the command that needs them
+HEAVY_MODULES = (
+    "anthropic",
+    "datasets",
+    "dspy",
+    "jinja2",
+    "litellm",
+    "mlflow",
+    "numpy",
+    "polars",
+    "pyarrow",
+    "sklearn",
+    "streamlit",
+    "textual",
+    "torch",
+    "transformers",
+)
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def _importtime(code: str) -> list[tuple[int, int, str]]:
+    """Run code with ``-X importtime`` and return ``(cumulative_us, depth, module)`` rows."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            rows.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    return rows
+
+
+def _loaded_modules(argv: list[str]) -> set[str]:
+    """Run the CLI with some arguments and return the modules it imported."""
+    code = (
+        "import json, sys\n"
+        "from elinker.cli import app\n"
+        "try:\n"
+        f"    app.meta({argv!r})\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "sys.stderr.write(json.dumps(sorted(sys.modules)))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=False
+    )
+    return set(json.loads(result.stderr.splitlines()[-1]))
+
+
+class TestStartup:
+    """Test that quick CLI invocations stay fast."""
+
+    def test_help_within_budget(self):
+        """Test that `elinker --help` imports within the startup budget."""
+        rows = _importtime(
+            "from elinker.cli import app\ntry:\n    app.meta(['--help'])\nexcept SystemExit:\n    pass"
+        )
+        total_ms = sum(cumulative for cumulative, depth, _ in rows if depth == 0) / 1000
+
+        slowest = sorted((row for row in rows if row[1] == 0), reverse=True)[:5]
+        assert total_ms < STARTUP_BUDGET_MS, f"{total_ms:.0f} ms; slowest: {slowest}"
+
+    def test_help_skips_heavy_modules(self):
+        """Test that rendering help for every command imports no heavy package."""
+        modules = _loaded_modules(["--help"])
+        assert "elinker.commands.evaluate" in modules
+
+        heavy = {name for name in modules if name.split(".")[0] in HEAVY_MODULES}
+        assert not heavy
+
+    def test_commands_load_lazily(self, tmp_path):
+        """Test that running one command does not import the others."""
+        path = tmp_path / "doc.json"
+        path.write_text('{"a": 1}')
+
+        modules = _loaded_modules(["view-json", str(path)])
+        assert "elinker.commands.evaluate" not in modules
+        assert "elinker.viewer" not in modules
@@ -0,0 +1,402 @@
+"""Tests for the annotation viewer."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from textual.widgets import SelectionList
+
+from elinker.viewer import (
+    GOLD_STYLE,
+    PREDICTED_STYLE,
+    AnnotationGroup,
+    AnnotationTable,
+    DiffViewer,
+    ICD10Viewer,
+    SearchIndex,
+    chapter,
+)
+
+
+@pytest.fixture
+def data():
+    """An admission with two notes."""
+    return {
+        "hadm_id": 1,
+        "notes": [
+            {
+                "note_id": 10,
+                "category": "Discharge summary",
+                "text": "Creatinine rose.\nAcute kidney injury.",
+                "annotations": [{"begin": 17, "end": 36, "code": "N17.9"}],
+            },
+            {
+                "note_id": 11,
+                "category": "Nursing",
+                "text": "Kidney function improving; creatinine down.",
+                "annotations": [],
+            },
+        ],
+    }
+
+
+class TestSearchIndex:
+    """Test the inverted index over note text."""
+
+    def test_word_prefix(self):
+        """Test that a single word matches the start of longer words."""
+        index = SearchIndex("Creatinine and CREAT kinase; recreate")
+        assert index.search("creat") == [(0, 5), (15, 20)]
+
+    def test_phrase(self):
+        """Test that later words of a phrase are checked in place."""
+        index = SearchIndex("acute kidney injury, acute  kidney, acute kidneys")
+        assert index.search("Acute kidney") == [(0, 12), (36, 48)]
+
+    def test_words_stop_at_note_boundaries(self):
+        """Test that a word starting a note is found when the previous note ends in one."""
+        index = SearchIndex("Elevated creatinineCreatinine 2.1", starts=[0, 19])
+        assert index.search("creatinine") == [(9, 19), (19, 29)]
+
+    def test_non_word_query(self):
+        """Test queries that do not start with a word character."""
+        index = SearchIndex("BP 120/80, HR 80")
+        assert index.search("/80") == [(6, 9)]
+        assert index.search("  ") == []
+
+
+class TestViewerSearch:
+    """Test mapping hits to notes and stepping through them."""
+
+    def test_hits_in_note_offsets(self, data):
+        """Test that hits are reported per note, in note offsets."""
+        viewer = ICD10Viewer(data, Path("admission.json"))
+        viewer.search("kidney")
+        assert viewer.matches == [(0, 23, 29), (1, 0, 6)]
+        assert viewer.match_index == 0
+
+        viewer.search("injury. kidney")
+        assert viewer.matches == []
+        assert viewer.match_index == -1
+
+    def test_hit_at_start_of_note(self):
+        """Test that a hit opening a note is found after a note ending in a word."""
+        data = {
+            "hadm_id": 1,
+            "notes": [
+                {"note_id": 1, "text": "Elevated creatinine", "annotations": []},
+                {"note_id": 2, "text": "Creatinine 2.1", "annotations": []},
+            ],
+        }
+        viewer = ICD10Viewer(data, Path("admission.json"))
+        viewer.search("creatinine")
+        assert viewer.matches == [(0, 9, 19), (1, 0, 10)]
+
+    def test_keyboard_navigation(self, data):
+        """Test typing a query and moving between hits with n and N."""
+
+        async def run():
+            viewer = ICD10Viewer(data, Path("admission.json"))
+            async with viewer.run_test() as pilot:
+                await pilot.press("/", *"creatinine", "enter")
+                assert len(viewer.matches) == 2
+                assert viewer.query_one("#search").border_title == "Match 1 of 2"
+                await pilot.press("n")
+                assert viewer.match_index == 1
+                await pilot.press("n")
+                assert viewer.match_index == 0
+                await pilot.press("N")
+                assert viewer.match_index == 1
+
+        asyncio.run(run())
+
+
+@pytest.fixture
+def coded():
+    """An admission with codes from several chapters."""
+    notes = [
+        {
+            "note_id": 1,
+            "text": "x" * 100,
+            "annotations": [
+                {"begin": 50, "end": 51, "code": "I10", "description": "Essential hypertension"},
+                {"begin": 10, "end": 11, "code": "N17.9", "description": "Acute kidney failure"},
+                {"begin": 20, "end": 21, "code": "I50.9", "description": "Heart failure"},
+                {"begin": 30, "end": 31, "code": "I50.9", "description": "Heart failure"},
+                {"begin": 40, "end": 41, "code": "D64.9", "description": "Anemia"},
+                {"begin": 60, "end": 61, "code": "D49.9", "description": "Neoplasm"},
+            ],
+        }
+    ]
+    return {"hadm_id": 2, "notes": notes}
+
+
+class TestCodeList:
+    """Test filtering, sorting and bulk selection in the code list."""
+
+    def test_filter_and_sort(self, coded):
+        """Test code-prefix and description filters and the sort orders."""
+        viewer = ICD10Viewer(coded, Path("admission.json"))
+
+        def codes():
+            return [viewer.sorted_groups[idx].code for idx in viewer.visible_groups()]
+
+        assert codes() == ["D49.9", "D64.9", "I10", "I50.9", "N17.9"]
+        viewer.sort = "count"
+        assert codes()[0] == "I50.9"
+        viewer.sort = "first"
+        assert codes() == ["N17.9", "I50.9", "D64.9", "I10", "D49.9"]
+
+        viewer.filter_codes("i50")
+        assert codes() == ["I50.9"]
+        viewer.filter_codes("FAILURE")
+        assert codes() == ["N17.9", "I50.9"]
+
+    def test_chapters(self, coded):
+        """Test that chapters follow ICD-10-CM ranges, not first letters."""
+        viewer = ICD10Viewer(coded, Path("admission.json"))
+        groups = viewer.annotation_groups
+        assert chapter(groups["D49.9"]) == "C00"
+        assert chapter(groups["D64.9"]) == "D50"
+        assert chapter(groups["I10"]) == chapter(groups["I50.9"])
+
+    def test_bulk_selection(self, coded):
+        """Test selecting filtered codes and toggling a chapter from the keyboard."""
+
+        async def run():
+            viewer = ICD10Viewer(coded, Path("admission.json"))
+            async with viewer.run_test() as pilot:
+                code_list = viewer.query_one("#code-list", SelectionList)
+
+                def selected():
+                    return sorted(viewer.sorted_groups[i].code for i in viewer.selected_groups)
+
+                await pilot.press("f", *"failure", "enter", "a")
+                assert selected() == ["I50.9", "N17.9"]
+                assert sorted(code_list.selected) == sorted(viewer.selected_groups)
+
+                await pilot.press("f", *["backspace"] * 7, "enter")
+                assert len(code_list.options) == 5
+                assert sorted(code_list.selected) == sorted(viewer.selected_groups)
+                await pilot.press("d")
+                assert selected() == []
+
+                # Highlight D64.9 and select chapter III
+                await pilot.press("down", "down", "c")
+                assert code_list.highlighted == 1
+                assert selected() == ["D64.9"]
+                await pilot.press("space")
+                assert selected() == []
+
+                await pilot.press("s")
+                assert viewer.sort == "count"
+                assert code_list.get_option_at_index(0).value == viewer.shown[0]
+
+        asyncio.run(run())
+
+
+class TestSpanNavigation:
+    """Test jumping between annotated spans."""
+
+    @pytest.fixture
+    def long_notes(self):
+        """Two long notes with codes far apart."""
+        text = "\n".join(f"line {i}" for i in range(200))
+        second = text.index("line 150")
+        return {
+            "hadm_id": 3,
+            "notes": [
+                {
+                    "note_id": 1,
+                    "text": text,
+                    "annotations": [
+                        {"begin": second, "end": second + 4, "code": "I10"},
+                        {"begin": 0, "end": 4, "code": "I10"},
+                        {"begin": 0, "end": 4, "code": "E11.9"},
+                    ],
+                },
+                {
+                    "note_id": 2,
+                    "text": text,
+                    "annotations": [{"begin": 7, "end": 13, "code": "I10"}],
+                },
+            ],
+        }
+
+    def test_global_order(self, long_notes):
+        """Test that spans are ordered by note, then offset within the note."""
+        viewer = ICD10Viewer(long_notes, Path("admission.json"))
+        second = long_notes["notes"][0]["annotations"][0]["begin"]
+        assert [viewer._span_at(idx)[:2] for idx in viewer.spans] == [
+            (0, 0),
+            (0, 0),
+            (0, second),
+            (1, 7),
+        ]
+        assert [viewer._span_label(idx) for idx in viewer.spans[:2]] == ["E11.9", "I10"]
+
+    def test_steps_through_selected_codes(self, long_notes):
+        """Test that j / k visit the selected code's spans, wrapping around."""
+        viewer = ICD10Viewer(long_notes, Path("admission.json"))
+
+        viewer.action_next_span()
+        assert viewer.span_index == 0  # Nothing selected: every span
+
+        viewer.selected_groups = {viewer.sorted_groups.index(viewer.annotation_groups["I10"])}
+        visited = []
+        for _ in range(4):
+            viewer.action_next_span()
+            visited.append(viewer.span_index)
+        assert visited == [1, 2, 3, 1]
+
+        viewer.action_previous_span()
+        assert viewer.span_index == 3
+
+    def test_scrolls_to_span(self, long_notes):
+        """Test that jumping scrolls the span into view."""
+
+        async def run():
+            viewer = ICD10Viewer(long_notes, Path("admission.json"))
+            async with viewer.run_test() as pilot:
+                panel = viewer.query_one("#text-panel")
+                await pilot.press("j", "j", "j")
+                await pilot.pause()
+                assert viewer.span_index == 2
+                assert panel.scroll_y > 100
+                assert panel.border_subtitle == "Span 3 of 4: I10"
+
+                await pilot.press("k", "k")
+                await pilot.pause()
+                assert panel.scroll_y < 20
+
+        asyncio.run(run())
+
+
+class TestAnnotationTable:
+    """Test the columnar annotation store."""
+
+    def test_columns_and_groups(self):
+        """Test interned codes, row order and the rows of each code group."""
+        table = AnnotationTable()
+        table.add(1, {"begin": 5, "end": 9, "code": "I10", "description": "Hypertension"})
+        table.add(0, {"code": "E11.9"})
+        table.add(0, {"begin": 2, "end": 4, "code": "I10", "description": "Hypertension"})
+        table.sort()
+
+        assert table.codes == ["I10", "E11.9"]
+        assert table.descriptions == ["Hypertension", ""]
+        assert list(table.note) == [0, 1, 0]  # Unlocated rows last
+        assert list(table.begin) == [2, 5, -1]
+        assert table.located == 2
+        assert table.note_rows(0) == range(0, 1)
+        assert table.note_rows(1) == range(1, 2)
+        assert {column.itemsize for column in (table.begin, table.end, table.note, table.code)} == {
+            4
+        }
+
+        group = AnnotationGroup(table, table.code_ids["I10"])
+        group.rows.extend(row for row, code in enumerate(table.code) if code == group.code_id)
+        assert (group.count, group.first, group.description) == (2, (0, 2), "Hypertension")
+
+
+class TestDiffViewer:
+    """Test the gold-vs-prediction viewer."""
+
+    def test_colors_and_navigation(self):
+        """Test span styles, the code list and stepping through errors."""
+        data = {
+            "hadm_id": 1,
+            "notes": [
+                {
+                    "note_id": 7,
+                    "text": "HTN and DM2 and AKI and CKD",
+                    "annotations": [
+                        {"begin": 0, "end": 3, "code": "I10"},
+                        {"begin": 8, "end": 11, "code": "E11.9"},
+                        {"begin": 16, "end": 19, "code": "N17.9"},
+                    ],
+                }
+            ],
+        }
+        records = [
+            {"hadm_id": 1, "note_id": 7, "begin": 0, "end": 3, "predicted": "I10"},
+            {"hadm_id": 1, "note_id": 7, "begin": 8, "end": 11, "predicted": "E11.65"},
+            {"hadm_id": 1, "note_id": 7, "begin": 24, "end": 27, "predicted": "N18.9"},
+        ]
+
+        async def run():
+            viewer = DiffViewer(data, Path("admission.json"), records)
+            async with viewer.run_test() as pilot:
+                assert viewer._note_styles(0) == [
+                    (0, 3, "bold underline green"),
+                    (8, 11, "bold underline magenta"),
+                    (16, 19, "bold underline yellow"),
+                    (24, 27, "bold underline red"),
+                ]
+                assert sorted(viewer.annotation_groups) == [
+                    "E11.65",
+                    "E11.9",
+                    "I10",
+                    "N17.9",
+                    "N18.9",
+                ]
+                assert "False negative: 1" in str(viewer.query_one("#diff-summary Static").render())
+
+                panel = viewer.query_one("#text-panel")
+                await pilot.press("j")
+                assert (
+                    panel.border_subtitle == "Span 1 of 3: Wrong code: gold E11.9, predicted E11.65"
+                )
+                await pilot.press("j", "j")
+                assert panel.border_subtitle == "Span 3 of 3: False positive: N18.9"
+
+        asyncio.run(run())
+
+    def test_predicted_spans_kept_apart(self):
+        """Test predicted spans are counted and highlighted apart from gold ones."""
+        data = {
+            "hadm_id": 1,
+            "notes": [
+                {
+                    "note_id": 7,
+                    "text": "HTN and CKD",
+                    "annotations": [{"begin": 0, "end": 3, "code": "I10"}],
+                }
+            ],
+        }
+        records = [
+            {"hadm_id": 1, "note_id": 7, "begin": 0, "end": 3, "predicted": "I10"},
+            {"hadm_id": 1, "note_id": 7, "begin": 8, "end": 11, "predicted": "I10"},
+        ]
+        viewer = DiffViewer(data, Path("admission.json"), records)
+
+        group = viewer.annotation_groups["I10"]
+        assert (group.count, group.predicted) == (1, 1)
+        assert "+1 predicted" in group.label().plain
+        assert viewer.gold_codes == 1
+        assert data["notes"][0]["annotations"] == [{"begin": 0, "end": 3, "code": "I10"}]
+
+        text = viewer._highlight_text(viewer.notes[0].text, viewer.notes[0].rows, {group.code_id})
+        styles = {(span.start, span.end): str(span.style) for span in text.spans}
+        assert styles == {(0, 3): GOLD_STYLE, (8, 11): PREDICTED_STYLE}
+
+    def test_keeps_no_annotation_dicts(self):
+        """Test that the viewer keeps offsets and codes, not the JSON it was given."""
+        data = {
+            "hadm_id": 1,
+            "notes": [
+                {
+                    "note_id": 7,
+                    "text": "HTN",
+                    "annotations": [{"begin": 0, "end": 3, "code": "I10"}],
+                }
+            ],
+        }
+        records = [{"hadm_id": 1, "note_id": 7, "begin": 0, "end": 3, "predicted": "I11.9"}]
+        viewer = DiffViewer(data, Path("admission.json"), records)
+
+        assert not hasattr(viewer, "data")
+        assert viewer._predicted is None
+        span = viewer.alignments[0][0]
+        assert not hasattr(span, "__dict__")
+        assert (span.kind, span.gold_code, span.predicted_code) == ("wrong_code", "I10", "I11.9")